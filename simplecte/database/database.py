@@ -1,10 +1,26 @@
-from ftplib import FTP
-from typing import TYPE_CHECKING, Any, Callable
+import ftplib
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from inspect import signature
+from typing import TYPE_CHECKING, Any, Callable, Iterator
 
 from pony import orm
 
+from database.ftp import FTPCache, FTPWriteBack, FTPConflictError
+from database.fuzzy import NameIndex
+from database.graph import RecordGraph
+from database.stats import Statistics
+from database.migrations import migrate
+from database.queries import TracedCursor, record_query
+from database.readpool import ReadPool, enable_wal, table_values as read_table_values
+from database.remote import RemoteDatabase, ServerReplica
+from database.server import DEFAULT_PORT
+from database.replication import enable_replication, get_id_block, id_range
 from utils.enums import DBStatus
-from utils.helpers import format_phone
+from utils.helpers import format_phone, join_phone, split_phone
+from utils.phonetics import name_codes
 from layouts import get_field_keys, get_sort_keys
 
 if TYPE_CHECKING:
@@ -17,23 +33,57 @@ __all__ = (
     "Organization",
     "Contact",
     "Resource",
+    "Membership",
+    "Phone",
+    "NameSound",
+    "PRIMARY_TITLE",
     "get_table_values",
-    "search_and_destroy",
+    "records_changed",
 )
 
+# The title that makes a contact the primary contact of an organization
+PRIMARY_TITLE = "Primary"
 
-def search_and_destroy(func: "Callable") -> "Callable":
+
+def records_changed(func: "Callable") -> "Callable":
     """
-    Decorator for functions that delete an object, so they can
-    go through the app's stack and remove the deleted object
-    using the app.stack.search_and_pop() function, referencing
-    app from the subclass's self.app variable.
+    Decorator for methods that change records. Once the method is done, the
+    database's change listeners get the (record type, ID) of every record it changed,
+    taken from its contact, org and resource arguments, any duplicates merged into
+    them, and the record it returns.
     """
+    parameters = signature(func)
 
+    @wraps(func)
     def wrapper(*args, **kwargs):
-        app: "App" = args[0].app
-        func(*args, **kwargs)
-        app.stack.search_and_pop(args[1])
+        self: "Database" = args[0]
+        result = func(*args, **kwargs)
+
+        if not self.change_listeners:
+            return result
+
+        arguments = parameters.bind(*args, **kwargs).arguments
+        changed = set()
+
+        for name, record_type in (
+            ("contact", "contact"),
+            ("org", "organization"),
+            ("resource", "resource"),
+        ):
+            if (record := arguments.get(name)) is not None:
+                changed.add((record_type, getattr(record, "id", record)))
+
+                # Records that were merged into this one, see merge_contacts()
+                for duplicate in arguments.get("duplicates", ()):
+                    changed.add((record_type, getattr(duplicate, "id", duplicate)))
+
+        if isinstance(result, orm.core.Entity):
+            changed.add((type(result).__name__.lower(), result.id))
+
+        for listener in self.change_listeners:
+            listener(changed)
+
+        return result
 
     return wrapper
 
@@ -50,7 +100,100 @@ class Database(orm.Database):
         self.organizations_page = 0
         self.status = DBStatus.DISCONNECTED
         self.password = None
-        self.app = None
+        self.ftp_cache: FTPCache | None = None
+        self.ftp_writeback: FTPWriteBack | None = None
+        self.server_replica: ServerReplica | None = None
+        self.commit_listeners: list[Callable[[], None]] = []
+
+        # Told which records each write method changed, see records_changed()
+        self.change_listeners: list[Callable[[set[tuple[str, int]]], None]] = []
+
+        # Read-only connections for searches, table loading and exports, see readpool.py
+        self.read_pool: ReadPool | None = None
+
+        # Typo-tolerant name search, see fuzzy.py
+        self.name_index = NameIndex()
+        self.change_listeners.append(self.name_index.invalidate)
+
+        # Links between records for queries that follow them, see graph.py
+        self.graph = RecordGraph()
+        self.change_listeners.append(self.graph.invalidate)
+
+        # Counts for the statistics dashboard, see stats.py
+        self.statistics = Statistics()
+        self.change_listeners.append(self.statistics.invalidate)
+
+        # The block new record IDs come from when the database is replicated, see replication.py
+        self.id_block: int | None = None
+        self._local = threading.local()
+
+    def _exec_sql(self, sql, arguments=None, *args, **kwargs):
+        # Every statement Pony runs goes through here, so it's counted, see queries.py
+        start = time.perf_counter()
+        result = super()._exec_sql(sql, arguments, *args, **kwargs)
+        duration = time.perf_counter() - start
+        explain = self._explain if self.provider.dialect == "SQLite" else None
+
+        # Inserts return the new ID instead of a cursor
+        if not hasattr(result, "fetchone"):
+            record_query(sql, arguments, duration, explain)
+            return result
+
+        # Pony fetches the rows after this returns, which is when SQLite finds most of them
+        return TracedCursor(result, sql, arguments, duration, explain)
+
+    def _explain(self, sql: str, arguments: Any) -> list[tuple]:
+        """
+        Get the plan of one of Pony's statements, for the slow query log.
+        """
+        return (
+            self.get_connection()
+            .execute(f"EXPLAIN QUERY PLAN {sql}", arguments or ())
+            .fetchall()
+        )
+
+    def commit(self) -> None:
+        """
+        Commit the current transaction and tell everything listening for changes about it.
+        Inside group_commit(), changes are only flushed, and committed when the group ends.
+        """
+        if getattr(self._local, "group_commit", False):
+            self.flush()
+            return
+
+        super().commit()
+
+        for listener in self.commit_listeners:
+            listener()
+
+    @contextmanager
+    def group_commit(self) -> Iterator[None]:
+        """
+        Run several write methods as one transaction, so they cost a single commit.
+        If anything in the group fails, none of it is committed.
+        """
+        self._local.group_commit = True
+
+        try:
+            with orm.db_session:
+                yield
+        finally:
+            self._local.group_commit = False
+
+        for listener in self.commit_listeners:
+            listener()
+
+    def read(self, query: Callable[[Any], Any]) -> Any:
+        """
+        Run query(connection) on a connection from the read pool, or on the current
+        session's connection if the database has no read pool, and return its result.
+        """
+        if self.read_pool is not None:
+            with self.read_pool.snapshot() as connection:
+                return query(connection)
+
+        with orm.db_session:
+            return query(self.get_connection())
 
     @orm.db_session
     def get_records(
@@ -61,7 +204,7 @@ class Database(orm.Database):
         sort: str = "",
         paginated: bool = True,
         descending: bool = False,
-    ) -> orm.core.Query | bool:
+    ) -> orm.core.Query | list | bool:
         """
         Get a list of records from the database.
         Field can include, based on the GUI implementation,
@@ -100,14 +243,29 @@ class Database(orm.Database):
         if sort and sort not in sort_key:
             sort = ""
 
+        page = (
+            self.contacts_page
+            if record_type == Contact
+            else (self.organizations_page if record_type == Organization else 1)
+        )
+
         if (
-            field == "phone" or field == "id" or field == "associated with resource..."
+            field == "id" or field == "associated with resource..."
         ) and not query.isdigit():
             return False
 
-        if field == "phone" or field == "id":
+        if field == "id":
             query = int(query)
 
+        if field == "phone":
+            try:
+                digits, _ = split_phone(query)
+            except ValueError:
+                return False
+
+        if field == "sounds like" and not (sounds := name_codes(query)):
+            return False
+
         if not field or field not in field_key.keys():
             db_query = orm.select(r for r in record_type)
 
@@ -151,7 +309,58 @@ class Database(orm.Database):
                 r for r in record_type if resource in getattr(r, field_key[field])
             )
 
-        elif field == "address" or field == "phone" or field == "email":
+        elif field == "phone":
+            # Numbers that start or end with the digits, found with range scans of the phone index
+            reversed_digits = digits[::-1]
+            owner = "organization" if record_type == Organization else "contact"
+            matches = orm.select(
+                getattr(p, owner).id
+                for p in Phone
+                if (p.digits >= digits and p.digits < digits + ":")
+                or (
+                    p.reversed_digits >= reversed_digits
+                    and p.reversed_digits < reversed_digits + ":"
+                )
+            )
+            db_query = orm.select(r for r in record_type if r.id in matches)
+
+        elif field == "fuzzy name":
+            matches = self.name_index.search(
+                self.get_connection(), record_type_str, query
+            )
+            db_query = orm.select(r for r in record_type if r.id in matches)
+
+            # Without a sort, the closest matches come first. Pony can't order by where
+            # the ID is in a list, so the page of IDs is taken and ordered here instead.
+            if not sort:
+                if paginated:
+                    matches = matches[(page - 1) * 10 : page * 10]
+
+                closeness = {record_id: i for i, record_id in enumerate(matches)}
+                records = orm.select(r for r in record_type if r.id in matches)
+
+                return sorted(records, key=lambda r: closeness[r.id])
+
+        elif field == "sounds like":
+            # Records with a word that sounds like each word of the query
+            owner = "organization" if record_type == Organization else "contact"
+            matches = None
+
+            for word in sounds:
+                codes = sorted(word)
+                found = set(
+                    orm.select(
+                        getattr(s, owner).id
+                        for s in NameSound
+                        if s.code in codes and getattr(s, owner) is not None
+                    )
+                )
+                matches = found if matches is None else matches & found
+
+            matches = list(matches)
+            db_query = orm.select(r for r in record_type if r.id in matches)
+
+        elif field == "address" or field == "email":
             # Search through each item in the array, making each item lowercase if its a string
             # using the same hacky method as above, unfortunately.
             db_query = orm.select(r for r in record_type)
@@ -188,12 +397,7 @@ class Database(orm.Database):
                 db_query = db_query.order_by(getattr(record_type, sort_key[sort]))
 
         if paginated:
-            return db_query.page(
-                self.contacts_page
-                if record_type == Contact
-                else (self.organizations_page if record_type == Organization else 1),
-                10,
-            )
+            return db_query.page(page, 10)
         else:
             return db_query
 
@@ -205,41 +409,156 @@ class Database(orm.Database):
     def get_organization(self, org_id: int) -> "Organization":
         return Organization.get(id=org_id)
 
+    def next_id(self, entity: "type[Organization | Contact | Resource]") -> int | None:
+        """
+        Get the ID for a new record from this database's ID block, so records created in
+        replicated databases never get the same ID. Returns None if the database isn't
+        replicated, in which case SQLite picks the ID.
+        """
+        return self.next_ids(entity, 1)[0]
+
+    def next_ids(self, entity: "type[orm.core.Entity]", count: int) -> list[int | None]:
+        """
+        Get the IDs for count new records, like next_id(). A loop that creates several
+        records has to get their IDs all at once, since the records it already created
+        aren't in the database yet.
+        """
+        if self.id_block is None:
+            return [None] * count
+
+        # Records made earlier in this session, such as by other writes in a group commit
+        orm.flush()
+
+        start, end = id_range(self.id_block)
+        highest = orm.max(r.id for r in entity if r.id >= start and r.id < end)
+        first = (highest or start - 1) + 1
+
+        return list(range(first, first + count))
+
+    def _set_phones(self, record: "Organization | Contact", phones: list) -> None:
+        """
+        Set the phone numbers of a record and update its phone index.
+        Numbers can be ints or text as it was typed, which keeps their leading zeros
+        and extensions in the index. Raises ValueError if one isn't a phone number.
+        """
+        numbers = [split_phone(phone) for phone in phones]
+        owner = "organization" if isinstance(record, Organization) else "contact"
+
+        setattr(
+            record,
+            "phones" if owner == "organization" else "phone_numbers",
+            [int(digits) for digits, _ in numbers],
+        )
+
+        for phone in list(record.phone_index):
+            phone.delete()
+
+        for (digits, extension), phone_id in zip(
+            numbers, self.next_ids(Phone, len(numbers))
+        ):
+            values = {
+                "digits": digits,
+                "reversed_digits": digits[::-1],
+                "extension": extension,
+                owner: record,
+            }
+
+            if phone_id:
+                values["id"] = phone_id
+
+            Phone(**values)
+
+    def _set_sounds(self, record: "Organization | Contact") -> None:
+        """
+        Update the phonetic codes of a record's name, after it's created or renamed.
+        """
+        owner = "organization" if isinstance(record, Organization) else "contact"
+
+        for sound in list(record.sound_index):
+            sound.delete()
+
+        codes = set().union(*name_codes(record.name))
+
+        for code, sound_id in zip(codes, self.next_ids(NameSound, len(codes))):
+            values = {"code": code, owner: record}
+
+            if sound_id:
+                values["id"] = sound_id
+
+            NameSound(**values)
+
+    @orm.db_session
+    def get_phone_numbers(
+        self, contact: "Contact | int" = None, org: "Organization | int" = None
+    ) -> list[str]:
+        """
+        Get the phone numbers of a contact or organization, formatted the way they were typed.
+        """
+        if isinstance(contact, int):
+            contact = Contact.get(id=contact)
+
+        if isinstance(org, int):
+            org = Organization.get(id=org)
+
+        record = contact or org
+
+        if record is None:
+            return []
+
+        return [phone.number for phone in record.phone_index.order_by(Phone.id)]
+
+    @records_changed
     @orm.db_session
     def create_contact(self, **kwargs) -> "Contact":
         values = kwargs.copy()
-        if phone := values.get("phone_number", None):
-            values["phone_numbers"] = [phone]
-            del values["phone_number"]
+        phones = values.pop("phone_numbers", [])
+
+        if phone := values.pop("phone_number", None):
+            phones = [phone]
 
         if address := values.get("address", None):
             values["addresses"] = [address]
             del values["address"]
 
+        if record_id := self.next_id(Contact):
+            values["id"] = record_id
+
         contact = Contact(**values)
+        self._set_phones(contact, phones)
+        self._set_sounds(contact)
         self.commit()
 
         return contact
 
+    @records_changed
     @orm.db_session
     def create_organization(self, **kwargs) -> "Organization":
         values = kwargs.copy()
-        if phone := values.get("phone_number", None):
-            try:
-                values["phones"] = [int(phone)]
-            except ValueError:
-                values["phones"] = []
-            del values["phone_number"]
+        phones = values.pop("phones", [])
+
+        if phone := values.pop("phone_number", None):
+            phones = [phone]
 
         if address := values.get("address", None):
             values["addresses"] = [address]
             del values["address"]
 
+        if record_id := self.next_id(Organization):
+            values["id"] = record_id
+
         organization = Organization(**values)
+        self._set_sounds(organization)
+
+        try:
+            self._set_phones(organization, phones)
+        except ValueError:
+            self._set_phones(organization, [])
+
         self.commit()
 
         return organization
 
+    @records_changed
     @orm.db_session
     def update_contact(self, contact: "Contact | int", **kwargs) -> bool:
         if isinstance(contact, int):
@@ -253,16 +572,22 @@ class Database(orm.Database):
             if value == "" and key in ["first_name", "last_name"]:
                 continue
             if key == "phone_number":
-                contact.phone_numbers = [value]
+                self._set_phones(contact, [value])
+            elif key == "phone_numbers":
+                self._set_phones(contact, value)
             elif key == "address":
                 contact.addresses = [value]
             else:
                 setattr(contact, key, value)
 
+        if "first_name" in kwargs or "last_name" in kwargs:
+            self._set_sounds(contact)
+
         self.commit()
 
         return True
 
+    @records_changed
     @orm.db_session
     def update_organization(self, org: "Organization | int", **kwargs) -> bool:
         if isinstance(org, int):
@@ -277,17 +602,22 @@ class Database(orm.Database):
                 continue
 
             if key == "phone_number":
-                org.phone_numbers = [value]
+                self._set_phones(org, [value])
+            elif key == "phones":
+                self._set_phones(org, value)
             elif key == "address":
                 org.addresses = [value]
             else:
                 setattr(org, key, value)
 
+        if "name" in kwargs:
+            self._set_sounds(org)
+
         self.commit()
 
         return True
 
-    @search_and_destroy
+    @records_changed
     @orm.db_session
     def delete_contact(self, contact: "Contact | int") -> bool:
         if isinstance(contact, int):
@@ -301,7 +631,7 @@ class Database(orm.Database):
 
         return True
 
-    @search_and_destroy
+    @records_changed
     @orm.db_session
     def delete_organization(self, org: "Organization | int") -> bool:
         if isinstance(org, int):
@@ -315,6 +645,7 @@ class Database(orm.Database):
 
         return True
 
+    @records_changed
     @orm.db_session
     def add_contact_to_org(
         self, contact: "Contact | int", org: "Organization | int"
@@ -328,11 +659,14 @@ class Database(orm.Database):
         if org is None or contact is None:
             return False
 
-        org.contacts.add(contact)
+        if Membership.get(organization=org, contact=contact) is None:
+            Membership(organization=org, contact=contact)
+
         self.commit()
 
         return True
 
+    @records_changed
     @orm.db_session
     def remove_contact_from_org(
         self, contact: "Contact | int", org: "Organization | int"
@@ -346,11 +680,16 @@ class Database(orm.Database):
         if org is None or contact is None:
             return False
 
-        org.contacts.remove(contact)
+        membership = Membership.get(organization=org, contact=contact)
+
+        if membership is not None:
+            membership.delete()
+
         self.commit()
 
         return True
 
+    @records_changed
     @orm.db_session
     def change_contact_title(
         self, org: "Organization | int", contact: "Contact | int", title: str
@@ -364,18 +703,161 @@ class Database(orm.Database):
         if org is None or contact is None:
             return False
 
-        contact.org_titles[str(org.id)] = title
+        membership = Membership.get(organization=org, contact=contact)
+
+        if membership is None:
+            return False
+
+        membership.title = title
+        membership.is_primary = title == PRIMARY_TITLE
         self.commit()
 
         return True
 
+    def _merge_common(
+        self, record: "Organization | Contact", duplicate: "Organization | Contact"
+    ) -> None:
+        """
+        Move what organizations and contacts both have from a duplicate into a record.
+        The record's own values win wherever both have one.
+        """
+        for attribute in ("addresses", "emails"):
+            values = list(getattr(record, attribute) or [])
+            seen = {str(v).strip().lower() for v in values}
+
+            for value in getattr(duplicate, attribute) or []:
+                if str(value).strip().lower() not in seen:
+                    seen.add(str(value).strip().lower())
+                    values.append(value)
+
+            setattr(record, attribute, values)
+
+        record.custom_fields = {
+            **(duplicate.custom_fields or {}),
+            **(record.custom_fields or {}),
+        }
+
+        if not record.status:
+            record.status = duplicate.status
+
+        digits = {phone.digits for phone in record.phone_index}
+        self._set_phones(
+            record,
+            [p.number for p in record.phone_index.order_by(Phone.id)]
+            + [
+                p.number
+                for p in duplicate.phone_index.order_by(Phone.id)
+                if p.digits not in digits
+            ],
+        )
+
+        record.resources.add(duplicate.resources)
+
+    @records_changed
+    @orm.db_session
+    def merge_contacts(self, contact: "Contact | int", duplicates: list[int]) -> bool:
+        """
+        Merge duplicates of a contact into it and delete them, all in one transaction.
+        Their organizations and titles, resources, phone numbers, emails, addresses,
+        contact info and custom fields are moved to the contact.
+        """
+        if isinstance(contact, int):
+            contact = Contact.get(id=contact)
+
+        if contact is None:
+            return False
+
+        for duplicate in [Contact.get(id=d) for d in duplicates if d != contact.id]:
+            if duplicate is None:
+                continue
+
+            self._merge_common(contact, duplicate)
+            contact.contact_info = {
+                **(duplicate.contact_info or {}),
+                **(contact.contact_info or {}),
+            }
+
+            if not contact.availability:
+                contact.availability = duplicate.availability
+
+            for membership in duplicate.memberships:
+                existing = Membership.get(
+                    organization=membership.organization, contact=contact
+                )
+
+                if existing is None:
+                    Membership(
+                        organization=membership.organization,
+                        contact=contact,
+                        title=membership.title,
+                        is_primary=membership.is_primary,
+                    )
+
+                else:
+                    existing.title = existing.title or membership.title
+                    existing.is_primary = existing.title == PRIMARY_TITLE
+
+            duplicate.delete()
+
+        self.commit()
+
+        return True
+
+    @records_changed
+    @orm.db_session
+    def merge_organizations(
+        self, org: "Organization | int", duplicates: list[int]
+    ) -> bool:
+        """
+        Merge duplicates of an organization into it and delete them, all in one transaction.
+        Their contacts and the contacts' titles, resources, phone numbers, emails,
+        addresses and custom fields are moved to the organization.
+        """
+        if isinstance(org, int):
+            org = Organization.get(id=org)
+
+        if org is None:
+            return False
+
+        for duplicate in [Organization.get(id=d) for d in duplicates if d != org.id]:
+            if duplicate is None:
+                continue
+
+            self._merge_common(org, duplicate)
+
+            for membership in duplicate.memberships:
+                existing = Membership.get(organization=org, contact=membership.contact)
+
+                if existing is None:
+                    Membership(
+                        organization=org,
+                        contact=membership.contact,
+                        title=membership.title,
+                        is_primary=membership.is_primary,
+                    )
+
+                else:
+                    existing.title = existing.title or membership.title
+                    existing.is_primary = existing.title == PRIMARY_TITLE
+
+            duplicate.delete()
+
+        self.commit()
+
+        return True
+
+    @records_changed
     @orm.db_session
     def create_resource(self, **kwargs) -> "Resource":
+        if record_id := self.next_id(Resource):
+            kwargs["id"] = record_id
+
         resource = Resource(**kwargs)
         self.commit()
 
         return resource
 
+    @records_changed
     @orm.db_session
     def update_resource(self, resource: "Resource | int", **kwargs) -> "Resource":
         if isinstance(resource, int):
@@ -391,7 +873,7 @@ class Database(orm.Database):
     def get_resource(self, resource_id: int) -> "Resource":
         return Resource.get(id=resource_id)
 
-    @search_and_destroy
+    @records_changed
     @orm.db_session
     def delete_resource(self, resource: "Resource | int") -> bool:
         if isinstance(resource, int):
@@ -405,6 +887,7 @@ class Database(orm.Database):
 
         return True
 
+    @records_changed
     @orm.db_session
     def link_resource(
         self,
@@ -434,6 +917,7 @@ class Database(orm.Database):
 
         return True
 
+    @records_changed
     @orm.db_session
     def unlink_resource(
         self,
@@ -463,6 +947,7 @@ class Database(orm.Database):
 
         return True
 
+    @records_changed
     @orm.db_session
     def create_custom_field(
         self,
@@ -494,6 +979,7 @@ class Database(orm.Database):
 
         return True
 
+    @records_changed
     @orm.db_session
     def update_custom_field(
         self,
@@ -521,6 +1007,7 @@ class Database(orm.Database):
 
         return True
 
+    @records_changed
     @orm.db_session
     def delete_custom_field(
         self,
@@ -547,6 +1034,7 @@ class Database(orm.Database):
 
         return True
 
+    @records_changed
     @orm.db_session
     def create_contact_info(
         self,
@@ -578,6 +1066,7 @@ class Database(orm.Database):
 
         return True
 
+    @records_changed
     @orm.db_session
     def update_contact_info(
         self,
@@ -605,6 +1094,7 @@ class Database(orm.Database):
 
         return True
 
+    @records_changed
     @orm.db_session
     def delete_contact_info(
         self,
@@ -623,17 +1113,26 @@ class Database(orm.Database):
             return False
 
         contact_diff_values = {
-            "phone": "phone_numbers",
             "address": "addresses",
             "email": "emails",
         }
 
-        org_diff_values = {"phone": "phones", "address": "addresses"}
+        org_diff_values = {"address": "addresses"}
 
         if contact:
             if name.lower() == "availability":
                 contact.availability = ""
 
+            elif name.lower() == "phone":
+                self._set_phones(
+                    contact,
+                    [
+                        p.number
+                        for p in contact.phone_index.order_by(Phone.id)
+                        if int(p.digits) != value
+                    ],
+                )
+
             elif name.lower() in contact_diff_values.keys():
                 getattr(contact, contact_diff_values[name.lower()]).remove(value)
 
@@ -641,13 +1140,31 @@ class Database(orm.Database):
                 del contact.contact_info[name]
 
         if org:
-            if name in org_diff_values.keys():
+            if name == "phone":
+                self._set_phones(
+                    org,
+                    [
+                        p.number
+                        for p in org.phone_index.order_by(Phone.id)
+                        if int(p.digits) != value
+                    ],
+                )
+
+            elif name in org_diff_values.keys():
                 getattr(org, org_diff_values[name]).remove(value)
 
         self.commit()
 
         return True
 
+    def reset_caches(self) -> None:
+        """
+        Forget everything cached about the records, for when the database file is replaced.
+        """
+        self.name_index.clear()
+        self.graph.clear()
+        self.statistics.clear()
+
     def construct_database(
         self,
         provider: str,
@@ -660,34 +1177,83 @@ class Database(orm.Database):
     ) -> "Database":
         # Perform a different operation based on what type of database is being used
         self.password = password
+        self.reset_caches()
         match provider:
-            case "sqlite":
+            case "sqlite" | "server":
+                # If the provider is a SimpleCTE server (database/server.py), we open a local copy
+                # of its database, which is kept in sync with the server's. The password is its token.
                 # If the provider is SQLite, we have to check if the user is storing it in an FTP server.
-                # If they are, we have to take download it and temporarily store it on our machine.
-                if server_address:
-                    ftp = FTP(server_address)
-                    ftp.login(username, password)
-                    ftp.cwd(absolute_path[: absolute_path.rfind("/")])
-                    ftp.retrbinary(
-                        "RETR " + absolute_path, open("../data/temp/db.db", "wb").write
+                # If they are, we keep a local copy of it, which is only downloaded again if it changed.
+                if provider == "server":
+                    self.server_replica = ServerReplica(
+                        RemoteDatabase(
+                            server_address, server_port or DEFAULT_PORT, token=password
+                        )
                     )
-                    ftp.quit()
 
                     self.bind(
-                        provider=provider, filename="../data/temp/db.db", create_db=True
+                        provider="sqlite",
+                        filename=self.server_replica.fetch(),
+                        create_db=True,
                     )
+
+                    self.commit_listeners.append(self.server_replica.notify)
+                elif server_address:
+                    self.ftp_cache = FTPCache(
+                        server_address,
+                        absolute_path,
+                        username=username,
+                        password=password,
+                        server_port=server_port,
+                    )
+
+                    self.bind(
+                        provider=provider,
+                        filename=self.ftp_cache.fetch(),
+                        create_db=True,
+                    )
+
+                    # Send changes back to the server a while after they are made
+                    self.ftp_writeback = FTPWriteBack(self.ftp_cache)
+                    self.commit_listeners.append(self.ftp_writeback.notify)
+
+                    if self.ftp_cache.unsent_changes:
+                        self.ftp_writeback.notify()
                 else:
                     self.bind(provider=provider, filename=absolute_path, create_db=True)
 
-            case ["mysql", "postgres"]:
+                self.generate_mapping(create_tables=True)
+
+                filename = self.provider.pool.filename
+                migrate(filename)
+
+                # The FTP cache tells local changes apart by the database file changing,
+                # which a write-ahead log would hide until it is checkpointed
+                if self.ftp_cache is None:
+                    enable_wal(filename)
+
+                self.read_pool = ReadPool(filename)
+                self.id_block = get_id_block(filename)
+
+                if self.id_block is not None:
+                    # Cover any tables or columns added since replication was enabled
+                    enable_replication(filename)
+
+                if self.server_replica is not None:
+                    self.server_replica.start()
+
+                self.status = DBStatus.CONNECTED
+                return self
+
+            case "mysql" | "postgres":
                 # if the provider is MySQL or PostgreSQL, we will connect to the database server.
                 self.bind(
                     provider=provider,
                     host=server_address,
                     port=server_port,
                     user=username,
-                    passwd=password,
-                    db=database_name,
+                    password=password,
+                    database=database_name,
                 )
 
             # case "postgres":
@@ -704,13 +1270,31 @@ class Database(orm.Database):
 
     def close_database(self, app: "App") -> bool:
         """
-        Close the database connection. This does not do much at the moment,
-        but it may be useful in the future for implementing other databases types.
+        Close the database connection. If the database came from an FTP server,
+        any changes that were not uploaded yet are uploaded first. The same goes for
+        changes not yet sent to a database server.
         """
 
         if self.status != DBStatus.CONNECTED:
             return False
 
+        if self.server_replica is not None:
+            self.commit_listeners.remove(self.server_replica.notify)
+            self.server_replica.close()
+            self.server_replica = None
+
+        if self.ftp_writeback is not None:
+            self.commit_listeners.remove(self.ftp_writeback.notify)
+
+            try:
+                self.ftp_writeback.close()
+            except (FTPConflictError, OSError, EOFError, ftplib.Error) as e:
+                # The local copy is kept, and its changes are uploaded the next time it is opened
+                app.logger.error(f"Could not upload the database: {e}")
+                return False
+            finally:
+                self.ftp_writeback = None
+
         return True
 
 
@@ -733,19 +1317,38 @@ class Organization(db.Entity):
     emails = orm.Optional(orm.StrArray)
     custom_fields = orm.Optional(orm.Json)
 
-    contacts = orm.Set("Contact")
+    memberships = orm.Set("Membership", cascade_delete=True)
     resources = orm.Set("Resource")
+    phone_index = orm.Set("Phone", cascade_delete=True)
+    sound_index = orm.Set("NameSound", cascade_delete=True)
+
+    @property
+    def contacts(self):
+        return orm.select(m.contact for m in self.memberships)
 
     @property
     def primary_contact(self):
-        contact = self.contacts.filter(
-            lambda c: c.org_titles[str(self.id)] == "Primary"
-        ).first()
-        if contact:
-            return contact
+        membership = (
+            self.memberships.select(lambda m: m.is_primary)
+            .order_by(lambda m: m.contact.id)
+            .first()
+        )
+        if membership:
+            return membership.contact
         else:
             return None
 
+    def to_dict(self, *args, **kwargs) -> dict:
+        data = super().to_dict(*args, **kwargs)
+        data.pop("phone_index", None)
+        data.pop("sound_index", None)
+
+        # Memberships are listed as the IDs of the contacts, as they were before they had a table
+        if data.pop("memberships", None) is not None:
+            data["contacts"] = [m.contact.id for m in self.memberships]
+
+        return data
+
 
 class Contact(db.Entity):
     """
@@ -765,14 +1368,87 @@ class Contact(db.Entity):
     contact_info = orm.Optional(orm.Json)
     custom_fields = orm.Optional(orm.Json)
 
-    org_titles = orm.Optional(orm.Json)
-    organizations = orm.Set(Organization)
+    memberships = orm.Set("Membership", cascade_delete=True)
     resources = orm.Set("Resource")
+    phone_index = orm.Set("Phone", cascade_delete=True)
+    sound_index = orm.Set("NameSound", cascade_delete=True)
 
     @property
     def name(self):
         return f"{self.first_name} {self.last_name}"
 
+    @property
+    def organizations(self):
+        return orm.select(m.organization for m in self.memberships)
+
+    @property
+    def org_titles(self) -> dict[str, str]:
+        return {str(m.organization.id): m.title for m in self.memberships if m.title}
+
+    def to_dict(self, *args, **kwargs) -> dict:
+        data = super().to_dict(*args, **kwargs)
+        data.pop("phone_index", None)
+        data.pop("sound_index", None)
+
+        if data.pop("memberships", None) is not None:
+            data["organizations"] = [m.organization.id for m in self.memberships]
+            data["org_titles"] = self.org_titles
+
+        return data
+
+
+class Membership(db.Entity):
+    """
+    A contact's membership in an organization, with their title there
+    and whether they are its primary contact.
+    """
+
+    organization = orm.Required(Organization)
+    contact = orm.Required(Contact)
+    title = orm.Optional(str, index=True)
+    is_primary = orm.Required(bool, default=False)
+
+    orm.PrimaryKey(organization, contact)
+    orm.composite_index(organization, is_primary)
+    orm.composite_index(contact, is_primary)
+
+
+class Phone(db.Entity):
+    """
+    A phone number of an organization or contact as its digits, including any leading
+    zeros, which the phones and phone_numbers arrays drop along with extensions.
+    The digits are also kept reversed, so numbers can be found by how they start,
+    such as an area code, or by how they end, such as the last four digits,
+    with a range scan of an index in either case.
+    """
+
+    id = orm.PrimaryKey(int, auto=True)
+    digits = orm.Required(str, index=True)
+    reversed_digits = orm.Required(str, index=True)
+    extension = orm.Optional(str)
+
+    organization = orm.Optional(Organization)
+    contact = orm.Optional(Contact)
+
+    @property
+    def number(self) -> str:
+        return join_phone(self.digits, self.extension)
+
+
+class NameSound(db.Entity):
+    """
+    The phonetic code of a word in an organization's or contact's name, from
+    utils/phonetics.py. Each word has a row for its primary code and one for its
+    alternate code if it has one, so names that sound alike can be found with
+    a lookup in the code's index.
+    """
+
+    id = orm.PrimaryKey(int, auto=True)
+    code = orm.Required(str, index=True)
+
+    organization = orm.Optional(Organization)
+    contact = orm.Optional(Contact)
+
 
 class Resource(db.Entity):
     """
@@ -798,6 +1474,16 @@ def get_table_values(
     """
     Get the necessary information from the database to populate the search table's info.
     """
+    if app.db.read_pool is not None:
+        with app.db.read_pool.snapshot() as connection:
+            return read_table_values(
+                connection,
+                "organization" if record == Organization else "contact",
+                search_info,
+                descending,
+                app.db.name_index,
+            )
+
     table_values = []
 
     # Make sure we don't have an empty search_info
@@ -812,6 +1498,15 @@ def get_table_values(
     if not record_pages:
         record_pages = app.db.get_records(record, paginated=False)
 
+    # When searching by phone, each contact's number that matched is shown instead of its first
+    digits = None
+
+    if search_info.get("field", "").lower() == "phone":
+        try:
+            digits, _ = split_phone(search_info.get("query", ""))
+        except ValueError:
+            pass
+
     # Iterate through the records to format them in a way that can be displayed in the table
     for rec in record_pages:
         if record == Organization:
@@ -820,26 +1515,40 @@ def get_table_values(
             table_values.append([rec.id, rec.name, rec.type, contact_name, rec.status])
 
         else:
-            org = None
-            for org in rec.organizations:
-                if org.primary_contact == rec:
-                    break
+            # The organization the contact is the primary contact of, or else the latest one
+            membership = (
+                rec.memberships.select()
+                .order_by(
+                    lambda m: (orm.desc(m.is_primary), orm.desc(m.organization.id))
+                )
+                .first()
+            )
 
-            if org:
-                org_name = org.name
+            if membership:
+                org_name = membership.organization.name
 
             else:
                 org_name = "No Organization"
 
-            table_values.append(
-                [
-                    rec.id,
-                    rec.name,
-                    org_name,
-                    format_phone(rec.phone_numbers[0])
-                    if rec.phone_numbers
-                    else "No Phone Number",
-                ]
+            matched = digits and next(
+                (
+                    phone
+                    for phone in sorted(rec.phone_index, key=lambda p: p.id)
+                    if phone.digits.startswith(digits)
+                    or phone.reversed_digits.startswith(digits[::-1])
+                ),
+                None,
             )
 
+            if matched:
+                phone_number = matched.number
+
+            elif rec.phone_numbers:
+                phone_number = format_phone(rec.phone_numbers[0])
+
+            else:
+                phone_number = "No Phone Number"
+
+            table_values.append([rec.id, rec.name, org_name, phone_number])
+
     return table_values
@@ -0,0 +1,267 @@
+"""
+Finds contacts or organizations that are probably the same, such as ones entered twice.
+Comparing every record with every other one would take hours with 100,000 contacts,
+so records are first put into blocks by keys that duplicates are likely to share:
+their normalized name, their last name and first initial, an email address, or the
+end of a phone number. Only records sharing a block are compared, their names are
+scored by how similar they are, and pairs that score high enough are joined
+into clusters, which can then be merged with Database.merge_contacts()
+or Database.merge_organizations().
+"""
+
+import re
+import sqlite3
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from itertools import combinations
+from typing import TYPE_CHECKING, Iterator
+
+from database.readpool import decode_json
+
+if TYPE_CHECKING:
+    from database.database import Database
+
+__all__ = ("Cluster", "find_duplicates", "find_clusters", "normalize_name")
+
+# Blocks larger than this are compared with a sliding window instead of pair by pair,
+# so a very common name or a shared office number can't make the search quadratic
+MAX_BLOCK = 20
+WINDOW = 8
+
+# Words that don't tell organizations apart
+ORG_NOISE = {
+    "the",
+    "of",
+    "and",
+    "inc",
+    "llc",
+    "ltd",
+    "co",
+    "corp",
+    "corporation",
+    "company",
+}
+
+
+@dataclass
+class Cluster:
+    """
+    A group of records that are probably the same. score is the similarity of the
+    closest pair, from 0 to 1, and reasons is what the records were matched on.
+    """
+
+    ids: list[int]
+    score: float
+    reasons: set[str] = field(default_factory=set)
+    records: list[dict] = field(default_factory=list)
+
+
+@dataclass
+class _Record:
+    id: int
+    name: str
+    key: str
+    emails: set[str]
+    phones: set[str]
+
+
+def _words(name: str) -> list[str]:
+    """
+    The words of a name, lowercase and without accents or punctuation.
+    """
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+
+    return re.sub(r"[^a-z0-9]+", " ", name.lower()).split()
+
+
+def normalize_name(name: str, organization: bool = False) -> str:
+    """
+    Normalize a name with its words in order, so "Smith, John" and "John Smith"
+    are the same. Organization names also lose words like "Inc." and "The".
+    """
+    words = _words(name)
+
+    if organization:
+        words = [w for w in words if w not in ORG_NOISE] or words
+
+    return " ".join(sorted(words))
+
+
+def _blocking_keys(record: _Record, organization: bool) -> Iterator[str]:
+    yield f"name:{record.key}"
+
+    if organization:
+        # The start of the first two words, which survives most typos in the rest
+        yield "start:" + " ".join(w[:4] for w in record.key.split()[:2])
+
+    elif len(words := _words(record.name)) >= 2:
+        # A typo in one of the names still leaves the other one and an initial
+        first, last = words[0], words[-1]
+        yield f"initial:{last}|{first[:1]}"
+        yield f"initial:{first}|{last[:1]}"
+
+    for email in record.emails:
+        yield f"email:{email}"
+
+    for phone in record.phones:
+        yield f"phone:{phone}"
+
+
+def _similarity(
+    a: _Record, b: _Record, threshold: float = 0.0
+) -> tuple[float, set[str]]:
+    """
+    Score how likely two records are the same, from 0 to 1, and say what they matched on.
+    Pairs that can't reach threshold score 0 without their names being fully compared.
+    """
+    shared = [
+        reason
+        for reason, values in (
+            ("email", a.emails & b.emails),
+            ("phone", a.phones & b.phones),
+        )
+        if values
+    ]
+
+    # Each shared email or phone halves the distance to 1, so this is the lowest name
+    # score that can still reach the threshold. Shared info needs similar names too,
+    # since people share office numbers.
+    lowest = max(1 - (1 - threshold) * 2 ** len(shared), 0.5 if shared else 0.0)
+    matcher = SequenceMatcher(None, a.key, b.key)
+
+    # The quick ratios are upper bounds of the real one, and much cheaper
+    if matcher.real_quick_ratio() < lowest or matcher.quick_ratio() < lowest:
+        return 0.0, set()
+
+    score = matcher.ratio()
+    reasons = {"name"} if score >= 0.8 else set()
+
+    if score >= 0.5:
+        for reason in shared:
+            score += (1 - score) / 2
+            reasons.add(reason)
+
+    return score, reasons
+
+
+def _candidate_pairs(
+    records: dict[int, _Record], organization: bool
+) -> Iterator[tuple[int, int]]:
+    blocks: dict[str, list[int]] = defaultdict(list)
+
+    for record in records.values():
+        for key in set(_blocking_keys(record, organization)):
+            blocks[key].append(record.id)
+
+    seen = set()
+
+    for ids in blocks.values():
+        if len(ids) < 2:
+            continue
+
+        if len(ids) <= MAX_BLOCK:
+            pairs = combinations(sorted(ids), 2)
+        else:
+            ids = sorted(ids, key=lambda i: records[i].key)
+            pairs = (
+                (min(a, b), max(a, b))
+                for index, a in enumerate(ids)
+                for b in ids[index + 1 : index + 1 + WINDOW]
+            )
+
+        for pair in pairs:
+            if pair not in seen:
+                seen.add(pair)
+                yield pair
+
+
+def _read_records(
+    connection: sqlite3.Connection, record_type: str
+) -> dict[int, _Record]:
+    organization = record_type == "organization"
+    name = "name" if organization else "first_name || ' ' || last_name"
+    table = "Organization" if organization else "Contact"
+    phones: dict[int, set[str]] = defaultdict(set)
+
+    # The last seven digits, so numbers with and without an area code still match
+    for owner, digits in connection.execute(
+        f"SELECT {record_type}, digits FROM Phone WHERE {record_type} IS NOT NULL"
+    ):
+        if len(digits) >= 7:
+            phones[owner].add(digits[-7:])
+
+    records = {}
+
+    for row in connection.execute(f"SELECT id, {name}, emails FROM {table}"):
+        record = decode_json({"id": row[0], "name": row[1], "emails": row[2]})
+        records[record["id"]] = _Record(
+            record["id"],
+            record["name"],
+            normalize_name(record["name"], organization),
+            {e.strip().lower() for e in record["emails"] if e.strip()},
+            phones[record["id"]],
+        )
+
+    return records
+
+
+def find_clusters(
+    connection: sqlite3.Connection, record_type: str, threshold: float = 0.85
+) -> list[Cluster]:
+    """
+    Find clusters of duplicate organizations or contacts whose records score at least
+    threshold, with the closest matches first.
+    """
+    record_type = record_type.lower()
+    records = _read_records(connection, record_type)
+    parents = {record_id: record_id for record_id in records}
+
+    def find(record_id: int) -> int:
+        while parents[record_id] != record_id:
+            parents[record_id] = parents[parents[record_id]]
+            record_id = parents[record_id]
+
+        return record_id
+
+    scores: dict[tuple[int, int], tuple[float, set[str]]] = {}
+
+    for a, b in _candidate_pairs(records, record_type == "organization"):
+        score, reasons = _similarity(records[a], records[b], threshold)
+
+        if score >= threshold:
+            scores[(a, b)] = (score, reasons)
+            parents[find(b)] = find(a)
+
+    clusters: dict[int, Cluster] = {}
+
+    for (a, b), (score, reasons) in scores.items():
+        cluster = clusters.setdefault(find(a), Cluster([], 0.0))
+        cluster.score = max(cluster.score, score)
+        cluster.reasons |= reasons
+
+    for record_id in records:
+        if (cluster := clusters.get(find(record_id))) is not None:
+            cluster.ids.append(record_id)
+
+    for cluster in clusters.values():
+        cluster.records = [
+            {
+                "id": records[i].id,
+                "name": records[i].name,
+                "emails": sorted(records[i].emails),
+            }
+            for i in cluster.ids
+        ]
+
+    return sorted(clusters.values(), key=lambda c: (-c.score, -len(c.ids), c.ids[0]))
+
+
+def find_duplicates(
+    db: "Database", record_type: str, threshold: float = 0.85
+) -> list[Cluster]:
+    """
+    Find clusters of duplicate records with find_clusters(), see Database.read().
+    """
+    return db.read(lambda connection: find_clusters(connection, record_type, threshold))
@@ -0,0 +1,463 @@
+"""
+Keeps a local copy of a SimpleCTE database that is stored on an FTP server.
+The copy is only downloaded again when the file on the server changed, which is
+checked with the file's size and modification time (the SIZE and MDTM commands).
+Interrupted downloads are resumed where they stopped using REST offsets.
+Changes made to the copy are uploaded back to the server in the background.
+"""
+
+import ftplib
+import hashlib
+import io
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime as dt, timezone
+from typing import Callable
+
+from utils.backup import hot_backup
+from utils.scheduler import Scheduler
+
+__all__ = (
+    "FTPCache",
+    "FTPWriteBack",
+    "FTPConflictError",
+    "FTPLockedError",
+    "TEMP_PATH",
+)
+
+TEMP_PATH = os.path.join(os.path.dirname(__file__), "../data/temp")
+DOWNLOAD_ATTEMPTS = 3
+BLOCK_SIZE = 64 * 1024
+UPLOAD_DELAY = 30  # Seconds to wait after the last change before uploading
+LOCK_TIMEOUT = 600  # Seconds before someone else's lock file is considered abandoned
+
+
+class FTPConflictError(Exception):
+    """
+    The database on the server was changed by someone else, or is locked by them.
+    """
+
+
+class FTPLockedError(FTPConflictError):
+    """
+    Someone else is uploading the database right now, so uploading has to wait.
+    """
+
+
+class FTPCache:
+    """
+    The local copy of one database on an FTP server. Next to the copy, a small JSON file
+    records the remote file's size and modification time when the two were last in sync,
+    and the local copy's size and modification time, so edits made to the copy are noticed too.
+    """
+
+    def __init__(
+        self,
+        server_address: str,
+        remote_path: str,
+        username: str | None = None,
+        password: str | None = None,
+        server_port: int | None = None,
+        cache_path: str = TEMP_PATH,
+    ):
+        self.logger = logging.getLogger("ftp")
+        self.server_address = server_address
+        self.server_port = server_port or 21
+        self.remote_path = remote_path
+        self.username = username
+        self.password = password
+
+        # Name the copy after where it came from, so different servers never share a copy
+        key = hashlib.sha1(
+            f"{server_address}:{self.server_port}/{remote_path}".encode()
+        ).hexdigest()[:16]
+        self.local_path = os.path.abspath(os.path.join(cache_path, key + ".db"))
+        self.info_path = self.local_path + ".json"
+
+        # Whether the local copy has changes that never made it to the server
+        self.unsent_changes = False
+
+        os.makedirs(cache_path, exist_ok=True)
+
+    def connect(self) -> ftplib.FTP:
+        ftp = ftplib.FTP()
+        ftp.connect(self.server_address, self.server_port)
+        ftp.login(self.username or "", self.password or "")
+
+        # SIZE is only reliable for binary transfers
+        ftp.voidcmd("TYPE I")
+
+        return ftp
+
+    def remote_version(self, ftp: ftplib.FTP) -> dict:
+        """
+        Get the size and modification time of the file on the server.
+        The modification time is None if the server does not support MDTM.
+        """
+        size = ftp.size(self.remote_path)
+
+        try:
+            modified = ftp.voidcmd("MDTM " + self.remote_path).split()[-1]
+        except ftplib.error_perm:
+            modified = None
+
+        return {"size": size, "modified": modified}
+
+    def _local_state(self, path: str) -> dict | None:
+        if not os.path.exists(path):
+            return None
+
+        stat = os.stat(path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    def read_info(self, path: str | None = None) -> dict | None:
+        path = path or self.info_path
+
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_info(
+        self, remote: dict, path: str | None = None, local: dict | None = None
+    ) -> None:
+        """
+        Record that the local copy matches the given version of the remote file.
+        local is the state of the local copy that matches it, which defaults to its current state.
+        """
+        path = path or self.info_path
+        info = {"remote": remote, "local": local or self._local_state(self.local_path)}
+
+        with open(path + ".part", "w") as f:
+            json.dump(info, f)
+
+        os.replace(path + ".part", path)
+
+    def is_current(self, remote: dict) -> bool:
+        """
+        Check if the local copy is an unchanged download of this version of the remote file.
+        """
+        info = self.read_info()
+
+        return (
+            info is not None
+            and remote["modified"] is not None
+            and info["remote"] == remote
+            and info["local"] == self._local_state(self.local_path)
+        )
+
+    def fetch(self) -> str:
+        """
+        Make sure the local copy is up to date, downloading the database only if it changed.
+        Returns the path of the local copy.
+        """
+        ftp = self.connect()
+
+        try:
+            remote = self.remote_version(ftp)
+
+            if self.is_current(remote):
+                self.logger.info("The local copy of the database is up to date.")
+                return self.local_path
+
+            info = self.read_info()
+
+            if info is not None and info["local"] != self._local_state(self.local_path):
+                if info["remote"] == remote:
+                    # Only our copy changed, so keep it and let the write-back upload it
+                    self.logger.info(
+                        "The local copy has changes that were not uploaded."
+                    )
+                    self.unsent_changes = True
+                    return self.local_path
+
+                # Both copies changed, so keep ours aside instead of overwriting it
+                conflict_path = (
+                    os.path.splitext(self.local_path)[0]
+                    + f".conflict-{dt.now().strftime('%Y%m%d-%H%M%S')}.db"
+                )
+                os.replace(self.local_path, conflict_path)
+                self.logger.warning(
+                    f"The database changed on the server and locally. The local changes were kept in {conflict_path}."
+                )
+
+            ftp = self._download(ftp, remote)
+        finally:
+            try:
+                ftp.quit()
+            except (OSError, ftplib.Error):
+                ftp.close()
+
+        return self.local_path
+
+    def _download(self, ftp: ftplib.FTP, remote: dict) -> ftplib.FTP:
+        """
+        Download the remote file into a partial file, resuming a previous attempt at the
+        same version of the file if there is one, and move it into place once it is complete.
+        Returns the FTP connection, which is replaced if the old one broke.
+        """
+        part_path = self.local_path + ".part"
+        part_info_path = part_path + ".json"
+
+        # A partial download can only be continued if the remote file has not changed since
+        if (
+            self.read_info(part_info_path) != {"remote": remote}
+            or not os.path.exists(part_path)
+            or os.path.getsize(part_path) > remote["size"]
+        ):
+            with open(part_path, "wb"):
+                pass
+
+            with open(part_info_path, "w") as f:
+                json.dump({"remote": remote}, f)
+
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            offset = os.path.getsize(part_path)
+
+            if offset >= remote["size"]:
+                break
+
+            try:
+                with open(part_path, "ab") as f:
+                    ftp.retrbinary(
+                        "RETR " + self.remote_path,
+                        f.write,
+                        blocksize=BLOCK_SIZE,
+                        rest=offset or None,
+                    )
+            except (OSError, EOFError, ftplib.error_temp) as e:
+                if attempt == DOWNLOAD_ATTEMPTS:
+                    raise
+
+                self.logger.warning(
+                    f"The download stopped at {os.path.getsize(part_path)} bytes ({e}), resuming."
+                )
+
+                # The control connection may have died with the transfer
+                try:
+                    ftp.close()
+                except OSError:
+                    pass
+
+                ftp = self.connect()
+
+        if os.path.getsize(part_path) != remote["size"]:
+            raise EOFError(
+                f"Downloaded {os.path.getsize(part_path)} of {remote['size']} bytes."
+            )
+
+        os.replace(part_path, self.local_path)
+        os.remove(part_info_path)
+
+        # A journal belonging to an older copy must not be applied to the new one
+        if os.path.exists(self.local_path + "-journal"):
+            os.remove(self.local_path + "-journal")
+
+        self.write_info(remote)
+        self.logger.info(f"Downloaded the database ({remote['size']} bytes).")
+
+        return ftp
+
+
+class FTPWriteBack:
+    """
+    Uploads the local copy of a database back to the FTP server. Uploads happen on a
+    background thread once no changes have been made for UPLOAD_DELAY seconds, and one
+    last time when the database is closed.
+    An upload takes a consistent snapshot of the local copy and then, while holding a lock
+    file on the server, checks that nobody else uploaded since our copy was downloaded.
+    The snapshot is uploaded under a temporary name and renamed over the real file, so
+    other users never download a half-uploaded database.
+    If someone else changed the database on the server, uploads stop and on_conflict is
+    called from the background thread, until keep_local() or keep_remote() decides
+    which copy wins.
+    """
+
+    def __init__(self, cache: FTPCache, delay: float = UPLOAD_DELAY):
+        self.logger = logging.getLogger("ftp")
+        self.cache = cache
+        self.delay = delay
+        self.scheduler = Scheduler()
+        self.dirty = False
+        self.conflict: FTPConflictError | None = None
+        self.on_conflict: Callable[[FTPConflictError], None] | None = None
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self.scheduler.start()
+
+    @property
+    def lock_path(self) -> str:
+        return self.cache.remote_path + ".lock"
+
+    def notify(self) -> None:
+        """
+        Tell the write-back that the database changed. Every change pushes the upload back,
+        so a burst of edits results in one upload.
+        """
+        self.dirty = True
+        self.scheduler.schedule("upload", self._upload_in_background, delay=self.delay)
+
+    def _upload_in_background(self, force: bool = False) -> None:
+        if self.conflict is not None and not force:
+            # Nothing is uploaded until the user picks which copy to keep
+            return
+
+        try:
+            self.upload(force=force)
+            self.conflict = None
+        except FTPLockedError as e:
+            self.logger.warning(f"{e} Retrying later.")
+            self.scheduler.schedule(
+                "upload",
+                lambda: self._upload_in_background(force=force),
+                delay=self.delay,
+            )
+        except FTPConflictError as e:
+            self.conflict = e
+            self.logger.error(f"Could not upload the database: {e}")
+
+            if self.on_conflict is not None:
+                self.on_conflict(e)
+        except (OSError, EOFError, ftplib.Error) as e:
+            self.logger.warning(f"Uploading the database failed ({e}), retrying later.")
+            self.scheduler.schedule(
+                "upload",
+                lambda: self._upload_in_background(force=force),
+                delay=self.delay,
+            )
+
+    def keep_local(self) -> None:
+        """
+        Settle a conflict by uploading the local copy over the one on the server,
+        in the background.
+        """
+        self.scheduler.schedule(
+            "upload", lambda: self._upload_in_background(force=True), delay=0
+        )
+
+    def keep_remote(self) -> None:
+        """
+        Settle a conflict by dropping the local changes instead of uploading them. The next
+        time the database is opened, the server's copy is downloaded and the local copy is
+        kept aside, see FTPCache.fetch().
+        """
+        self.scheduler.cancel("upload")
+        self.scheduler.stop(wait=True)
+        self.dirty = False
+        self.conflict = None
+
+    def close(self) -> None:
+        """
+        Upload any changes that are still waiting and stop the background thread.
+        Raises FTPConflictError if the changes could not be uploaded because of someone else.
+        """
+        self.scheduler.cancel("upload")
+        self.scheduler.stop(wait=True)
+
+        if self.dirty:
+            self.upload()
+
+    def _acquire_lock(self, ftp: ftplib.FTP) -> None:
+        try:
+            modified = ftp.voidcmd("MDTM " + self.lock_path).split()[-1]
+            locked_at = (
+                dt.strptime(modified[:14], "%Y%m%d%H%M%S")
+                .replace(tzinfo=timezone.utc)
+                .timestamp()
+            )
+
+            if time.time() - locked_at < LOCK_TIMEOUT:
+                raise FTPLockedError(
+                    "Someone else is uploading the database right now."
+                )
+
+            self.logger.warning("Taking over an abandoned lock file on the server.")
+        except ftplib.error_perm:
+            pass  # There is no lock file
+
+        ftp.storbinary("STOR " + self.lock_path, io.BytesIO(self.owner.encode()))
+
+        # FTP can't create a file only if it doesn't exist, so read the lock back to
+        # make sure another user didn't write theirs at the same time
+        owner = io.BytesIO()
+        ftp.retrbinary("RETR " + self.lock_path, owner.write)
+
+        if owner.getvalue().decode() != self.owner:
+            raise FTPLockedError("Someone else is uploading the database right now.")
+
+    def _release_lock(self, ftp: ftplib.FTP) -> None:
+        try:
+            ftp.delete(self.lock_path)
+        except ftplib.Error as e:
+            self.logger.warning(f"Could not remove the lock file on the server: {e}")
+
+    def upload(self, force: bool = False) -> None:
+        """
+        Upload the local copy now. With force, it replaces the database on the server
+        even if someone else changed it since it was downloaded.
+        """
+        snapshot_path = self.cache.local_path + ".upload"
+
+        # Changes made from here on will need another upload
+        self.dirty = False
+        local = self.cache._local_state(self.cache.local_path)
+
+        try:
+            hot_backup(self.cache.local_path, snapshot_path)
+        except BaseException:
+            self.dirty = True
+            raise
+
+        ftp = None
+
+        try:
+            ftp = self.cache.connect()
+            self._acquire_lock(ftp)
+
+            try:
+                info = self.cache.read_info()
+                remote = self.cache.remote_version(ftp)
+
+                if not force and (info is None or info["remote"] != remote):
+                    raise FTPConflictError(
+                        "The database on the server was changed by someone else since it "
+                        "was downloaded. Your changes were kept in "
+                        + self.cache.local_path
+                    )
+
+                temp_name = f"{self.cache.remote_path}.{self.owner}.part"
+
+                with open(snapshot_path, "rb") as f:
+                    ftp.storbinary("STOR " + temp_name, f, blocksize=BLOCK_SIZE)
+
+                try:
+                    ftp.rename(temp_name, self.cache.remote_path)
+                except ftplib.error_perm:
+                    # Some servers won't rename over an existing file
+                    ftp.delete(self.cache.remote_path)
+                    ftp.rename(temp_name, self.cache.remote_path)
+
+                self.cache.write_info(self.cache.remote_version(ftp), local=local)
+            finally:
+                self._release_lock(ftp)
+        except BaseException:
+            self.dirty = True
+            raise
+        finally:
+            os.remove(snapshot_path)
+
+            if ftp is not None:
+                try:
+                    ftp.quit()
+                except (OSError, ftplib.Error):
+                    ftp.close()
+
+        self.logger.info("Uploaded the database to the server.")
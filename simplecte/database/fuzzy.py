@@ -0,0 +1,274 @@
+"""
+Typo-tolerant search of organization and contact names.
+Every word of every name is kept in a BK-tree, a tree that arranges words by their edit
+distance from each other, so the words within a few typos of a search can be found
+by visiting a small part of the tree instead of comparing every name.
+The index is built the first time it's searched, and kept up to date afterwards
+from the records that write methods report changing, see records_changed().
+"""
+
+import json
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Callable, Iterator
+
+from database.dedupe import normalize_name
+
+__all__ = ("BKTree", "NameIndex", "edit_distance")
+
+# The name of each kind of record, as SQL
+NAMES = {
+    "organization": "SELECT id, name FROM Organization",
+    "contact": "SELECT id, first_name || ' ' || last_name FROM Contact",
+}
+
+
+def _distance_from(word: str) -> Callable[[str], int]:
+    """
+    Make a function that gives the edit distance from word to another word.
+    It uses Myers' bit-parallel algorithm, which keeps a column of the usual table in
+    the bits of two integers, so each letter of the other word takes a few integer
+    operations instead of a loop over word. Searches compare one word with many,
+    so the bit mask of each letter of word is only worked out once.
+    """
+    masks: dict[str, int] = {}
+
+    for i, letter in enumerate(word):
+        masks[letter] = masks.get(letter, 0) | 1 << i
+
+    length = len(word)
+    full = (1 << length) - 1
+    last = 1 << (length - 1) if length else 0
+
+    def distance(other: str) -> int:
+        if not length:
+            return len(other)
+
+        # The vertical differences between cells, positive and negative
+        positive, negative, score = full, 0, length
+
+        for letter in other:
+            match = masks.get(letter, 0)
+            vertical = match | negative
+            diagonal = (((match & positive) + positive) ^ positive) | match
+            up = negative | ~(diagonal | positive) & full
+            down = positive & diagonal
+
+            if up & last:
+                score += 1
+            elif down & last:
+                score -= 1
+
+            up = (up << 1 | 1) & full
+            down = (down << 1) & full
+            positive = down | ~(vertical | up) & full
+            negative = up & vertical
+
+        return score
+
+    return distance
+
+
+def edit_distance(a: str, b: str) -> int:
+    """
+    The Levenshtein distance between two words, the number of letters
+    that must be added, removed, or changed to turn one into the other.
+    """
+    return _distance_from(a)(b)
+
+
+class BKTree:
+    """
+    A BK-tree of words. Each child is keyed by its distance from its parent, so by the
+    triangle inequality, a search only has to follow the children whose key is within
+    max_distance of the searched word's distance from their parent.
+    """
+
+    def __init__(self, words: "Iterator[str] | None" = None):
+        # Each node is [word, {distance: child}]
+        self._root: list | None = None
+        self.size = 0
+
+        for word in words or ():
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        if self._root is None:
+            self._root = [word, {}]
+            self.size += 1
+            return
+
+        node = self._root
+        distance_to = _distance_from(word)
+
+        while (distance := distance_to(node[0])) != 0:
+            if distance not in node[1]:
+                node[1][distance] = [word, {}]
+                self.size += 1
+                return
+
+            node = node[1][distance]
+
+    def search(self, word: str, max_distance: int) -> list[tuple[int, str]]:
+        """
+        Find the words within max_distance of word, as (distance, word), closest first.
+        """
+        found = []
+        nodes = [self._root] if self._root is not None else []
+        distance_to = _distance_from(word)
+
+        while nodes:
+            node = nodes.pop()
+            distance = distance_to(node[0])
+
+            if distance <= max_distance:
+                found.append((distance, node[0]))
+
+            nodes.extend(
+                child
+                for key, child in node[1].items()
+                if distance - max_distance <= key <= distance + max_distance
+            )
+
+        return sorted(found)
+
+
+class _TypeIndex:
+    """
+    The words of one kind of record's names, and which records have each word.
+    """
+
+    def __init__(self):
+        self.tree = BKTree()
+        self.records: dict[str, set[int]] = {}
+        self.words: dict[int, list[str]] = {}
+        self.unused = 0
+
+    def set_name(self, record_id: int, name: str | None) -> None:
+        for word in self.words.pop(record_id, []):
+            self.records[word].discard(record_id)
+
+            if not self.records[word]:
+                self.unused += 1
+
+        if name is None:
+            return
+
+        self.words[record_id] = words = normalize_name(name).split()
+
+        for word in words:
+            if word not in self.records:
+                self.records[word] = set()
+                self.tree.add(word)
+
+            elif not self.records[word]:
+                self.unused -= 1
+
+            self.records[word].add(record_id)
+
+        # Words can't be taken out of a BK-tree, so it's rebuilt once most are unused
+        if self.unused > len(self.records) // 2:
+            self.records = {w: ids for w, ids in self.records.items() if ids}
+            self.tree = BKTree(iter(self.records))
+            self.unused = 0
+
+
+class NameIndex:
+    """
+    Finds organizations and contacts whose names are within a few typos of a search.
+    Database.change_listeners tells it which records changed with invalidate(),
+    and their names are read again the next time it's searched.
+    """
+
+    def __init__(self, max_distance: int = 2):
+        self.max_distance = max_distance
+        self._indexes: dict[str, _TypeIndex] = {}
+        self._changed: dict[str, set[int]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def invalidate(self, changed: set[tuple[str, int]]) -> None:
+        """
+        Mark records as changed. A change listener, see records_changed().
+        """
+        with self._lock:
+            for record_type, record_id in changed:
+                if record_type in self._indexes:
+                    self._changed[record_type].add(record_id)
+
+    def clear(self) -> None:
+        """
+        Forget everything, such as when a different database is opened.
+        """
+        with self._lock:
+            self._indexes.clear()
+            self._changed.clear()
+
+    def _index(self, connection: sqlite3.Connection, record_type: str) -> _TypeIndex:
+        if (index := self._indexes.get(record_type)) is None:
+            index = self._indexes[record_type] = _TypeIndex()
+
+            for record_id, name in connection.execute(NAMES[record_type]):
+                index.set_name(record_id, name)
+
+            self._changed.pop(record_type, None)
+
+        elif changed := self._changed.pop(record_type, None):
+            names = dict(
+                connection.execute(
+                    f"SELECT * FROM ({NAMES[record_type]}) "
+                    "WHERE id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(sorted(changed)),),
+                )
+            )
+
+            # Records that weren't found were deleted
+            for record_id in changed:
+                index.set_name(record_id, names.get(record_id))
+
+        return index
+
+    def search(
+        self,
+        connection: sqlite3.Connection,
+        record_type: str,
+        query: str,
+        max_distance: int | None = None,
+    ) -> list[int]:
+        """
+        Find the records with a word within max_distance typos of every word of query,
+        fewest typos first. Words are allowed one typo for every two letters, up to
+        max_distance, so short words don't match nearly everything.
+        """
+        record_type = record_type.lower()
+        max_distance = self.max_distance if max_distance is None else max_distance
+        words = normalize_name(query).split()
+
+        if record_type not in NAMES or not words:
+            return []
+
+        with self._lock:
+            index = self._index(connection, record_type)
+            distances: dict[int, int] | None = None
+
+            for word in words:
+                closest: dict[int, int] = {}
+
+                for distance, match in index.tree.search(
+                    word, min(max_distance, len(word) // 2)
+                ):
+                    for record_id in index.records[match]:
+                        closest.setdefault(record_id, distance)
+
+                if distances is None:
+                    distances = closest
+                else:
+                    distances = {
+                        record_id: distance + closest[record_id]
+                        for record_id, distance in distances.items()
+                        if record_id in closest
+                    }
+
+        return sorted(
+            distances, key=lambda record_id: (distances[record_id], record_id)
+        )
@@ -0,0 +1,281 @@
+"""
+Queries that follow links between records more than one step, such as everyone within
+two links of a contact, or the organizations that share resources with another one.
+Organizations, contacts and resources are nodes of a graph whose edges are their links,
+kept in memory as a dictionary of each node's neighbors. It's built with one pass over
+the link tables the first time it's used, and after that only the links of records that
+write methods report changing are read again, see records_changed().
+"""
+
+import json
+import sqlite3
+import threading
+from collections import Counter, defaultdict, deque
+from typing import TYPE_CHECKING
+
+from database.readpool import TABLES
+
+if TYPE_CHECKING:
+    from database.database import Database
+
+__all__ = ("RecordGraph", "related_records", "shared_neighbors", "records_along")
+
+# A record, as (record type, ID)
+Node = tuple[str, int]
+
+# Every link table and the record types of its two columns
+EDGES = (
+    ("Membership", "organization", "contact"),
+    ("Organization_Resource", "organization", "resource"),
+    ("Contact_Resource", "contact", "resource"),
+)
+
+# The names shown for each kind of record
+NAMES = {
+    "organization": "name",
+    "contact": "first_name || ' ' || last_name",
+    "resource": "name",
+}
+
+
+class RecordGraph:
+    """
+    The links between organizations, contacts and resources, as each record's neighbors.
+    Database.change_listeners tells it which records changed with invalidate(),
+    and their links are read again the next time it's used.
+    """
+
+    def __init__(self):
+        self._neighbors: dict[Node, set[Node]] | None = None
+        self._changed: set[Node] = set()
+        self._lock = threading.Lock()
+
+    def invalidate(self, changed: set[tuple[str, int]]) -> None:
+        """
+        Mark records as changed. A change listener, see records_changed().
+        """
+        with self._lock:
+            if self._neighbors is not None:
+                self._changed |= changed
+
+    def clear(self) -> None:
+        """
+        Forget everything, such as when a different database is opened.
+        """
+        with self._lock:
+            self._neighbors = None
+            self._changed.clear()
+
+    def _refresh(self, connection: sqlite3.Connection) -> dict[Node, set[Node]]:
+        if self._neighbors is None:
+            self._neighbors = defaultdict(set)
+
+            for table, first, second in EDGES:
+                for a, b in connection.execute(
+                    f"SELECT {first}, {second} FROM {table}"
+                ):
+                    self._neighbors[(first, a)].add((second, b))
+                    self._neighbors[(second, b)].add((first, a))
+
+            self._changed.clear()
+
+        elif self._changed:
+            changed, self._changed = self._changed, set()
+
+            # Drop every link of the changed records, then add back the ones they still have
+            for node in changed:
+                for neighbor in self._neighbors.pop(node, ()):
+                    self._neighbors[neighbor].discard(node)
+
+            for table, first, second in EDGES:
+                for column in (first, second):
+                    ids = [i for record_type, i in changed if record_type == column]
+
+                    if not ids:
+                        continue
+
+                    for a, b in connection.execute(
+                        f"SELECT {first}, {second} FROM {table} "
+                        f"WHERE {column} IN (SELECT value FROM json_each(?))",
+                        (json.dumps(ids),),
+                    ):
+                        self._neighbors[(first, a)].add((second, b))
+                        self._neighbors[(second, b)].add((first, a))
+
+        return self._neighbors
+
+    def within(
+        self,
+        connection: sqlite3.Connection,
+        start: Node,
+        max_hops: int = 2,
+        record_type: str | None = None,
+    ) -> dict[Node, int]:
+        """
+        Find the records within max_hops links of start with a breadth-first search,
+        along with how many links away each one is. Only records of record_type are
+        returned if it's given, though the search still passes through the others.
+        """
+        with self._lock:
+            neighbors = self._refresh(connection)
+            hops = {start: 0}
+            queue = deque([start])
+
+            while queue:
+                node = queue.popleft()
+
+                if hops[node] == max_hops:
+                    continue
+
+                for neighbor in neighbors.get(node, ()):
+                    if neighbor not in hops:
+                        hops[neighbor] = hops[node] + 1
+                        queue.append(neighbor)
+
+        del hops[start]
+
+        return {
+            node: distance
+            for node, distance in hops.items()
+            if record_type is None or node[0] == record_type
+        }
+
+    def shared(
+        self,
+        connection: sqlite3.Connection,
+        start: Node,
+        via: str = "resource",
+        record_type: str | None = None,
+    ) -> Counter[Node]:
+        """
+        Find the records that share a neighbor of type via with start, such as the
+        organizations that share a resource with an organization, with how many they share.
+        """
+        with self._lock:
+            neighbors = self._refresh(connection)
+            counts: Counter[Node] = Counter()
+
+            for middle in neighbors.get(start, ()):
+                if middle[0] != via:
+                    continue
+
+                for node in neighbors.get(middle, ()):
+                    if node != start and (
+                        record_type is None or node[0] == record_type
+                    ):
+                        counts[node] += 1
+
+        return counts
+
+    def along(
+        self, connection: sqlite3.Connection, start: Node, path: list[str]
+    ) -> Counter[Node]:
+        """
+        Follow links from start through the record types in path, in order, such as
+        ["resource", "organization", "contact"] for the contacts of organizations that
+        share a resource with start. Returns the records at the end of the path with
+        how many ways they were reached. start itself is never included.
+        """
+        with self._lock:
+            neighbors = self._refresh(connection)
+            counts: Counter[Node] = Counter({start: 1})
+
+            for record_type in path:
+                following: Counter[Node] = Counter()
+
+                for node, ways in counts.items():
+                    for neighbor in neighbors.get(node, ()):
+                        if neighbor[0] == record_type and neighbor != start:
+                            following[neighbor] += ways
+
+                counts = following
+
+        return counts
+
+
+def _rows(connection: sqlite3.Connection, nodes: dict[Node, int | float]) -> list[list]:
+    """
+    The type, ID and name of each node, with its value from nodes.
+    """
+    names: dict[Node, str] = {}
+
+    for record_type, table in TABLES.items():
+        ids = [i for t, i in nodes if t == record_type]
+
+        if ids:
+            names.update(
+                ((record_type, record_id), name)
+                for record_id, name in connection.execute(
+                    f"SELECT id, {NAMES[record_type]} FROM {table} "
+                    "WHERE id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(ids),),
+                )
+            )
+
+    return [
+        [record_type.title(), record_id, names[(record_type, record_id)], value]
+        for (record_type, record_id), value in nodes.items()
+        if (record_type, record_id) in names
+    ]
+
+
+def related_records(
+    db: "Database",
+    record_type: str,
+    record_id: int,
+    max_hops: int = 2,
+    related_type: str | None = None,
+) -> list[list]:
+    """
+    Get the records within max_hops links of a record, closest first,
+    as rows of type, ID, name, and number of links away.
+    """
+
+    def query(connection: sqlite3.Connection) -> list[list]:
+        hops = db.graph.within(
+            connection, (record_type.lower(), record_id), max_hops, related_type
+        )
+
+        return _rows(connection, hops)
+
+    return sorted(db.read(query), key=lambda row: (row[3], row[0], row[2].lower()))
+
+
+def shared_neighbors(
+    db: "Database",
+    record_type: str,
+    record_id: int,
+    via: str = "resource",
+    related_type: str | None = None,
+) -> list[list]:
+    """
+    Get the records that share neighbors of type via with a record, most shared first,
+    as rows of type, ID, name, and how many they share.
+    """
+
+    def query(connection: sqlite3.Connection) -> list[list]:
+        counts = db.graph.shared(
+            connection, (record_type.lower(), record_id), via, related_type
+        )
+
+        return _rows(connection, counts)
+
+    return sorted(db.read(query), key=lambda row: (-row[3], row[0], row[2].lower()))
+
+
+def records_along(
+    db: "Database", record_type: str, record_id: int, path: list[str]
+) -> list[list]:
+    """
+    Get the records at the end of a path of record types from a record, see
+    RecordGraph.along(), as rows of type, ID, name, and how many ways they were reached.
+    """
+
+    def query(connection: sqlite3.Connection) -> list[list]:
+        counts = db.graph.along(
+            connection, (record_type.lower(), record_id), [t.lower() for t in path]
+        )
+
+        return _rows(connection, counts)
+
+    return sorted(db.read(query), key=lambda row: (-row[3], row[0], row[2].lower()))
@@ -0,0 +1,228 @@
+"""
+Loads a record together with everything its viewer screen shows.
+Each record type takes the same three queries no matter how many contacts,
+organizations or resources are linked to it: one for the record, and one for each
+of its relationships, with titles and primary contacts worked out in SQL.
+Relationships are loaded a page at a time, so a resource linked to thousands of
+contacts costs as much to view as one linked to a few.
+"""
+
+import sqlite3
+from typing import NamedTuple
+
+from database.readpool import LINKS, TABLES, decode_json
+
+__all__ = ("ViewerLoader", "Page", "PAGE_SIZE")
+
+CONTACT_NAME = "c.first_name || ' ' || c.last_name"
+
+# How many rows of a relationship are shown at once
+PAGE_SIZE = 50
+
+
+class Page(NamedTuple):
+    """
+    Which rows of a relationship to load: a page number, and text the rows must contain.
+    """
+
+    number: int = 0
+    filter: str = ""
+
+
+class ViewerLoader:
+    """
+    Loads viewer data from a SQLite connection, such as one from the read pool.
+    pages chooses the page of each relationship, by name, and defaults to the first.
+    query_count counts the queries it has run, so tests can check it stays fixed.
+    """
+
+    def __init__(
+        self,
+        connection: sqlite3.Connection,
+        pages: dict[str, Page] | None = None,
+        page_size: int = PAGE_SIZE,
+    ):
+        self.connection = connection
+        self.pages = pages or {}
+        self.page_size = page_size
+        self.query_count = 0
+
+    def _query(self, sql: str, params: tuple | dict = ()) -> list[dict]:
+        self.query_count += 1
+        cursor = self.connection.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+
+        return [decode_json(dict(zip(columns, row))) for row in cursor.fetchall()]
+
+    def _record(self, record_type: str, record_id: int) -> dict | None:
+        """
+        Load a record, along with how many records are linked to it in each relationship.
+        """
+        totals = [
+            f"(SELECT count(*) FROM {table} WHERE {column} = r.id) AS {name}"
+            for name, (table, column, _) in LINKS[record_type].items()
+        ]
+        rows = self._query(
+            f"SELECT r.*, {', '.join(totals)} FROM {TABLES[record_type]} r "
+            "WHERE r.id = ?",
+            (record_id,),
+        )
+
+        if not rows:
+            return None
+
+        record = rows[0]
+        record["pages"] = {
+            name: {"total": record.pop(name)} for name in LINKS[record_type]
+        }
+
+        return record
+
+    def _related(
+        self, record: dict, name: str, sql: str, params: dict, search: tuple[str, ...]
+    ) -> None:
+        """
+        Load a page of a relationship into record[name] from sql, a query for all of its
+        rows. Rows are filtered on the search columns and sorted by name.
+        """
+        page = self.pages.get(name, Page())
+        params = {
+            **params,
+            "filter": page.filter.lower(),
+            "limit": self.page_size,
+            "offset": page.number * self.page_size,
+        }
+        matching = " OR ".join(
+            f"instr(lower({column}), :filter) > 0" for column in search
+        )
+        rows = self._query(
+            f"""
+            SELECT *, count(*) OVER () AS matches FROM ({sql})
+            WHERE :filter = '' OR {matching}
+            ORDER BY name, id
+            LIMIT :limit OFFSET :offset
+            """,
+            params,
+        )
+
+        # The page is past the end, such as after its last row was removed
+        if not rows and page.number > 0:
+            self.pages[name] = Page(0, page.filter)
+            return self._related(record, name, sql, params, search)
+
+        record[name] = rows
+        record["pages"][name].update(
+            page=page, matches=rows[0].pop("matches") if rows else 0
+        )
+
+        for row in rows[1:]:
+            del row["matches"]
+
+    def organization(self, org_id: int) -> dict | None:
+        """
+        Load an organization, its contacts with their titles in it, and its resources.
+        """
+        org = self._record("organization", org_id)
+
+        if org is None:
+            return None
+
+        self._related(
+            org,
+            "contacts",
+            f"""
+            SELECT c.id, {CONTACT_NAME} AS name, c.emails, c.phone_numbers, m.title
+            FROM Membership m JOIN Contact c ON c.id = m.contact
+            WHERE m.organization = :id
+            """,
+            {"id": org_id},
+            ("name", "title", "emails"),
+        )
+        self._related(
+            org,
+            "resources",
+            """
+            SELECT r.id, r.name, r.value
+            FROM Organization_Resource o_r JOIN Resource r ON r.id = o_r.resource
+            WHERE o_r.organization = :id
+            """,
+            {"id": org_id},
+            ("name", "value"),
+        )
+
+        return org
+
+    def contact(self, contact_id: int) -> dict | None:
+        """
+        Load a contact, its organizations, and its resources.
+        """
+        contact = self._record("contact", contact_id)
+
+        if contact is None:
+            return None
+
+        contact["name"] = f"{contact['first_name']} {contact['last_name']}"
+        self._related(
+            contact,
+            "organizations",
+            """
+            SELECT o.id, o.name, o.status
+            FROM Membership m JOIN Organization o ON o.id = m.organization
+            WHERE m.contact = :id
+            """,
+            {"id": contact_id},
+            ("name", "status"),
+        )
+        self._related(
+            contact,
+            "resources",
+            """
+            SELECT r.id, r.name, r.value
+            FROM Contact_Resource c_r JOIN Resource r ON r.id = c_r.resource
+            WHERE c_r.contact = :id
+            """,
+            {"id": contact_id},
+            ("name", "value"),
+        )
+
+        return contact
+
+    def resource(self, resource_id: int) -> dict | None:
+        """
+        Load a resource, its contacts, and its organizations with their primary contacts.
+        """
+        resource = self._record("resource", resource_id)
+
+        if resource is None:
+            return None
+
+        self._related(
+            resource,
+            "contacts",
+            f"""
+            SELECT c.id, {CONTACT_NAME} AS name, c.emails, c.phone_numbers
+            FROM Contact_Resource c_r JOIN Contact c ON c.id = c_r.contact
+            WHERE c_r.resource = :id
+            """,
+            {"id": resource_id},
+            ("name", "emails"),
+        )
+        self._related(
+            resource,
+            "organizations",
+            """
+            SELECT o.id, o.name, o.status, p.id AS primary_id,
+                p.first_name || ' ' || p.last_name AS primary_name
+            FROM Organization_Resource o_r
+            JOIN Organization o ON o.id = o_r.organization
+            LEFT JOIN Contact p ON p.id = (
+                SELECT min(m.contact) FROM Membership m
+                WHERE m.organization = o.id AND m.is_primary
+            )
+            WHERE o_r.resource = :id
+            """,
+            {"id": resource_id},
+            ("name", "status", "primary_name"),
+        )
+
+        return resource
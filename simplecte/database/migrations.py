@@ -0,0 +1,149 @@
+"""
+Changes to the layout of existing SQLite databases that Pony can't make by itself.
+Pony creates new tables and indexes, but doesn't move data into them or remove old
+columns, so each migration here does that once, after the tables have been created.
+The number of migrations a database has had is kept in its user_version.
+"""
+
+import itertools
+import sqlite3
+from typing import Callable, Iterator
+
+from database.replication import id_range
+from utils.phonetics import name_codes
+
+__all__ = ("migrate",)
+
+
+def _table_exists(connection: sqlite3.Connection, table: str) -> bool:
+    return (
+        connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        is not None
+    )
+
+
+def _columns(connection: sqlite3.Connection, table: str) -> set[str]:
+    return {row[1] for row in connection.execute(f'PRAGMA table_info("{table}")')}
+
+
+def _new_ids(connection: sqlite3.Connection, table: str) -> Iterator[int | None]:
+    """
+    The IDs of new rows of table. In a replicated database they come from its ID block,
+    like Database.next_id(), and otherwise they're None, so SQLite picks them.
+    """
+    if not _table_exists(connection, "_sync_state"):
+        return itertools.repeat(None)
+
+    block = connection.execute(
+        "SELECT value FROM _sync_state WHERE key = 'block'"
+    ).fetchone()
+
+    if block is None:
+        return itertools.repeat(None)
+
+    start, end = id_range(int(block[0]))
+    highest = connection.execute(
+        f"SELECT max(id) FROM {table} WHERE id >= ? AND id < ?", (start, end)
+    ).fetchone()[0]
+
+    return itertools.count((highest or start - 1) + 1)
+
+
+def _memberships(connection: sqlite3.Connection) -> None:
+    """
+    Move contacts' organizations and their titles, which were kept in a link table and
+    a JSON column keyed by organization ID, into the Membership table.
+    Titles of organizations the contact wasn't in are dropped, along with the old tables.
+    """
+    if _table_exists(connection, "Contact_Organization"):
+        title = "json_extract(c.org_titles, '$.\"' || co.organization || '\"')"
+
+        if "org_titles" not in _columns(connection, "Contact"):
+            title = "NULL"
+
+        connection.execute(
+            f"""
+            INSERT OR IGNORE INTO Membership (organization, contact, title, is_primary)
+            SELECT co.organization, co.contact, coalesce({title}, ''),
+                coalesce({title} = 'Primary', 0)
+            FROM Contact_Organization co JOIN Contact c ON c.id = co.contact
+            """
+        )
+        connection.execute("DROP TABLE Contact_Organization")
+
+    if "org_titles" in _columns(connection, "Contact"):
+        connection.execute("ALTER TABLE Contact DROP COLUMN org_titles")
+
+
+def _phone_index(connection: sqlite3.Connection) -> None:
+    """
+    Fill the phone index from the numbers organizations and contacts already have.
+    Their leading zeros and extensions were already lost, so they can't be restored.
+    """
+    for table, column, owner in (
+        ("Organization", "phones", "organization"),
+        ("Contact", "phone_numbers", "contact"),
+    ):
+        rows = connection.execute(
+            f"SELECT r.id, CAST(j.value AS TEXT) FROM {table} r, json_each(r.{column}) j "
+            f"WHERE json_valid(r.{column}) ORDER BY r.id, j.key"
+        ).fetchall()
+        ids = _new_ids(connection, "Phone")
+        connection.executemany(
+            f"INSERT INTO Phone (id, digits, reversed_digits, extension, {owner}) "
+            "VALUES (?, ?, ?, '', ?)",
+            [
+                (next(ids), digits, digits[::-1], record_id)
+                for record_id, digits in rows
+            ],
+        )
+
+
+def _name_sounds(connection: sqlite3.Connection) -> None:
+    """
+    Fill the phonetic codes of the names organizations and contacts already have.
+    """
+    for table, name, owner in (
+        ("Organization", "name", "organization"),
+        ("Contact", "first_name || ' ' || last_name", "contact"),
+    ):
+        rows = connection.execute(f"SELECT id, {name} FROM {table}").fetchall()
+        ids = _new_ids(connection, "NameSound")
+        connection.executemany(
+            f"INSERT INTO NameSound (id, code, {owner}) VALUES (?, ?, ?)",
+            [
+                (next(ids), code, record_id)
+                for record_id, record_name in rows
+                for code in sorted(set().union(*name_codes(record_name or "")))
+            ],
+        )
+
+
+# In the order they were added. Never remove or reorder them, only add to the end.
+MIGRATIONS: list[Callable[[sqlite3.Connection], None]] = [
+    _memberships,
+    _phone_index,
+    _name_sounds,
+]
+
+
+def migrate(db_path: str) -> int:
+    """
+    Run the migrations a database hasn't had yet, each in its own transaction.
+    Returns how many were run.
+    """
+    connection = sqlite3.connect(db_path, timeout=60)
+
+    try:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            with connection:
+                migration(connection)
+                connection.execute(f"PRAGMA user_version = {number}")
+
+        return max(len(MIGRATIONS) - version, 0)
+    finally:
+        connection.close()
@@ -0,0 +1,397 @@
+"""
+Counting and timing the SQL statements an operation runs, to catch N+1 patterns, where
+a loop runs the same query once per record, such as reading primary_contact for every
+row of a table. Every statement Pony or the read pool runs is passed to the counters
+active in the current context. The main loop counts each UI event, and the database
+worker counts each request, logging a warning when one runs a statement with the same
+shape more than REPEAT_THRESHOLD times. Tests can also count an operation themselves:
+
+    with QueryCounter("load org view", max_queries=10) as counter:
+        load_org_view(1)
+
+Statements slower than slow_queries.threshold are also kept in the slow query log with
+their plan from EXPLAIN QUERY PLAN and the function that ran them, so a slow search
+shows the SQL Pony made for it and whether it used an index. It's opened from the
+Slow Queries item of the main window's right-click debug menus.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable
+
+__all__ = (
+    "Query",
+    "QueryCounter",
+    "QueryLimitExceeded",
+    "SlowQuery",
+    "SlowQueryLog",
+    "slow_queries",
+    "TracedConnection",
+    "TracedCursor",
+    "record_query",
+    "statement_shape",
+    "REPEAT_THRESHOLD",
+)
+
+# How many times an operation can run the same shape of statement before it's reported
+REPEAT_THRESHOLD = 10
+
+logger = logging.getLogger("queries")
+
+# The counters of the operations running in the current context, outermost first
+_active: ContextVar[tuple["QueryCounter", ...]] = ContextVar(
+    "query_counters", default=()
+)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+# Frames in these files are skipped when finding the function that ran a statement
+_SIMPLECTE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SKIPPED_FILES = {os.path.abspath(__file__)}
+
+
+@dataclass
+class Query:
+    sql: str
+    arguments: Any
+    duration: float
+
+
+class QueryLimitExceeded(AssertionError):
+    """
+    Raised when an operation counted with max_queries runs more statements than that.
+    """
+
+
+def statement_shape(sql: str) -> str:
+    """
+    A statement with its literal values and lists of parameters taken out, so
+    statements that only differ by the record they're about have the same shape.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _LIST.sub("(...)", sql)
+
+    return _SPACE.sub(" ", sql).strip()
+
+
+@dataclass
+class SlowQuery:
+    sql: str
+    arguments: Any
+    duration: float
+    # When it ran, as a time.time()
+    started: float
+    # The SimpleCTE function that ran it, and where
+    caller: str
+    path: str | None
+    line: int | None
+    plan: list[str]
+
+
+def _caller() -> tuple[str, str | None, int | None]:
+    """
+    The first function up the stack that's part of SimpleCTE, skipping this module,
+    Database._exec_sql() and everything in Pony, as a description, path, and line.
+    """
+    frame = sys._getframe(1)
+
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+
+        # Pony's decorators make functions from strings, which have no file
+        if (
+            not frame.f_code.co_filename.startswith("<")
+            and path.startswith(_SIMPLECTE)
+            and path not in _SKIPPED_FILES
+            and frame.f_code.co_name != "_exec_sql"
+        ):
+            name = os.path.relpath(path, os.path.dirname(_SIMPLECTE))
+
+            return (
+                f"{frame.f_code.co_name} ({name}:{frame.f_lineno})",
+                path,
+                frame.f_lineno,
+            )
+
+        frame = frame.f_back
+
+    return "Unknown", None, None
+
+
+def explain_plan(rows: list[tuple]) -> list[str]:
+    """
+    Format the rows of EXPLAIN QUERY PLAN, (id, parent, unused, detail),
+    as lines indented under their parent steps.
+    """
+    depths = {0: -1}
+    lines = []
+
+    for step, parent, _, detail in rows:
+        depths[step] = depths.get(parent, -1) + 1
+        lines.append("    " * depths[step] + detail)
+
+    return lines
+
+
+class SlowQueryLog:
+    """
+    The most recent statements that took longer than threshold seconds, oldest first.
+    A threshold of None turns the log off.
+    """
+
+    def __init__(self, threshold: float | None = 0.25, size: int = 200):
+        self.threshold = threshold
+        self._queries: deque[SlowQuery] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def is_slow(self, duration: float) -> bool:
+        return self.threshold is not None and duration >= self.threshold
+
+    def add(
+        self,
+        sql: str,
+        arguments: Any,
+        duration: float,
+        explain: Callable[[str, Any], list[tuple]],
+    ) -> None:
+        """
+        Keep a slow statement, with its plan from explain(sql, arguments).
+        """
+        caller, path, line = _caller()
+
+        try:
+            plan = explain_plan(explain(sql, arguments))
+        except Exception as e:
+            # Statements such as BEGIN and PRAGMA have no plan
+            plan = [f"No plan: {e}"]
+
+        query = SlowQuery(
+            sql, arguments, duration, time.time(), caller, path, line, plan
+        )
+
+        with self._lock:
+            self._queries.append(query)
+
+        logger.info(f"Slow statement ({duration * 1000:.0f} ms) in {caller}: {sql}")
+
+    def queries(self) -> list[SlowQuery]:
+        with self._lock:
+            return list(self._queries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._queries.clear()
+
+
+# The slow query log of every connection, set up from the settings by the app
+slow_queries = SlowQueryLog()
+
+
+def record_query(
+    sql: str,
+    arguments: Any,
+    duration: float,
+    explain: Callable[[str, Any], list[tuple]] | None = None,
+) -> None:
+    """
+    Tell the active counters that a statement ran, and keep it in the slow query log
+    if it was slow and can be explained. Called by TracedCursor for Pony's statements,
+    through Database._exec_sql(), and for the read pool's, through TracedConnection.
+    """
+    for counter in _active.get():
+        counter.queries.append(Query(sql, arguments, duration))
+
+    if explain is not None and slow_queries.is_slow(duration):
+        slow_queries.add(sql, arguments, duration, explain)
+
+
+class TracedCursor:
+    """
+    Wraps a cursor so its statement is timed until its rows are fetched, since SQLite
+    finds most of them while they're fetched rather than in execute(). The statement is
+    passed to record_query() with the time spent running it and fetching its rows once
+    they run out, or when the cursor is closed or dropped before that.
+    """
+
+    # Until __init__ has finished, there's nothing to record
+    _recorded = True
+
+    def __init__(
+        self,
+        cursor: Any,
+        sql: str,
+        arguments: Any,
+        duration: float,
+        explain: Callable[[str, Any], list[tuple]] | None = None,
+    ):
+        self._cursor = cursor
+        self._sql = sql
+        self._arguments = arguments
+        self._duration = duration
+        self._explain = explain
+        self._recorded = False
+
+        # Statements without rows, like INSERT and UPDATE, are finished already
+        if cursor.description is None:
+            self._record()
+
+    def _record(self) -> None:
+        if not self._recorded:
+            self._recorded = True
+            record_query(self._sql, self._arguments, self._duration, self._explain)
+
+    def _fetch(self, fetch: Callable[..., Any], *args) -> Any:
+        start = time.perf_counter()
+
+        try:
+            return fetch(*args)
+        finally:
+            self._duration += time.perf_counter() - start
+
+    def fetchone(self) -> Any:
+        row = self._fetch(self._cursor.fetchone)
+
+        if row is None:
+            self._record()
+
+        return row
+
+    def fetchmany(self, *args) -> list:
+        rows = self._fetch(self._cursor.fetchmany, *args)
+
+        if not rows:
+            self._record()
+
+        return rows
+
+    def fetchall(self) -> list:
+        rows = self._fetch(self._cursor.fetchall)
+        self._record()
+
+        return rows
+
+    def __iter__(self) -> "TracedCursor":
+        return self
+
+    def __next__(self) -> Any:
+        row = self.fetchone()
+
+        if row is None:
+            raise StopIteration
+
+        return row
+
+    def close(self) -> None:
+        self._record()
+        self._cursor.close()
+
+    def __del__(self) -> None:
+        self._record()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+
+class TracedConnection(sqlite3.Connection):
+    """
+    A SQLite connection that reports its statements to record_query(). Made by passing
+    it as the factory of sqlite3.connect().
+    """
+
+    def execute(self, sql: str, parameters: Any = (), /) -> TracedCursor:
+        start = time.perf_counter()
+        cursor = super().execute(sql, parameters)
+
+        return TracedCursor(
+            cursor, sql, parameters, time.perf_counter() - start, self._explain
+        )
+
+    def executemany(self, sql: str, parameters: Any, /) -> sqlite3.Cursor:
+        start = time.perf_counter()
+        cursor = super().executemany(sql, parameters)
+        record_query(sql, None, time.perf_counter() - start)
+
+        return cursor
+
+    def _explain(self, sql: str, parameters: Any) -> list[tuple]:
+        # Run on the connection itself, so it isn't recorded as a statement
+        return super().execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+
+
+class QueryCounter:
+    """
+    Counts the statements run while it's active, including on the database worker for
+    requests made from inside it with DatabaseWorker.call(). Counters can be nested, and each statement counts
+    toward all of them. When it ends, repeated statements are logged, and
+    QueryLimitExceeded is raised if max_queries is given and was exceeded.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_queries: int | None = None,
+        repeat_threshold: int | None = REPEAT_THRESHOLD,
+    ):
+        self.name = name
+        self.max_queries = max_queries
+        self.repeat_threshold = repeat_threshold
+        self.queries: list[Query] = []
+        self._token = None
+
+    def __enter__(self) -> "QueryCounter":
+        self._token = _active.set(_active.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        _active.reset(self._token)
+
+        if exc_type is not None:
+            return
+
+        if self.repeat_threshold is not None:
+            for shape, count in self.repeated(self.repeat_threshold):
+                logger.warning(
+                    f"{self.name} ran the same statement {count} times, "
+                    f"which may be an N+1 query: {shape}"
+                )
+
+        if self.max_queries is not None and self.count > self.max_queries:
+            raise QueryLimitExceeded(
+                f"{self.name} ran {self.count} statements, "
+                f"more than the limit of {self.max_queries}"
+            )
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def duration(self) -> float:
+        """
+        The total time spent running statements and fetching their rows, in seconds.
+        """
+        return sum(query.duration for query in self.queries)
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD) -> list[tuple[str, int]]:
+        """
+        The shapes of statements that ran more than threshold times, most repeated first.
+        """
+        # Not enough statements to repeat any of them that much
+        if self.count <= threshold:
+            return []
+
+        shapes = Counter(statement_shape(query.sql) for query in self.queries)
+
+        return [(s, n) for s, n in shapes.most_common() if n > threshold]
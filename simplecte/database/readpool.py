@@ -0,0 +1,460 @@
+"""
+Read-only connections for searches, table loading and exports.
+These run on their own SQLite connections instead of Pony's, so long scans don't wait
+for edits and edits don't wait for scans. With the database in WAL mode, every scan
+reads one consistent snapshot of the database, even while edits are being committed.
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
+
+from database.queries import TracedConnection
+from layouts import get_field_keys, get_sort_keys
+from utils.helpers import format_phone, join_phone, split_phone
+from utils.phonetics import name_codes
+
+if TYPE_CHECKING:
+    from database.fuzzy import NameIndex
+
+__all__ = (
+    "ReadPool",
+    "enable_wal",
+    "search_ids",
+    "table_values",
+    "read_records",
+    "decode_json",
+)
+
+# The columns stored as JSON, which are decoded when records are read
+JSON_LISTS = {"addresses", "phones", "phone_numbers", "emails"}
+JSON_DICTS = {"custom_fields", "contact_info", "org_titles"}
+
+TABLES = {
+    "organization": "Organization",
+    "contact": "Contact",
+    "resource": "Resource",
+}
+
+# The link table and the column pointing back at the record for each relationship
+LINKS = {
+    "organization": {
+        "contacts": ("Membership", "organization", "contact"),
+        "resources": ("Organization_Resource", "organization", "resource"),
+    },
+    "contact": {
+        "organizations": ("Membership", "contact", "organization"),
+        "resources": ("Contact_Resource", "contact", "resource"),
+    },
+    "resource": {
+        "contacts": ("Contact_Resource", "resource", "contact"),
+        "organizations": ("Organization_Resource", "resource", "organization"),
+    },
+}
+
+# Whether a row of the phone index starts or ends with the digits in phone_params()
+PHONE_MATCH = (
+    "((p.digits >= :digits AND p.digits < :digits_end) "
+    "OR (p.reversed_digits >= :reversed AND p.reversed_digits < :reversed_end))"
+)
+
+
+def enable_wal(db_path: str) -> None:
+    """
+    Switch a database to WAL mode, which lets readers keep reading while a change is committed.
+    The mode is stored in the database file, so this only has to happen once.
+    """
+    connection = sqlite3.connect(db_path)
+
+    try:
+        connection.execute("PRAGMA journal_mode = WAL")
+    finally:
+        connection.close()
+
+
+class ReadPool:
+    """
+    A pool of read-only connections to a SQLite database. Connections are opened
+    when they are first needed, up to size of them, and reused afterward.
+    """
+
+    def __init__(self, db_path: str, size: int = 4):
+        self.db_path = db_path
+        self.size = size
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        # Connections opened since the pool was last closed
+        self._current: set[sqlite3.Connection] = set()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            isolation_level=None,  # Transactions are started by snapshot()
+            factory=TracedConnection,
+        )
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA query_only = ON")
+        self._current.add(connection)
+
+        return connection
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                return self._connect()
+
+        # Every connection is in use, so wait for one to be returned
+        return self._idle.get()
+
+    def _release(self, connection: sqlite3.Connection) -> None:
+        if connection in self._current:
+            self._idle.put(connection)
+            return
+
+        # The connection was in use when the pool was closed, see close()
+        connection.close()
+
+        with self._lock:
+            self._opened -= 1
+
+    @contextmanager
+    def snapshot(self) -> Iterator[sqlite3.Connection]:
+        """
+        Get a connection that sees the database as it was when the snapshot started,
+        no matter what is committed while it is in use.
+        """
+        connection = self._acquire()
+
+        try:
+            connection.execute("BEGIN")
+
+            # A read transaction only takes its snapshot once it reads something
+            connection.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+
+            yield connection
+        finally:
+            connection.execute("ROLLBACK")
+            self._release(connection)
+
+    def close(self) -> None:
+        """
+        Close every connection, such as before the database file is replaced.
+        Connections in use are closed when their snapshots end, and new ones are
+        opened the next time a snapshot is taken.
+        """
+        self._current = set()
+
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+            connection.close()
+
+            with self._lock:
+                self._opened -= 1
+
+
+def decode_json(record: dict, lists: Iterable[str] = ()) -> dict:
+    """
+    Decode the JSON columns of a record read with SQL, along with any other columns
+    in lists that hold JSON arrays, such as relationships read with json_group_array().
+    """
+    for key in record.keys() & (JSON_LISTS | JSON_DICTS | set(lists)):
+        if record[key]:
+            record[key] = json.loads(record[key])
+        else:
+            record[key] = {} if key in JSON_DICTS else []
+
+    return record
+
+
+def phone_params(query: str) -> dict[str, str] | None:
+    """
+    The parameters of PHONE_MATCH for finding numbers that start or end with the
+    digits of a query, or None if the query isn't a phone number.
+    Every number starting with the digits sorts between them and the digits followed
+    by ":", the character after "9", so the index can be scanned for that range.
+    """
+    try:
+        digits, _ = split_phone(query)
+    except ValueError:
+        return None
+
+    return {
+        "digits": digits,
+        "digits_end": digits + ":",
+        "reversed": digits[::-1],
+        "reversed_end": digits[::-1] + ":",
+    }
+
+
+def _matches_json(column: str, part: str) -> str:
+    """
+    SQL for whether any key or value of a JSON column contains the (lowercase) query.
+    """
+    return (
+        f"EXISTS (SELECT 1 FROM json_each(r.{column}) "
+        f"WHERE instr(lower(CAST(json_each.{part} AS TEXT)), :query) > 0)"
+    )
+
+
+def search_ids(
+    connection: sqlite3.Connection,
+    record_type: str,
+    query: str = "",
+    field: str = "",
+    sort: str = "",
+    descending: bool = False,
+    name_index: "NameIndex | None" = None,
+) -> list[int] | None:
+    """
+    Search for records with the same rules as Database.get_records(), in SQL.
+    Returns the IDs of the matching records in order,
+    or None if the search can't be done, such as with a non-numeric ID.
+    Fuzzy name searches need the database's name_index.
+    """
+    record_type = record_type.lower()
+    field = field.lower()
+    query = query.lower()
+    sort = sort.lower()
+
+    field_key = get_field_keys(record=record_type)
+    sort_key = get_sort_keys(record=record_type)
+
+    if sort and sort not in sort_key:
+        sort = ""
+
+    if (
+        field == "id" or field == "associated with resource..."
+    ) and not query.isdigit():
+        return None
+
+    params: dict[str, Any] = {"query": query}
+
+    if field == "phone":
+        if (phone := phone_params(query)) is None:
+            return None
+
+        params.update(phone)
+
+    if field == "sounds like":
+        if not (sounds := name_codes(query)):
+            return None
+
+        params.update(
+            {f"sounds{i}": json.dumps(sorted(c)) for i, c in enumerate(sounds)}
+        )
+
+    if not field or field not in field_key.keys():
+        where = "1"
+
+    elif field == "custom field name" or field == "contact info name":
+        where = _matches_json(field_key[field], "key")
+
+    elif field == "custom field value" or field == "contact info value":
+        where = _matches_json(field_key[field], "value")
+
+    elif field == "id":
+        where = "r.id = :id"
+        params["id"] = int(query)
+
+    elif field == "associated with resource...":
+        if not connection.execute(
+            "SELECT 1 FROM Resource WHERE id = ?", (int(query),)
+        ).fetchone():
+            return None
+
+        table, column, _ = LINKS["resource"][f"{record_type}s"]
+        where = f"r.id IN (SELECT {record_type} FROM {table} WHERE {column} = :id)"
+        params["id"] = int(query)
+
+    elif field == "phone":
+        where = f"r.id IN (SELECT p.{record_type} FROM Phone p WHERE {PHONE_MATCH})"
+
+    elif field == "fuzzy name":
+        if name_index is None:
+            return None
+
+        params["ids"] = json.dumps(
+            ids := name_index.search(connection, record_type, query)
+        )
+
+        # Without a sort, the closest matches come first
+        if not sort:
+            return ids
+
+        where = "r.id IN (SELECT value FROM json_each(:ids))"
+
+    elif field == "sounds like":
+        # Records with a word that sounds like each word of the query
+        where = " AND ".join(
+            f"r.id IN (SELECT s.{record_type} FROM NameSound s "
+            f"WHERE s.code IN (SELECT value FROM json_each(:sounds{i})))"
+            for i in range(len(sounds))
+        )
+
+    elif field == "address" or field == "email":
+        where = _matches_json(field_key[field], "value")
+
+    else:
+        where = f"instr(lower(r.{field_key[field]}), :query) > 0"
+
+    sql = f"SELECT r.id FROM {TABLES[record_type]} r WHERE {where}"
+
+    if sort:
+        sql += f" ORDER BY r.{sort_key[sort]}{' DESC' if descending else ''}"
+
+    return [row[0] for row in connection.execute(sql, params)]
+
+
+def table_values(
+    connection: sqlite3.Connection,
+    record_type: str,
+    search_info: dict | None = None,
+    descending: bool = False,
+    name_index: "NameIndex | None" = None,
+) -> list:
+    """
+    Get the rows of a search table, the same as get_table_values(), in a single query.
+    """
+    record_type = record_type.lower()
+    ids = search_ids(
+        connection,
+        record_type,
+        **(search_info or {}),
+        descending=descending,
+        name_index=name_index,
+    )
+
+    # If the search didn't find anything, all the records are shown, as get_table_values() does
+    if not ids:
+        ids = search_ids(connection, record_type)
+
+    params: dict[str, Any] = {"ids": json.dumps(ids)}
+    phone = "json_array(json_extract(c.phone_numbers, '$[0]'), NULL)"
+
+    # When searching by phone, each contact's number that matched is shown instead of its first
+    if (search_info or {}).get("field", "").lower() == "phone":
+        if (phone_match := phone_params(search_info.get("query", ""))) is not None:
+            params.update(phone_match)
+            phone = f"""coalesce((
+                SELECT json_array(p.digits, p.extension) FROM Phone p
+                WHERE p.contact = c.id AND {PHONE_MATCH}
+                ORDER BY p.id LIMIT 1
+            ), {phone})"""
+
+    if record_type == "organization":
+        sql = """
+            SELECT o.id, o.name, o.type, (
+                SELECT c.first_name || ' ' || c.last_name
+                FROM Membership m JOIN Contact c ON c.id = m.contact
+                WHERE m.organization = o.id AND m.is_primary
+                ORDER BY c.id LIMIT 1
+            ), o.status
+            FROM json_each(:ids) AS i JOIN Organization o ON o.id = i.value
+            ORDER BY i.key
+        """
+    else:
+        # The organization shown is one the contact is the primary contact of, if there is one
+        sql = f"""
+            SELECT c.id, c.first_name || ' ' || c.last_name, (
+                SELECT o.name
+                FROM Membership m JOIN Organization o ON o.id = m.organization
+                WHERE m.contact = c.id
+                ORDER BY m.is_primary DESC, o.id DESC LIMIT 1
+            ), {phone}
+            FROM json_each(:ids) AS i JOIN Contact c ON c.id = i.value
+            ORDER BY i.key
+        """
+
+    rows = []
+
+    for row in connection.execute(sql, params):
+        if record_type == "organization":
+            rows.append(
+                [row[0], row[1], row[2], row[3] or "No Primary Contact", row[4]]
+            )
+        else:
+            rows.append(
+                [
+                    row[0],
+                    row[1],
+                    row[2] or "No Organization",
+                    _format_match(row[3]),
+                ]
+            )
+
+    return rows
+
+
+def _format_match(phone: str) -> str:
+    digits, extension = json.loads(phone)
+
+    if digits is None:
+        return "No Phone Number"
+
+    # Numbers from the phone index keep their extensions
+    if extension is None:
+        return format_phone(digits)
+
+    return join_phone(digits, extension)
+
+
+def read_records(
+    connection: sqlite3.Connection,
+    record_type: str,
+    search_info: dict | None = None,
+    ids: list[int] | None = None,
+    name_index: "NameIndex | None" = None,
+) -> list[dict]:
+    """
+    Read whole records, with JSON columns decoded and each relationship as a list of IDs.
+    Records are chosen by search_info, or by ids if it is given.
+    """
+    record_type = record_type.lower()
+
+    if ids is None:
+        ids = (
+            search_ids(
+                connection, record_type, **(search_info or {}), name_index=name_index
+            )
+            or []
+        )
+
+    columns = ["r.*"]
+
+    if record_type == "contact":
+        columns.append(
+            "(SELECT json_group_object(organization, title) FROM Membership "
+            "WHERE contact = r.id AND title != '') AS org_titles"
+        )
+
+    for name, (table, column, other) in LINKS[record_type].items():
+        columns.append(
+            f"(SELECT json_group_array({other}) FROM {table} "
+            f"WHERE {column} = r.id) AS {name}"
+        )
+
+    sql = (
+        f"SELECT {', '.join(columns)} FROM json_each(:ids) AS i "
+        f"JOIN {TABLES[record_type]} r ON r.id = i.value ORDER BY i.key"
+    )
+
+    return [
+        decode_json(dict(row), LINKS[record_type].keys())
+        for row in connection.execute(sql, {"ids": json.dumps(ids)})
+    ]
@@ -0,0 +1,392 @@
+"""
+A client for the SimpleCTE database server (database/server.py).
+RemoteDatabase offers the same operations as Database, but runs them on the server,
+so several scripts and other programs can share one database.
+The SimpleCTE window uses the server through ServerReplica instead, a local copy of the
+database that is kept in sync with the server's in the background.
+"""
+
+import base64
+import http.client
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Callable, Iterator
+from urllib.parse import urlencode
+
+from database.ftp import TEMP_PATH
+from database.replication import Replicator, make_replica
+from database.server import DEFAULT_PORT
+from utils.scheduler import Scheduler
+
+__all__ = ("RemoteDatabase", "RemoteError", "ServerReplica")
+
+SYNC_DELAY = 2  # Seconds to wait after the last change before sending it
+SYNC_INTERVAL = 15  # Seconds between checks for changes made by others
+
+
+class RemoteError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class RemoteDatabase:
+    """
+    Records are returned as dictionaries, with relationships as lists of IDs.
+    Each thread keeps its own connection to the server open between requests.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        token: str | None = None,
+        timeout: float = 30,
+    ):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=self.timeout
+            )
+            self._local.connection = connection
+
+        return connection
+
+    def _request(
+        self, method: str, path: str, body: dict | None = None
+    ) -> http.client.HTTPResponse:
+        headers = {"Content-Type": "application/json"}
+
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+
+        data = json.dumps(body).encode() if body is not None else None
+
+        for attempt in range(2):
+            connection = self._connection()
+
+            try:
+                connection.request(method, path, body=data, headers=headers)
+                response = connection.getresponse()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # The server may have closed a connection that sat idle, so reconnect once
+                connection.close()
+                self._local.connection = None
+
+                if attempt:
+                    raise
+
+        if response.status >= 400:
+            error = json.loads(response.read() or b"{}").get("error", response.reason)
+            raise RemoteError(response.status, error)
+
+        return response
+
+    def _json(self, method: str, path: str, body: dict | None = None) -> Any:
+        return json.loads(self._request(method, path, body).read())
+
+    def close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def health(self) -> bool:
+        try:
+            return self._json("GET", "/health")["status"] == "ok"
+        except (OSError, RemoteError):
+            return False
+
+    def get_records(
+        self,
+        record_type: str,
+        query: str = "",
+        field: str = "",
+        sort: str = "",
+        descending: bool = False,
+    ) -> Iterator[dict]:
+        """
+        Search for records. Records are yielded as they arrive from the server.
+        """
+        params = urlencode(
+            {
+                "query": query,
+                "field": field,
+                "sort": sort,
+                "descending": "true" if descending else "",
+            }
+        )
+        response = self._request("GET", f"/records/{record_type.lower()}?{params}")
+
+        while line := response.readline():
+            yield json.loads(line)
+
+    def get_record(self, record_type: str, record_id: int) -> dict | None:
+        try:
+            return self._json("GET", f"/records/{record_type.lower()}/{record_id}")
+        except RemoteError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def get_organization(self, org_id: int) -> dict | None:
+        return self.get_record("organization", org_id)
+
+    def get_contact(self, contact_id: int) -> dict | None:
+        return self.get_record("contact", contact_id)
+
+    def get_resource(self, resource_id: int) -> dict | None:
+        return self.get_record("resource", resource_id)
+
+    def create_organization(self, **kwargs) -> dict:
+        return self._json("POST", "/records/organization", kwargs)
+
+    def create_contact(self, **kwargs) -> dict:
+        return self._json("POST", "/records/contact", kwargs)
+
+    def create_resource(self, **kwargs) -> dict:
+        return self._json("POST", "/records/resource", kwargs)
+
+    def _update(self, record_type: str, record_id: int, fields: dict) -> bool:
+        try:
+            self._json("PATCH", f"/records/{record_type}/{record_id}", fields)
+        except RemoteError as e:
+            if e.status == 404:
+                return False
+            raise
+
+        return True
+
+    def update_organization(self, org: int, **kwargs) -> bool:
+        return self._update("organization", org, kwargs)
+
+    def update_contact(self, contact: int, **kwargs) -> bool:
+        return self._update("contact", contact, kwargs)
+
+    def update_resource(self, resource: int, **kwargs) -> bool:
+        return self._update("resource", resource, kwargs)
+
+    def _delete(self, record_type: str, record_id: int) -> bool:
+        try:
+            self._json("DELETE", f"/records/{record_type}/{record_id}")
+        except RemoteError as e:
+            if e.status == 404:
+                return False
+            raise
+
+        return True
+
+    def delete_organization(self, org: int) -> bool:
+        return self._delete("organization", org)
+
+    def delete_contact(self, contact: int) -> bool:
+        return self._delete("contact", contact)
+
+    def delete_resource(self, resource: int) -> bool:
+        return self._delete("resource", resource)
+
+    def _link(self, method: str, links: dict) -> bool:
+        try:
+            self._json(method, "/links", links)
+        except RemoteError as e:
+            if e.status == 404:
+                return False
+            raise
+
+        return True
+
+    def add_contact_to_org(self, contact: int, org: int) -> bool:
+        return self._link("PUT", {"contact": contact, "organization": org})
+
+    def remove_contact_from_org(self, contact: int, org: int) -> bool:
+        return self._link("DELETE", {"contact": contact, "organization": org})
+
+    def link_resource(
+        self, resource: int, org: int | None = None, contact: int | None = None
+    ) -> bool:
+        return self._link(
+            "PUT", {"resource": resource, "organization": org, "contact": contact}
+        )
+
+    def unlink_resource(
+        self, resource: int, org: int | None = None, contact: int | None = None
+    ) -> bool:
+        return self._link(
+            "DELETE", {"resource": resource, "organization": org, "contact": contact}
+        )
+
+    def change_contact_title(self, org: int, contact: int, title: str) -> bool:
+        try:
+            self._json(
+                "PUT",
+                "/titles",
+                {"organization": org, "contact": contact, "title": title},
+            )
+        except RemoteError as e:
+            if e.status == 404:
+                return False
+            raise
+
+        return True
+
+    def register_replica(self) -> dict:
+        """
+        Ask the server for an ID block for a new copy of its database.
+        Returns the server's node ID and the block.
+        """
+        return self._json("POST", "/replicas")
+
+    def download_snapshot(self, path: str) -> None:
+        """
+        Download a consistent copy of the server's database to path.
+        """
+        response = self._request("GET", "/replicas/snapshot")
+
+        with open(path, "wb") as f:
+            while chunk := response.read(64 * 1024):
+                f.write(chunk)
+
+    def sync_changes(self, node: str, since: int, changes: bytes) -> tuple[int, bytes]:
+        """
+        Send a changeset to the server and get back the server's changes with a version
+        above since, leaving out the ones that came from node.
+        Returns the number of changes the server applied and its changeset.
+        """
+        result = self._json(
+            "POST",
+            "/replicas/sync",
+            {
+                "node": node,
+                "since": since,
+                "changes": base64.b64encode(changes).decode(),
+            },
+        )
+
+        return result["applied"], base64.b64decode(result["changes"])
+
+
+class ServerReplica:
+    """
+    The local copy of a database on a SimpleCTE server, which the window opens like any
+    other database file. The first time, the server gives the copy an ID block of its own
+    and sends a snapshot of its database. After that, sync() exchanges what changed on
+    either side, see replication.py.
+    Once started, local changes are sent SYNC_DELAY seconds after they're committed, and
+    the server is asked for other people's changes every SYNC_INTERVAL seconds.
+    on_changes is called from the background thread with the number of changes received.
+    """
+
+    def __init__(
+        self,
+        remote: RemoteDatabase,
+        cache_path: str = TEMP_PATH,
+        delay: float = SYNC_DELAY,
+        interval: float = SYNC_INTERVAL,
+    ):
+        self.logger = logging.getLogger("remote")
+        self.remote = remote
+        self.delay = delay
+        self.interval = interval
+        self.scheduler = Scheduler()
+        self.on_changes: Callable[[int], None] | None = None
+
+        name = re.sub(r"[^\w.-]", "_", f"{remote.host}_{remote.port}")
+        self.local_path = os.path.join(os.path.abspath(cache_path), f"server_{name}.db")
+
+    def fetch(self) -> str:
+        """
+        Get the path of the local copy, downloading it from the server if there is none yet.
+        """
+        if os.path.exists(self.local_path):
+            return self.local_path
+
+        os.makedirs(os.path.dirname(self.local_path), exist_ok=True)
+
+        info = self.remote.register_replica()
+        temp_path = self.local_path + ".part"
+
+        try:
+            self.remote.download_snapshot(temp_path)
+            make_replica(temp_path, info["block"], info["node"])
+            os.replace(temp_path, self.local_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        return self.local_path
+
+    def sync(self) -> int:
+        """
+        Send the local changes the server hasn't received yet, and apply the server's.
+        Returns the number of changes received.
+        """
+        with Replicator(self.local_path) as replicator:
+            server = replicator.source
+            changes = replicator.changeset(replicator.sent_watermark(server), server)
+
+            _, reply = self.remote.sync_changes(
+                replicator.node, replicator.watermark(server), changes
+            )
+
+            received = replicator.apply(reply)
+            replicator.mark_sent(server, changes)
+
+        return received
+
+    def start(self) -> None:
+        """
+        Sync in the background from now on, starting right away in case the last
+        session's changes weren't all sent.
+        """
+        self.scheduler.start()
+        self.scheduler.schedule(
+            "sync", self._sync_in_background, interval=self.interval
+        )
+
+    def notify(self) -> None:
+        """
+        Tell the replica that the local copy changed. Every change pushes the sync back,
+        so a burst of edits is sent together.
+        """
+        self.scheduler.schedule("send", self._sync_in_background, delay=self.delay)
+
+    def _sync_in_background(self) -> None:
+        try:
+            received = self.sync()
+        except (OSError, http.client.HTTPException, RemoteError) as e:
+            # Nothing is marked as sent, so the changes are sent again next time
+            self.logger.warning(
+                f"Syncing with the server failed ({e}), retrying later."
+            )
+            return
+
+        if received and self.on_changes is not None:
+            self.on_changes(received)
+
+    def close(self) -> None:
+        """
+        Stop syncing in the background, after one last try at sending the local changes.
+        """
+        self.scheduler.cancel("sync")
+        self.scheduler.cancel("send")
+        self.scheduler.stop(wait=True)
+
+        try:
+            self.sync()
+        except (OSError, http.client.HTTPException, RemoteError) as e:
+            self.logger.error(f"Could not send the last changes to the server: {e}")
+
+        self.remote.close()
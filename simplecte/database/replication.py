@@ -0,0 +1,644 @@
+"""
+Delta replication between SimpleCTE databases.
+Once replication is enabled, triggers keep a version number, the time of the last change,
+and the node that made it for every record, and keep a tombstone when a record is deleted.
+Syncing then only exchanges the records whose version is above what the other database
+has already seen, so a sync costs time in proportion to the number of changes.
+Conflicts are resolved by keeping the most recent change, with the node ID breaking ties,
+so every database ends up with the same data no matter which order they sync in.
+
+Each database creates new records with IDs from its own block, so records created
+on different machines never get the same ID.
+
+Run this file directly to manage replication:
+    python simplecte/database/replication.py enable <db> --block <number> [--share-existing]
+    python simplecte/database/replication.py status <db>
+    python simplecte/database/replication.py sync <db> <other db>
+    python simplecte/database/replication.py export <db> <file> --peer <node>
+    python simplecte/database/replication.py import <db> <file>
+
+The database server (server.py) also uses this to keep the copies that the SimpleCTE
+window opens in sync with the database it serves, see remote.py.
+"""
+
+import argparse
+import json
+import sqlite3
+import uuid
+import zlib
+from typing import Any
+
+__all__ = (
+    "Replicator",
+    "allocate_block",
+    "enable_replication",
+    "get_id_block",
+    "make_replica",
+    "id_range",
+    "sync",
+    "BLOCK_SIZE",
+)
+
+# IDs are 32-bit in Pony, so this leaves room for about 200 blocks
+BLOCK_SIZE = 10_000_000
+MAX_ID = 2**31 - 1
+FORMAT_VERSION = 1
+
+# The current time as a POSIX timestamp with fractions of a second, in SQL
+SQL_NOW = "((julianday('now') - 2440587.5) * 86400.0)"
+
+
+def id_range(block: int) -> tuple[int, int]:
+    """
+    Get the first ID and the ID after the last one of a block.
+    """
+    return max(block * BLOCK_SIZE, 1), (block + 1) * BLOCK_SIZE
+
+
+def _user_tables(connection: sqlite3.Connection) -> list[str]:
+    return [
+        row[0]
+        for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '\\_%' ESCAPE '\\'"
+        )
+    ]
+
+
+def _primary_key(connection: sqlite3.Connection, table: str) -> list[str]:
+    info = connection.execute(f'PRAGMA table_info("{table}")').fetchall()
+    primary_key = [row[1] for row in sorted(info, key=lambda r: r[5]) if row[5]]
+
+    return primary_key or [row[1] for row in info]
+
+
+def _foreign_keys(connection: sqlite3.Connection, table: str) -> list[tuple[str, str]]:
+    """
+    Get the (column, referenced table) of every foreign key of a table.
+    """
+    return [
+        (row[3], row[2])
+        for row in connection.execute(f'PRAGMA foreign_key_list("{table}")')
+    ]
+
+
+def _pk_json(alias: str, primary_key: list[str]) -> str:
+    return "json_array(" + ", ".join(f'{alias}."{c}"' for c in primary_key) + ")"
+
+
+def get_id_block(db_path: str) -> int | None:
+    """
+    Get the ID block of a database, or None if replication is not enabled for it.
+    """
+    connection = sqlite3.connect(db_path)
+
+    try:
+        row = connection.execute(
+            "SELECT value FROM _sync_state WHERE key = 'block'"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        connection.close()
+
+    return int(row[0]) if row else None
+
+
+def _install_triggers(connection: sqlite3.Connection) -> None:
+    triggers = connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '\\_sync\\_%' ESCAPE '\\'"
+    ).fetchall()
+
+    for (trigger,) in triggers:
+        connection.execute(f'DROP TRIGGER "{trigger}"')
+
+    # Changes applied from another database carry their own version info
+    local_change = "(SELECT value FROM _sync_state WHERE key = 'applying') = '0'"
+    node = "(SELECT value FROM _sync_state WHERE key = 'node')"
+    next_version = "(SELECT COALESCE(MAX(version), 0) + 1 FROM _sync_meta)"
+
+    for table in _user_tables(connection):
+        primary_key = _primary_key(connection, table)
+        name = table.lower()
+
+        for event, alias, deleted in (
+            ("INSERT", "NEW", 0),
+            ("UPDATE", "NEW", 0),
+            ("DELETE", "OLD", 1),
+        ):
+            connection.execute(
+                f'CREATE TRIGGER "_sync_{name}_{event.lower()}" '
+                f'AFTER {event} ON "{table}" WHEN {local_change} BEGIN '
+                f"INSERT OR REPLACE INTO _sync_meta VALUES ('{table}', "
+                f"{_pk_json(alias, primary_key)}, {next_version}, {SQL_NOW}, {node}, {deleted}); END"
+            )
+
+
+def enable_replication(
+    db_path: str, block: int | None = None, share_existing: bool = False
+) -> str:
+    """
+    Set a database up for replication, or update its triggers after the tables changed.
+    block is the ID block new records get their IDs from, which must be different for every database.
+    The records that already exist are treated as shared by all databases, unless share_existing
+    is True, in which case they are sent on the first sync, such as when merging two unrelated databases.
+    Returns the node ID of the database.
+    """
+    connection = sqlite3.connect(db_path, timeout=60)
+
+    try:
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS _sync_state (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS _sync_meta ("
+                "tbl TEXT NOT NULL, pk TEXT NOT NULL, version INTEGER NOT NULL, "
+                "updated_at REAL NOT NULL, origin TEXT NOT NULL, deleted INTEGER NOT NULL, "
+                "PRIMARY KEY (tbl, pk))"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS _sync_meta_version ON _sync_meta (version)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS _sync_peers ("
+                "peer TEXT PRIMARY KEY, sent INTEGER NOT NULL DEFAULT 0, "
+                "received INTEGER NOT NULL DEFAULT 0)"
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO _sync_state VALUES ('node', ?)",
+                (uuid.uuid4().hex[:12],),
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO _sync_state VALUES ('applying', '0')"
+            )
+
+            if block is not None:
+                connection.execute(
+                    "INSERT OR REPLACE INTO _sync_state VALUES ('block', ?)",
+                    (str(block),),
+                )
+
+            node = connection.execute(
+                "SELECT value FROM _sync_state WHERE key = 'node'"
+            ).fetchone()[0]
+
+            # Give every record that has no version yet one. Version 0 is never sent,
+            # which is what shared records need.
+            for table in _user_tables(connection):
+                primary_key = _primary_key(connection, table)
+                connection.execute(
+                    f"INSERT OR IGNORE INTO _sync_meta SELECT '{table}', "
+                    f"{_pk_json('t', primary_key)}, "
+                    f"{'(SELECT COALESCE(MAX(version), 0) + 1 FROM _sync_meta)' if share_existing else '0'}, "
+                    f"0, ?, 0 FROM \"{table}\" t",
+                    (node if share_existing else "",),
+                )
+
+            _install_triggers(connection)
+    finally:
+        connection.close()
+
+    return node
+
+
+def allocate_block(db_path: str) -> int:
+    """
+    Hand out an ID block for a new copy of a database, which no other copy of it has been
+    given. Blocks are counted up from the one above the database's own block, and the next
+    one is remembered in the database itself.
+    """
+    connection = sqlite3.connect(db_path, timeout=60)
+
+    try:
+        with connection:
+            state = dict(
+                connection.execute(
+                    "SELECT key, value FROM _sync_state WHERE key IN ('block', 'next_block')"
+                )
+            )
+            block = max(int(state.get("next_block", 0)), int(state.get("block", 0)) + 1)
+
+            if id_range(block)[1] - 1 > MAX_ID:
+                raise ValueError("There are no ID blocks left to give out.")
+
+            connection.execute(
+                "INSERT OR REPLACE INTO _sync_state VALUES ('next_block', ?)",
+                (str(block + 1),),
+            )
+    except sqlite3.OperationalError:
+        raise ValueError(f"Replication is not enabled for {db_path}.")
+    finally:
+        connection.close()
+
+    return block
+
+
+def make_replica(db_path: str, block: int, source: str) -> str:
+    """
+    Turn a copy of another database, such as a hot backup of it, into a database of its
+    own with the given ID block. The copy already has every change the source node had when
+    it was copied, so syncing with the source only exchanges what changed after that.
+    Returns the node ID of the new database.
+    """
+    node = uuid.uuid4().hex[:12]
+    connection = sqlite3.connect(db_path, timeout=60)
+
+    try:
+        with connection:
+            connection.execute(
+                "UPDATE _sync_state SET value = ? WHERE key = 'node'", (node,)
+            )
+            connection.execute(
+                "UPDATE _sync_state SET value = '0' WHERE key = 'applying'"
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO _sync_state VALUES ('block', ?)", (str(block),)
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO _sync_state VALUES ('source', ?)", (source,)
+            )
+
+            # Only the source hands out blocks
+            connection.execute("DELETE FROM _sync_state WHERE key = 'next_block'")
+
+            # Versions are the source's up to here, so both watermarks start at the copy's newest
+            upto = connection.execute(
+                "SELECT COALESCE(MAX(version), 0) FROM _sync_meta"
+            ).fetchone()[0]
+            connection.execute("DELETE FROM _sync_peers")
+            connection.execute(
+                "INSERT INTO _sync_peers VALUES (?, ?, ?)", (source, upto, upto)
+            )
+    finally:
+        connection.close()
+
+    return node
+
+
+class Replicator:
+    """
+    Reads and applies changesets for one database that has replication enabled.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, timeout=60)
+
+        try:
+            self.node = self._state("node")
+        except sqlite3.OperationalError:
+            self.connection.close()
+            raise ValueError(f"Replication is not enabled for {db_path}.")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "Replicator":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _state(self, key: str) -> str | None:
+        row = self.connection.execute(
+            "SELECT value FROM _sync_state WHERE key = ?", (key,)
+        ).fetchone()
+
+        return row[0] if row else None
+
+    @property
+    def source(self) -> str | None:
+        """
+        The node this database was copied from, if it was made with make_replica().
+        """
+        return self._state("source")
+
+    def watermark(self, peer: str) -> int:
+        """
+        Get the highest version of the peer's changes this database has received.
+        """
+        row = self.connection.execute(
+            "SELECT received FROM _sync_peers WHERE peer = ?", (peer,)
+        ).fetchone()
+
+        return row[0] if row else 0
+
+    def sent_watermark(self, peer: str) -> int:
+        """
+        Get the highest version of this database's changes that was exported for the peer.
+        """
+        row = self.connection.execute(
+            "SELECT sent FROM _sync_peers WHERE peer = ?", (peer,)
+        ).fetchone()
+
+        return row[0] if row else 0
+
+    def _set_watermark(self, peer: str, column: str, version: int) -> None:
+        self.connection.execute(
+            "INSERT OR IGNORE INTO _sync_peers (peer) VALUES (?)", (peer,)
+        )
+        self.connection.execute(
+            f"UPDATE _sync_peers SET {column} = MAX({column}, ?) WHERE peer = ?",
+            (version, peer),
+        )
+
+    def changeset(self, since: int, peer: str | None = None) -> bytes:
+        """
+        Get every change with a version above since, compressed.
+        Changes that came from the peer are left out, since it already has them.
+        """
+        upto = self.connection.execute(
+            "SELECT COALESCE(MAX(version), 0) FROM _sync_meta"
+        ).fetchone()[0]
+
+        changes = self.connection.execute(
+            "SELECT tbl, pk, updated_at, origin, deleted FROM _sync_meta "
+            "WHERE version > ? AND origin != ? ORDER BY version",
+            (since, peer or ""),
+        ).fetchall()
+
+        origins: list[str] = []
+        tables: dict[str, dict] = {}
+
+        for table, pk, updated_at, origin, deleted in changes:
+            if table not in tables:
+                columns = [
+                    row[1]
+                    for row in self.connection.execute(f'PRAGMA table_info("{table}")')
+                ]
+                tables[table] = {
+                    "columns": columns,
+                    "key": _primary_key(self.connection, table),
+                    "rows": [],
+                }
+
+            if origin not in origins:
+                origins.append(origin)
+
+            values = None
+
+            if not deleted:
+                key = tables[table]["key"]
+                values = self.connection.execute(
+                    f'SELECT * FROM "{table}" WHERE '
+                    + " AND ".join(f'"{c}" = ?' for c in key),
+                    json.loads(pk),
+                ).fetchone()
+
+                if values is None:
+                    continue  # Deleted without a tombstone, which shouldn't happen
+
+            tables[table]["rows"].append(
+                [json.loads(pk), updated_at, origins.index(origin), deleted, values]
+            )
+
+        changeset = {
+            "format": FORMAT_VERSION,
+            "node": self.node,
+            "upto": upto,
+            "origins": origins,
+            "tables": tables,
+        }
+
+        return zlib.compress(json.dumps(changeset, separators=(",", ":")).encode())
+
+    def apply(self, data: bytes) -> int:
+        """
+        Apply a changeset from another database. A change is only applied if it is newer
+        than this database's version of the record. Returns the number of changes applied.
+        """
+        changeset = json.loads(zlib.decompress(data))
+
+        if changeset["format"] != FORMAT_VERSION:
+            raise ValueError(
+                "The changeset was made by a different version of SimpleCTE."
+            )
+
+        origins = changeset["origins"]
+        applied = 0
+
+        # Records come before the links between them, so a link is never applied
+        # before the records it links arrive
+        tables = sorted(
+            changeset["tables"].items(),
+            key=lambda item: len(_foreign_keys(self.connection, item[0])),
+        )
+
+        with self.connection:
+            self.connection.execute(
+                "UPDATE _sync_state SET value = '1' WHERE key = 'applying'"
+            )
+
+            try:
+                for table, info in tables:
+                    columns = ", ".join(f'"{c}"' for c in info["columns"])
+                    placeholders = ", ".join("?" for _ in info["columns"])
+                    key_filter = " AND ".join(f'"{c}" = ?' for c in info["key"])
+                    references = [
+                        (info["columns"].index(column), referenced)
+                        for column, referenced in _foreign_keys(self.connection, table)
+                        if column in info["columns"]
+                    ]
+
+                    for pk, updated_at, origin_index, deleted, values in info["rows"]:
+                        origin = origins[origin_index]
+                        pk_text = json.dumps(pk, separators=(",", ":"))
+                        local = self.connection.execute(
+                            "SELECT updated_at, origin FROM _sync_meta WHERE tbl = ? AND pk = ?",
+                            (table, pk_text),
+                        ).fetchone()
+
+                        if local is not None and tuple(local) >= (updated_at, origin):
+                            continue
+
+                        if deleted:
+                            self.connection.execute(
+                                f'DELETE FROM "{table}" WHERE {key_filter}', pk
+                            )
+                            self._delete_dependents(table, pk, updated_at, origin)
+                        elif any(
+                            values[index] is not None
+                            and not self._exists(referenced, values[index])
+                            for index, referenced in references
+                        ):
+                            # Links to a record that was deleted here are dropped, like
+                            # the deletion dropped the links this database had
+                            continue
+                        else:
+                            self.connection.execute(
+                                f'INSERT OR REPLACE INTO "{table}" ({columns}) VALUES ({placeholders})',
+                                values,
+                            )
+
+                        # The change gets a new local version, so it is passed on to other databases
+                        self.connection.execute(
+                            "INSERT OR REPLACE INTO _sync_meta VALUES (?, ?, "
+                            "(SELECT COALESCE(MAX(version), 0) + 1 FROM _sync_meta), ?, ?, ?)",
+                            (table, pk_text, updated_at, origin, deleted),
+                        )
+                        applied += 1
+            finally:
+                self.connection.execute(
+                    "UPDATE _sync_state SET value = '0' WHERE key = 'applying'"
+                )
+
+            self._set_watermark(changeset["node"], "received", changeset["upto"])
+
+        return applied
+
+    def _exists(self, table: str, record_id: Any) -> bool:
+        key = _primary_key(self.connection, table)
+
+        return (
+            self.connection.execute(
+                f'SELECT 1 FROM "{table}" WHERE "{key[0]}" = ?', (record_id,)
+            ).fetchone()
+            is not None
+        )
+
+    def _delete_dependents(
+        self, table: str, pk: list, updated_at: float, origin: str
+    ) -> None:
+        """
+        Delete the rows that refer to a deleted record, the way the foreign keys' cascades
+        would have, and keep tombstones for them so the deletions are passed on too.
+        Changes are applied with foreign keys off, since INSERT OR REPLACE would set off
+        the cascades every time a record is replaced.
+        """
+        for dependent in _user_tables(self.connection):
+            key = _primary_key(self.connection, dependent)
+            key_columns = ", ".join(f'"{c}"' for c in key)
+            key_filter = " AND ".join(f'"{c}" = ?' for c in key)
+
+            for column, referenced in _foreign_keys(self.connection, dependent):
+                if referenced != table:
+                    continue
+
+                rows = self.connection.execute(
+                    f'SELECT {key_columns} FROM "{dependent}" WHERE "{column}" = ?',
+                    pk[:1],
+                ).fetchall()
+
+                for row in rows:
+                    self.connection.execute(
+                        f'DELETE FROM "{dependent}" WHERE {key_filter}', row
+                    )
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO _sync_meta VALUES (?, ?, "
+                        "(SELECT COALESCE(MAX(version), 0) + 1 FROM _sync_meta), ?, ?, 1)",
+                        (
+                            dependent,
+                            json.dumps(list(row), separators=(",", ":")),
+                            updated_at,
+                            origin,
+                        ),
+                    )
+                    self._delete_dependents(dependent, list(row), updated_at, origin)
+
+    def export_changes(self, peer: str) -> bytes:
+        """
+        Get the changes the peer has not been sent yet, for when the databases
+        can't see each other and changesets are passed around as files.
+        """
+        data = self.changeset(self.sent_watermark(peer), peer)
+        self.mark_sent(peer, data)
+
+        return data
+
+    def mark_sent(self, peer: str, data: bytes) -> None:
+        """
+        Record that the peer received a changeset from this database, so its changes
+        aren't sent again.
+        """
+        upto = json.loads(zlib.decompress(data))["upto"]
+
+        with self.connection:
+            self._set_watermark(peer, "sent", upto)
+
+
+def sync(db_path: str, other_db_path: str) -> tuple[int, int]:
+    """
+    Exchange changes between two databases both ways.
+    Returns how many changes each database received.
+    """
+    with Replicator(db_path) as first, Replicator(other_db_path) as second:
+        received_by_second = second.apply(
+            first.changeset(second.watermark(first.node), second.node)
+        )
+        received_by_first = first.apply(
+            second.changeset(first.watermark(second.node), first.node)
+        )
+
+    return received_by_first, received_by_second
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replicate changes between SimpleCTE databases."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enable_parser = commands.add_parser("enable", help="Enable replication.")
+    enable_parser.add_argument("db")
+    enable_parser.add_argument(
+        "--block",
+        type=int,
+        required=True,
+        help="The ID block for new records. Use a different number on every machine.",
+    )
+    enable_parser.add_argument(
+        "--share-existing",
+        action="store_true",
+        help="Send the existing records on the first sync, to merge unrelated databases.",
+    )
+
+    status_parser = commands.add_parser("status", help="Show replication status.")
+    status_parser.add_argument("db")
+
+    sync_parser = commands.add_parser("sync", help="Sync two databases.")
+    sync_parser.add_argument("db")
+    sync_parser.add_argument("other_db")
+
+    export_parser = commands.add_parser("export", help="Write changes to a file.")
+    export_parser.add_argument("db")
+    export_parser.add_argument("file")
+    export_parser.add_argument("--peer", required=True, help="The receiving node.")
+
+    import_parser = commands.add_parser("import", help="Apply changes from a file.")
+    import_parser.add_argument("db")
+    import_parser.add_argument("file")
+
+    args = parser.parse_args()
+
+    if args.command == "enable":
+        node = enable_replication(args.db, args.block, args.share_existing)
+        print(f"Replication is enabled. This database's node ID is {node}.")
+
+    elif args.command == "status":
+        with Replicator(args.db) as replicator:
+            print(f"Node: {replicator.node}, ID block: {replicator._state('block')}")
+
+            for peer, sent, received in replicator.connection.execute(
+                "SELECT peer, sent, received FROM _sync_peers"
+            ):
+                print(f"Peer {peer}: sent up to {sent}, received up to {received}")
+
+    elif args.command == "sync":
+        received_by_first, received_by_second = sync(args.db, args.other_db)
+        print(
+            f"{args.db} received {received_by_first} changes, "
+            f"{args.other_db} received {received_by_second} changes."
+        )
+
+    elif args.command == "export":
+        with Replicator(args.db) as replicator, open(args.file, "wb") as f:
+            f.write(replicator.export_changes(args.peer))
+
+    elif args.command == "import":
+        with Replicator(args.db) as replicator, open(args.file, "rb") as f:
+            print(f"Applied {replicator.apply(f.read())} changes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,685 @@
+"""
+A local HTTP/JSON server that owns a SimpleCTE database, so several people can use it at once.
+Reads run on worker threads, while writes from every client go through one writer that
+commits them in groups. Searches are streamed one record per line, so large result sets
+never have to fit in memory on either side.
+
+Endpoints:
+    GET    /health
+    GET    /records/<type>?query=&field=&sort=&descending=   Search, streamed as JSON lines
+    GET    /records/<type>/<id>
+    POST   /records/<type>                                   Create a record from a JSON object
+    PATCH  /records/<type>/<id>                              Update fields from a JSON object
+    DELETE /records/<type>/<id>
+    PUT    /links                                            Link two records
+    DELETE /links                                            Unlink two records
+    PUT    /titles                                           Change a contact's title at an organization
+    POST   /replicas                                         Give a new copy of the database an ID block
+    GET    /replicas/snapshot                                Download the whole database file
+    POST   /replicas/sync                                    Exchange replication changesets
+
+Start it with `main.py --serve [port]`. If the SIMPLECTE_TOKEN environment variable is
+set, every request needs an `Authorization: Bearer <token>` header. The server listens on
+127.0.0.1, or on the address in SIMPLECTE_HOST.
+
+Scripts and other programs can use database/remote.py as a client. The SimpleCTE window
+works with Pony entities, so it uses the server through a local copy of the database
+instead, which the replicas endpoints keep in sync, see ServerReplica in remote.py.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import tempfile
+import threading
+import zlib
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from pony import orm
+
+from database.replication import (
+    Replicator,
+    allocate_block,
+    enable_replication,
+    get_id_block,
+)
+from utils.backup import hot_backup
+
+if TYPE_CHECKING:
+    from database.database import Database
+
+__all__ = ("DatabaseServer", "DEFAULT_PORT")
+
+DEFAULT_PORT = 8765
+MAX_BODY_SIZE = 16 * 1024 * 1024
+MAX_BATCH_SIZE = 100  # Writes committed together at most
+BATCH_WINDOW = 0.005  # Seconds to wait for more writes before committing a batch
+STREAM_CHUNK_SIZE = 200  # Records per chunk of a streamed response
+
+STATUS_TEXT = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: dict[str, str]
+    headers: dict[str, str]
+    body: bytes = b""
+    params: list[str] = field(default_factory=list)
+
+    def json(self) -> dict:
+        if not self.body:
+            return {}
+
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HTTPError(400, "The request body is not valid JSON.")
+
+        if not isinstance(data, dict):
+            raise HTTPError(400, "The request body must be a JSON object.")
+
+        return data
+
+
+@dataclass
+class Write:
+    action: Callable[[], Any]
+    future: asyncio.Future
+
+
+def serialize(record) -> dict | None:
+    """
+    Turn a record into JSON-friendly data. Relationships become lists of IDs.
+    """
+    if record is None:
+        return None
+
+    data = record.to_dict(with_collections=True)
+
+    if hasattr(record, "name"):
+        data["name"] = record.name
+
+    return data
+
+
+class DatabaseServer:
+    def __init__(
+        self,
+        db: "Database",
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        token: str | None = None,
+    ):
+        # Imported here because database.py imports the other modules of this package
+        from database.database import Organization, Contact, Resource
+
+        self.logger = logging.getLogger("server")
+        self.db = db
+        self.host = host
+        self.port = port
+        self.token = token
+        self.record_types = {
+            "organization": (
+                Organization,
+                db.create_organization,
+                db.update_organization,
+                db.delete_organization,
+            ),
+            "contact": (
+                Contact,
+                db.create_contact,
+                db.update_contact,
+                db.delete_contact,
+            ),
+            "resource": (
+                Resource,
+                db.create_resource,
+                db.update_resource,
+                db.delete_resource,
+            ),
+        }
+        self.routes = [
+            ("GET", "health", self.health),
+            ("GET", "records/*", self.search),
+            ("GET", "records/*/*", self.get_record),
+            ("POST", "records/*", self.create_record),
+            ("PATCH", "records/*/*", self.update_record),
+            ("DELETE", "records/*/*", self.delete_record),
+            ("PUT", "links", self.link),
+            ("DELETE", "links", self.unlink),
+            ("PUT", "titles", self.change_title),
+            ("POST", "replicas", self.register_replica),
+            ("GET", "replicas/snapshot", self.snapshot),
+            ("POST", "replicas/sync", self.sync_replica),
+        ]
+        # Held while replication is set up or a changeset is applied
+        self._replication_lock = threading.Lock()
+        self._writes: asyncio.Queue[Write] | None = None
+        self._server: asyncio.Server | None = None
+        self._writer_task: asyncio.Task | None = None
+
+    # MARK: Serving
+
+    async def start(self) -> None:
+        self._writes = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._writer())
+
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"Serving the database on http://{self.host}:{self.port}.")
+
+    async def serve_forever(self) -> None:
+        await self.start()
+
+        async with self._server:
+            await self._server.serve_forever()
+
+    def run(self) -> None:
+        asyncio.run(self.serve_forever())
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": str(e)}, False)
+                    break
+
+                if request is None:
+                    break
+
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+
+                try:
+                    handler = self._route(request)
+                    self._check_token(request)
+                    status, result = await handler(request)
+                except HTTPError as e:
+                    status, result = e.status, {"error": str(e)}
+                except (ValueError, TypeError, orm.core.OrmError) as e:
+                    status, result = 400, {"error": str(e)}
+                except Exception as e:
+                    self.logger.exception("A request failed.")
+                    status, result = 500, {"error": str(e)}
+
+                if isinstance(result, asyncio.Queue):
+                    await self._send_stream(writer, result, keep_alive)
+                elif isinstance(result, bytes):
+                    await self._send_bytes(writer, status, result, keep_alive)
+                else:
+                    await self._send_json(writer, status, result, keep_alive)
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Request | None:
+        try:
+            request_line = await reader.readline()
+        except ConnectionError:
+            return None
+
+        if not request_line:
+            return None
+
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line.")
+
+        headers = {}
+
+        while True:
+            line = await reader.readline()
+
+            if line in (b"\r\n", b"\n", b""):
+                break
+
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Content-Length is not a number.")
+
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(413, "The request body is too large.")
+
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+
+        return Request(
+            method=method.upper(),
+            path=unquote(url.path).strip("/"),
+            query=dict(parse_qsl(url.query)),
+            headers=headers,
+            body=body,
+        )
+
+    def _route(self, request: Request) -> Callable:
+        parts = request.path.split("/")
+        allowed = False
+
+        for method, pattern, handler in self.routes:
+            pattern_parts = pattern.split("/")
+
+            if len(pattern_parts) != len(parts) or not all(
+                p == "*" or p == part for p, part in zip(pattern_parts, parts)
+            ):
+                continue
+
+            if method != request.method:
+                allowed = True
+                continue
+
+            request.params = [part for p, part in zip(pattern_parts, parts) if p == "*"]
+            return handler
+
+        if allowed:
+            raise HTTPError(405, f"{request.method} is not allowed here.")
+
+        raise HTTPError(404, f"There is nothing at /{request.path}.")
+
+    def _check_token(self, request: Request) -> None:
+        if (
+            self.token
+            and request.headers.get("authorization") != f"Bearer {self.token}"
+        ):
+            raise HTTPError(401, "A valid token is required.")
+
+    def _response_head(self, status: int, headers: dict[str, str]) -> bytes:
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_json(
+        self, writer: asyncio.StreamWriter, status: int, data: Any, keep_alive: bool
+    ) -> None:
+        body = json.dumps(data).encode()
+        writer.write(
+            self._response_head(
+                status,
+                {
+                    "Content-Type": "application/json",
+                    "Content-Length": str(len(body)),
+                    "Connection": "keep-alive" if keep_alive else "close",
+                },
+            )
+            + body
+        )
+        await writer.drain()
+
+    async def _send_bytes(
+        self, writer: asyncio.StreamWriter, status: int, data: bytes, keep_alive: bool
+    ) -> None:
+        writer.write(
+            self._response_head(
+                status,
+                {
+                    "Content-Type": "application/octet-stream",
+                    "Content-Length": str(len(data)),
+                    "Connection": "keep-alive" if keep_alive else "close",
+                },
+            )
+            + data
+        )
+        await writer.drain()
+
+    async def _send_stream(
+        self, writer: asyncio.StreamWriter, chunks: asyncio.Queue, keep_alive: bool
+    ) -> None:
+        writer.write(
+            self._response_head(
+                200,
+                {
+                    "Content-Type": "application/x-ndjson",
+                    "Transfer-Encoding": "chunked",
+                    "Connection": "keep-alive" if keep_alive else "close",
+                },
+            )
+        )
+
+        try:
+            while (chunk := await chunks.get()) is not None:
+                writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+
+                # Waiting for the client to keep up also makes the query thread wait
+                await writer.drain()
+        except ConnectionError:
+            # Let the query thread finish instead of waiting forever for a client that left
+            async def discard():
+                while await chunks.get() is not None:
+                    pass
+
+            asyncio.create_task(discard())
+            raise
+
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    # MARK: Database access
+
+    async def _read(self, action: Callable[[], Any]) -> Any:
+        def run():
+            with orm.db_session:
+                return action()
+
+        return await asyncio.to_thread(run)
+
+    async def _write(self, action: Callable[[], Any]) -> Any:
+        """
+        Queue a write to be committed together with any other writes that arrive at the same time.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._writes.put(Write(action, future))
+
+        return await future
+
+    async def _writer(self) -> None:
+        while True:
+            batch = [await self._writes.get()]
+            deadline = asyncio.get_running_loop().time() + BATCH_WINDOW
+
+            while len(batch) < MAX_BATCH_SIZE:
+                timeout = deadline - asyncio.get_running_loop().time()
+
+                try:
+                    batch.append(await asyncio.wait_for(self._writes.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            results = await asyncio.to_thread(self._commit_batch, batch)
+
+            for write, (error, result) in zip(batch, results):
+                if write.future.cancelled():
+                    continue
+
+                if error is not None:
+                    write.future.set_exception(error)
+                else:
+                    write.future.set_result(result)
+
+    def _commit_batch(self, batch: list[Write]) -> list[tuple[Exception | None, Any]]:
+        try:
+            with self.db.group_commit():
+                return [(None, write.action()) for write in batch]
+        except Exception:
+            # Nothing in the group was committed. Retry each write separately below,
+            # so one bad write doesn't fail the others.
+            pass
+
+        results = []
+
+        for write in batch:
+            try:
+                with self.db.group_commit():
+                    results.append((None, write.action()))
+            except Exception as e:
+                results.append((e, None))
+
+        return results
+
+    @property
+    def db_path(self) -> str:
+        return self.db.provider.pool.filename
+
+    def _record_type(self, request: Request) -> tuple:
+        record_type = request.params[0].lower()
+
+        if record_type not in self.record_types:
+            raise HTTPError(404, f"There are no records of type {record_type}.")
+
+        return self.record_types[record_type]
+
+    def _record_id(self, request: Request) -> int:
+        try:
+            return int(request.params[1])
+        except ValueError:
+            raise HTTPError(404, "Record IDs are numbers.")
+
+    # MARK: Handlers
+
+    async def health(self, request: Request) -> tuple[int, Any]:
+        return 200, {"status": "ok"}
+
+    async def search(self, request: Request) -> tuple[int, Any]:
+        entity = self._record_type(request)[0]
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=4)
+
+        def put(chunk: bytes | None) -> None:
+            # Blocks while the queue is full, so the query never gets far ahead of the client
+            asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+
+        def produce():
+            try:
+                with orm.db_session:
+                    records = self.db.get_records(
+                        entity,
+                        query=request.query.get("query", ""),
+                        field=request.query.get("field", ""),
+                        sort=request.query.get("sort", ""),
+                        paginated=False,
+                        descending=request.query.get("descending", "").lower()
+                        in ("1", "true"),
+                    )
+
+                    if records is False:
+                        return
+
+                    lines = []
+
+                    for record in records:
+                        lines.append(json.dumps(serialize(record)).encode() + b"\n")
+
+                        if len(lines) >= STREAM_CHUNK_SIZE:
+                            put(b"".join(lines))
+                            lines = []
+
+                    if lines:
+                        put(b"".join(lines))
+            except Exception:
+                # The status line is already sent, so all that can be done is end the stream
+                self.logger.exception("A search failed while streaming.")
+            finally:
+                put(None)
+
+        threading.Thread(target=produce, name="search", daemon=True).start()
+
+        return 200, chunks
+
+    async def get_record(self, request: Request) -> tuple[int, Any]:
+        entity = self._record_type(request)[0]
+        record_id = self._record_id(request)
+        record = await self._read(lambda: serialize(entity.get(id=record_id)))
+
+        if record is None:
+            raise HTTPError(404, f"There is no {request.params[0]} {record_id}.")
+
+        return 200, record
+
+    async def create_record(self, request: Request) -> tuple[int, Any]:
+        create = self._record_type(request)[1]
+        fields = request.json()
+
+        return 201, await self._write(lambda: serialize(create(**fields)))
+
+    async def update_record(self, request: Request) -> tuple[int, Any]:
+        entity, _, update, _ = self._record_type(request)
+        record_id = self._record_id(request)
+        fields = request.json()
+
+        def action():
+            record = entity.get(id=record_id)
+
+            if record is None:
+                return None
+
+            update(record, **fields)
+            return serialize(record)
+
+        record = await self._write(action)
+
+        if record is None:
+            raise HTTPError(404, f"There is no {request.params[0]} {record_id}.")
+
+        return 200, record
+
+    async def delete_record(self, request: Request) -> tuple[int, Any]:
+        delete = self._record_type(request)[3]
+        record_id = self._record_id(request)
+
+        if not await self._write(lambda: delete(record_id)):
+            raise HTTPError(404, f"There is no {request.params[0]} {record_id}.")
+
+        return 200, {"deleted": record_id}
+
+    async def _change_link(self, request: Request, add: bool) -> tuple[int, Any]:
+        data = request.json()
+        contact = data.get("contact")
+        org = data.get("organization")
+        resource = data.get("resource")
+
+        if resource is not None:
+
+            def action():
+                change = self.db.link_resource if add else self.db.unlink_resource
+                return change(resource, org=org, contact=contact)
+
+        elif contact is not None and org is not None:
+
+            def action():
+                change = (
+                    self.db.add_contact_to_org
+                    if add
+                    else self.db.remove_contact_from_org
+                )
+                return change(contact, org)
+
+        else:
+            raise HTTPError(
+                400, "Give a contact and an organization, or a resource and either."
+            )
+
+        if not await self._write(action):
+            raise HTTPError(404, "One of the records does not exist.")
+
+        return 200, data
+
+    async def link(self, request: Request) -> tuple[int, Any]:
+        return await self._change_link(request, add=True)
+
+    async def unlink(self, request: Request) -> tuple[int, Any]:
+        return await self._change_link(request, add=False)
+
+    async def change_title(self, request: Request) -> tuple[int, Any]:
+        data = request.json()
+
+        try:
+            org, contact, title = data["organization"], data["contact"], data["title"]
+        except KeyError as e:
+            raise HTTPError(400, f"{e.args[0]} is required.")
+
+        if not await self._write(
+            lambda: self.db.change_contact_title(org, contact, title)
+        ):
+            raise HTTPError(404, "One of the records does not exist.")
+
+        return 200, data
+
+    async def register_replica(self, request: Request) -> tuple[int, Any]:
+        def register():
+            with self._replication_lock:
+                if get_id_block(self.db_path) is None:
+                    # The server's own records keep the IDs they would have had anyway
+                    enable_replication(self.db_path, block=0)
+                    self.db.id_block = 0
+
+                with Replicator(self.db_path) as replicator:
+                    node = replicator.node
+
+                return {"node": node, "block": allocate_block(self.db_path)}
+
+        return 201, await asyncio.to_thread(register)
+
+    async def snapshot(self, request: Request) -> tuple[int, Any]:
+        def copy():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "snapshot.db")
+                hot_backup(self.db_path, path)
+
+                with open(path, "rb") as f:
+                    return f.read()
+
+        return 200, await asyncio.to_thread(copy)
+
+    async def sync_replica(self, request: Request) -> tuple[int, Any]:
+        data = request.json()
+
+        try:
+            node, since = data["node"], int(data["since"])
+            changes = base64.b64decode(data["changes"])
+        except KeyError as e:
+            raise HTTPError(400, f"{e.args[0]} is required.")
+
+        def exchange():
+            with self._replication_lock:
+                try:
+                    replicator = Replicator(self.db_path)
+                except ValueError:
+                    raise HTTPError(400, "Register the copy at /replicas first.")
+
+                with replicator:
+                    try:
+                        applied = replicator.apply(changes)
+                    except zlib.error:
+                        raise HTTPError(400, "The changes are not a changeset.")
+
+                    reply = replicator.changeset(since, node)
+
+            if applied:
+                # The changes didn't go through Pony, so nothing cached knows about them
+                self.db.reset_caches()
+
+            return {"applied": applied, "changes": base64.b64encode(reply).decode()}
+
+        return 200, await asyncio.to_thread(exchange)
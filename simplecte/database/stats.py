@@ -0,0 +1,200 @@
+"""
+Counts for the statistics dashboard, such as organizations by type or contacts without
+a phone number. Each one is a grouped SQL query whose results are kept in memory, so the
+dashboard opens instantly. After a write, only the counts that depend on the kinds of
+records it changed are run again, see records_changed().
+"""
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+__all__ = ("Aggregate", "AGGREGATES", "Statistics")
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    """
+    A count shown on the dashboard. sql returns rows of (label, count), unless labels
+    is given, in which case it returns one row with a count for each label.
+    depends is the record types whose changes can change its result.
+    """
+
+    name: str
+    title: str
+    sql: str
+    depends: frozenset[str]
+    labels: tuple[str, ...] = ()
+
+
+# Treats blank values as their own group, instead of a group with no name
+def _grouped(table: str, column: str) -> str:
+    return (
+        f"SELECT coalesce(nullif(trim({column}), ''), '(None)') AS label, count(*) "
+        f"FROM {table} GROUP BY label ORDER BY count(*) DESC, label"
+    )
+
+
+def _is_empty(column: str) -> str:
+    return f"(NOT json_valid({column}) OR json_array_length({column}) = 0)"
+
+
+ALL = frozenset({"organization", "contact", "resource"})
+
+AGGREGATES = (
+    Aggregate(
+        "totals",
+        "Records",
+        "SELECT (SELECT count(*) FROM Organization), (SELECT count(*) FROM Contact), "
+        "(SELECT count(*) FROM Resource)",
+        ALL,
+        ("Organizations", "Contacts", "Resources"),
+    ),
+    Aggregate(
+        "organization_types",
+        "Organizations by Type",
+        _grouped("Organization", "type"),
+        frozenset({"organization"}),
+    ),
+    Aggregate(
+        "organization_statuses",
+        "Organizations by Status",
+        _grouped("Organization", "status"),
+        frozenset({"organization"}),
+    ),
+    Aggregate(
+        "contact_statuses",
+        "Contacts by Status",
+        _grouped("Contact", "status"),
+        frozenset({"contact"}),
+    ),
+    Aggregate(
+        "organization_gaps",
+        "Organizations Missing",
+        f"""
+        SELECT
+            sum(NOT EXISTS (SELECT 1 FROM Membership m WHERE m.organization = o.id)),
+            sum(NOT EXISTS (
+                SELECT 1 FROM Membership m WHERE m.organization = o.id AND m.is_primary
+            )),
+            sum(NOT EXISTS (SELECT 1 FROM Phone p WHERE p.organization = o.id)),
+            sum({_is_empty("o.emails")}),
+            sum({_is_empty("o.addresses")})
+        FROM Organization o
+        """,
+        frozenset({"organization", "contact"}),
+        ("Contacts", "A Primary Contact", "A Phone Number", "An Email", "An Address"),
+    ),
+    Aggregate(
+        "contact_gaps",
+        "Contacts Missing",
+        f"""
+        SELECT
+            sum(NOT EXISTS (SELECT 1 FROM Membership m WHERE m.contact = c.id)),
+            sum(NOT EXISTS (SELECT 1 FROM Phone p WHERE p.contact = c.id)),
+            sum({_is_empty("c.emails")}),
+            sum({_is_empty("c.addresses")})
+        FROM Contact c
+        """,
+        frozenset({"organization", "contact"}),
+        ("An Organization", "A Phone Number", "An Email", "An Address"),
+    ),
+    Aggregate(
+        "unlinked_resources",
+        "Resources",
+        """
+        SELECT
+            sum(NOT EXISTS (SELECT 1 FROM Organization_Resource l WHERE l.resource = r.id)
+                AND NOT EXISTS (SELECT 1 FROM Contact_Resource l WHERE l.resource = r.id))
+        FROM Resource r
+        """,
+        ALL,
+        ("Not Linked to Anything",),
+    ),
+)
+
+
+class Statistics:
+    """
+    The dashboard's counts, kept until a change makes them stale.
+    Database.change_listeners tells it which records changed with invalidate().
+    """
+
+    def __init__(self):
+        self._results: dict[str, list[tuple[str, int]]] = {}
+        self._stale = {aggregate.name for aggregate in AGGREGATES}
+        self._lock = threading.Lock()
+
+        # When the counts were last run, as a time.time()
+        self.updated: float | None = None
+
+    def invalidate(self, changed: set[tuple[str, int]]) -> None:
+        """
+        Mark the counts that depend on the changed records as stale.
+        A change listener, see records_changed().
+        """
+        types = {record_type for record_type, _ in changed}
+
+        with self._lock:
+            self._stale.update(a.name for a in AGGREGATES if a.depends & types)
+
+    def clear(self) -> None:
+        """
+        Forget every count, such as when a different database is opened.
+        """
+        with self._lock:
+            self._results.clear()
+            self._stale = {aggregate.name for aggregate in AGGREGATES}
+            self.updated = None
+
+    @property
+    def stale(self) -> bool:
+        """
+        Whether any count has to be run again to be current.
+        """
+        return bool(self._stale)
+
+    def cached(self) -> dict[str, list[tuple[str, int]]]:
+        """
+        The counts as they were last run, even if some are stale.
+        """
+        with self._lock:
+            return dict(self._results)
+
+    def refresh(
+        self, connection: sqlite3.Connection, everything: bool = False
+    ) -> dict[str, list[tuple[str, int]]]:
+        """
+        Run the stale counts again, or every count if everything is True, and return them all.
+        """
+        with self._lock:
+            names = {a.name for a in AGGREGATES} if everything else set(self._stale)
+
+            # Cleared first, so a change made while the counts run marks them stale again
+            self._stale -= names
+
+        results = {}
+
+        try:
+            for aggregate in AGGREGATES:
+                if aggregate.name not in names:
+                    continue
+
+                rows = connection.execute(aggregate.sql).fetchall()
+
+                if aggregate.labels:
+                    rows = list(zip(aggregate.labels, (v or 0 for v in rows[0])))
+
+                results[aggregate.name] = [(label, count) for label, count in rows]
+        except Exception:
+            with self._lock:
+                self._stale |= names - results.keys()
+
+            raise
+
+        with self._lock:
+            self._results.update(results)
+            self.updated = time.time()
+
+            return dict(self._results)
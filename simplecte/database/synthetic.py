@@ -0,0 +1,483 @@
+"""
+Realistic synthetic databases for benchmarking and trying out SimpleCTE at scale.
+The same seed always builds the same database, so timings taken on different commits
+compare like with like. Records are written straight to the tables with SQL, along with
+their memberships, resource links, phone index and name sounds, since creating a million
+contacts through the write methods would take hours.
+
+Run this file directly to build a database:
+    python simplecte/database/synthetic.py <path> --scale 100k --seed 1
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+from typing import Callable, Iterator
+
+if __name__ == "__main__":
+    # Running as a script puts simplecte/database on the path instead of simplecte/
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.phonetics import name_codes
+
+__all__ = ("SCALES", "Scale", "populate", "generate_database")
+
+
+class Scale:
+    """
+    How many of each record a database has, and how densely they're linked.
+    Link counts are averages, the actual number for each record is random.
+    """
+
+    def __init__(
+        self,
+        contacts: int,
+        organizations: int | None = None,
+        resources: int | None = None,
+        memberships_per_contact: float = 1.3,
+        resources_per_organization: float = 1.5,
+        resources_per_contact: float = 0.4,
+    ):
+        self.contacts = contacts
+        self.organizations = organizations or max(contacts // 4, 1)
+        self.resources = resources or max(contacts // 50, 10)
+        self.memberships_per_contact = memberships_per_contact
+        self.resources_per_organization = resources_per_organization
+        self.resources_per_contact = resources_per_contact
+
+
+SCALES = {
+    "1k": Scale(1_000),
+    "10k": Scale(10_000),
+    "100k": Scale(100_000),
+    "1m": Scale(1_000_000),
+}
+
+# Common names come up far more often than the rest, like in a real contact list
+FIRST_NAMES = (
+    "James Mary John Patricia Robert Jennifer Michael Linda William Elizabeth David "
+    "Barbara Richard Susan Joseph Jessica Thomas Sarah Charles Karen Christopher Nancy "
+    "Daniel Lisa Matthew Betty Anthony Margaret Mark Sandra Donald Ashley Steven Kimberly "
+    "Stephen Emily Paul Donna Andrew Michelle Joshua Carol Kenneth Amanda Kevin Melissa "
+    "Brian Deborah George Stephanie Timothy Rebecca Ronald Sharon Jason Laura Edward "
+    "Cynthia Jeffrey Kathleen Ryan Amy Jacob Angela Gary Shirley Nicholas Anna Eric "
+    "Brenda Jonathan Pamela Jon Catherine Katherine Sean Shawn Jeffery Geoffrey Jose Maria"
+).split()
+
+LAST_NAMES = (
+    "Smith Johnson Williams Brown Jones Garcia Miller Davis Rodriguez Martinez Hernandez "
+    "Lopez Gonzalez Wilson Anderson Thomas Taylor Moore Jackson Martin Lee Perez Thompson "
+    "White Harris Sanchez Clark Ramirez Lewis Robinson Walker Young Allen King Wright "
+    "Scott Torres Nguyen Hill Flores Green Adams Nelson Baker Hall Rivera Campbell "
+    "Mitchell Carter Roberts Smyth Schmidt Schmitt Jonson Thomson Mueller Muller Meyer "
+    "Meier Philips Phillips Stephenson Stevenson Catherwood Kowalski Nowak Murphy"
+).split()
+
+# Uncommon surnames are put together from these, so big databases have a long tail of names
+SYLLABLES = (
+    "al an ar ber bro cal can car da del der dun el en er fal fer gar gil ham har hol "
+    "in kel ken lan ler lin mar mer mon nor or ran ril ros sal sel son ster tal ter ton "
+    "val ver wal win wor"
+).split()
+SURNAME_ENDINGS = ("", "", "son", "ton", "ley", "man", "berg", "ski", "ez", "s")
+
+ORGANIZATION_WORDS = (
+    "Riverside Northside Summit Harbor Valley Oak Maple Cedar Pine Lakeview Central "
+    "Union Liberty Heritage Pioneer Eastgate Westfield Highland Meadow Sunrise Golden "
+    "Evergreen Granite Beacon Bridge Crossroads Horizon"
+).split()
+ORGANIZATION_KINDS = (
+    "Hardware",
+    "Community Center",
+    "Food Bank",
+    "Library",
+    "Elementary School",
+    "High School",
+    "Credit Union",
+    "Bakery",
+    "Animal Shelter",
+    "Health Clinic",
+    "Rotary Club",
+    "Youth League",
+    "Theater",
+    "Printing",
+    "Construction",
+    "Garden Club",
+    "Church",
+    "Fire Department",
+    "Chamber of Commerce",
+    "Consulting",
+)
+ORGANIZATION_SUFFIXES = ("", "", "", "LLC", "Inc.", "Co.", "Foundation", "Association")
+
+ORGANIZATION_TYPES = ("Commercial", "Non-Profit", "Government", "Education", "Other")
+TYPE_WEIGHTS = (45, 30, 8, 12, 5)
+ORGANIZATION_COLUMNS = (
+    "id",
+    "name",
+    "type",
+    "status",
+    "addresses",
+    "phones",
+    "emails",
+    "custom_fields",
+)
+CONTACT_COLUMNS = (
+    "id",
+    "first_name",
+    "last_name",
+    "addresses",
+    "phone_numbers",
+    "emails",
+    "availability",
+    "status",
+    "contact_info",
+    "custom_fields",
+)
+
+STATUSES = ("Active", "Active", "Active", "Inactive", "Prospect", "")
+AVAILABILITY = ("", "", "Weekdays", "Weekends", "9am-5pm", "Evenings", "Mornings")
+TITLES = ("", "", "Director", "Manager", "Volunteer", "Coordinator", "Owner", "Teacher")
+
+STREETS = (
+    "Main Oak Maple Park Pine Cedar Elm Washington Lake Hill Church High Mill Spring "
+    "River Center School North South Bridge"
+).split()
+STREET_KINDS = ("St", "Ave", "Rd", "Blvd", "Ln", "Dr", "Ct", "Way")
+CITIES = (
+    ("Springfield", "IL"),
+    ("Franklin", "TN"),
+    ("Greenville", "SC"),
+    ("Bristol", "CT"),
+    ("Clinton", "IA"),
+    ("Fairview", "OR"),
+    ("Salem", "MA"),
+    ("Madison", "WI"),
+    ("Georgetown", "TX"),
+    ("Arlington", "VA"),
+)
+DOMAINS = ("gmail.com", "yahoo.com", "outlook.com", "aol.com", "icloud.com")
+
+CUSTOM_FIELDS: dict[str, Callable[[random.Random], str]] = {
+    "Birthday": lambda r: f"{r.randint(1, 12)}/{r.randint(1, 28)}/{r.randint(1940, 2005)}",
+    "Preferred Contact": lambda r: r.choice(("Email", "Phone", "Text", "Mail")),
+    "Department": lambda r: r.choice(("Sales", "Outreach", "Finance", "Operations")),
+    "Volunteer Hours": lambda r: str(r.randint(1, 400)),
+    "Notes": lambda r: r.choice(
+        ("Met at the fair", "Call before noon", "Prefers email", "Board member")
+    ),
+    "Member Since": lambda r: str(r.randint(1990, 2026)),
+}
+CONTACT_INFO: dict[str, Callable[[random.Random, str], str]] = {
+    "LinkedIn": lambda r, handle: f"linkedin.com/in/{handle}",
+    "Twitter": lambda r, handle: f"@{handle}",
+    "Fax": lambda r, handle: str(r.randint(2002000000, 9899999999)),
+    "Assistant": lambda r, handle: r.choice(FIRST_NAMES),
+}
+
+RESOURCE_NAMES = (
+    "Projector",
+    "Meeting Room",
+    "Van",
+    "Folding Tables",
+    "Grant Writing",
+    "Sound System",
+    "Storage Space",
+    "Printing",
+    "Kitchen",
+    "Tutoring",
+    "Legal Advice",
+    "Website Hosting",
+)
+RESOURCE_VALUES = (
+    "Available on weekdays",
+    "Available on weekends",
+    "By appointment",
+    "Free for members",
+    "$25 an hour",
+    "Limited",
+)
+
+
+def _skewed(rng: random.Random, count: int) -> int:
+    """
+    A random index below count where low indexes come up much more often,
+    so some organizations are large and most are small.
+    """
+    return int(count * rng.random() ** 2)
+
+
+def _surname(rng: random.Random) -> str:
+    if rng.random() < 0.75:
+        return LAST_NAMES[_skewed(rng, len(LAST_NAMES))]
+
+    parts = [rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))]
+
+    return ("".join(parts) + rng.choice(SURNAME_ENDINGS)).title()
+
+
+def _phones(rng: random.Random, most: int) -> list[int]:
+    phones = []
+
+    for _ in range(rng.choice((0, 1, 1, 1, 2, most))):
+        number = rng.randint(2002000000, 9899999999)
+        phones.append(number + 10_000_000_000 if rng.random() < 0.1 else number)
+
+    return phones
+
+
+def _addresses(rng: random.Random) -> list[str]:
+    addresses = []
+
+    for _ in range(rng.choice((0, 1, 1, 1, 2))):
+        city, state = rng.choice(CITIES)
+        addresses.append(
+            f"{rng.randint(1, 9999)} {rng.choice(STREETS)} {rng.choice(STREET_KINDS)}, "
+            f"{city}, {state} {rng.randint(10000, 99999)}"
+        )
+
+    return addresses
+
+
+def _custom_fields(rng: random.Random) -> dict[str, str]:
+    names = rng.sample(list(CUSTOM_FIELDS), rng.choice((0, 0, 1, 1, 2, 3)))
+
+    return {name: CUSTOM_FIELDS[name](rng) for name in names}
+
+
+def _organizations(rng: random.Random, scale: Scale) -> Iterator[tuple]:
+    for org_id in range(1, scale.organizations + 1):
+        if rng.random() < 0.4:
+            name = f"{_surname(rng)} {rng.choice(ORGANIZATION_KINDS)}"
+        else:
+            name = f"{rng.choice(ORGANIZATION_WORDS)} {rng.choice(ORGANIZATION_KINDS)}"
+
+        if suffix := rng.choice(ORGANIZATION_SUFFIXES):
+            name += f" {suffix}"
+
+        slug = "".join(c for c in name.lower() if c.isalnum())[:20]
+
+        yield (
+            org_id,
+            name,
+            rng.choices(ORGANIZATION_TYPES, TYPE_WEIGHTS)[0],
+            rng.choice(STATUSES),
+            _addresses(rng),
+            _phones(rng, 3),
+            [f"{rng.choice(('info', 'contact', 'office'))}@{slug}.org"]
+            if rng.random() < 0.7
+            else [],
+            _custom_fields(rng),
+        )
+
+
+def _contacts(rng: random.Random, scale: Scale) -> Iterator[tuple]:
+    for contact_id in range(1, scale.contacts + 1):
+        first_name = FIRST_NAMES[_skewed(rng, len(FIRST_NAMES))]
+        last_name = _surname(rng)
+        handle = f"{first_name}.{last_name}{rng.randint(1, 999)}".lower()
+        info_names = rng.sample(list(CONTACT_INFO), rng.choice((0, 0, 0, 1, 2)))
+
+        yield (
+            contact_id,
+            first_name,
+            last_name,
+            _addresses(rng),
+            _phones(rng, 4),
+            [
+                f"{handle}@{rng.choice(DOMAINS)}"
+                for _ in range(rng.choice((0, 1, 1, 2)))
+            ],
+            rng.choice(AVAILABILITY),
+            rng.choice(STATUSES),
+            {name: CONTACT_INFO[name](rng, handle) for name in info_names},
+            _custom_fields(rng),
+        )
+
+
+def _link_count(rng: random.Random, average: float) -> int:
+    # Mostly zero to two links, with the occasional record that has many
+    return min(int(rng.expovariate(1 / average) + 0.5), 25) if average else 0
+
+
+def _memberships(rng: random.Random, scale: Scale) -> Iterator[tuple]:
+    with_primary = set()
+
+    for contact_id in range(1, scale.contacts + 1):
+        organizations = {
+            _skewed(rng, scale.organizations) + 1
+            for _ in range(_link_count(rng, scale.memberships_per_contact))
+        }
+
+        for org_id in sorted(organizations):
+            # Most organizations get a primary contact, the first one to join
+            if org_id not in with_primary and rng.random() < 0.7:
+                with_primary.add(org_id)
+                yield org_id, contact_id, "Primary", True
+            else:
+                yield org_id, contact_id, rng.choice(TITLES), False
+
+
+def _links(
+    rng: random.Random, records: int, resources: int, average: float
+) -> Iterator[tuple]:
+    for record_id in range(1, records + 1):
+        linked = {_skewed(rng, resources) + 1 for _ in range(_link_count(rng, average))}
+
+        for resource_id in sorted(linked):
+            yield record_id, resource_id
+
+
+def populate(
+    connection: sqlite3.Connection,
+    scale: Scale,
+    seed: int = 0,
+    progress: "Callable[[str], None] | None" = None,
+) -> dict[str, int]:
+    """
+    Fill an empty SimpleCTE database with random but realistic records, the same ones
+    for the same scale and seed. Returns how many rows were added to each table.
+    """
+    rng = random.Random(seed)
+    counts: dict[str, int] = {}
+    sounds: dict[str, list[str]] = {}
+
+    # The phone index and name sounds of each record, written after the records
+    phones: list[tuple] = []
+    names: list[tuple] = []
+
+    def insert(table: str, columns: tuple[str, ...], rows: Iterator[tuple]) -> None:
+        if progress is not None:
+            progress(table)
+
+        cursor = connection.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            rows,
+        )
+        counts[table] = cursor.rowcount
+
+    def indexed(rows: Iterator[tuple], owner: str) -> Iterator[tuple]:
+        for row in rows:
+            if owner == "organization":
+                name, numbers = row[1], row[5]
+            else:
+                name, numbers = f"{row[1]} {row[2]}", row[4]
+
+            # Names repeat a lot, so each one is only coded once
+            if name not in sounds:
+                sounds[name] = sorted(set().union(*name_codes(name)))
+
+            owners = (row[0], None) if owner == "organization" else (None, row[0])
+            phones.extend((str(n), str(n)[::-1], "", *owners) for n in numbers)
+            names.extend((code, *owners) for code in sounds[name])
+
+            yield tuple(
+                json.dumps(value) if isinstance(value, (list, dict)) else value
+                for value in row
+            )
+
+    connection.execute("BEGIN")
+
+    try:
+        insert(
+            "Organization",
+            ORGANIZATION_COLUMNS,
+            indexed(_organizations(rng, scale), "organization"),
+        )
+        insert("Contact", CONTACT_COLUMNS, indexed(_contacts(rng, scale), "contact"))
+        insert(
+            "Resource",
+            ("id", "name", "value"),
+            (
+                (i, f"{rng.choice(RESOURCE_NAMES)} #{i}", rng.choice(RESOURCE_VALUES))
+                for i in range(1, scale.resources + 1)
+            ),
+        )
+        insert(
+            "Membership",
+            ("organization", "contact", "title", "is_primary"),
+            _memberships(rng, scale),
+        )
+        insert(
+            "Organization_Resource",
+            ("organization", "resource"),
+            _links(
+                rng,
+                scale.organizations,
+                scale.resources,
+                scale.resources_per_organization,
+            ),
+        )
+        insert(
+            "Contact_Resource",
+            ("contact", "resource"),
+            _links(rng, scale.contacts, scale.resources, scale.resources_per_contact),
+        )
+        insert(
+            "Phone",
+            ("digits", "reversed_digits", "extension", "organization", "contact"),
+            iter(phones),
+        )
+        insert("NameSound", ("code", "organization", "contact"), iter(names))
+
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+    return counts
+
+
+def generate_database(
+    path: str,
+    scale: Scale,
+    seed: int = 0,
+    progress: "Callable[[str], None] | None" = None,
+) -> dict[str, int]:
+    """
+    Build a synthetic database at path, which must not exist yet, see populate().
+    The tables are made by opening it with the global database first, so they match
+    the current entities and migrations.
+    """
+    from database.database import db
+
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists")
+
+    db.construct_database("sqlite", path)
+
+    # Autocommit mode, so populate() controls its own transaction
+    connection = sqlite3.connect(path, isolation_level=None)
+
+    try:
+        return populate(connection, scale, seed, progress)
+    finally:
+        connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Build a synthetic SimpleCTE database."
+    )
+    parser.add_argument("path", help="Where to create the database")
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    counts = generate_database(
+        args.path,
+        SCALES[args.scale],
+        args.seed,
+        lambda table: print(f"Writing {table}..."),
+    )
+
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+
+
+if __name__ == "__main__":
+    main()
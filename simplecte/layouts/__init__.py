@@ -8,3 +8,7 @@ from .backup import *
 from .export import *
 from .help import *
 from .first_time import *
+from .dedupe import *
+from .related import *
+from .stats import *
+from .slow_queries import *
@@ -18,6 +18,9 @@ def get_action_bar(screen: Screen) -> list[sg.Element]:
             sg.Button("Backup", k="-BACKUP-", tooltip="Back up your data"),
             sg.Button("Add Record", k="-ADD_RECORD-", tooltip="Create a new record"),
             sg.Button("Help", k="-HELP-"),
+            sg.Button(
+                "Statistics", k="-STATS-", tooltip="See counts of the records you have"
+            ),
         ]
     ]
 
@@ -34,6 +37,14 @@ def get_action_bar(screen: Screen) -> list[sg.Element]:
         layout[0].insert(
             2, sg.Button("Export All", k="-EXPORT_ALL-", tooltip="Export all data")
         )
+        layout[0].insert(
+            4,
+            sg.Button(
+                "Find Duplicates",
+                k="-DEDUPE-",
+                tooltip="Find and merge records that were entered more than once",
+            ),
+        )
 
     elif screen == Screen.RESOURCE_VIEW:
         layout[0].pop(4)
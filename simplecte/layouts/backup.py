@@ -10,8 +10,8 @@ def get_backup_layout():
         [
             sg.Text(
                 "Back up your data! Data is backed up by copying the database file to a new\n"
-                "directory. To restore a backup, you can simply copy the file and paste it where\n"
-                "the old file was, or open the database directly via settings.",
+                "directory. To restore a backup, press Restore and choose the backup file.\n"
+                "Backups are checked before they are restored.",
                 auto_size_text=True,
                 right_click_menu=[
                     "",
@@ -34,6 +34,7 @@ def get_backup_layout():
         ],
         [
             sg.Button("Backup", key="-BACKUP_BACKUP-", size=(10, 1)),
+            sg.Button("Restore", key="-BACKUP_RESTORE-", size=(10, 1)),
             sg.Button("Cancel", key="-BACKUP_CANCEL-", size=(10, 1)),
         ],
     ]
@@ -0,0 +1,81 @@
+import PySimpleGUI as sg
+
+__all__ = ("get_dedupe_layout",)
+
+
+def get_dedupe_layout(record_type: str = "Contacts") -> list:
+    threshold_tooltip = (
+        " How similar records must be to count as duplicates, in percent "
+    )
+    layout = [
+        [
+            sg.Text(
+                "Find records that were probably entered more than once, by similar names\n"
+                "and shared emails or phone numbers. Select a group, then select the record\n"
+                "to keep and press Merge to move everything from the others into it.",
+                auto_size_text=True,
+                right_click_menu=[
+                    "",
+                    [
+                        "Code LYT::CODE(simplecte/layouts/dedupe.py,6)",
+                        "Code BTS::CODE(simplecte/ui_management/dedupe.py,22)",
+                    ],
+                ],
+            ),
+        ],
+        [sg.HorizontalSeparator()],
+        [
+            sg.Text("Find:"),
+            sg.Combo(
+                ["Contacts", "Organizations"],
+                default_value=record_type,
+                key="-DEDUPE_TYPE-",
+                readonly=True,
+            ),
+            sg.Text("Similarity:", tooltip=threshold_tooltip),
+            sg.Slider(
+                (50, 100),
+                85,
+                orientation="h",
+                size=(20, 15),
+                key="-DEDUPE_THRESHOLD-",
+                tooltip=threshold_tooltip,
+            ),
+            sg.Button("Find", key="-DEDUPE_FIND-", size=(10, 1)),
+        ],
+        [
+            sg.Table(
+                [],
+                headings=["#", "Records", "Similarity", "Matched On"],
+                key="-DEDUPE_CLUSTERS-",
+                col_widths=[5, 40, 10, 15],
+                auto_size_columns=False,
+                num_rows=10,
+                justification="left",
+                enable_events=True,
+                select_mode=sg.TABLE_SELECT_MODE_BROWSE,
+                expand_x=True,
+            ),
+        ],
+        [
+            sg.Table(
+                [],
+                headings=["ID", "Name", "Emails"],
+                key="-DEDUPE_RECORDS-",
+                col_widths=[8, 30, 32],
+                auto_size_columns=False,
+                num_rows=5,
+                justification="left",
+                select_mode=sg.TABLE_SELECT_MODE_BROWSE,
+                expand_x=True,
+            ),
+        ],
+        [sg.Text("", key="-DEDUPE_STATUS-", size=(60, 1))],
+        [
+            sg.Button("Merge Into Selected", key="-DEDUPE_MERGE-"),
+            sg.Push(),
+            sg.Button("Close", key="-DEDUPE_CLOSE-", size=(10, 1)),
+        ],
+    ]
+
+    return layout
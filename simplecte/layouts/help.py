@@ -13,7 +13,7 @@ The action bar is the bar at the top of the screen that contains various buttons
 - Export by Filter: Displays the Export screen with the current filter applied.
 - Export All: Exports all records in the database.
 - Settings: Opens the settings menu.
-- Backup: Backs up the database.
+- Backup: Backs up the database, or restores a backup.
 - Add Record: Creates a new record.
 - Help: Opens the help menu.
 
@@ -0,0 +1,88 @@
+import PySimpleGUI as sg
+
+__all__ = ("get_related_layout", "RELATED_MODES", "RELATED_TYPES")
+
+# What each search finds, as shown in the window
+RELATED_MODES = [
+    "Linked Within",
+    "Sharing Resources",
+    "Contacts of Organizations Sharing Resources",
+]
+
+RELATED_TYPES = {
+    "All": None,
+    "Organizations": "organization",
+    "Contacts": "contact",
+    "Resources": "resource",
+}
+
+
+def get_related_layout(title: str) -> list:
+    hops_tooltip = (
+        " How many links away records can be, such as 2 for the other contacts "
+        "of a contact's organizations "
+    )
+    layout = [
+        [
+            sg.Text(
+                f"Records linked to {title}",
+                font=("Arial", 14),
+                right_click_menu=[
+                    "",
+                    [
+                        "Code LYT::CODE(simplecte/layouts/related.py,20)",
+                        "Code BTS::CODE(simplecte/ui_management/related.py,30)",
+                    ],
+                ],
+            ),
+        ],
+        [sg.HorizontalSeparator()],
+        [
+            sg.Combo(
+                RELATED_MODES,
+                default_value=RELATED_MODES[0],
+                key="-RELATED_MODE-",
+                readonly=True,
+                enable_events=True,
+            ),
+            sg.Spin(
+                list(range(1, 5)),
+                initial_value=2,
+                key="-RELATED_HOPS-",
+                readonly=True,
+                size=(3, 1),
+                tooltip=hops_tooltip,
+            ),
+            sg.Text("links", key="-RELATED_HOPS_TEXT-", tooltip=hops_tooltip),
+            sg.Text("Show:"),
+            sg.Combo(
+                list(RELATED_TYPES),
+                default_value="All",
+                key="-RELATED_TYPE-",
+                readonly=True,
+            ),
+            sg.Button("Find", key="-RELATED_FIND-", size=(10, 1)),
+        ],
+        [
+            sg.Table(
+                [],
+                headings=["Type", "ID", "Name", "Links"],
+                key="-RELATED_TABLE-",
+                col_widths=[12, 8, 35, 8],
+                auto_size_columns=False,
+                num_rows=12,
+                justification="left",
+                select_mode=sg.TABLE_SELECT_MODE_BROWSE,
+                bind_return_key=True,
+                expand_x=True,
+            ),
+        ],
+        [sg.Text("", key="-RELATED_STATUS-", size=(60, 1))],
+        [
+            sg.Button("Open", key="-RELATED_OPEN-", size=(10, 1)),
+            sg.Push(),
+            sg.Button("Close", key="-RELATED_CLOSE-", size=(10, 1)),
+        ],
+    ]
+
+    return layout
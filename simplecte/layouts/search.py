@@ -17,6 +17,8 @@ def get_field_keys(
         return {
             "id": "id",
             "name": "name",
+            "fuzzy name": "name",
+            "sounds like": "name",
             "type": "type",
             "status": "status",
             "phone": "phones",
@@ -31,6 +33,8 @@ def get_field_keys(
             "id": "id",
             "first name": "first_name",
             "last name": "last_name",
+            "fuzzy name": "last_name",
+            "sounds like": "last_name",
             "address": "addresses",
             "phone": "phone_numbers",
             "email": "emails",
@@ -54,6 +58,10 @@ def get_sort_keys(screen: Screen = None, record: str = None) -> dict:
     else:
         fields = get_field_keys(record=record)
 
+    # These search names in other ways, so sorting by them sorts by name
+    fields.pop("fuzzy name", None)
+    fields.pop("sounds like", None)
+
     if screen == Screen.ORG_SEARCH or record == "organization":
         del fields["custom field name"]
         del fields["custom field value"]
@@ -99,6 +107,7 @@ def get_search_layout(
                                 [
                                     "Help::ACTION_BAR",
                                     "Code LYT::CODE(simplecte/layouts/action_bar.py,7)",
+                                    "Slow Queries::SLOW_QUERIES",
                                 ],
                             ],
                         ),
@@ -143,6 +152,7 @@ def get_search_layout(
                         "Help::SEARCH_BAR",
                         "Code BTS::CODE(simplecte/database/database.py,794)",
                         "Code LYT::CODE(simplecte/layouts/search.py,131)",
+                        "Slow Queries::SLOW_QUERIES",
                     ],
                 ],
                 layout=[
@@ -195,7 +205,11 @@ def get_search_layout(
                 visible=screen == Screen.ORG_SEARCH,
                 right_click_menu=[
                     "",
-                    ["Help::SEARCH", "Code LYT::CODE(simplecte/layouts/search.py,176)"],
+                    [
+                        "Help::SEARCH",
+                        "Code LYT::CODE(simplecte/layouts/search.py,176)",
+                        "Slow Queries::SLOW_QUERIES",
+                    ],
                 ],
                 layout=[
                     [
@@ -227,6 +241,7 @@ def get_search_layout(
                                     "Help::SEARCH",
                                     "Code BTS::CODE(simplecte/process/app.py,197)",
                                     "Code LYT::CODE(simplecte/layouts/search.py,209)",
+                                    "Slow Queries::SLOW_QUERIES",
                                 ],
                             ],
                             right_click_selects=True,
@@ -250,7 +265,11 @@ def get_search_layout(
                 visible=screen == Screen.CONTACT_SEARCH,
                 right_click_menu=[
                     "",
-                    ["Help::SEARCH", "Code LYT::CODE(simplecte/layouts/search.py,221)"],
+                    [
+                        "Help::SEARCH",
+                        "Code LYT::CODE(simplecte/layouts/search.py,221)",
+                        "Slow Queries::SLOW_QUERIES",
+                    ],
                 ],
                 layout=[
                     [
@@ -281,6 +300,7 @@ def get_search_layout(
                                     "Help::SEARCH",
                                     "Code BTS::CODE(simplecte/process/app.py,197)",
                                     "Code LYT::CODE(simplecte/layouts/search.py,238)",
+                                    "Slow Queries::SLOW_QUERIES",
                                 ],
                             ],
                             right_click_selects=True,
@@ -42,6 +42,32 @@ def get_general_layout():
                 tooltip=" Change the app's theme! ",
             ),
         ],
+        [
+            sg.Text(
+                "Fuzzy Name Search Typos: ",
+                tooltip=" The most typos a word can have to match in a Fuzzy Name search. ",
+            ),
+            sg.Spin(
+                list(range(0, 5)),
+                initial_value=2,
+                readonly=True,
+                key="-SET_FUZZY_DISTANCE-",
+                tooltip=" The most typos a word can have to match in a Fuzzy Name search. ",
+            ),
+        ],
+        [
+            sg.Text(
+                "Slow Query Threshold (ms): ",
+                tooltip=" Statements slower than this are kept in the slow query log. 0 turns it off. ",
+            ),
+            sg.Spin(
+                [0, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000],
+                initial_value=250,
+                readonly=True,
+                key="-SET_SLOW_QUERY_MS-",
+                tooltip=" Statements slower than this are kept in the slow query log. 0 turns it off. ",
+            ),
+        ],
     ]
 
 
@@ -57,6 +83,36 @@ def get_sqlite_layout():
             ),
             sg.FileBrowse(tooltip=" Select the path to the file. "),
         ],
+        [sg.HorizontalSeparator()],
+        [
+            sg.Text(
+                "Server Address:",
+                tooltip=" Use the database of a SimpleCTE server instead of the file. "
+                "Leave this empty to use the file. ",
+            ),
+            sg.Input(
+                key="-SET_DB_SERVER-",
+                tooltip=" Use the database of a SimpleCTE server instead of the file. "
+                "Leave this empty to use the file. ",
+            ),
+        ],
+        [
+            sg.Text("Server Port:", tooltip=" The port the server listens on. "),
+            sg.Input(
+                key="-SET_DB_SERVER_PORT-", tooltip=" The port the server listens on. "
+            ),
+        ],
+        [
+            sg.Text(
+                "Server Token:",
+                tooltip=" The token the server was started with, if it has one. ",
+            ),
+            sg.Input(
+                key="-SET_DB_SERVER_TOKEN-",
+                password_char="*",
+                tooltip=" The token the server was started with, if it has one. ",
+            ),
+        ],
     ]
 
     return layout
@@ -68,6 +124,22 @@ def get_backup_layout():
             sg.Checkbox("Perform Automated Backups", key="-BACKUP_ENABLED-"),
             sg.Checkbox("Run at System Startup", key="-BACKUP_STARTUP-"),
         ],
+        [
+            sg.Checkbox(
+                "Incremental Backups",
+                key="-BACKUP_INCREMENTAL-",
+                tooltip=" Only store what changed since the last backup. Old backups are "
+                "thinned out automatically, keeping hourly, daily, and weekly copies. ",
+            ),
+        ],
+        [
+            sg.Checkbox(
+                "Continuous Archiving",
+                key="-BACKUP_CONTINUOUS-",
+                tooltip=" Keep a record of every change so the database can be restored "
+                "to any point in time, not just to when a backup was made. ",
+            ),
+        ],
         [
             sg.Text("Backup Interval:"),
             sg.Combo(
@@ -120,7 +192,7 @@ def get_settings_layout():
                             get_backup_layout(),
                             right_click_menu=[
                                 "",
-                                ["Code BTS::CODE(simplecte/utils/backup.py,65)"],
+                                ["Code BTS::CODE(simplecte/process/maintenance.py,92)"],
                             ],
                         )
                     ],
@@ -0,0 +1,56 @@
+import PySimpleGUI as sg
+
+__all__ = ("get_slow_queries_layout",)
+
+
+def get_slow_queries_layout() -> list:
+    layout = [
+        [
+            sg.Text(
+                "Statements slower than the threshold in Settings, newest first.",
+                key="-SLOW_STATUS-",
+                right_click_menu=[
+                    "",
+                    [
+                        "Code LYT::CODE(simplecte/layouts/slow_queries.py,6)",
+                        "Code BTS::CODE(simplecte/ui_management/slow_queries.py,36)",
+                    ],
+                ],
+            ),
+        ],
+        [sg.HorizontalSeparator()],
+        [
+            sg.Table(
+                [],
+                headings=["Time", "ms", "Caller", "Statement"],
+                key="-SLOW_QUERIES-",
+                col_widths=[10, 7, 30, 50],
+                auto_size_columns=False,
+                num_rows=12,
+                justification="left",
+                enable_events=True,
+                select_mode=sg.TABLE_SELECT_MODE_BROWSE,
+                expand_x=True,
+                expand_y=True,
+            )
+        ],
+        [
+            sg.Multiline(
+                "",
+                key="-SLOW_DETAILS-",
+                size=(100, 14),
+                disabled=True,
+                font=("Courier New", 10),
+                expand_x=True,
+            )
+        ],
+        [
+            sg.Button("Open Caller", key="-SLOW_OPEN-", size=(12, 1), disabled=True),
+            sg.Push(),
+            sg.Button("Refresh", key="-SLOW_REFRESH-", size=(10, 1)),
+            sg.Button("Clear", key="-SLOW_CLEAR-", size=(10, 1)),
+            sg.Button("Close", key="-SLOW_CLOSE-", size=(10, 1)),
+        ],
+    ]
+
+    return layout
@@ -0,0 +1,58 @@
+import PySimpleGUI as sg
+
+from database.stats import AGGREGATES
+
+__all__ = ("get_stats_layout",)
+
+# How many aggregates are shown side by side
+COLUMNS = 3
+
+
+def _aggregate_frame(title: str, name: str) -> sg.Frame:
+    return sg.Frame(
+        title,
+        [
+            [
+                sg.Table(
+                    [],
+                    headings=["", "Count"],
+                    key=f"-STATS_{name.upper()}-",
+                    col_widths=[22, 8],
+                    auto_size_columns=False,
+                    num_rows=6,
+                    justification="left",
+                    hide_vertical_scroll=False,
+                    expand_x=True,
+                )
+            ]
+        ],
+        expand_x=True,
+    )
+
+
+def get_stats_layout() -> list:
+    frames = [_aggregate_frame(a.title, a.name) for a in AGGREGATES]
+    layout = [
+        [
+            sg.Text(
+                "Counts of the records in this database. They update as records change.",
+                right_click_menu=[
+                    "",
+                    [
+                        "Code LYT::CODE(simplecte/layouts/stats.py,36)",
+                        "Code BTS::CODE(simplecte/ui_management/stats.py,16)",
+                    ],
+                ],
+            ),
+        ],
+        [sg.HorizontalSeparator()],
+        *[frames[i : i + COLUMNS] for i in range(0, len(frames), COLUMNS)],
+        [
+            sg.Text("", key="-STATS_STATUS-", size=(50, 1)),
+            sg.Push(),
+            sg.Button("Refresh", key="-STATS_REFRESH-", size=(10, 1)),
+            sg.Button("Close", key="-STATS_CLOSE-", size=(10, 1)),
+        ],
+    ]
+
+    return layout
@@ -8,9 +8,31 @@ __all__ = (
     "get_org_view_layout",
     "get_viewer_head",
     "get_resource_view_layout",
+    "get_relation_controls",
 )
 
 
+def get_relation_controls(table_key: str) -> list:
+    """
+    The row under a relationship table with its filter, page buttons and row count.
+    Their keys are the table's key with _FILTER, _PREV, _NEXT and _COUNT added.
+    """
+    key = table_key.rstrip("-")
+
+    return [
+        sg.Input(
+            k=f"{key}_FILTER-",
+            size=(15, 1),
+            enable_events=True,
+            tooltip=" Only show rows containing this text. ",
+        ),
+        sg.Push(),
+        sg.Button("<", k=f"{key}_PREV-", disabled=True, tooltip=" Previous page "),
+        sg.Text("", k=f"{key}_COUNT-"),
+        sg.Button(">", k=f"{key}_NEXT-", disabled=True, tooltip=" Next page "),
+    ]
+
+
 def get_viewer_head(contact: bool = False) -> list:
     viewer_head = [
         [
@@ -26,6 +48,11 @@ def get_viewer_head(contact: bool = False) -> list:
                 element_justification="right",
                 layout=[
                     [
+                        sg.Button(
+                            "Related",
+                            k="-RELATED-" if not contact else "-RELATED_CONTACT-",
+                            tooltip=" Find records linked to this one through others ",
+                        ),
                         sg.Button(
                             "Delete",
                             k="-DELETE-" if not contact else "-DELETE_CONTACT-",
@@ -119,6 +146,7 @@ def get_viewer_head(contact: bool = False) -> list:
                                     "View All Phones",
                                     "Code BTS::CODE(simplecte/process/events/edit_info.py,433)",
                                     "Code LYT::CODE(simplecte/layouts/viewer.py,111)",
+                                    "Slow Queries::SLOW_QUERIES",
                                 ],
                             ],
                             layout=[
@@ -154,6 +182,7 @@ def get_viewer_head(contact: bool = False) -> list:
                                     "View All Addresses",
                                     "Code BTS::CODE(simplecte/process/events/edit_info.py,391)",
                                     "Code LYT::CODE(simplecte/layouts/viewer.py,138)",
+                                    "Slow Queries::SLOW_QUERIES",
                                 ],
                             ],
                             layout=[
@@ -287,6 +316,7 @@ def get_contact_view_layout():
                                         values=[[]],
                                     )
                                 ],
+                                get_relation_controls("-CONTACT_ORGANIZATIONS_TABLE-"),
                             ],
                         ),
                     ],
@@ -322,6 +352,7 @@ def get_contact_view_layout():
                                         values=[[]],
                                     )
                                 ],
+                                get_relation_controls("-CONTACT_RESOURCES_TABLE-"),
                             ],
                         ),
                         sg.Column(
@@ -423,6 +454,7 @@ def get_org_view_layout():
                                         values=[[]],
                                     )
                                 ],
+                                get_relation_controls("-ORG_CONTACT_INFO_TABLE-"),
                             ],
                         )
                     ],
@@ -464,6 +496,7 @@ def get_org_view_layout():
                                         values=[[]],
                                     )
                                 ],
+                                get_relation_controls("-ORG_RESOURCES_TABLE-"),
                             ],
                         ),
                         sg.Column(
@@ -526,6 +559,12 @@ def get_resource_view_layout():
                             element_justification="right",
                             layout=[
                                 [
+                                    sg.Button(
+                                        "Related",
+                                        k="-RELATED_RESOURCE-",
+                                        tooltip=" Find records linked to this one "
+                                        "through others ",
+                                    ),
                                     sg.Button("Delete", k="-DELETE_RESOURCE-"),
                                     sg.Button("Back", k="-EXIT_RESOURCE-"),
                                 ]
@@ -648,6 +687,7 @@ def get_resource_view_layout():
                                         values=[[]],
                                     )
                                 ],
+                                get_relation_controls("-RESOURCE_ORGANIZATIONS_TABLE-"),
                             ],
                         ),
                     ],
@@ -681,6 +721,7 @@ def get_resource_view_layout():
                                         values=[[]],
                                     )
                                 ],
+                                get_relation_controls("-RESOURCE_CONTACTS_TABLE-"),
                             ],
                         ),
                     ],
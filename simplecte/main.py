@@ -1,5 +1,11 @@
+import os
+import sys
+
 from process import App
 from process import main_loop
+from process.maintenance import Maintenance
+from process.settings import Settings
+from database import db
 
 
 def start():
@@ -7,5 +13,53 @@ def start():
     main_loop(app)
 
 
+def start_daemon():
+    """
+    Run the maintenance jobs (backups, etc.) without opening the program.
+    """
+    settings = Settings("simplecte/data/settings.json")
+    db.construct_database("sqlite", settings.absolute_database_path)
+
+    Maintenance(settings, db).run_forever()
+
+
+def start_server():
+    """
+    Serve the database over HTTP for scripts, other programs and SimpleCTE windows on
+    other computers, see database/server.py. If SIMPLECTE_TOKEN is set, clients have to
+    send it. SIMPLECTE_HOST is the address to listen on, such as 0.0.0.0 for every network.
+    """
+    from database.server import DatabaseServer, DEFAULT_PORT
+
+    index = sys.argv.index("--serve")
+    port = int(sys.argv[index + 1]) if len(sys.argv) > index + 1 else DEFAULT_PORT
+
+    settings = Settings("simplecte/data/settings.json")
+    db.construct_database("sqlite", settings.absolute_database_path)
+
+    DatabaseServer(
+        db,
+        host=os.environ.get("SIMPLECTE_HOST", "127.0.0.1"),
+        port=port,
+        token=os.environ.get("SIMPLECTE_TOKEN"),
+    ).run()
+
+
+def start_benchmark():
+    """
+    Time the data layer on a synthetic database, see process/benchmark.py.
+    """
+    from process.benchmark import main as benchmark
+
+    benchmark([arg for arg in sys.argv[1:] if arg != "--benchmark"])
+
+
 if __name__ == "__main__":
-    start()
+    if "--daemon" in sys.argv:
+        start_daemon()
+    elif "--serve" in sys.argv:
+        start_server()
+    elif "--benchmark" in sys.argv:
+        start_benchmark()
+    else:
+        start()
@@ -3,11 +3,15 @@ from typing import Callable
 from datetime import datetime
 import PySimpleGUI as sg
 import os
+import shutil
 import sys
 
 from utils.enums import Screen, AppStatus
 from process.stack import Stack
 from process.settings import Settings
+from process.maintenance import Maintenance
+from process.worker import DatabaseWorker
+from utils.latency import LatencyRecorder
 from layouts import (
     get_search_layout,
     get_contact_view_layout,
@@ -19,8 +23,10 @@ from ui_management import (
     swap_to_org_viewer,
     swap_to_contact_viewer,
     swap_to_resource_viewer,
+    ViewerCache,
 )
 from database import Contact, Organization, db, get_table_values
+from database.queries import slow_queries
 
 
 __all__ = ("App",)
@@ -34,6 +40,8 @@ class App:
     """
 
     ICON_PATH = os.path.join(os.path.dirname(__file__), "../data/simplecte.ico")
+    # Where each session's event handler latencies are saved when it ends
+    LATENCY_PATH = os.path.join(os.path.dirname(__file__), "../data/event_latency.txt")
 
     def __init__(self):
         self.logger = logging.getLogger("app")
@@ -42,14 +50,30 @@ class App:
         self.status = AppStatus.BUSY
         self.last_clicked_table_time = None
         self.last_selected_id: int | None = None
+        # How long each event handler takes, see main_loop()
+        self.event_latency = LatencyRecorder()
         self.logger.info("Loading database settings...")
         self.settings: Settings = Settings("simplecte/data/settings.json")
         self.settings.load_settings()
         self.db = db
-        self.db.app = self
+        self.viewer_cache = ViewerCache()
+        self.db.change_listeners.append(self.viewer_cache.invalidate)
+        self.db.name_index.max_distance = self.settings.search_fuzzyDistance
+        slow_queries.threshold = self.settings.debug_slowQueryMs / 1000 or None
+
+        if self.settings.database_server:
+            self.logger.info("Connecting to the database server...")
+            self.db.construct_database(
+                "server",
+                "",
+                server_address=self.settings.database_server,
+                server_port=self.settings.database_serverPort,
+                password=self.settings.database_serverToken,
+            )
+        else:
+            self.logger.info("Constructing SQLite database...")
+            self.db.construct_database("sqlite", self.settings.absolute_database_path)
 
-        self.logger.info("Constructing SQLite database...")
-        self.db.construct_database("sqlite", self.settings.absolute_database_path)
         self.stack.push(Screen.ORG_SEARCH)
 
         # Configure GUI-related settings
@@ -57,8 +81,13 @@ class App:
         sg.theme(self.settings.theme)
 
         self.show_start_screen()
+        self.worker = DatabaseWorker(self.window, self.db)
+        self.watch_ftp_conflicts()
+        self.watch_server_changes()
         self.lazy_load_table_values()
-        self.settings.spawn_backup_process()
+
+        self.maintenance = Maintenance(self.settings, self.db)
+        self.maintenance.start()
         self.window.Font = ("Arial", 12)
 
     @property
@@ -199,11 +228,10 @@ class App:
         self, search_info: dict = None, descending: bool = False
     ):
         """
-        Load the values for the search tables, in the case there is a
-        lot of info in the database to decrease load times.
+        Load the values for the search tables on the database worker,
+        so the window stays responsive when there is a lot of info in the database.
         """
 
-        # Use empty lists to retrieve the information from the threads.
         def get_values():
             values = [
                 get_table_values(
@@ -222,7 +250,14 @@ class App:
 
             return values
 
-        self.window.start_thread(get_values, end_key="-UPDATE_TABLES-")
+        self.worker.submit_read(get_values, callback=self.update_tables)
+
+    def update_tables(self, values: list) -> None:
+        """
+        Show the search table values loaded by lazy_load_table_values().
+        """
+        self.window["-CONTACT_TABLE-"].update(values[0])
+        self.window["-ORG_TABLE-"].update(values[1])
 
     def show_start_screen(self):
         """
@@ -262,8 +297,72 @@ class App:
                     ]
                 ],
             )
-            self.window["-CONTACT_TABLE-"].update(get_table_values(self, Contact))
-            self.window["-ORG_TABLE-"].update(get_table_values(self, Organization))
+
+    def watch_ftp_conflicts(self) -> None:
+        """
+        If the database is on an FTP server, ask the user which copy to keep
+        when someone else changed it there, with the -FTP_CONFLICT- event.
+        """
+        if self.db.ftp_writeback is not None:
+            self.db.ftp_writeback.on_conflict = lambda e: self.window.write_event_value(
+                "-FTP_CONFLICT-", str(e)
+            )
+
+    def watch_server_changes(self) -> None:
+        """
+        If the database is on a SimpleCTE server, refresh the window with the
+        -SERVER_CHANGES- event when changes made by someone else arrive.
+        """
+        if self.db.server_replica is not None:
+            self.db.server_replica.on_changes = (
+                lambda count: self.window.write_event_value("-SERVER_CHANGES-", count)
+            )
+
+    def restore_backup(self, backup_path: str) -> None:
+        """
+        Replace the database with a backup while the app is running.
+        backup_path can be a database file or the manifest of a snapshot in a backup store.
+        The backup is copied next to the database first and then swapped in with a single
+        rename, so the database is never left half-restored.
+        """
+        db_path = self.settings.absolute_database_path
+        temp_path = db_path + ".restore"
+
+        self.logger.info(f"Restoring {backup_path}...")
+
+        if backup_path.endswith(".json"):
+            from utils.backup_store import BackupStore
+
+            store = BackupStore(os.path.dirname(os.path.dirname(backup_path)))
+            store.restore(os.path.splitext(os.path.basename(backup_path))[0], temp_path)
+        else:
+            shutil.copyfile(backup_path, temp_path)
+
+        # Nothing may have the old database open when it is replaced, so wait for the
+        # running jobs and requests, and close every thread's connection
+        self.worker.stop()
+        self.maintenance.stop(wait=True)
+        self.db.disconnect()
+
+        if self.db.read_pool is not None:
+            self.db.read_pool.close()
+
+        os.replace(temp_path, db_path)
+
+        # A leftover journal from the old database would be applied to the restored one
+        for suffix in ("-journal", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+        self.worker = DatabaseWorker(self.window, self.db)
+        self.db.reset_caches()
+        self.viewer_cache.clear()
+        self.stack.clear()
+        self.switch_screen(Screen.ORG_SEARCH)
+        self.lazy_load_table_values()
+
+        self.maintenance = Maintenance(self.settings, self.db)
+        self.maintenance.start()
 
     def restart(self):
         """
@@ -271,5 +370,26 @@ class App:
         to restart the entire program and re-run the file.
         """
         self.logger.info("Restarting...")
+        self.save_event_latency()
+        self.worker.stop()
+        self.maintenance.stop()
         self.window.close()
         os.execv(sys.executable, ["python"] + sys.argv)
+
+    def save_event_latency(self) -> None:
+        """
+        Log how long each event handler took this session, and save it to LATENCY_PATH.
+        """
+        if not self.event_latency.histograms:
+            return
+
+        report = self.event_latency.report()
+        self.logger.info(f"Event handler latency:\n{report}")
+
+        try:
+            with open(self.LATENCY_PATH, "w") as f:
+                f.write(
+                    f"Session ended {datetime.now():%m/%d/%Y %H:%M:%S}\n\n{report}\n"
+                )
+        except OSError as e:
+            self.logger.error(f"Could not save event handler latency: {e}")
@@ -0,0 +1,360 @@
+"""
+A headless benchmark of the data layer: every search field with every sort, with and
+without the read pool, viewer loads, exports, and backups, timed on a synthetic
+database, see synthetic.py. Results are saved as JSON, so runs on different commits
+can be compared.
+
+Run it from the repository root:
+    python simplecte/main.py --benchmark --scale 100k [--compare <earlier results>]
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime as dt
+from types import SimpleNamespace
+from typing import Callable, Iterator
+
+from database import db, Organization, Contact, get_table_values
+from database.synthetic import SCALES, generate_database
+from layouts import get_field_keys, get_sort_keys
+from layouts.export import available_export_formats
+from ui_management.export import export_records
+from ui_management.viewers import LOADERS
+from utils.backup import hot_backup
+
+__all__ = ("Benchmark", "compare_results", "main")
+
+# How many records of each type the viewer benchmarks load
+VIEWER_SAMPLES = 20
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def _without_read_pool() -> Iterator[None]:
+    """
+    Make the database read with Pony, the way it does when it has no read pool,
+    such as on a MySQL or PostgreSQL server.
+    """
+    read_pool, db.read_pool = db.read_pool, None
+
+    try:
+        yield
+    finally:
+        db.read_pool = read_pool
+
+
+class Benchmark:
+    """
+    Times operations on the open database. Each one is run repeat times, and the time of
+    the first run is kept apart from the rest, since it includes building caches such as
+    the fuzzy name index.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        repeat: int = 3,
+        only: str | None = None,
+        progress: "Callable[[str], None] | None" = None,
+    ):
+        self.db_path = db_path
+        self.repeat = repeat
+        self.only = re.compile(only) if only else None
+        self.progress = progress
+        self.results: dict[str, dict] = {}
+
+        # get_table_values() only uses the app for its database
+        self._app = SimpleNamespace(db=db)
+
+    def time(self, name: str, operation: Callable[[], object]) -> None:
+        if self.only is not None and not self.only.search(name):
+            return
+
+        if self.progress is not None:
+            self.progress(name)
+
+        runs = []
+
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            operation()
+            runs.append(time.perf_counter() - start)
+
+        self.results[name] = {
+            "first": runs[0],
+            "min": min(runs),
+            "median": statistics.median(runs),
+            "runs": runs,
+        }
+
+    def _queries(self, connection: sqlite3.Connection, record_type: str) -> dict:
+        """
+        A search for each field that matches some records, taken from a sample record.
+        """
+        table = "Organization" if record_type == "organization" else "Contact"
+        phones = "phones" if record_type == "organization" else "phone_numbers"
+        sample = connection.execute(
+            f"SELECT * FROM {table} WHERE json_array_length({phones}) > 0 "
+            "AND json_array_length(addresses) > 0 ORDER BY id LIMIT 1 "
+            f"OFFSET (SELECT count(*) / 2 FROM {table})"
+        ).fetchone()
+
+        if sample is None:
+            sample = connection.execute(f"SELECT * FROM {table} LIMIT 1").fetchone()
+
+        sample = dict(sample)
+        name = sample["name" if record_type == "organization" else "last_name"]
+        word = max(name.split(), key=len)
+        resource = connection.execute(
+            "SELECT resource FROM Organization_Resource GROUP BY resource "
+            "ORDER BY count(*) DESC LIMIT 1"
+        ).fetchone()
+
+        queries = {
+            "id": str(sample["id"]),
+            "name": word[:4],
+            # One letter changed, so the search has to tolerate a typo
+            "fuzzy name": word[:-2] + "x" + word[-1:] if len(word) > 3 else word,
+            "sounds like": word,
+            "type": sample.get("type", ""),
+            "status": sample["status"],
+            "phone": str(json.loads(sample[phones] or "[0]")[0])[:6],
+            "address": (json.loads(sample["addresses"]) or ["main"])[0].split()[1],
+            "email": "gmail",
+            "custom field name": "birth",
+            "custom field value": "board",
+            "associated with resource...": str(resource[0] if resource else 1),
+        }
+
+        if record_type == "contact":
+            queries.update(
+                {
+                    "first name": sample["first_name"][:3],
+                    "last name": word[:4],
+                    "availability": "week",
+                    "contact info name": "linked",
+                    "contact info value": "@",
+                }
+            )
+
+        return {field: query.lower() for field, query in queries.items()}
+
+    def searches(self) -> None:
+        """
+        Every search field with every sort, including no search and no sort,
+        through the read pool and through Pony.
+        """
+        with db.read_pool.snapshot() as connection:
+            queries = {
+                t: self._queries(connection, t) for t in ("organization", "contact")
+            }
+
+        for record_type, entity in (
+            ("organization", Organization),
+            ("contact", Contact),
+        ):
+            fields = [""] + list(get_field_keys(record=record_type))
+            sorts = [""] + list(get_sort_keys(record=record_type))
+
+            for path in ("read pool", "pony"):
+                for field in fields:
+                    for sort in sorts:
+                        search_info = {
+                            "query": queries[record_type].get(field, ""),
+                            "field": field,
+                            "sort": sort,
+                        }
+
+                        def search(search_info=search_info, path=path):
+                            if path == "pony":
+                                with _without_read_pool():
+                                    return get_table_values(
+                                        self._app, entity, search_info
+                                    )
+
+                            return get_table_values(self._app, entity, search_info)
+
+                        self.time(
+                            f"search/{path}/{record_type}/{field or 'all'}/"
+                            f"{sort or 'unsorted'}",
+                            search,
+                        )
+
+    def viewers(self) -> None:
+        """
+        Viewer loads of records spread through each table, including the most linked one.
+        """
+        for record_type, table in (
+            ("organization", "Organization"),
+            ("contact", "Contact"),
+            ("resource", "Resource"),
+        ):
+            with db.read_pool.snapshot() as connection:
+                count = connection.execute(f"SELECT max(id) FROM {table}").fetchone()[0]
+
+            if not count:
+                continue
+
+            # Low IDs are the most linked in a synthetic database
+            ids = sorted(
+                {1} | {1 + count * i // VIEWER_SAMPLES for i in range(VIEWER_SAMPLES)}
+            )
+
+            for path in ("read pool", "pony"):
+
+                def load(ids=ids, path=path, record_type=record_type):
+                    if path == "pony":
+                        with _without_read_pool():
+                            return [LOADERS[record_type](i) for i in ids]
+
+                    return [LOADERS[record_type](i) for i in ids]
+
+                self.time(f"viewer/{path}/{record_type} x{len(ids)}", load)
+
+    def exports(self, folder: str) -> None:
+        """
+        Exports of every record in each format.
+        """
+        for export_format in available_export_formats:
+            self.time(
+                f"export/{export_format}",
+                lambda export_format=export_format: export_records(
+                    db,
+                    export_format,
+                    folder,
+                    "benchmark",
+                    orgs=True,
+                    contacts=True,
+                    resources=True,
+                ),
+            )
+
+    def backups(self, folder: str) -> None:
+        """
+        Online backups of the whole database, without the pauses that let writers in.
+        """
+
+        def backup():
+            path = os.path.join(folder, "backup.db")
+
+            if os.path.exists(path):
+                os.remove(path)
+
+            hot_backup(self.db_path, path, step_delay=0)
+
+        self.time("backup/hot", backup)
+
+    def run(self) -> dict[str, dict]:
+        with tempfile.TemporaryDirectory() as folder:
+            self.searches()
+            self.viewers()
+            self.exports(folder)
+            self.backups(folder)
+
+        return self.results
+
+
+def compare_results(old: dict, new: dict) -> list[str]:
+    """
+    Lines comparing the median times of two benchmark results, slowest changes first.
+    """
+    lines = []
+    changes = []
+
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+
+        before = old["results"][name]["median"]
+        after = result["median"]
+        change = (after - before) / before if before else 0.0
+        changes.append((change, name, before, after))
+
+    for change, name, before, after in sorted(changes, reverse=True):
+        lines.append(
+            f"{change:+8.1%}  {before * 1000:10.2f} ms -> {after * 1000:10.2f} ms  {name}"
+        )
+
+    return lines
+
+
+def main(arguments: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="main.py --benchmark", description="Benchmark SimpleCTE's data layer."
+    )
+    parser.add_argument("--scale", choices=SCALES, default="10k")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--database",
+        help="Benchmark this synthetic database, building it first if it doesn't exist",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--only", help="Only run benchmarks whose names match this regex"
+    )
+    parser.add_argument("--output", help="Where to save the results as JSON")
+    parser.add_argument("--compare", help="Earlier results to compare these with")
+    args = parser.parse_args(arguments)
+
+    with tempfile.TemporaryDirectory() as folder:
+        db_path = args.database or os.path.join(folder, "benchmark.db")
+        counts = None
+
+        if not os.path.exists(db_path):
+            print(f"Building a {args.scale} database with seed {args.seed}...")
+            counts = generate_database(db_path, SCALES[args.scale], args.seed)
+        else:
+            db.construct_database("sqlite", db_path)
+
+        benchmark = Benchmark(
+            db_path, args.repeat, args.only, lambda name: print(name, flush=True)
+        )
+        results = benchmark.run()
+
+        db.read_pool.close()
+        db.disconnect()
+
+    commit = _commit()
+    output = {
+        "commit": commit,
+        "created": dt.now().isoformat(timespec="seconds"),
+        # Databases that already existed may not have been built with these
+        "scale": args.scale if counts is not None else None,
+        "seed": args.seed if counts is not None else None,
+        "database": args.database,
+        "rows": counts,
+        "repeat": args.repeat,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "results": results,
+    }
+    output_path = args.output or (
+        f"benchmark-{(commit or 'unknown')[:8]}-{args.scale}.json"
+    )
+
+    with open(output_path, "w") as f:
+        json.dump(output, f, indent=2)
+
+    print(f"Saved {len(results)} results to {output_path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            for line in compare_results(json.load(f), output):
+                print(line)
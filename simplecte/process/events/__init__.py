@@ -2,13 +2,42 @@ from .manage_record import EVENT_MAP as RECORD_MAP, _delete_record
 from .edit_info import EVENT_MAP as EDIT_INFO_MAP
 from .manage_ui import EVENT_MAP as UI_MAP
 from .debug import handle_debug
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable
 from inspect import signature
 
 if TYPE_CHECKING:
     from process.app import App
 
 
+def _handler(method: Callable) -> tuple[Callable, int]:
+    # How many of (app, data, event) the callback takes, found once instead of every event
+    return method, len(signature(method).parameters)
+
+
+# Each event's handler. Later maps are added first, so earlier ones win when they share an event.
+HANDLERS = {
+    event: _handler(method)
+    for func_map in [UI_MAP, RECORD_MAP, EDIT_INFO_MAP]
+    for event, method in func_map.items()
+}
+DELETE_HANDLER = _handler(_delete_record)
+
+
+def find_handler(event: str) -> tuple[Callable, int] | None:
+    """
+    Get the handler of an event and how many parameters it takes,
+    or None if it isn't handled by handle_other_events().
+    """
+    if event.find("::CODE") != -1:
+        return handle_debug, 0
+
+    # _delete_record() gets special treatment
+    if event not in EDIT_INFO_MAP and event.lower().strip("-").startswith("delete"):
+        return DELETE_HANDLER
+
+    return HANDLERS.get(event)
+
+
 def handle_other_events(app: "App", event: str, data: dict) -> bool:
     """
     Updates some part of the system, whether it be a record, a screen, or something else.
@@ -16,22 +45,12 @@ def handle_other_events(app: "App", event: str, data: dict) -> bool:
     if event.find("::CODE") != -1:
         return handle_debug(event)
 
-    for func_map in [EDIT_INFO_MAP, RECORD_MAP, UI_MAP]:
-        method = func_map.get(event, None)
-
-        # _delete_record() gets special treatment
-        if method is None:
-            if event.lower().strip("-").startswith("delete"):
-                method = _delete_record
-            else:
-                continue
-
-        # Find out how many parameters the callback takes and call it based on that
-        num_params = len(signature(method).parameters)
-        params = [app, data, event]
+    if (handler := find_handler(event)) is None:
+        return False
 
-        method(*params[0:num_params])
+    method, num_params = handler
+    params = [app, data, event]
 
-        return True
+    method(*params[0:num_params])
 
-    return False
+    return True
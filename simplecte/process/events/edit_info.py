@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable
 import PySimpleGUI as sg
 from ui_management import (
     swap_to_org_viewer,
@@ -6,14 +6,45 @@ from ui_management import (
     swap_to_resource_viewer,
 )
 from utils.enums import Screen
-from utils.helpers import format_phone, strip_phone
+from utils.helpers import split_phone, strip_phone
 
 if TYPE_CHECKING:
     from process.app import App
+    from database import Organization, Contact, Resource
+
+    Record = Organization | Contact | Resource
 
 __all__ = ("EVENT_MAP",)
 
 
+def _with_viewed_record(
+    app: "App",
+    callback: "Callable[[App, Screen, Record], None]",
+    screens: tuple[Screen, ...] = (Screen.ORG_VIEW, Screen.CONTACT_VIEW),
+) -> None:
+    """
+    Load the record shown on the current viewer screen on the database worker,
+    then call callback(app, screen, record) with it on the UI thread.
+    Nothing happens if the current screen isn't one of screens.
+    """
+    screen = app.current_screen
+
+    if screen not in screens:
+        return
+
+    getter = {
+        Screen.ORG_VIEW: app.db.get_organization,
+        Screen.CONTACT_VIEW: app.db.get_contact,
+        Screen.RESOURCE_VIEW: app.db.get_resource,
+    }[screen]
+
+    app.worker.submit(
+        getter,
+        app.window[screen.value].metadata,
+        callback=lambda record: callback(app, screen, record),
+    )
+
+
 def _change_title(app: "App", values: dict):
     """
     Triggered when a user tries to change the title of a user
@@ -39,62 +70,49 @@ def _change_title(app: "App", values: dict):
     if not title:
         return
 
-    status = app.db.change_contact_title(org_id, contact_id, title)
+    def title_changed(status: bool):
+        if not status:
+            sg.popup("Error changing title.")
+            return
 
-    if not status:
-        sg.popup("Error changing title.")
-        return
+        swap_to_org_viewer(app, org_id=org_id, push=False)
 
-    swap_to_org_viewer(app, org_id=org_id, push=False)
+    app.worker.submit(
+        app.db.change_contact_title, org_id, contact_id, title, callback=title_changed
+    )
 
 
 def _change_name(app: "App"):
     """
     Change the name of a record.
     """
+    _with_viewed_record(
+        app,
+        _prompt_name,
+        (Screen.ORG_VIEW, Screen.CONTACT_VIEW, Screen.RESOURCE_VIEW),
+    )
 
-    # Get the ID of the record we're viewing
-    if app.current_screen == Screen.ORG_VIEW:
-        org_id = app.window["-ORG_VIEW-"].metadata
-
-        try:
-            org = app.db.get_organization(org_id)
-        except IndexError:
-            return
-
-        layout = [
-            [sg.Text("New Name:"), sg.Input(key="-NAME-", default_text=org.name)],
-            [sg.Button("Change"), sg.Button("Cancel")],
-        ]
-
-    elif app.current_screen == Screen.CONTACT_VIEW:
-        contact_id = app.window["-CONTACT_VIEW-"].metadata
-        contact = app.db.get_contact(contact_id)
 
+def _prompt_name(app: "App", screen: Screen, record: "Record"):
+    if screen == Screen.CONTACT_VIEW:
         layout = [
             [
                 sg.Text("New First Name:"),
-                sg.Input(key="-FIRST_NAME-", default_text=contact.first_name),
+                sg.Input(key="-FIRST_NAME-", default_text=record.first_name),
             ],
             [
                 sg.Text("New Last Name:"),
-                sg.Input(key="-LAST_NAME-", default_text=contact.last_name),
+                sg.Input(key="-LAST_NAME-", default_text=record.last_name),
             ],
             [sg.Button("Change"), sg.Button("Cancel")],
         ]
 
-    elif app.current_screen == Screen.RESOURCE_VIEW:
-        resource_id = app.window["-RESOURCE_VIEW-"].metadata
-        resource = app.db.get_resource(resource_id)
-
+    else:
         layout = [
-            [sg.Text("New Name:"), sg.Input(key="-NAME-", default_text=resource.name)],
+            [sg.Text("New Name:"), sg.Input(key="-NAME-", default_text=record.name)],
             [sg.Button("Change"), sg.Button("Cancel")],
         ]
 
-    else:
-        return
-
     input_window = sg.Window("Change Name", layout, finalize=True, modal=True)
 
     event, values = input_window.read()
@@ -119,19 +137,23 @@ def _change_name(app: "App"):
         if confirmation == "No" or confirmation == sg.WIN_CLOSED:
             return
 
-    if app.current_screen == Screen.ORG_VIEW:
-        app.db.update_organization(org_id, name=new_org_name)
-        swap_to_org_viewer(app, org_id=org_id, push=False)
-
-    elif app.current_screen == Screen.CONTACT_VIEW:
-        app.db.update_contact(
-            contact_id, first_name=new_first_name, last_name=new_last_name
+    # The worker runs requests in order, so the viewer reloads after the change is saved
+    if screen == Screen.ORG_VIEW:
+        app.worker.submit(app.db.update_organization, record.id, name=new_org_name)
+        swap_to_org_viewer(app, org_id=record.id, push=False)
+
+    elif screen == Screen.CONTACT_VIEW:
+        app.worker.submit(
+            app.db.update_contact,
+            record.id,
+            first_name=new_first_name,
+            last_name=new_last_name,
         )
-        swap_to_contact_viewer(app, contact_id=contact_id, push=False)
+        swap_to_contact_viewer(app, contact_id=record.id, push=False)
 
-    elif app.current_screen == Screen.RESOURCE_VIEW:
-        app.db.update_resource(resource_id, name=new_org_name)
-        swap_to_resource_viewer(app, resource_id=resource_id, push=False)
+    elif screen == Screen.RESOURCE_VIEW:
+        app.worker.submit(app.db.update_resource, record.id, name=new_org_name)
+        swap_to_resource_viewer(app, resource_id=record.id, push=False)
 
     app.lazy_load_table_values()
 
@@ -140,11 +162,11 @@ def _change_type(app: "App"):
     """
     Change the type of an Organization
     """
-    if not app.current_screen == Screen.ORG_VIEW:
-        return  # Only organizations can have this info
+    # Only organizations can have this info
+    _with_viewed_record(app, _prompt_type, (Screen.ORG_VIEW,))
 
-    org = app.db.get_organization(app.window["-ORG_VIEW-"].metadata)
 
+def _prompt_type(app: "App", screen: Screen, org: "Organization"):
     input_win = sg.Window(
         "Change Type",
         [
@@ -170,7 +192,7 @@ def _change_type(app: "App"):
     if new_type == org.type:
         return
 
-    app.db.update_organization(org.id, type=new_type)
+    app.worker.submit(app.db.update_organization, org.id, type=new_type)
     swap_to_org_viewer(app, org_id=org.id, push=False)
 
 
@@ -179,30 +201,14 @@ def _change_status(app: "App"):
     Change the status of a record.
     """
 
-    # Get the ID of the record we're viewing
-    if app.current_screen == Screen.ORG_VIEW:
-        org_id = app.window["-ORG_VIEW-"].metadata
-        org = app.db.get_organization(org_id)
-
-        layout = [
-            [sg.Text("New Status:"), sg.Input(key="-STATUS-", default_text=org.status)],
-            [sg.Button("Change"), sg.Button("Cancel")],
-        ]
-
-    elif app.current_screen == Screen.CONTACT_VIEW:
-        contact_id = app.window["-CONTACT_VIEW-"].metadata
-        contact = app.db.get_contact(contact_id)
+    _with_viewed_record(app, _prompt_status)
 
-        layout = [
-            [
-                sg.Text("New Status:"),
-                sg.Input(key="-STATUS-", default_text=contact.status),
-            ],
-            [sg.Button("Change"), sg.Button("Cancel")],
-        ]
 
-    else:
-        return
+def _prompt_status(app: "App", screen: Screen, record: "Organization | Contact"):
+    layout = [
+        [sg.Text("New Status:"), sg.Input(key="-STATUS-", default_text=record.status)],
+        [sg.Button("Change"), sg.Button("Cancel")],
+    ]
 
     input_window = sg.Window("Change Status", layout, finalize=True, modal=True)
 
@@ -227,32 +233,24 @@ def _change_status(app: "App"):
         if confirmation == "No" or confirmation == sg.WIN_CLOSED:
             return
 
-    if app.current_screen == Screen.ORG_VIEW:
-        app.db.update_organization(org_id, status=new_org_status)
-        swap_to_org_viewer(app, org_id=org_id, push=False)
+    if screen == Screen.ORG_VIEW:
+        app.worker.submit(app.db.update_organization, record.id, status=new_org_status)
+        swap_to_org_viewer(app, org_id=record.id, push=False)
         app.lazy_load_table_values()
 
-    elif app.current_screen == Screen.CONTACT_VIEW:
-        app.db.update_contact(contact_id, status=new_contact_status)
-        swap_to_contact_viewer(app, contact_id=contact_id, push=False)
+    elif screen == Screen.CONTACT_VIEW:
+        app.worker.submit(app.db.update_contact, record.id, status=new_contact_status)
+        swap_to_contact_viewer(app, contact_id=record.id, push=False)
 
 
 def _edit_availability(app: "App"):
     """
     Change the availability of the record
     """
+    _with_viewed_record(app, _prompt_availability)
 
-    if app.current_screen == Screen.ORG_VIEW:
-        org_id = app.window["-ORG_VIEW-"].metadata
-        record = app.db.get_organization(org_id)
-
-    elif app.current_screen == Screen.CONTACT_VIEW:
-        contact_id = app.window["-CONTACT_VIEW-"].metadata
-        record = app.db.get_contact(contact_id)
-
-    else:
-        return
 
+def _prompt_availability(app: "App", screen: Screen, record: "Organization | Contact"):
     layout = [
         [sg.Text("Availability:")],
         [sg.Multiline(record.availability, size=(30, 10), key="-AVAILABILITY-")],
@@ -269,13 +267,17 @@ def _edit_availability(app: "App"):
 
     new_availability = values["-AVAILABILITY-"]
 
-    if app.current_screen == Screen.ORG_VIEW:
-        app.db.update_organization(org_id, availability=new_availability)
-        swap_to_org_viewer(app, org_id=org_id, push=False)
+    if screen == Screen.ORG_VIEW:
+        app.worker.submit(
+            app.db.update_organization, record.id, availability=new_availability
+        )
+        swap_to_org_viewer(app, org_id=record.id, push=False)
 
-    elif app.current_screen == Screen.CONTACT_VIEW:
-        app.db.update_contact(contact_id, availability=new_availability)
-        swap_to_contact_viewer(app, contact_id=contact_id, push=False)
+    elif screen == Screen.CONTACT_VIEW:
+        app.worker.submit(
+            app.db.update_contact, record.id, availability=new_availability
+        )
+        swap_to_contact_viewer(app, contact_id=record.id, push=False)
 
 
 def _edit_contact_info(app: "App", values: dict):
@@ -293,8 +295,14 @@ def _edit_contact_info(app: "App", values: dict):
     except IndexError:
         return
 
-    contact = app.db.get_contact(record_id)
+    app.worker.submit(
+        app.db.get_contact,
+        record_id,
+        callback=lambda contact: _prompt_contact_info(app, contact, field_name),
+    )
+
 
+def _prompt_contact_info(app: "App", contact: "Contact", field_name: str):
     layout = [
         [sg.Text("Contact Info Name: "), sg.Text(field_name)],
         [
@@ -316,11 +324,14 @@ def _edit_contact_info(app: "App", values: dict):
     if event != "-EDIT-":
         return
 
-    app.db.update_contact_info(
-        name=field_name, value=values["-CONTACT_INFO_VALUE-"], contact=record_id
+    app.worker.submit(
+        app.db.update_contact_info,
+        name=field_name,
+        value=values["-CONTACT_INFO_VALUE-"],
+        contact=contact.id,
     )
 
-    swap_to_contact_viewer(app, contact_id=record_id, push=False)
+    swap_to_contact_viewer(app, contact_id=contact.id, push=False)
 
 
 def _decide_contact_info_edit(app: "App", values: dict):
@@ -347,18 +358,10 @@ def _decide_contact_info_edit(app: "App", values: dict):
 
 
 def _edit_emails(app: "App"):
-    # Get the ID of the record we're viewing
-    if app.current_screen == Screen.ORG_VIEW:
-        org_id = app.window["-ORG_VIEW-"].metadata
-        record = app.db.get_organization(org_id)
-
-    elif app.current_screen == Screen.CONTACT_VIEW:
-        contact_id = app.window["-CONTACT_VIEW-"].metadata
-        record = app.db.get_contact(contact_id)
+    _with_viewed_record(app, _prompt_emails)
 
-    else:
-        return
 
+def _prompt_emails(app: "App", screen: Screen, record: "Organization | Contact"):
     layout = [
         [sg.Text("Emails, one per line\n(The first email is primary):")],
         [
@@ -379,25 +382,20 @@ def _edit_emails(app: "App"):
 
     new_emails = values["-EMAILS-"].split("\n")
 
-    if app.current_screen == Screen.ORG_VIEW:
-        app.db.update_organization(org_id, emails=new_emails)
-        swap_to_org_viewer(app, org_id=org_id, push=False)
+    if screen == Screen.ORG_VIEW:
+        app.worker.submit(app.db.update_organization, record.id, emails=new_emails)
+        swap_to_org_viewer(app, org_id=record.id, push=False)
 
-    elif app.current_screen == Screen.CONTACT_VIEW:
-        app.db.update_contact(contact_id, emails=new_emails)
-        swap_to_contact_viewer(app, contact_id=contact_id, push=False)
+    elif screen == Screen.CONTACT_VIEW:
+        app.worker.submit(app.db.update_contact, record.id, emails=new_emails)
+        swap_to_contact_viewer(app, contact_id=record.id, push=False)
 
 
 def _edit_addresses(app: "App"):
-    # Get the ID of the record we're viewing
-    if app.current_screen == Screen.ORG_VIEW:
-        org_id = app.window["-ORG_VIEW-"].metadata
-        record = app.db.get_organization(org_id)
+    _with_viewed_record(app, _prompt_addresses)
 
-    elif app.current_screen == Screen.CONTACT_VIEW:
-        contact_id = app.window["-CONTACT_VIEW-"].metadata
-        record = app.db.get_contact(contact_id)
 
+def _prompt_addresses(app: "App", screen: Screen, record: "Organization | Contact"):
     layout = [
         [sg.Text("Addresses, one per line\n(The first address is primary):")],
         [
@@ -421,32 +419,35 @@ def _edit_addresses(app: "App"):
 
     new_addresses = values["-ADDRESSES-"].split("\n")
 
-    if app.current_screen == Screen.ORG_VIEW:
-        app.db.update_organization(org_id, addresses=new_addresses)
-        swap_to_org_viewer(app, org_id=org_id, push=False)
+    if screen == Screen.ORG_VIEW:
+        app.worker.submit(
+            app.db.update_organization, record.id, addresses=new_addresses
+        )
+        swap_to_org_viewer(app, org_id=record.id, push=False)
 
-    elif app.current_screen == Screen.CONTACT_VIEW:
-        app.db.update_contact(contact_id, addresses=new_addresses)
-        swap_to_contact_viewer(app, contact_id=contact_id, push=False)
+    elif screen == Screen.CONTACT_VIEW:
+        app.worker.submit(app.db.update_contact, record.id, addresses=new_addresses)
+        swap_to_contact_viewer(app, contact_id=record.id, push=False)
 
 
 def _edit_phones(app: "App"):
-    # Get the ID of the record we're viewing
-    if app.current_screen == Screen.ORG_VIEW:
-        org_id = app.window["-ORG_VIEW-"].metadata
-        record = app.db.get_organization(org_id)
+    screen = app.current_screen
 
-        phones = [format_phone(phone, False) for phone in record.phones]
+    if screen not in (Screen.ORG_VIEW, Screen.CONTACT_VIEW):
+        return
 
-    elif app.current_screen == Screen.CONTACT_VIEW:
-        contact_id = app.window["-CONTACT_VIEW-"].metadata
+    record_id = app.window[screen.value].metadata
+    owner = {"org": record_id} if screen == Screen.ORG_VIEW else {"contact": record_id}
 
-        record = app.db.get_contact(contact_id)
-        phones = [format_phone(phone, False) for phone in record.phone_numbers]
+    # The numbers come from the phone index, which keeps leading zeros and extensions
+    app.worker.submit(
+        app.db.get_phone_numbers,
+        **owner,
+        callback=lambda phones: _prompt_phones(app, screen, record_id, phones),
+    )
 
-    else:
-        return
 
+def _prompt_phones(app: "App", screen: Screen, record_id: int, phones: list[str]):
     layout = [
         [sg.Text("Phone Numbers, one per line\n(The first number is primary):")],
         [
@@ -470,27 +471,34 @@ def _edit_phones(app: "App"):
             input_window.close()
             return
 
+        new_phones = [
+            phone.strip() for phone in values["-PHONES-"].split("\n") if phone.strip()
+        ]
+
         try:
             # Make sure each phone number is valid
-            new_phones = [
-                int(strip_phone(phone)) for phone in values["-PHONES-"].split("\n")
-            ]
+            for phone in new_phones:
+                split_phone(phone)
         except ValueError:
             sg.popup(
                 "Invalid phone number! Phone number must be a continuous string of numbers, or a string "
-                "of numbers separated by dashes or parentheses."
+                "of numbers separated by dashes or parentheses, optionally followed by an extension "
+                "such as x123."
             )
             continue
 
-        if app.current_screen == Screen.ORG_VIEW:
-            app.db.update_organization(org_id, phones=new_phones)
-            swap_to_org_viewer(app, org_id=org_id, push=False)
+        if screen == Screen.ORG_VIEW:
+            app.worker.submit(app.db.update_organization, record_id, phones=new_phones)
+            swap_to_org_viewer(app, org_id=record_id, push=False)
 
-        elif app.current_screen == Screen.CONTACT_VIEW:
-            app.db.update_contact(contact_id, phone_numbers=new_phones)
-            swap_to_contact_viewer(app, contact_id=contact_id, push=False)
+        elif screen == Screen.CONTACT_VIEW:
+            app.worker.submit(
+                app.db.update_contact, record_id, phone_numbers=new_phones
+            )
+            swap_to_contact_viewer(app, contact_id=record_id, push=False)
 
         input_window.close()
+        return
 
 
 def add_contact_info(app: "App"):
@@ -545,7 +553,8 @@ def add_contact_info(app: "App"):
     contact_id = app.window["-CONTACT_VIEW-"].metadata
 
     # Add the contact info
-    app.db.create_contact_info(
+    app.worker.submit(
+        app.db.create_contact_info,
         values["-CONTACT_INFO_TYPE-"],
         values["-CONTACT_INFO_VALUE-"],
         contact=contact_id,
@@ -574,8 +583,11 @@ def delete_contact_info(app: "App", values: dict):
     if contact_info_name.lower() == "phone":
         contact_info_value = int(strip_phone(contact_info_value))
 
-    app.db.delete_contact_info(
-        contact_info_name, contact_info_value, contact=contact_id
+    app.worker.submit(
+        app.db.delete_contact_info,
+        contact_info_name,
+        contact_info_value,
+        contact=contact_id,
     )
 
     # Reload the table values
@@ -583,43 +595,31 @@ def delete_contact_info(app: "App", values: dict):
 
 
 def _manage_custom_field(app: "App", values: dict) -> None:
-    try:
-        record_id = app.window[app.current_screen.value].metadata
-    except IndexError:
-        return
-
-    method = [{"app": app, "push": False}]
-
     if app.current_screen == Screen.ORG_VIEW:
-        record = app.db.get_organization(record_id)
-        record_type = "org"
-        method.insert(0, swap_to_org_viewer)
-        method[1]["org_id"] = record.id
-
-        try:
-            field_name = app.window["-ORG_CUSTOM_FIELDS_TABLE-"].get()[
-                values["-ORG_CUSTOM_FIELDS_TABLE-"][0]
-            ][0]
-
-        except IndexError:
-            return
+        table = "-ORG_CUSTOM_FIELDS_TABLE-"
 
     elif app.current_screen == Screen.CONTACT_VIEW:
-        record = app.db.get_contact(record_id)
-        record_type = "contact"
-        method.insert(0, swap_to_contact_viewer)
-        method[1]["contact_id"] = record.id
-
-        try:
-            field_name = app.window["-CONTACT_CUSTOM_FIELDS_TABLE-"].get()[
-                values["-CONTACT_CUSTOM_FIELDS_TABLE-"][0]
-            ][0]
-        except IndexError:
-            return
+        table = "-CONTACT_CUSTOM_FIELDS_TABLE-"
 
     else:
         return
 
+    try:
+        field_name = app.window[table].get()[values[table][0]][0]
+    except IndexError:
+        return
+
+    _with_viewed_record(
+        app,
+        lambda app, screen, record: _prompt_custom_field(
+            app, screen, record, field_name
+        ),
+    )
+
+
+def _prompt_custom_field(
+    app: "App", screen: Screen, record: "Organization | Contact", field_name: str
+) -> None:
     name_tooltip = "The names of custom fields cannot be changed. Consider creating a new custom field instead."
 
     layout = [
@@ -649,26 +649,31 @@ def _manage_custom_field(app: "App", values: dict) -> None:
     elif event != "-EDIT-":
         return
 
-    app.db.update_custom_field(
-        name=field_name,
-        value=values["-CUSTOM_FIELD_VALUE-"],
-        **{record_type: record_id},
-    )
-
-    app.db.update_custom_field(
-        name=field_name,
-        value=values["-CUSTOM_FIELD_VALUE-"],
-        **{record_type: record_id},
-    )
+    if screen == Screen.ORG_VIEW:
+        app.worker.submit(
+            app.db.update_custom_field,
+            name=field_name,
+            value=values["-CUSTOM_FIELD_VALUE-"],
+            org=record.id,
+        )
+        swap_to_org_viewer(app, org_id=record.id, push=False)
 
-    method[0](**method[1])
+    else:
+        app.worker.submit(
+            app.db.update_custom_field,
+            name=field_name,
+            value=values["-CUSTOM_FIELD_VALUE-"],
+            contact=record.id,
+        )
+        swap_to_contact_viewer(app, contact_id=record.id, push=False)
 
 
 def _change_value(app: "App"):
     # Change the value of a resource
-    resource_id = app.window["-RESOURCE_VIEW-"].metadata
-    resource = app.db.get_resource(resource_id)
+    _with_viewed_record(app, _prompt_value, (Screen.RESOURCE_VIEW,))
 
+
+def _prompt_value(app: "App", screen: Screen, resource: "Resource"):
     layout = [
         [sg.Text("Full Resource Value:")],
         [sg.Multiline(resource.value, size=(30, 10), key="-NEW_VALUE-")],
@@ -688,13 +693,8 @@ def _change_value(app: "App"):
     if new_value == resource.value:
         return
 
-    app.db.update_resource(resource_id, value=new_value)
-    swap_to_resource_viewer(app, resource_id=resource_id, push=False)
-
-
-def _update_tables(app: "App", values: dict):
-    app.window["-CONTACT_TABLE-"].update(values["-UPDATE_TABLES-"][0])
-    app.window["-ORG_TABLE-"].update(values["-UPDATE_TABLES-"][1])
+    app.worker.submit(app.db.update_resource, resource.id, value=new_value)
+    swap_to_resource_viewer(app, resource_id=resource.id, push=False)
 
 
 EVENT_MAP = {
@@ -716,5 +716,4 @@ EVENT_MAP = {
     "Edit Custom Field": _manage_custom_field,
     "View Full Content": _manage_custom_field,
     "Change Value": _change_value,
-    "Update Tables": _update_tables,
 }
@@ -1,14 +1,12 @@
 from typing import TYPE_CHECKING
 import PySimpleGUI as sg
 
-from database import get_table_values
 from ui_management import (
     swap_to_org_viewer,
     swap_to_contact_viewer,
     swap_to_resource_viewer,
 )
 from utils.enums import Screen
-from database import Organization, Contact
 
 if TYPE_CHECKING:
     from process.app import App
@@ -38,13 +36,16 @@ def _add_contact(app: "App"):
 
     org_id = app.window["-ORG_VIEW-"].metadata
 
-    status = app.db.add_contact_to_org(user_input, org_id)
+    def contact_added(status: bool):
+        if not status:
+            sg.popup("Error adding contact.\nPerhaps you used an incorrect ID?")
+            return
 
-    if not status:
-        sg.popup("Error adding contact.\nPerhaps you used an incorrect ID?")
-        return
+        swap_to_org_viewer(app, org_id=org_id, push=False)
 
-    swap_to_org_viewer(app, org_id=org_id, push=False)
+    app.worker.submit(
+        app.db.add_contact_to_org, user_input, org_id, callback=contact_added
+    )
 
 
 def _remove_contact(app: "App", values: dict):
@@ -62,14 +63,17 @@ def _remove_contact(app: "App", values: dict):
     # Get organization name
     org_id = app.window["-ORG_VIEW-"].metadata
 
-    # Remove contact from organization
-    status = app.db.remove_contact_from_org(contact_name, org_id)
+    def contact_removed(status: bool):
+        if not status:
+            sg.popup("Error removing contact.")
+            return
 
-    if not status:
-        sg.popup("Error removing contact.")
-        return
+        swap_to_org_viewer(app, org_id=org_id, push=False)
 
-    swap_to_org_viewer(app, org_id=org_id, push=False)
+    # Remove contact from organization
+    app.worker.submit(
+        app.db.remove_contact_from_org, contact_name, org_id, callback=contact_removed
+    )
 
 
 def _add_org(app: "App"):
@@ -95,13 +99,16 @@ def _add_org(app: "App"):
         sg.popup("Invalid ID!")
         return
 
-    status = app.db.add_contact_to_org(contact_id, user_input)
+    def org_added(status: bool):
+        if not status:
+            sg.popup("Error adding organization.\nPerhaps you used an incorrect ID?")
+            return
 
-    if not status:
-        sg.popup("Error adding organization.\nPerhaps you used an incorrect ID?")
-        return
+        swap_to_contact_viewer(app, contact_id=contact_id, push=False)
 
-    swap_to_contact_viewer(app, contact_id=contact_id, push=False)
+    app.worker.submit(
+        app.db.add_contact_to_org, contact_id, user_input, callback=org_added
+    )
 
 
 def _remove_org(app: "App", values: dict):
@@ -120,14 +127,17 @@ def _remove_org(app: "App", values: dict):
     # Get contact name
     contact_id = app.window["-CONTACT_VIEW-"].metadata
 
-    # Remove contact from organization
-    status = app.db.remove_contact_from_org(contact_id, org_id)
+    def org_removed(status: bool):
+        if not status:
+            sg.popup("Error removing organization.")
+            return
 
-    if not status:
-        sg.popup("Error removing organization.")
-        return
+        swap_to_contact_viewer(app, contact_id=contact_id, push=False)
 
-    swap_to_contact_viewer(app, contact_id=contact_id, push=False)
+    # Remove contact from organization
+    app.worker.submit(
+        app.db.remove_contact_from_org, contact_id, org_id, callback=org_removed
+    )
 
 
 def _create_resource(app: "App"):
@@ -156,24 +166,30 @@ def _create_resource(app: "App"):
         sg.popup("Resource name and value are required!")
         return
 
-    resource = app.db.create_resource(
-        name=values["-RESOURCE_NAME-"], value=values["-RESOURCE_VALUE-"]
-    )
+    link = {}
 
     if app.current_screen == Screen.ORG_VIEW:
-        app.db.link_resource(
-            org=app.window["-ORG_VIEW-"].metadata, resource=resource.id
-        )
-        swap_to_org_viewer(app, org_id=app.window["-ORG_VIEW-"].metadata, push=False)
+        link["org"] = app.window["-ORG_VIEW-"].metadata
 
     elif app.current_screen == Screen.CONTACT_VIEW:
-        app.db.link_resource(
-            contact=app.window["-CONTACT_VIEW-"].metadata, resource=resource.id
-        )
-        swap_to_contact_viewer(
-            app, contact_id=app.window["-CONTACT_VIEW-"].metadata, push=False
+        link["contact"] = app.window["-CONTACT_VIEW-"].metadata
+
+    def create_and_link():
+        resource = app.db.create_resource(
+            name=values["-RESOURCE_NAME-"], value=values["-RESOURCE_VALUE-"]
         )
 
+        if link:
+            app.db.link_resource(resource=resource.id, **link)
+
+    app.worker.submit(create_and_link)
+
+    if "org" in link:
+        swap_to_org_viewer(app, org_id=link["org"], push=False)
+
+    elif "contact" in link:
+        swap_to_contact_viewer(app, contact_id=link["contact"], push=False)
+
 
 def _delete_resource(app: "App", values: dict):
     if app.current_screen == Screen.ORG_VIEW:
@@ -204,14 +220,21 @@ def _delete_resource(app: "App", values: dict):
     if confirmation == "No" or confirmation == sg.WIN_CLOSED:
         return
 
+    def resource_deleted(_):
+        app.stack.search_and_pop(resource_id)
+
     if app.current_screen == Screen.ORG_VIEW:
-        app.db.delete_resource(resource_id)
+        app.worker.submit(
+            app.db.delete_resource, resource_id, callback=resource_deleted
+        )
 
         org_id = app.window["-ORG_VIEW-"].metadata
         swap_to_org_viewer(app, org_id=org_id, push=False)
 
     elif app.current_screen == Screen.CONTACT_VIEW:
-        app.db.delete_resource(resource_id)
+        app.worker.submit(
+            app.db.delete_resource, resource_id, callback=resource_deleted
+        )
 
         contact_id = app.window["-CONTACT_VIEW-"].metadata
         swap_to_contact_viewer(app, contact_id=contact_id, push=False)
@@ -242,12 +265,14 @@ def _link_resource(app: "App"):
 
     if app.current_screen == Screen.ORG_VIEW:
         org_id = app.window["-ORG_VIEW-"].metadata
-        app.db.link_resource(org=org_id, resource=resource_id)
+        app.worker.submit(app.db.link_resource, org=org_id, resource=resource_id)
         swap_to_org_viewer(app, org_id=org_id, push=False)
 
     elif app.current_screen == Screen.CONTACT_VIEW:
         contact_id = app.window["-CONTACT_VIEW-"].metadata
-        app.db.link_resource(contact=contact_id, resource=resource_id)
+        app.worker.submit(
+            app.db.link_resource, contact=contact_id, resource=resource_id
+        )
         swap_to_contact_viewer(app, contact_id=contact_id, push=False)
 
 
@@ -271,12 +296,14 @@ def _unlink_resource(app: "App", values: dict) -> None:
 
     if app.current_screen == Screen.ORG_VIEW:
         org_id = app.window["-ORG_VIEW-"].metadata
-        app.db.unlink_resource(org=org_id, resource=resource_id)
+        app.worker.submit(app.db.unlink_resource, org=org_id, resource=resource_id)
         swap_to_org_viewer(app, org_id=org_id, push=False)
 
     elif app.current_screen == Screen.CONTACT_VIEW:
         contact_id = app.window["-CONTACT_VIEW-"].metadata
-        app.db.unlink_resource(contact=contact_id, resource=resource_id)
+        app.worker.submit(
+            app.db.unlink_resource, contact=contact_id, resource=resource_id
+        )
         swap_to_contact_viewer(app, contact_id=contact_id, push=False)
 
 
@@ -312,9 +339,9 @@ def _link_record(app: "App", values: dict, event: str) -> None:
     resource_id = app.window["-RESOURCE_VIEW-"].metadata
 
     if selected_item.lower() == "organization":
-        app.db.link_resource(org=record_id, resource=resource_id)
+        app.worker.submit(app.db.link_resource, org=record_id, resource=resource_id)
     elif selected_item.lower() == "contact":
-        app.db.link_resource(contact=record_id, resource=resource_id)
+        app.worker.submit(app.db.link_resource, contact=record_id, resource=resource_id)
 
     swap_to_resource_viewer(app, resource_id=resource_id, push=False)
 
@@ -331,13 +358,15 @@ def _unlink_record(app: "App", values: dict, event: str) -> None:
         record_id = app.window["-RESOURCE_ORGANIZATIONS_TABLE-"].get()[
             values["-RESOURCE_ORGANIZATIONS_TABLE-"][0]
         ][0]
-        app.db.unlink_resource(resource=resource_id, org=record_id)
+        app.worker.submit(app.db.unlink_resource, resource=resource_id, org=record_id)
 
     elif selected_item.lower() == "contact":
         record_id = app.window["-RESOURCE_CONTACTS_TABLE-"].get()[
             values["-RESOURCE_CONTACTS_TABLE-"][0]
         ][0]
-        app.db.unlink_resource(resource=resource_id, contact=record_id)
+        app.worker.submit(
+            app.db.unlink_resource, resource=resource_id, contact=record_id
+        )
 
     swap_to_resource_viewer(app, resource_id=resource_id, push=False)
 
@@ -352,26 +381,42 @@ def _delete_record(app: "App"):
 
     match app.current_screen:
         case Screen.ORG_VIEW:
-            org_id = app.window["-ORG_VIEW-"].metadata
-            app.db.delete_organization(org_id)
-            app.switch_to_last_screen()
+            delete, record_id = (
+                app.db.delete_organization,
+                app.window["-ORG_VIEW-"].metadata,
+            )
 
         case Screen.CONTACT_VIEW:
-            contact_id = app.window["-CONTACT_VIEW-"].metadata
-            app.db.delete_contact(contact_id)
-            app.switch_to_last_screen()
+            delete, record_id = (
+                app.db.delete_contact,
+                app.window["-CONTACT_VIEW-"].metadata,
+            )
 
         case Screen.RESOURCE_VIEW:
-            app.db.delete_resource(app.window["-RESOURCE_VIEW-"].metadata)
-            app.switch_to_last_screen()
+            delete, record_id = (
+                app.db.delete_resource,
+                app.window["-RESOURCE_VIEW-"].metadata,
+            )
 
         case Screen.ORG_SEARCH:
-            app.db.delete_organization(app.last_selected_id)
-            app.window["-ORG_TABLE-"].update(get_table_values(app, Organization))
+            delete, record_id = app.db.delete_organization, app.last_selected_id
 
         case Screen.CONTACT_SEARCH:
-            app.db.delete_contact(app.last_selected_id)
-            app.window["-CONTACT_TABLE-"].update(get_table_values(app, Contact))
+            delete, record_id = app.db.delete_contact, app.last_selected_id
+
+        case _:
+            return
+
+    viewing = app.current_screen not in (Screen.ORG_SEARCH, Screen.CONTACT_SEARCH)
+
+    def record_deleted(_):
+        # Runs on the UI thread, which is the only one that changes the stack
+        app.stack.search_and_pop(record_id)
+
+        if viewing:
+            app.switch_to_last_screen()
+
+    app.worker.submit(delete, record_id, callback=record_deleted)
 
     # Reload the table values after the record is deleted
     app.lazy_load_table_values()
@@ -428,15 +473,18 @@ def _create_custom_field(app: "App"):
 
     # Get the ID of the record we're viewing
 
-    field = app.db.create_custom_field(**create_kwargs)
+    def field_created(field):
+        if not field:
+            sg.popup(
+                "Error creating custom field.\nPerhaps you used the same name as an existing field?"
+            )
+            return
 
-    if not field:
-        sg.popup(
-            "Error creating custom field.\nPerhaps you used the same name as an existing field?"
-        )
-        return
+        (swap_args[1])(**(swap_args[0]))
 
-    (swap_args[1])(**(swap_args[0]))
+    app.worker.submit(
+        app.db.create_custom_field, **create_kwargs, callback=field_created
+    )
 
 
 def _delete_custom_field(app: "App", values: dict):
@@ -470,11 +518,13 @@ def _delete_custom_field(app: "App", values: dict):
 
     # Delete the field
     if app.current_screen == Screen.ORG_VIEW:
-        app.db.delete_custom_field(org=org_id, name=field_name)
+        app.worker.submit(app.db.delete_custom_field, org=org_id, name=field_name)
         swap_to_org_viewer(app, org_id=org_id, push=False)
 
     elif app.current_screen == Screen.CONTACT_VIEW:
-        app.db.delete_custom_field(contact=contact_id, name=field_name)
+        app.worker.submit(
+            app.db.delete_custom_field, contact=contact_id, name=field_name
+        )
         swap_to_contact_viewer(app, contact_id=contact_id, push=False)
 
 
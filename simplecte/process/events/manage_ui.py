@@ -2,8 +2,11 @@ from typing import TYPE_CHECKING
 from ui_management import (
     swap_to_org_viewer,
     swap_to_contact_viewer,
+    show_relation_page,
+    RELATION_TABLES,
 )
-from database import get_table_values, Contact, Organization
+from database import get_table_values, Contact, Organization, Resource
+from database.loader import Page
 from utils.enums import Screen
 import PySimpleGUI as sg
 
@@ -62,8 +65,14 @@ def _view_resource_contact(app: "App", values: dict):
 
 
 def _view_full_value(app: "App"):
-    resource = app.db.get_resource(app.window["-RESOURCE_VIEW-"].metadata)
+    app.worker.submit(
+        app.db.get_resource,
+        app.window["-RESOURCE_VIEW-"].metadata,
+        callback=_show_full_value,
+    )
 
+
+def _show_full_value(resource: Resource):
     layout = [
         [sg.Text("Full Resource Value:")],
         [sg.Multiline(resource.value, size=(30, 10), disabled=True)],
@@ -76,18 +85,56 @@ def _view_full_value(app: "App"):
     view_window.close()
 
 
+def _resolve_ftp_conflict(app: "App", values: dict):
+    writeback = app.db.ftp_writeback
+
+    if writeback is None or writeback.conflict is None:
+        return
+
+    conflict_window = sg.Window(
+        "Database Conflict",
+        [
+            [sg.Text(values["-FTP_CONFLICT-"])],
+            [
+                sg.Text(
+                    "Keep your copy to replace the one on the server, or keep the server's\n"
+                    "copy to restart with it. Your changes are then kept in a separate file."
+                )
+            ],
+            [
+                sg.Button("Keep My Copy", k="-KEEP_LOCAL-"),
+                sg.Button("Keep the Server's Copy", k="-KEEP_REMOTE-"),
+                sg.Button("Decide Later"),
+            ],
+        ],
+        finalize=True,
+        modal=True,
+    )
+
+    event, _ = conflict_window.read()
+    conflict_window.close()
+
+    if event == "-KEEP_LOCAL-":
+        writeback.keep_local()
+
+    elif event == "-KEEP_REMOTE-":
+        writeback.keep_remote()
+        app.restart()
+
+
+def _show_server_changes(app: "App"):
+    # The changes were written to the local copy without going through Pony
+    app.db.reset_caches()
+    app.viewer_cache.clear()
+    app.lazy_load_table_values()
+
+
 def _reset_search(app: "App"):
     # Reset the search parameters
     app.window["-SEARCH_QUERY-"].update("")
     app.window["-SEARCH_FIELDS-"].update("")
     app.window["-SORT_TYPE-"].update("")
 
-    if app.current_screen == Screen.ORG_SEARCH:
-        app.window["-ORG_TABLE-"].update(get_table_values(app, Organization))
-
-    elif app.current_screen == Screen.CONTACT_SEARCH:
-        app.window["-CONTACT_TABLE-"].update(get_table_values(app, Contact))
-
     app.lazy_load_table_values()
 
 
@@ -100,26 +147,42 @@ def _execute_search(app: "App", values: dict):
 
     match app.current_screen:
         case Screen.ORG_SEARCH:
-            app.window["-ORG_TABLE-"].update(
-                get_table_values(
-                    app,
-                    Organization,
-                    search_info=search_info,
-                    descending=values["-SORT_DESCENDING-"],
-                )
-            )
+            record, table = Organization, "-ORG_TABLE-"
 
         case Screen.CONTACT_SEARCH:
-            app.window["-CONTACT_TABLE-"].update(
-                get_table_values(
-                    app,
-                    Contact,
-                    search_info=search_info,
-                    descending=values["-SORT_DESCENDING-"],
-                )
-            )
+            record, table = Contact, "-CONTACT_TABLE-"
+
+        case _:
+            return
+
+    # The search runs on the database worker, and the table updates when it's done
+    app.worker.submit_read(
+        get_table_values,
+        app,
+        record,
+        search_info=search_info,
+        descending=values["-SORT_DESCENDING-"],
+        callback=app.window[table].update,
+    )
+
 
-    app.lazy_load_table_values(search_info, descending=values["-SORT_DESCENDING-"])
+def _change_relation_page(app: "App", values: dict, event: str):
+    # The event's key is the table's key with _PREV, _NEXT or _FILTER added
+    table, _, action = event.strip("-").rpartition("_")
+    table_key = f"-{table}-"
+    page = app.window[table_key].metadata or Page()
+
+    if action == "PREV":
+        page = page._replace(number=max(page.number - 1, 0))
+
+    elif action == "NEXT":
+        page = page._replace(number=page.number + 1)
+
+    else:
+        # A new filter starts back on the first page
+        page = Page(0, values[event])
+
+    show_relation_page(app, table_key, page)
 
 
 EVENT_MAP = {
@@ -129,4 +192,11 @@ EVENT_MAP = {
     "View Full Value": _view_full_value,
     "-RESET_BUTTON-": _reset_search,
     "-SEARCH_BUTTON-": _execute_search,
+    "-FTP_CONFLICT-": _resolve_ftp_conflict,
+    "-SERVER_CHANGES-": _show_server_changes,
 }
+
+for _tables in RELATION_TABLES.values():
+    for _key in _tables:
+        for _action in ("PREV", "NEXT", "FILTER"):
+            EVENT_MAP[f"{_key.rstrip('-')}_{_action}-"] = _change_relation_page
@@ -0,0 +1,353 @@
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime as dt
+from typing import TYPE_CHECKING, Callable
+
+from filelock import FileLock, Timeout
+
+from utils.archive import ChangeArchiver, install_changelog, remove_changelog
+from utils.backup import backup, verify_backup, DATETIME_FORMAT
+from utils.scheduler import Scheduler, Budget
+from ui_management.export import export_records
+
+if TYPE_CHECKING:
+    from process.settings import Settings
+    from database import Database
+
+__all__ = ("Maintenance",)
+
+
+class Maintenance:
+    """
+    Runs SimpleCTE's background upkeep on a scheduler: backups, change archiving,
+    ANALYZE, VACUUM, integrity checks, and scheduled exports. Only one scheduler runs at a time,
+    either inside the program or as a daemon started with `main.py --daemon`,
+    which is decided by whoever holds the database's .maintenance.lock file.
+    """
+
+    def __init__(self, settings: "Settings", db: "Database"):
+        self.logger = logging.getLogger("maintenance")
+        self.settings = settings
+        self.db = db
+        self.scheduler = Scheduler()
+        # Next to the database, so the program and the daemon find the same lock
+        # whatever directory they were started from
+        self.lock = FileLock(f"{self.db_path}.maintenance.lock")
+
+        # The daemon re-reads settings.json before each job, since the program may have changed it
+        self.follow_settings_file = False
+
+    @property
+    def db_path(self) -> str:
+        # A database on an FTP server or a SimpleCTE server is opened through a local copy
+        if self.db.ftp_cache is not None:
+            return self.db.ftp_cache.local_path
+
+        if self.db.server_replica is not None:
+            return self.db.server_replica.local_path
+
+        return self.settings.absolute_database_path
+
+    @property
+    def rewrites_allowed(self) -> bool:
+        """
+        Whether jobs may change the database file without changing any records. A copy of
+        a database on an FTP server is uploaded whole whenever its file changes, so those
+        jobs are left to whoever opens the database on the server directly.
+        """
+        return self.db.ftp_cache is None
+
+    @property
+    def config(self) -> dict:
+        return self.settings.settings["maintenance"]
+
+    def start(self) -> bool:
+        """
+        Start running jobs in the background. Returns False if a maintenance
+        daemon is already running jobs for this installation.
+        """
+        try:
+            self.lock.acquire(timeout=0)
+        except Timeout:
+            self.logger.info("A maintenance daemon is already running.")
+            return False
+
+        self.reschedule()
+        self.scheduler.start()
+
+        return True
+
+    def run_forever(self) -> None:
+        """
+        Run jobs on the current thread, waiting for the program to close first if it is running them.
+        """
+        self.follow_settings_file = True
+
+        with self.lock:
+            self.settings.settings = self.settings.load_settings()
+            self.reschedule()
+            self.scheduler.run_forever()
+
+    @property
+    def archiver(self) -> ChangeArchiver:
+        return ChangeArchiver(
+            self.db_path,
+            os.path.join(self.settings.settings["backup"]["path"], "wal"),
+        )
+
+    def stop(self, wait: bool = False) -> None:
+        """
+        Stop running jobs. With wait, this waits for the running job to finish,
+        so nothing uses the database afterwards.
+        """
+        self.scheduler.stop(wait=wait)
+
+        if self.lock.is_locked:
+            if self.settings.settings["backup"]["continuous"] and self.rewrites_allowed:
+                # Ship the last changes so they can be restored before the program opens again
+                self.run_archive()
+
+            self.lock.release()
+
+    def reschedule(self, settings: "Settings | None" = None) -> None:
+        """
+        (Re)create every job from the settings. Call this after the settings change.
+        """
+        if settings is not None:
+            self.settings = settings
+
+        self.scheduler.budget = Budget(
+            cpu=self.config["cpuBudget"], io=self.config["ioBudget"]
+        )
+
+        last_run = self.config["lastRun"]
+        backup_settings = self.settings.settings["backup"]
+        last_backup = backup_settings["lastBackup"]
+
+        # The change log's triggers would be uploaded along with an FTP server's database
+        continuous = backup_settings["continuous"] and self.rewrites_allowed
+
+        if continuous:
+            if install_changelog(self.db_path):
+                # Archived changes can only be replayed onto a snapshot taken after archiving started
+                last_backup = None
+        else:
+            remove_changelog(self.db_path)
+
+        self._schedule(
+            "backup",
+            self.run_backup,
+            backup_settings["interval"]
+            if backup_settings["enabled"] or continuous
+            else None,
+            last_backup,
+            priority=0,
+        )
+        self._schedule(
+            "archive",
+            self.run_archive,
+            self.config["archiveInterval"] if continuous else None,
+            None,
+            priority=0,
+        )
+        self._schedule(
+            "integrity",
+            self.run_integrity_check,
+            self.config["integrityInterval"],
+            last_run.get("integrity"),
+            priority=5,
+        )
+        self._schedule(
+            "analyze",
+            self.run_analyze,
+            self.config["analyzeInterval"] if self.rewrites_allowed else None,
+            last_run.get("analyze"),
+            priority=10,
+        )
+        self._schedule(
+            "vacuum",
+            self.run_vacuum,
+            self.config["vacuumInterval"] if self.rewrites_allowed else None,
+            last_run.get("vacuum"),
+            priority=20,
+        )
+        self._schedule(
+            "export",
+            self.run_export,
+            self.config["exportInterval"] if self.config["exportPath"] else None,
+            last_run.get("export"),
+            priority=15,
+        )
+
+    def _schedule(
+        self,
+        name: str,
+        action: Callable[[], None],
+        interval: int | None,
+        last_run: str | None,
+        priority: int,
+    ) -> None:
+        if not interval:
+            self.scheduler.cancel(name)
+            return
+
+        if last_run is None:
+            due = time.time()
+        else:
+            due = dt.strptime(last_run, DATETIME_FORMAT).timestamp() + interval
+
+        self.scheduler.schedule(
+            name, self._wrap(name, action), interval=interval, at=due, priority=priority
+        )
+
+    def _wrap(self, name: str, action: Callable[[], None]) -> Callable[[], None]:
+        def run():
+            if self.follow_settings_file:
+                settings = self.settings.load_settings()
+
+                if settings != self.settings.settings:
+                    # The settings changed, so this job may not be wanted anymore
+                    self.settings.settings = settings
+                    self.reschedule()
+                    return
+
+            try:
+                action()
+            finally:
+                # Exports use Pony, which would keep this thread's connection open
+                self.db.disconnect()
+
+        return run
+
+    def _mark_run(self, name: str) -> None:
+        now = dt.now().strftime(DATETIME_FORMAT)
+
+        # Runs on the scheduler's thread, while the UI may be saving the settings too
+        with self.settings.lock:
+            if name == "backup":
+                self.settings.settings["backup"]["lastBackup"] = now
+            else:
+                self.config["lastRun"][name] = now
+
+            self.settings.save_settings()
+
+    def _connect(self) -> sqlite3.Connection:
+        # A long timeout, because maintenance can wait for the program to finish writing
+        return sqlite3.connect(self.db_path, timeout=60)
+
+    def run_backup(self) -> None:
+        path, counts = backup(
+            self.db_path,
+            self.settings.settings["backup"],
+            bytes_per_second=self.scheduler.budget.io,
+        )
+        self.logger.info(f"Backed up the database to {path}.")
+        self._mark_run("backup")
+
+        # Check the new backup as soon as nothing more important is due
+        self.scheduler.schedule(
+            "verify", lambda: self.run_verify(path, counts), priority=25
+        )
+
+    def run_verify(self, path: str, counts: dict[str, int] | None) -> None:
+        problems = verify_backup(
+            path, counts, time_limit=self.config["verifyTimeLimit"]
+        )
+
+        if problems is None:
+            self.logger.warning(
+                f"Verifying {path} ran out of time and will be retried in an hour."
+            )
+            self.scheduler.schedule(
+                "verify", lambda: self.run_verify(path, counts), delay=3600, priority=25
+            )
+            return
+
+        if problems:
+            self.logger.error(f"The backup {path} is damaged:\n" + "\n".join(problems))
+            return
+
+        self.logger.info(f"Verified the backup {path}.")
+
+        with self.settings.lock:
+            self.settings.settings["backup"]["lastVerified"] = path
+            self.settings.save_settings()
+
+    def run_archive(self) -> None:
+        batch = self.archiver.ship()
+
+        if batch is not None:
+            self.logger.info(f"Archived changes to {batch}.")
+
+    def run_analyze(self) -> None:
+        connection = self._connect()
+
+        try:
+            # Only sample each index, so ANALYZE stays quick on big databases
+            connection.execute("PRAGMA analysis_limit = 1000")
+            connection.execute("ANALYZE")
+            connection.commit()
+        finally:
+            connection.close()
+
+        self._mark_run("analyze")
+
+    def run_vacuum(self) -> None:
+        connection = self._connect()
+
+        try:
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+
+        self._mark_run("vacuum")
+
+    def run_integrity_check(self) -> None:
+        connection = self._connect()
+        deadline = time.monotonic() + self.config["integrityTimeLimit"]
+
+        # Returning a truthy value from the progress handler interrupts the check
+        connection.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+
+        try:
+            result = [row[0] for row in connection.execute("PRAGMA quick_check")]
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                self.logger.warning(
+                    "The integrity check ran out of time and will be retried next time."
+                )
+            else:
+                self.logger.error(f"The integrity check could not run: {e}")
+
+            return
+        except sqlite3.DatabaseError as e:
+            # Raised when the file is too damaged to be read as a database
+            result = [str(e)]
+        finally:
+            connection.close()
+
+        if result != ["ok"]:
+            self.logger.error(
+                "The database failed its integrity check:\n" + "\n".join(result)
+            )
+
+        self._mark_run("integrity")
+
+    def run_export(self) -> None:
+        export_path = self.config["exportPath"]
+
+        if not os.path.exists(export_path):
+            os.makedirs(export_path)
+
+        export_records(
+            self.db,
+            self.config["exportFormat"],
+            export_path,
+            "scheduled_" + dt.now().strftime("%Y-%m-%d_%H-%M"),
+            orgs=True,
+            contacts=True,
+            resources=True,
+        )
+        self._mark_run("export")
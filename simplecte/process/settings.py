@@ -1,7 +1,8 @@
+import copy
 import json
 import os
+import threading
 from utils.enums import BackupInterval
-import subprocess
 from filelock import FileLock
 import pylnk3
 
@@ -9,10 +10,17 @@ __all__ = ("Settings",)
 
 
 class Settings:
+    # Held while the settings are changed or saved, since the maintenance scheduler's
+    # thread saves them too. Shared by every copy, because they're all the same file.
+    lock = threading.RLock()
+
     template = {
         "theme": "dark",
         "database": {
             "path": str(os.path.abspath("simplecte/data/db.db")),
+            "server": None,  # The address of a SimpleCTE server to use instead of the file
+            "serverPort": 8765,
+            "serverToken": None,
         },
         "backup": {
             "interval": 86400,  # Seconds between backups
@@ -20,8 +28,31 @@ class Settings:
             "name": "{dbName}_{date}",
             "date": "%m-%d-%Y",
             "lastBackup": None,
+            "lastVerified": None,  # The newest backup known to be intact
             "enabled": False,
-            "processId": None,
+            "incremental": False,  # Store backups as deduplicated snapshots
+            "continuous": False,  # Archive every change for point-in-time restores
+            "retention": {"hourly": 24, "daily": 7, "weekly": 4},
+        },
+        "search": {
+            "fuzzyDistance": 2,  # Most typos a word can have in a fuzzy name search
+        },
+        "debug": {
+            "slowQueryMs": 250,  # Statements slower than this are kept in the slow query log
+        },
+        "maintenance": {
+            "cpuBudget": 0.25,  # Fraction of the time maintenance jobs may run
+            "ioBudget": 8388608,  # Bytes per second backups may read
+            "analyzeInterval": 86400,
+            "vacuumInterval": 604800,
+            "integrityInterval": 86400,
+            "integrityTimeLimit": 30,  # Seconds before an integrity check gives up
+            "archiveInterval": 60,  # Seconds between shipping archived changes
+            "verifyTimeLimit": 120,  # Seconds before verifying a backup gives up
+            "exportInterval": None,
+            "exportPath": None,
+            "exportFormat": "CSV",
+            "lastRun": {},
         },
     }
 
@@ -53,18 +84,35 @@ class Settings:
                     with open(self.settings_path, "r") as settings_file:
                         settings = json.load(settings_file)
 
-                    return settings
+                    # Settings files from older versions may be missing newer keys
+                    return self.fill_defaults(settings)
                 except:
                     pass
 
             # Create the directory relative to the top-level of this project
             os.makedirs(os.path.dirname(self.settings_path), exist_ok=True)
 
-        settings = self.save_settings(self.template)
+        settings = self.save_settings(copy.deepcopy(self.template))
         self.first_time = True
 
         return settings
 
+    def fill_defaults(self, settings: dict) -> dict:
+        """
+        Verify that all the required keys are in the settings.
+        If not, create them. Defaults are copied, so changing them never changes the template.
+        """
+        for key, value in self.template.items():
+            if key not in settings:
+                settings[key] = copy.deepcopy(value)
+
+            if isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    if sub_key not in settings[key]:
+                        settings[key][sub_key] = copy.deepcopy(sub_value)
+
+        return settings
+
     def save_settings(self, settings: "dict | Settings | None" = None) -> dict:
         """
         Save the settings to the settings file.
@@ -75,22 +123,14 @@ class Settings:
         elif isinstance(settings, Settings):
             settings = settings.settings
 
-        # Verify that all the required keys are in the settings to save.
-        # If not, create them.
-        for key, value in self.template.items():
-            if key not in settings:
-                settings[key] = value
+        with self.lock:
+            self.fill_defaults(settings)
 
-            if isinstance(value, dict):
-                for sub_key, sub_value in value.items():
-                    if sub_key not in settings[key]:
-                        settings[key][sub_key] = sub_value
-
-        # Use a lock because this file can also be accessed by the backup process
-        lock = FileLock("settings.lock")
-        with lock:
-            with open(self.settings_path, "w") as settings_file:
-                json.dump(settings, settings_file, indent=4)
+            # Use a lock because this file can also be accessed by the maintenance daemon
+            lock = FileLock("settings.lock")
+            with lock:
+                with open(self.settings_path, "w") as settings_file:
+                    json.dump(settings, settings_file, indent=4)
 
         return settings
 
@@ -100,39 +140,22 @@ class Settings:
         """
         return Settings(self.settings_path)
 
-    def spawn_backup_process(self) -> None:
-        # We don't want to bother starting the process if the user doesn't have backups enabled
-        # This should be handled *before* this method is called, but it's always nice to check twice
-        if not self.backup_enabled:
-            return
-
-        def spawn_and_save():
-            process = subprocess.Popen(
-                ["python", "simplecte/utils/backup.py"],
-                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP,
-            )
-            self.settings["backup"]["processId"] = process.pid
-
-        # Make sure the backup process is running so we are able to backup
-        if self.backup_processId is None:
-            spawn_and_save()
-        else:
-            try:
-                os.kill(self.backup_processId, 0)
-            except (OSError, SystemError):
-                spawn_and_save()
-
-        # Now our process must surely be running
-
+    @staticmethod
     def backup_on_startup():
+        """
+        Start the maintenance daemon, which runs backups, when Windows starts.
+        """
         startup_folder = os.path.expanduser(
             r"~\AppData\Roaming\Microsoft\Windows\Start Menu\Programs\Startup"
         )
         shortcut_path = os.path.join(startup_folder, "simplecte-backup.lnk")
 
-        lnk = pylnk3.LNK()
-        lnk.target = os.path.abspath("simplcte/utils/backup.py")
-        lnk.save(shortcut_path)
+        pylnk3.for_file(
+            os.path.abspath("simplecte/main.py"),
+            shortcut_path,
+            arguments="--daemon",
+            work_dir=os.path.abspath("."),
+        )
 
     def __getattr__(self, name: str) -> str | int | None:
         parts = name.split("_")
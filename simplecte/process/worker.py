@@ -0,0 +1,234 @@
+import itertools
+import logging
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import Context, copy_context
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable
+
+import PySimpleGUI as sg
+from pony import orm
+
+from database.queries import QueryCounter
+
+if TYPE_CHECKING:
+    from database import Database
+
+__all__ = ("DatabaseWorker", "WORKER_EVENT")
+
+# The event the main loop receives when a request has finished
+WORKER_EVENT = "-DB_RESULT-"
+
+# Shared by every worker, so the events of a stopped worker that are still waiting in
+# the window's queue never match a request of the worker that replaced it
+_request_ids = itertools.count()
+
+
+@dataclass
+class Request:
+    id: int
+    action: Callable[..., Any]
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    # Set for requests made with call(), which wait for the result instead of an event
+    future: Future | None = None
+    # For call(), the context it was made in, so its statements count toward the query
+    # counters of the caller, which is still waiting. Submitted requests usually run after
+    # their caller's counters have ended, so only the request's own counter checks them.
+    context: Context = field(default_factory=Context)
+
+
+class DatabaseWorker:
+    """
+    Runs database requests on a background thread, so a slow query never freezes the window.
+    The thread has its own Pony session and connection. Requests run one at a time in the
+    order they were submitted, so a change is always saved before the request that reloads it.
+    Read-only requests, like searches and exports, run beside them on reader threads
+    using the database's read pool.
+    Results come back to the UI thread through window.write_event_value(), where the
+    main loop passes them to dispatch() and the request's callback runs.
+    """
+
+    def __init__(self, window: sg.Window, db: "Database", readers: int = 2):
+        self.logger = logging.getLogger("worker")
+        self.window = window
+        self.db = db
+        self._requests: queue.Queue[Request | None] = queue.Queue()
+        self._reader_count = readers
+        self._readers = ThreadPoolExecutor(readers, thread_name_prefix="db-reader")
+
+        # How many requests were submitted and how many have finished
+        self._submitted = 0
+        self._finished = 0
+        self._progress = threading.Condition()
+
+        # Callbacks are only touched on the UI thread
+        self._callbacks: dict[int, tuple[Callable | None, Callable | None]] = {}
+        self._thread = threading.Thread(target=self._run, name="db-worker", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        action: Callable[..., Any],
+        *args,
+        callback: Callable[[Any], None] | None = None,
+        error: Callable[[Exception], None] | None = None,
+        **kwargs,
+    ) -> int:
+        """
+        Run action(*args, **kwargs) on the worker thread. callback receives what it returns,
+        and error receives the exception if it raises. Both run on the UI thread.
+        Without an error callback, the error is shown to the user.
+        """
+        request = Request(next(_request_ids), action, args, kwargs)
+        self._callbacks[request.id] = (callback, error)
+
+        with self._progress:
+            self._submitted += 1
+
+        self._requests.put(request)
+
+        return request.id
+
+    def submit_read(
+        self,
+        action: Callable[..., Any],
+        *args,
+        callback: Callable[[Any], None] | None = None,
+        error: Callable[[Exception], None] | None = None,
+        **kwargs,
+    ) -> int:
+        """
+        Like submit(), but for actions that only read, through the database's read pool.
+        They run on a reader thread without waiting for later requests, but only start
+        once every request submitted before them has finished, so they see those changes.
+        """
+        request = Request(next(_request_ids), action, args, kwargs)
+        self._callbacks[request.id] = (callback, error)
+        self._readers.submit(self._read, request, self._submitted)
+
+        return request.id
+
+    def call(
+        self, action: Callable[..., Any], *args, read: bool = False, **kwargs
+    ) -> Any:
+        """
+        Run action(*args, **kwargs) like submit(), or like submit_read() if read is True,
+        and wait for what it returns, raising its exception if it raises. For threads other
+        than the UI thread, such as a modal window's long operations, which can't receive
+        the main window's events. Calling it on the UI thread freezes the window.
+        """
+        request = Request(
+            next(_request_ids), action, args, kwargs, Future(), copy_context()
+        )
+
+        with self._progress:
+            if read:
+                self._readers.submit(self._read, request, self._submitted)
+            else:
+                self._submitted += 1
+                self._requests.put(request)
+
+        return request.future.result()
+
+    @property
+    def busy(self) -> bool:
+        """
+        Whether any request submitted with submit() hasn't finished yet.
+        """
+        return self._finished < self._submitted
+
+    def dispatch(self, result: tuple[int, Any, Exception | None]) -> None:
+        """
+        Run the callback of a finished request. Called by the main loop for WORKER_EVENT.
+        Results of requests this worker didn't submit, such as those of a worker that was
+        stopped, are ignored.
+        """
+        request_id, value, exception = result
+
+        if request_id not in self._callbacks:
+            return
+
+        callback, error = self._callbacks.pop(request_id)
+
+        if exception is None:
+            if callback is not None:
+                callback(value)
+
+        elif error is not None:
+            error(exception)
+
+        else:
+            sg.popup(f"Database error: {exception}", title="Error")
+
+    def stop(self) -> None:
+        """
+        Finish the requests already submitted, then stop the threads and close
+        their connections. Their callbacks are dropped, since the window may be closing.
+        """
+        self._requests.put(None)
+        self._thread.join()
+
+        # Each reader waits for the others, so every reader thread disconnects once
+        barrier = threading.Barrier(self._reader_count)
+
+        def disconnect():
+            barrier.wait()
+            self.db.disconnect()
+
+        for _ in range(self._reader_count):
+            self._readers.submit(disconnect)
+
+        self._readers.shutdown()
+        self._callbacks.clear()
+
+    def _perform(self, request: Request) -> Any:
+        name = getattr(request.action, "__qualname__", request.action)
+
+        # Counted outside the session, so the statements of its commit are included
+        with QueryCounter(f"Request {name}"):
+            with orm.db_session:
+                return request.action(*request.args, **request.kwargs)
+
+    def _execute(self, request: Request) -> None:
+        value = exception = None
+
+        try:
+            value = request.context.run(self._perform, request)
+        except Exception as e:
+            self.logger.exception(
+                f"Request {getattr(request.action, '__name__', request.action)} failed"
+            )
+            exception = e
+
+        if request.future is not None:
+            if exception is None:
+                request.future.set_result(value)
+            else:
+                request.future.set_exception(exception)
+
+            return
+
+        try:
+            self.window.write_event_value(WORKER_EVENT, (request.id, value, exception))
+        except Exception:
+            # The window was closed while the request was running
+            pass
+
+    def _read(self, request: Request, after: int) -> None:
+        with self._progress:
+            self._progress.wait_for(lambda: self._finished >= after)
+
+        self._execute(request)
+
+    def _run(self) -> None:
+        while (request := self._requests.get()) is not None:
+            self._execute(request)
+
+            with self._progress:
+                self._finished += 1
+                self._progress.notify_all()
+
+        # Pony keeps one connection per thread, and it must not outlive the worker
+        self.db.disconnect()
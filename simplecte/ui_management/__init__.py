@@ -4,3 +4,7 @@ from .backup import *
 from .export import *
 from .add_record import *
 from .help_manager import *
+from .dedupe import *
+from .related import *
+from .stats import *
+from .slow_queries import *
@@ -3,6 +3,7 @@ from typing import TYPE_CHECKING
 from layouts import get_create_contact_layout, get_create_org_layout
 from ui_management import swap_to_contact_viewer, swap_to_org_viewer
 from utils.enums import Screen
+from utils.helpers import split_phone
 
 if TYPE_CHECKING:
     from process.app import App
@@ -31,11 +32,13 @@ def add_record_handler(app: "App"):
                 continue
 
             elif values["-PHONE_NUMBER-"]:
+                # The number is saved as it was typed, which keeps leading zeros and extensions
                 try:
-                    values["-PHONE_NUMBER-"] = int(values["-PHONE_NUMBER-"])
+                    split_phone(values["-PHONE_NUMBER-"])
                 except ValueError:
                     sg.popup(
-                        "Invalid phone number! Phone number must be a continuous string of numbers.",
+                        "Invalid phone number! Phone number must be a string of numbers, optionally "
+                        "separated by dashes or parentheses and followed by an extension, such as x123.",
                         title="Invalid phone number.",
                     )
                     continue
@@ -43,9 +46,11 @@ def add_record_handler(app: "App"):
             break
 
         db_values = {k.lower().replace("-", ""): v for k, v in values.items() if v}
-        contact = app.db.create_contact(**db_values)
-
-        swap_to_contact_viewer(app, contact=contact)
+        app.worker.submit(
+            app.db.create_contact,
+            **db_values,
+            callback=lambda contact: swap_to_contact_viewer(app, contact=contact),
+        )
         window.close()
 
     elif app.current_screen in [Screen.ORG_SEARCH, Screen.ORG_VIEW]:
@@ -68,11 +73,13 @@ def add_record_handler(app: "App"):
                 continue
 
             elif values["-PHONE_NUMBER-"]:
+                # The number is saved as it was typed, which keeps leading zeros and extensions
                 try:
-                    values["-PHONE_NUMBER-"] = int(values["-PHONE_NUMBER-"])
+                    split_phone(values["-PHONE_NUMBER-"])
                 except ValueError:
                     sg.popup(
-                        "Invalid phone number! Phone number must be a continuous string of numbers.",
+                        "Invalid phone number! Phone number must be a string of numbers, optionally "
+                        "separated by dashes or parentheses and followed by an extension, such as x123.",
                         title="Invalid phone number.",
                     )
                     continue
@@ -80,9 +87,11 @@ def add_record_handler(app: "App"):
             break
 
         db_values = {k.lower().replace("-", ""): v for k, v in values.items() if v}
-        organization = app.db.create_organization(**db_values)
-
-        swap_to_org_viewer(app, org=organization)
+        app.worker.submit(
+            app.db.create_organization,
+            **db_values,
+            callback=lambda organization: swap_to_org_viewer(app, org=organization),
+        )
         window.close()
 
     else:
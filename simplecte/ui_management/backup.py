@@ -1,7 +1,8 @@
 from layouts import get_backup_layout
-import shutil
 import os
+import sqlite3
 from process.events.debug import handle_debug
+from utils.backup import hot_backup, verify_backup
 
 import PySimpleGUI as sg
 from typing import TYPE_CHECKING
@@ -9,7 +10,7 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from simplecte.process import App
 
-__all__ = ("backup_handler",)
+__all__ = ("backup_handler", "restore_handler")
 
 
 def backup_handler(app: "App"):
@@ -26,6 +27,11 @@ def backup_handler(app: "App"):
             handle_debug(event)
 
         match event:
+            case "-BACKUP_RESTORE-":
+                if restore_handler(app):
+                    window.close()
+                    break
+
             case "-BACKUP_BACKUP-":
                 # Check if the backup name violates Windows' file naming rules
                 if any(c in values["-BACKUP_NAME-"] for c in '\\/:*?"<>|'):
@@ -44,9 +50,72 @@ def backup_handler(app: "App"):
                     continue
 
                 window.close()
+
+                def show_progress(copied: int, total: int):
+                    sg.one_line_progress_meter(
+                        "Backing up...",
+                        copied,
+                        total,
+                        "Copying database pages",
+                        key="-BACKUP_PROGRESS-",
+                        orientation="h",
+                        no_button=True,
+                    )
+
                 # back up the file
-                shutil.copy(
-                    app.settings.database_path,
-                    values["-BACKUP_PATH-"] + "/" + values["-BACKUP_NAME-"] + ".db",
-                )
+                try:
+                    hot_backup(
+                        app.settings.absolute_database_path,
+                        values["-BACKUP_PATH-"] + "/" + values["-BACKUP_NAME-"] + ".db",
+                        progress=show_progress,
+                    )
+                except (OSError, sqlite3.Error) as e:
+                    sg.one_line_progress_meter_cancel(key="-BACKUP_PROGRESS-")
+                    sg.popup(f"The backup failed: {e}", title="Error")
+
                 break
+
+
+def restore_handler(app: "App") -> bool:
+    """
+    Ask for a backup, check that it is intact, and swap it in for the current database.
+    Returns True if a backup was restored.
+    """
+    backup_path = sg.popup_get_file(
+        "Choose a backup file, or a snapshot from a backup store's snapshots folder.",
+        title="Restore a Backup",
+        default_path=app.settings.settings["backup"]["lastVerified"] or "",
+        file_types=(("Backups", "*.db *.json"), ("All Files", "*.*")),
+    )
+
+    if not backup_path:
+        return False
+
+    sg.popup_quick_message("Checking the backup...", auto_close_duration=1)
+    problems = verify_backup(backup_path)
+
+    if problems:
+        sg.popup(
+            "This backup is damaged and cannot be restored:\n" + "\n".join(problems),
+            title="Error",
+        )
+        return False
+
+    if (
+        sg.popup_yes_no(
+            "Restoring this backup will replace everything in the current database. "
+            "Are you sure you want to continue?",
+            title="Restore",
+        )
+        != "Yes"
+    ):
+        return False
+
+    try:
+        app.restore_backup(backup_path)
+    except (OSError, ValueError) as e:
+        sg.popup(f"The restore failed: {e}", title="Error")
+        return False
+
+    sg.popup("The backup was restored.", title="Restore")
+    return True
@@ -0,0 +1,161 @@
+from typing import TYPE_CHECKING
+
+import PySimpleGUI as sg
+
+from database.dedupe import Cluster, find_duplicates
+from layouts import get_dedupe_layout
+from process.events.debug import handle_debug
+from utils.enums import Screen
+from utils.helpers import attempt
+
+if TYPE_CHECKING:
+    from process.app import App
+
+__all__ = ("dedupe_handler",)
+
+# Events the long operations send back to the window when they're done
+FOUND_EVENT = "-DEDUPE_FOUND-"
+MERGED_EVENT = "-DEDUPE_MERGED-"
+
+
+def _cluster_rows(clusters: list[Cluster]) -> list[list]:
+    return [
+        [
+            number,
+            ", ".join(record["name"] for record in cluster.records),
+            f"{cluster.score:.0%}",
+            ", ".join(sorted(cluster.reasons)),
+        ]
+        for number, cluster in enumerate(clusters, start=1)
+    ]
+
+
+def _record_rows(cluster: Cluster) -> list[list]:
+    return [
+        [record["id"], record["name"], ", ".join(record["emails"])]
+        for record in cluster.records
+    ]
+
+
+def dedupe_handler(app: "App"):
+    record_type = (
+        "Organizations" if app.current_screen == Screen.ORG_SEARCH else "Contacts"
+    )
+    window = sg.Window(
+        "Find Duplicates", get_dedupe_layout(record_type), finalize=True, modal=True
+    )
+    clusters: list[Cluster] = []
+    selected: Cluster | None = None
+    merged = False
+
+    def find(values: dict):
+        nonlocal record_type
+
+        record_type = values["-DEDUPE_TYPE-"]
+        threshold = values["-DEDUPE_THRESHOLD-"] / 100
+        window["-DEDUPE_STATUS-"].update("Searching...")
+        window["-DEDUPE_FIND-"].update(disabled=True)
+
+        # Searching reads everything, so it runs on a reader while the window stays open
+        window.perform_long_operation(
+            lambda: attempt(
+                app.worker.call,
+                find_duplicates,
+                app.db,
+                record_type[:-1].lower(),
+                threshold,
+                read=True,
+            ),
+            FOUND_EVENT,
+        )
+
+    while True:
+        event, values = window.read()
+
+        if event == sg.WIN_CLOSED or event == "-DEDUPE_CLOSE-":
+            window.close()
+            break
+
+        if event.find("CODE") != -1:
+            handle_debug(event)
+
+        match event:
+            case "-DEDUPE_FIND-":
+                find(values)
+
+            case "-DEDUPE_CLUSTERS-":
+                if not values["-DEDUPE_CLUSTERS-"]:
+                    continue
+
+                selected = clusters[values["-DEDUPE_CLUSTERS-"][0]]
+                window["-DEDUPE_RECORDS-"].update(
+                    _record_rows(selected), select_rows=[0]
+                )
+
+            case "-DEDUPE_MERGE-":
+                if selected is None or not values["-DEDUPE_RECORDS-"]:
+                    sg.popup("Select a group and the record to keep first.")
+                    continue
+
+                keep = selected.ids[values["-DEDUPE_RECORDS-"][0]]
+                duplicates = [i for i in selected.ids if i != keep]
+
+                if (
+                    sg.popup_yes_no(
+                        f"Merge {len(duplicates)} record(s) into ID {keep}? "
+                        "The other records will be deleted, and this cannot be undone.",
+                        title="Merge",
+                    )
+                    != "Yes"
+                ):
+                    continue
+
+                merge = (
+                    app.db.merge_organizations
+                    if record_type == "Organizations"
+                    else app.db.merge_contacts
+                )
+                window["-DEDUPE_STATUS-"].update("Merging...")
+                window["-DEDUPE_MERGE-"].update(disabled=True)
+
+                # Merging goes through the database worker, in order with other changes
+                window.perform_long_operation(
+                    lambda: attempt(app.worker.call, merge, keep, duplicates),
+                    MERGED_EVENT,
+                )
+
+            case "-DEDUPE_FOUND-":
+                found, error = values[event]
+                window["-DEDUPE_FIND-"].update(disabled=False)
+
+                if error is not None:
+                    window["-DEDUPE_STATUS-"].update("")
+                    sg.popup(f"Finding duplicates failed: {error}", title="Error")
+                    continue
+
+                clusters, selected = found, None
+                window["-DEDUPE_CLUSTERS-"].update(_cluster_rows(clusters))
+                window["-DEDUPE_RECORDS-"].update([])
+                window["-DEDUPE_STATUS-"].update(
+                    f"Found {len(clusters)} group(s) of duplicate {record_type.lower()}."
+                )
+
+            case "-DEDUPE_MERGED-":
+                _, error = values[event]
+                window["-DEDUPE_MERGE-"].update(disabled=False)
+
+                if error is not None:
+                    window["-DEDUPE_STATUS-"].update("")
+                    sg.popup(f"Merging failed: {error}", title="Error")
+                    continue
+
+                for record_id in selected.ids:
+                    if record_id != keep:
+                        app.stack.search_and_pop(record_id)
+
+                merged = True
+                find(values)
+
+    # Show the merged records in the search table
+    if merged:
+        app.lazy_load_table_values()
@@ -1,71 +1,274 @@
 import os
-from typing import TYPE_CHECKING
+from functools import partial
+from typing import TYPE_CHECKING, Callable
 
 import PySimpleGUI as sg
 import pandas as pd
 from pony import orm
 
+from database.readpool import read_records
 from layouts import get_export_layout, available_export_formats
 
 if TYPE_CHECKING:
     from process.app import App
-    from database.database import Organization, Contact
-
-__all__ = ("export_handler",)
-
-
-def _get_org_data(org: "Organization") -> list:
+    from database.database import Database
+
+__all__ = ("export_handler", "export_records")
+
+ORG_COLUMNS = [
+    "ID",
+    "Name",
+    "Type",
+    "Status",
+    "Addresses",
+    "Phones",
+    "Custom Fields",
+    "Contacts",
+    "Resources",
+]
+
+CONTACT_COLUMNS = [
+    "ID",
+    "First Name",
+    "Last Name",
+    "Addresses",
+    "Phone Numbers",
+    "Emails",
+    "Availability",
+    "Status",
+    "Contact Info",
+    "Custom Fields",
+    "Org Titles",
+    "Resources",
+    "Organizations",
+]
+
+RESOURCE_COLUMNS = ["ID", "Name", "Value", "Contacts", "Organizations"]
+
+
+def _get_org_data(org: dict) -> list:
     org_data = [
-        org.id,
-        org.name,
-        org.type,
-        org.status,
-        ", ".join(org.addresses),
-        ", ".join([str(p) for p in org.phones]),
+        org["id"],
+        org["name"],
+        org["type"],
+        org["status"],
+        ", ".join(org["addresses"]),
+        ", ".join([str(p) for p in org["phones"]]),
         "\n".join(
             f"{field_name}: {field_value}\n"
-            for field_name, field_value in org.custom_fields.items()
+            for field_name, field_value in org["custom_fields"].items()
         ),
-        ", ".join([str(c.id) for c in org.contacts]),
-        ", ".join(str(r.id) for r in org.resources),
+        ", ".join([str(c) for c in org["contacts"]]),
+        ", ".join(str(r) for r in org["resources"]),
     ]
 
     return org_data
 
 
-def _get_contact_data(contact: "Contact") -> list:
+def _get_contact_data(contact: dict) -> list:
     contact_data = [
-        contact.id,
-        contact.first_name,
-        contact.last_name,
-        ", ".join(contact.addresses),
-        ", ".join([str(p) for p in contact.phone_numbers]),
-        ", ".join(contact.emails),
-        contact.availability,
-        contact.status,
+        contact["id"],
+        contact["first_name"],
+        contact["last_name"],
+        ", ".join(contact["addresses"]),
+        ", ".join([str(p) for p in contact["phone_numbers"]]),
+        ", ".join(contact["emails"]),
+        contact["availability"],
+        contact["status"],
         "\n".join(
             [
                 f"{field_name}: {field_value}"
-                for field_name, field_value in contact.contact_info.items()
+                for field_name, field_value in contact["contact_info"].items()
             ]
         ),
         "\n".join(
             f"{field_name}: {field_value}\n"
-            for field_name, field_value in contact.custom_fields.items()
+            for field_name, field_value in contact["custom_fields"].items()
         ),
         "\n".join(
             [
                 f"{field_name}: {field_value}"
-                for field_name, field_value in contact.org_titles.items()
+                for field_name, field_value in contact["org_titles"].items()
             ]
         ),
-        ", ".join(str(r.id) for r in contact.resources),
-        ", ".join(str(o.id) for o in contact.organizations),
+        ", ".join(str(r) for r in contact["resources"]),
+        ", ".join(str(o) for o in contact["organizations"]),
     ]
 
     return contact_data
 
 
+def _get_resource_data(resource: dict) -> list:
+    return [
+        resource["id"],
+        resource["name"],
+        resource["value"],
+        ", ".join([str(c) for c in resource["contacts"]]),
+        ", ".join([str(o) for o in resource["organizations"]]),
+    ]
+
+
+def _read_entities(
+    db: "Database",
+    record_type: str,
+    search_info: dict | None = None,
+    ids: list[int] | None = None,
+) -> list[dict]:
+    """
+    Read records through Pony in the same shape as readpool.read_records(),
+    for databases that have no read pool.
+    """
+    if ids is None:
+        records = db.get_records(record_type, paginated=False, **(search_info or {}))
+    else:
+        get = {
+            "organization": db.get_organization,
+            "contact": db.get_contact,
+            "resource": db.get_resource,
+        }[record_type]
+        records = [get(record_id) for record_id in ids]
+
+    rows = []
+
+    for record in records:
+        row = record.to_dict(with_collections=True)
+
+        for key in ("addresses", "phones", "phone_numbers", "emails"):
+            if key in row:
+                row[key] = list(row[key] or [])
+
+        for key in ("custom_fields", "contact_info", "org_titles"):
+            if key in row:
+                row[key] = row[key] or {}
+
+        rows.append(row)
+
+    return rows
+
+
+def export_records(
+    db: "Database",
+    export_format: str,
+    export_path: str,
+    export_name: str,
+    orgs: bool = False,
+    contacts: bool = False,
+    resources: bool = False,
+    org_search_info: dict | None = None,
+    contact_search_info: dict | None = None,
+    org_id: int | None = None,
+    contact_id: int | None = None,
+) -> None:
+    """
+    Export records to files in export_path without any UI, so exports
+    can also be run by the maintenance scheduler.
+    Everything is read from one snapshot of the database, so the files agree with
+    each other even if records are edited while the export runs.
+    """
+    if db.read_pool is not None:
+        with db.read_pool.snapshot() as connection:
+            export_items = _collect(
+                partial(read_records, connection, name_index=db.name_index),
+                orgs,
+                contacts,
+                resources,
+                org_search_info,
+                contact_search_info,
+                org_id,
+                contact_id,
+            )
+
+    else:
+        with orm.db_session:
+            export_items = _collect(
+                partial(_read_entities, db),
+                orgs,
+                contacts,
+                resources,
+                org_search_info,
+                contact_search_info,
+                org_id,
+                contact_id,
+            )
+
+    _write(export_items, export_format, export_path, export_name)
+
+
+def _collect(
+    read: Callable[..., list[dict]],
+    orgs: bool,
+    contacts: bool,
+    resources: bool,
+    org_search_info: dict | None,
+    contact_search_info: dict | None,
+    org_id: int | None,
+    contact_id: int | None,
+) -> list[tuple[pd.DataFrame, str]]:
+    export_items = []
+
+    if orgs:
+        org_data = [_get_org_data(org) for org in read("organization", org_search_info)]
+
+        export_items.append((pd.DataFrame(org_data, columns=ORG_COLUMNS), "orgs"))
+
+    if contacts:
+        contact_data = [
+            _get_contact_data(contact)
+            for contact in read("contact", contact_search_info)
+        ]
+
+        export_items.append(
+            (pd.DataFrame(contact_data, columns=CONTACT_COLUMNS), "contacts")
+        )
+
+    if resources:
+        resource_data = [_get_resource_data(resource) for resource in read("resource")]
+
+        export_items.append(
+            (pd.DataFrame(resource_data, columns=RESOURCE_COLUMNS), "resources")
+        )
+
+    if org_id:
+        org = [_get_org_data(org) for org in read("organization", ids=[org_id])]
+        export_items.append((pd.DataFrame(org, columns=ORG_COLUMNS), "orgs"))
+
+    if contact_id:
+        contact = [
+            _get_contact_data(contact) for contact in read("contact", ids=[contact_id])
+        ]
+        export_items.append(
+            (pd.DataFrame(contact, columns=CONTACT_COLUMNS), "contacts")
+        )
+
+    return export_items
+
+
+def _write(
+    export_items: list[tuple[pd.DataFrame, str]],
+    export_format: str,
+    export_path: str,
+    export_name: str,
+) -> None:
+    for df in export_items:
+        if export_format == "CSV":
+            df[0].to_csv(f"{export_path}/{export_name}_{df[1]}.csv", index=False)
+
+        elif export_format == "JSON":
+            df[0].to_json(f"{export_path}/{export_name}_{df[1]}.json", index=False)
+
+        elif export_format == "Markdown":
+            df[0].to_markdown(f"{export_path}/{export_name}_{df[1]}.md", index=False)
+
+        elif export_format == "Excel":
+            df[0].to_excel(f"{export_path}/{export_name}_{df[1]}.xlsx", index=False)
+
+        elif export_format == "HTML":
+            df[0].to_html(f"{export_path}/{export_name}_{df[1]}.html", index=False)
+
+        elif export_format == "Plaintext":
+            df[0].to_string(f"{export_path}/{export_name}_{df[1]}.txt", index=False)
+
+
 def update_info(info: dict, window: sg.Window, type: str):
     window[f"-EXPORT_FILTER_TYPE_{type}-"].update(value=info["field"])
     window[f"-EXPORT_SEARCH_QUERY_{type}-"].update(info["query"])
@@ -131,7 +334,6 @@ def export_handler(
             export_orgs = values["-EXPORT_ORGS-"]
             export_contacts = values["-EXPORT_CONTACTS-"]
             export_resources = values["-EXPORT_RESOURCES-"]
-            export_items = []
 
             if not export_contacts and not export_orgs:
                 sg.popup("You must select a type of record to export.")
@@ -159,155 +361,32 @@ def export_handler(
                 "Exporting...", [[sg.Text("Exporting...")]], finalize=True, modal=True
             )
 
-            if export_orgs:
-                orgs = app.db.get_records(
-                    "Organization",
-                    paginated=False,
-                    **org_search_info,
-                )
-                org_data = [_get_org_data(org) for org in orgs]
-
-                org_df = pd.DataFrame(
-                    org_data,
-                    columns=[
-                        "ID",
-                        "Name",
-                        "Type",
-                        "Status",
-                        "Addresses",
-                        "Phones",
-                        "Custom Fields",
-                        "Contacts",
-                        "Resources",
-                    ],
-                )
-                export_items.append((org_df, "orgs"))
-
-            if export_contacts:
-                contacts = app.db.get_records(
-                    "Contact",
-                    paginated=False,
-                    **contact_search_info,
-                )
-                contact_data = [_get_contact_data(contact) for contact in contacts]
-
-                contact_df = pd.DataFrame(
-                    contact_data,
-                    columns=[
-                        "ID",
-                        "First Name",
-                        "Last Name",
-                        "Addresses",
-                        "Phone Numbers",
-                        "Emails",
-                        "Availability",
-                        "Status",
-                        "Contact Info",
-                        "Custom Fields",
-                        "Org Titles",
-                        "Resources",
-                        "Organizations",
-                    ],
-                )
-                export_items.append((contact_df, "contacts"))
-
-            if export_resources:
-                resources = app.db.get_records(
-                    "Resource",
-                    paginated=False,
-                )
-                resource_data = [
-                    [
-                        resource.id,
-                        resource.name,
-                        resource.value,
-                        ", ".join([str(c.id) for c in resource.contacts]),
-                        ", ".join([str(o.id) for o in resource.organizations]),
-                    ]
-                    for resource in resources
-                ]
-
-                resource_df = pd.DataFrame(
-                    resource_data,
-                    columns=["ID", "Name", "Value", "Contacts", "Organizations"],
-                )
-                export_items.append((resource_df, "resources"))
-
-            if org_id:
-                org = _get_org_data(app.db.get_organization(org_id))
-                org_df = pd.DataFrame(
-                    [org],
-                    columns=[
-                        "ID",
-                        "Name",
-                        "Type",
-                        "Status",
-                        "Addresses",
-                        "Phones",
-                        "Custom Fields",
-                        "Contacts",
-                        "Resources",
-                    ],
-                )
-
-                export_items.append((org_df, "orgs"))
-
-            if contact_id:
-                contact = _get_contact_data(app.db.get_contact(contact_id))
-                contact_df = pd.DataFrame(
-                    [contact],
-                    columns=[
-                        "ID",
-                        "First Name",
-                        "Last Name",
-                        "Addresses",
-                        "Phone Numbers",
-                        "Emails",
-                        "Availability",
-                        "Status",
-                        "Contact Info",
-                        "Custom Fields",
-                        "Org Titles",
-                        "Resources",
-                        "Organizations",
-                    ],
-                )
-
-                export_items.append((contact_df, "contacts"))
-
-            for df in export_items:
-                if export_format == "CSV":
-                    df[0].to_csv(
-                        f"{export_path}/{export_name}_{df[1]}.csv", index=False
-                    )
-
-                elif export_format == "JSON":
-                    df[0].to_json(
-                        f"{export_path}/{export_name}_{df[1]}.json", index=False
-                    )
-
-                elif export_format == "Markdown":
-                    df[0].to_markdown(
-                        f"{export_path}/{export_name}_{df[1]}.md", index=False
-                    )
-
-                elif export_format == "Excel":
-                    df[0].to_excel(
-                        f"{export_path}/{export_name}_{df[1]}.xlsx", index=False
-                    )
-
-                elif export_format == "HTML":
-                    df[0].to_html(
-                        f"{export_path}/{export_name}_{df[1]}.html", index=False
-                    )
-
-                elif export_format == "Plaintext":
-                    df[0].to_string(
-                        f"{export_path}/{export_name}_{df[1]}.txt", index=False
-                    )
-
-            exporting_window.close()
-            sg.popup("Export complete.", title="Success")
+            def export_complete(_):
+                exporting_window.close()
+                sg.popup("Export complete.", title="Success")
+
+            def export_failed(e: Exception):
+                exporting_window.close()
+                sg.popup(f"Export failed: {e}", title="Error")
+
+            # Exporting runs on the database worker, so the program stays responsive meanwhile
+            app.worker.submit_read(
+                export_records,
+                app.db,
+                export_format,
+                export_path,
+                export_name,
+                orgs=export_orgs,
+                contacts=export_contacts,
+                resources=export_resources,
+                org_search_info=org_search_info,
+                contact_search_info=contact_search_info,
+                org_id=org_id,
+                contact_id=contact_id,
+                callback=export_complete,
+                error=export_failed,
+            )
+
             window.close()
 
             break
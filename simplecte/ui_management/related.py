@@ -0,0 +1,132 @@
+from typing import TYPE_CHECKING
+
+import PySimpleGUI as sg
+
+from database.graph import records_along, related_records, shared_neighbors
+from layouts import get_related_layout, RELATED_MODES, RELATED_TYPES
+from process.events.debug import handle_debug
+from ui_management.viewers import (
+    swap_to_contact_viewer,
+    swap_to_org_viewer,
+    swap_to_resource_viewer,
+)
+from utils.enums import Screen
+from utils.helpers import attempt
+
+if TYPE_CHECKING:
+    from process.app import App
+
+__all__ = ("related_handler",)
+
+# The record type shown on each viewer screen, and the element holding its ID
+VIEWERS = {
+    Screen.ORG_VIEW: ("organization", "-ORG_VIEW-"),
+    Screen.CONTACT_VIEW: ("contact", "-CONTACT_VIEW-"),
+    Screen.RESOURCE_VIEW: ("resource", "-RESOURCE_VIEW-"),
+}
+
+# What the Links column means for each search
+COUNT_MEANINGS = {
+    RELATED_MODES[0]: "Links is how many links away each record is.",
+    RELATED_MODES[1]: "Links is how many resources each record shares.",
+    RELATED_MODES[2]: "Links is how many shared resources lead to each contact.",
+}
+
+
+def related_handler(app: "App"):
+    if app.current_screen not in VIEWERS:
+        return
+
+    record_type, element = VIEWERS[app.current_screen]
+    record_id = app.window[element].metadata
+    window = sg.Window(
+        "Related Records",
+        get_related_layout(f"{record_type.title()} {record_id}"),
+        finalize=True,
+        modal=True,
+    )
+    rows: list[list] = []
+    opened = None
+
+    def find(values: dict):
+        mode = values["-RELATED_MODE-"]
+        related_type = RELATED_TYPES[values["-RELATED_TYPE-"]]
+
+        if mode == RELATED_MODES[0]:
+            args = (related_records, app.db, record_type, record_id)
+            args += (int(values["-RELATED_HOPS-"]), related_type)
+        elif mode == RELATED_MODES[1]:
+            args = (shared_neighbors, app.db, record_type, record_id)
+            args += ("resource", related_type)
+        else:
+            args = (records_along, app.db, record_type, record_id)
+            args += (["resource", "organization", "contact"],)
+
+        window["-RELATED_STATUS-"].update("Searching...")
+        window["-RELATED_FIND-"].update(disabled=True)
+
+        # The first search reads every link, so it runs on a reader
+        window.perform_long_operation(
+            lambda: attempt(app.worker.call, *args, read=True), "-RELATED_FOUND-"
+        )
+
+    find(window.read(timeout=0)[1])
+
+    while True:
+        event, values = window.read()
+
+        if event == sg.WIN_CLOSED or event == "-RELATED_CLOSE-":
+            window.close()
+            break
+
+        if event.find("CODE") != -1:
+            handle_debug(event)
+
+        match event:
+            case "-RELATED_MODE-":
+                # Only the first search goes a number of links, and the last finds contacts
+                within = values["-RELATED_MODE-"] == RELATED_MODES[0]
+                window["-RELATED_HOPS-"].update(disabled=not within)
+                window["-RELATED_TYPE-"].update(
+                    disabled=values["-RELATED_MODE-"] == RELATED_MODES[2]
+                )
+
+            case "-RELATED_FIND-":
+                find(values)
+
+            case "-RELATED_FOUND-":
+                found, error = values[event]
+                window["-RELATED_FIND-"].update(disabled=False)
+
+                if error is not None:
+                    window["-RELATED_STATUS-"].update("")
+                    sg.popup(f"Finding related records failed: {error}", title="Error")
+                    continue
+
+                rows = found
+                window["-RELATED_TABLE-"].update(rows)
+                window["-RELATED_STATUS-"].update(
+                    f"Found {len(rows)} record(s). "
+                    + COUNT_MEANINGS[values["-RELATED_MODE-"]]
+                )
+
+            case "-RELATED_OPEN-" | "-RELATED_TABLE-":
+                if not values["-RELATED_TABLE-"]:
+                    continue
+
+                opened = rows[values["-RELATED_TABLE-"][0]][:2]
+                window.close()
+                break
+
+    if opened is None:
+        return
+
+    opened_type, opened_id = opened
+
+    match opened_type:
+        case "Organization":
+            swap_to_org_viewer(app, org_id=opened_id)
+        case "Contact":
+            swap_to_contact_viewer(app, contact_id=opened_id)
+        case "Resource":
+            swap_to_resource_viewer(app, resource_id=opened_id)
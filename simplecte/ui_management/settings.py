@@ -4,6 +4,7 @@ from utils.enums import BackupInterval
 import datetime as dt
 from pathlib import Path
 
+from database.queries import slow_queries
 from layouts import get_settings_layout
 from process.events.debug import handle_debug
 
@@ -53,6 +54,13 @@ def update_settings_window(window: sg.Window, app: "App"):
     """
     window["-SET_THEME-"].update(value=app.settings.theme)
     window["-SET_DB_PATH-"].update(value=app.settings.absolute_database_path)
+    window["-SET_DB_SERVER-"].update(value=app.settings.database_server or "")
+    window["-SET_DB_SERVER_PORT-"].update(value=app.settings.database_serverPort)
+    window["-SET_DB_SERVER_TOKEN-"].update(
+        value=app.settings.database_serverToken or ""
+    )
+    window["-SET_FUZZY_DISTANCE-"].update(value=app.settings.search_fuzzyDistance)
+    window["-SET_SLOW_QUERY_MS-"].update(value=app.settings.debug_slowQueryMs)
 
     interval_str = "Custom"
 
@@ -68,6 +76,8 @@ def update_settings_window(window: sg.Window, app: "App"):
     window["-BACKUP_NAME-"].update(value=app.settings.backup_name)
     window["-BACKUP_DATE-"].update(value=app.settings.backup_date)
     window["-BACKUP_ENABLED-"].update(value=app.settings.backup_enabled)
+    window["-BACKUP_INCREMENTAL-"].update(value=app.settings.backup_incremental)
+    window["-BACKUP_CONTINUOUS-"].update(value=app.settings.backup_continuous)
 
 
 def settings_handler(app: "App"):
@@ -100,6 +110,26 @@ def settings_handler(app: "App"):
             case "-SET_SAVE_SETTINGS-":
                 settings.settings["theme"] = values["-SET_THEME-"]
                 settings.settings["database"]["path"] = values["-SET_DB_PATH-"]
+                settings.settings["database"]["server"] = (
+                    values["-SET_DB_SERVER-"].strip() or None
+                )
+                settings.settings["database"]["serverToken"] = (
+                    values["-SET_DB_SERVER_TOKEN-"] or None
+                )
+
+                try:
+                    settings.settings["database"]["serverPort"] = int(
+                        values["-SET_DB_SERVER_PORT-"]
+                    )
+                except ValueError:
+                    sg.popup_ok("The server port must be a number.")
+                    continue
+                settings.settings["search"]["fuzzyDistance"] = int(
+                    values["-SET_FUZZY_DISTANCE-"]
+                )
+                settings.settings["debug"]["slowQueryMs"] = int(
+                    values["-SET_SLOW_QUERY_MS-"]
+                )
 
                 if settings.database_path == "":
                     settings.database_path = app.settings.database_path
@@ -116,7 +146,13 @@ def settings_handler(app: "App"):
                 for setting in settings.backup:
                     # Make sure none of these are edited because they are either handled
                     # specially or should not be edited by the user
-                    if setting in ["lastBackup", "interval", "processId"]:
+                    if setting in [
+                        "lastBackup",
+                        "lastVerified",
+                        "interval",
+                        "processId",
+                        "retention",
+                    ]:
                         continue
 
                     settings.settings["backup"][setting] = values[
@@ -131,6 +167,10 @@ def settings_handler(app: "App"):
                     settings.theme == app.settings.theme
                     and Path(settings.database["path"])
                     == Path(app.settings.database["path"])
+                    and all(
+                        settings.database[key] == app.settings.database[key]
+                        for key in ("server", "serverPort", "serverToken")
+                    )
                 ):
                     restart_win = sg.popup_yes_no(
                         "You must restart the application for the changes to take effect. Would you like to restart now?"
@@ -138,9 +178,11 @@ def settings_handler(app: "App"):
                 else:
                     restart_win = None
 
-                settings.spawn_backup_process()
                 app.settings = settings
                 app.settings.save_settings()
+                app.maintenance.reschedule(settings)
+                app.db.name_index.max_distance = settings.search_fuzzyDistance
+                slow_queries.threshold = settings.debug_slowQueryMs / 1000 or None
 
                 if restart_win == "Yes":
                     app.restart()
@@ -0,0 +1,101 @@
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import PySimpleGUI as sg
+
+from database.queries import SlowQuery, slow_queries
+from layouts import get_slow_queries_layout
+from process.events.debug import handle_debug
+
+if TYPE_CHECKING:
+    from process.app import App
+
+__all__ = ("slow_queries_handler",)
+
+
+def _details(query: SlowQuery) -> str:
+    """
+    Everything the log knows about a statement, for the details box.
+    """
+    return "\n".join(
+        [
+            f"Took {query.duration * 1000:.1f} ms at "
+            f"{datetime.fromtimestamp(query.started):%m/%d/%Y %I:%M:%S %p}",
+            f"Called from {query.caller}",
+            "",
+            query.sql.strip(),
+            "",
+            f"Parameters: {query.arguments!r}",
+            "",
+            "Query plan:",
+            *query.plan,
+        ]
+    )
+
+
+def slow_queries_handler(app: "App"):
+    window = sg.Window(
+        "Slow Queries", get_slow_queries_layout(), finalize=True, modal=True
+    )
+    queries: list[SlowQuery] = []
+
+    def show():
+        nonlocal queries
+        queries = slow_queries.queries()[::-1]
+
+        window["-SLOW_QUERIES-"].update(
+            [
+                [
+                    datetime.fromtimestamp(q.started).strftime("%I:%M:%S %p"),
+                    f"{q.duration * 1000:.0f}",
+                    q.caller,
+                    " ".join(q.sql.split())[:120],
+                ]
+                for q in queries
+            ]
+        )
+        window["-SLOW_DETAILS-"].update("")
+        window["-SLOW_OPEN-"].update(disabled=True)
+
+        if slow_queries.threshold is None:
+            status = "The slow query log is off. Turn it on in Settings."
+        else:
+            status = (
+                f"{len(queries)} statements slower than "
+                f"{slow_queries.threshold * 1000:.0f} ms, newest first."
+            )
+
+        window["-SLOW_STATUS-"].update(status)
+
+    show()
+
+    while True:
+        event, values = window.read()
+
+        if event == sg.WIN_CLOSED or event == "-SLOW_CLOSE-":
+            window.close()
+            break
+
+        if event.find("CODE") != -1:
+            handle_debug(event)
+
+        match event:
+            case "-SLOW_QUERIES-":
+                if not values[event]:
+                    continue
+
+                query = queries[values[event][0]]
+                window["-SLOW_DETAILS-"].update(_details(query))
+                window["-SLOW_OPEN-"].update(disabled=query.path is None)
+
+            case "-SLOW_OPEN-":
+                if values["-SLOW_QUERIES-"]:
+                    query = queries[values["-SLOW_QUERIES-"][0]]
+                    sg.execute_editor(query.path, query.line)
+
+            case "-SLOW_REFRESH-":
+                show()
+
+            case "-SLOW_CLEAR-":
+                slow_queries.clear()
+                show()
@@ -0,0 +1,73 @@
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import PySimpleGUI as sg
+
+from layouts import get_stats_layout
+from process.events.debug import handle_debug
+from utils.helpers import attempt
+
+if TYPE_CHECKING:
+    from process.app import App
+
+__all__ = ("stats_handler",)
+
+
+def stats_handler(app: "App"):
+    window = sg.Window("Statistics", get_stats_layout(), finalize=True, modal=True)
+    statistics = app.db.statistics
+
+    def show(results: dict[str, list[tuple[str, int]]]):
+        for name, rows in results.items():
+            window[f"-STATS_{name.upper()}-"].update([list(row) for row in rows])
+
+        if statistics.updated is not None:
+            window["-STATS_STATUS-"].update(
+                "Updated "
+                + datetime.fromtimestamp(statistics.updated).strftime("%I:%M:%S %p")
+            )
+
+    def refresh(everything: bool = False):
+        window["-STATS_STATUS-"].update("Counting...")
+        window["-STATS_REFRESH-"].update(disabled=True)
+
+        # Only the stale counts are run, on a reader, while the cached ones are shown
+        window.perform_long_operation(
+            lambda: attempt(
+                app.worker.call,
+                app.db.read,
+                lambda connection: statistics.refresh(connection, everything),
+                read=True,
+            ),
+            "-STATS_REFRESHED-",
+        )
+
+    show(statistics.cached())
+
+    if statistics.stale:
+        refresh()
+
+    while True:
+        event, values = window.read()
+
+        if event == sg.WIN_CLOSED or event == "-STATS_CLOSE-":
+            window.close()
+            break
+
+        if event.find("CODE") != -1:
+            handle_debug(event)
+
+        match event:
+            case "-STATS_REFRESH-":
+                refresh(everything=True)
+
+            case "-STATS_REFRESHED-":
+                results, error = values[event]
+                window["-STATS_REFRESH-"].update(disabled=False)
+
+                if error is not None:
+                    window["-STATS_STATUS-"].update("")
+                    sg.popup(f"Counting records failed: {error}", title="Error")
+                    continue
+
+                show(results)
@@ -1,8 +1,11 @@
-from typing import TYPE_CHECKING
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, NamedTuple
 
 from pony.orm import db_session
 
-from database.database import Organization, Contact, Resource
+from database.database import Organization, Contact, Resource, db
+from database.loader import PAGE_SIZE, Page, ViewerLoader
 from utils.enums import Screen
 from utils.helpers import format_phone
 
@@ -13,9 +16,80 @@ __all__ = (
     "swap_to_org_viewer",
     "swap_to_contact_viewer",
     "swap_to_resource_viewer",
+    "load_org_view",
+    "load_contact_view",
+    "load_resource_view",
+    "load_record",
+    "apply_view",
+    "RecordRef",
+    "ViewerCache",
+    "prefetch_view",
+    "show_relation_page",
+    "RELATION_TABLES",
 )
 
 
+class RecordRef(NamedTuple):
+    """
+    What the screen stack keeps about a viewed record. Entities can't be kept
+    there, since they belong to the database worker's session.
+    """
+
+    id: int
+    name: str
+
+
+class ViewerCache:
+    """
+    Keeps the most recently loaded viewer payloads, so going back to a record
+    or opening one that was prefetched doesn't have to query the database.
+    Each payload is dropped as soon as its record, or any record shown in it, is changed.
+    """
+
+    def __init__(self, size: int = 64):
+        self.size = size
+        self._views: OrderedDict[tuple[str, int], dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, record_type: str, record_id: int) -> dict | None:
+        with self._lock:
+            view = self._views.get((record_type, record_id))
+
+            if view is not None:
+                self._views.move_to_end((record_type, record_id))
+
+            return view
+
+    def load(self, record_type: str, record_id: int) -> dict:
+        """
+        Get a payload from the cache, or load it if it isn't there. Runs on the database worker.
+        """
+        if (view := self.get(record_type, record_id)) is not None:
+            return view
+
+        view = LOADERS[record_type](record_id)
+
+        with self._lock:
+            self._views[(record_type, record_id)] = view
+
+            while len(self._views) > self.size:
+                self._views.popitem(last=False)
+
+        return view
+
+    def invalidate(self, changed: set[tuple[str, int]]) -> None:
+        """
+        Drop the payloads that show any of the changed records. Used as a change listener.
+        """
+        with self._lock:
+            for key in [k for k, v in self._views.items() if v["depends"] & changed]:
+                del self._views[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._views.clear()
+
+
 def sanitize(string: str | int, max_length: int = 10) -> str:
     """
     Sanitize the string by removing newlines and truncating it if it is too long.
@@ -43,221 +117,440 @@ def get_custom_field_info(custom_fields: dict) -> list:
     return return_values
 
 
-@db_session
-def swap_to_org_viewer(
-    app: "App",
-    org_id: int | None = None,
-    org: Organization | None = None,
-    push: bool = True,
-) -> None:
+def load_record(
+    record_type: str, record_id: int, pages: dict[str, Page] | None = None
+) -> dict:
     """
-    Get ready to swap the UI to the organization viewer screen.
+    Load a record and a page of everything linked to it with a ViewerLoader, from the
+    read pool if the database has one, or from the current session's connection if it doesn't.
     """
-    if org_id:
-        org = Organization.get(id=org_id)
+    if db.read_pool is not None:
+        with db.read_pool.snapshot() as connection:
+            loader = ViewerLoader(connection, pages)
+            record = getattr(loader, record_type)(record_id)
 
-    if not org:
-        raise ValueError("Must provide either ID or Organization.")
+    else:
+        with db_session:
+            loader = ViewerLoader(db.get_connection(), pages)
+            record = getattr(loader, record_type)(record_id)
+
+    if record is None:
+        raise ValueError(f"{record_type.title()} not found.")
+
+    return record
+
+
+def _relation_pages(screen: Screen, record: dict) -> dict[str, dict]:
+    """
+    The page, match count and total of each relationship table in a record's view.
+    """
+    return {key: record["pages"][name] for key, name in RELATION_TABLES[screen].items()}
+
+
+def _count_text(page: Page, matches: int, total: int) -> str:
+    """
+    The text under a relationship table saying which of its rows are shown.
+    """
+    if not matches:
+        return "No matches" if page.filter else "None"
+
+    start = page.number * PAGE_SIZE
+    text = f"{start + 1}-{min(start + PAGE_SIZE, matches)} of {matches}"
+
+    if page.filter:
+        text += f" ({total} total)"
+
+    return text
+
+
+def load_org_view(org_id: int, pages: dict[str, Page] | None = None) -> dict:
+    """
+    Load everything the organization viewer shows. Runs on the database worker.
+    """
+    org = load_record("organization", org_id, pages)
 
     contact_table_values = []
     resource_table_values = []
 
     # Compile the information of each org-related contact into a table
-    for contact in org.contacts.order_by(lambda c: c.name):
+    for contact in org["contacts"]:
         contact_table_values.append(
             [
-                contact.id,
-                contact.name,
-                sanitize(contact.org_titles.get(str(org.id), "No Title"), 20)
-                if contact.org_titles
-                else "No Title",
-                contact.emails[0] if contact.emails else "No Email",
-                format_phone(contact.phone_numbers[0])
-                if contact.phone_numbers
+                contact["id"],
+                contact["name"],
+                sanitize(contact["title"], 20) if contact["title"] else "No Title",
+                contact["emails"][0] if contact["emails"] else "No Email",
+                format_phone(contact["phone_numbers"][0])
+                if contact["phone_numbers"]
                 else "No Phone Number",
             ]
         )
 
     # Add available resources to the table of organization resources
-    for resource in org.resources.order_by(lambda r: r.name):
+    for resource in org["resources"]:
         resource_table_values.append(
-            [resource.id, resource.name, sanitize(resource.value, 20)]
+            [resource["id"], resource["name"], sanitize(resource["value"], 20)]
         )
 
-    # Add the custom fields to the table of custom fields
-    custom_field_table_values = get_custom_field_info(org.custom_fields)
-
-    # Update all the data in the screen to the new organization
-    app.window["-ORG_VIEW-"].metadata = org.id
-    app.window["-ORG_CONTACT_INFO_TABLE-"].update(values=contact_table_values)
-    app.window["-ORG_RESOURCES_TABLE-"].update(values=resource_table_values)
-    app.window["-ORG_CUSTOM_FIELDS_TABLE-"].update(values=custom_field_table_values)
-
-    app.window["-NAME-"].update(sanitize(org.type, 15))
-    app.window["-NAME_TEXT-"].update(sanitize(org.name, 30), font=("Arial", 11))
-
-    app.window["-STATUS-"].update(sanitize(org.status))
-    app.window["-PHONE-"].update(
-        sanitize(format_phone(org.phones[0]), 20) if org.phones else "No phone number"
-    )
-    app.window["-ADDRESS-"].update(
-        sanitize(org.addresses[0], 30) if org.addresses else "No address"
-    )
-    app.window["-EMAIL-"].update(
-        sanitize(org.emails[0], 20) if org.emails else "No email"
-    )
-
-    app.switch_screen(
-        Screen.ORG_VIEW, data=org, push=push
-    )  # Switch to the organization viewer screen
-
-
-@db_session
-def swap_to_contact_viewer(
-    app: "App",
-    contact_id: int | None = None,
-    contact: Contact | None = None,
-    push: bool = True,
-) -> None:
+    return {
+        "screen": Screen.ORG_VIEW,
+        "pages": _relation_pages(Screen.ORG_VIEW, org),
+        "record": RecordRef(org["id"], org["name"]),
+        "depends": {("organization", org["id"])}
+        | {("contact", row[0]) for row in contact_table_values}
+        | {("resource", row[0]) for row in resource_table_values},
+        "tables": {
+            "-ORG_CONTACT_INFO_TABLE-": contact_table_values,
+            "-ORG_RESOURCES_TABLE-": resource_table_values,
+            "-ORG_CUSTOM_FIELDS_TABLE-": get_custom_field_info(org["custom_fields"]),
+        },
+        "text": {
+            "-NAME-": sanitize(org["type"], 15),
+            "-NAME_TEXT-": sanitize(org["name"], 30),
+            "-STATUS-": sanitize(org["status"]),
+            "-PHONE-": sanitize(format_phone(org["phones"][0]), 20)
+            if org["phones"]
+            else "No phone number",
+            "-ADDRESS-": sanitize(org["addresses"][0], 30)
+            if org["addresses"]
+            else "No address",
+            "-EMAIL-": sanitize(org["emails"][0], 20) if org["emails"] else "No email",
+        },
+    }
+
+
+def load_contact_view(contact_id: int, pages: dict[str, Page] | None = None) -> dict:
     """
-    Get ready to swap the UI to the contact viewer screen.
+    Load everything the contact viewer shows. Runs on the database worker.
     """
-    if contact_id:
-        contact = Contact.get(id=contact_id)
-
-    if not contact:
-        raise ValueError("Must provide either ID or Contact.")
+    contact = load_record("contact", contact_id, pages)
 
     contact_info_table_values = []
     organization_table_values = []
     resource_table_values = []
 
     # An ungodly amount of loops to compile all the information into tables
-    for number in contact.phone_numbers:
+    for number in contact["phone_numbers"]:
         contact_info_table_values.append(["Phone", sanitize(format_phone(number), 20)])
 
-    for addresses in contact.addresses:
+    for addresses in contact["addresses"]:
         contact_info_table_values.append(["Address", sanitize(addresses, 20)])
 
-    for email in contact.emails:
+    for email in contact["emails"]:
         contact_info_table_values.append(["Email", sanitize(email, 20)])
 
     contact_info_table_values.append(
         [
             "Availability",
-            sanitize(contact.availability)
-            if contact.availability
+            sanitize(contact["availability"])
+            if contact["availability"]
             else "No Recorded Availability",
         ]
     )
 
-    for key, value in contact.contact_info.items():
+    for key, value in contact["contact_info"].items():
         contact_info_table_values.append([key, sanitize(value, 20)])
 
-    for org in contact.organizations.order_by(lambda o: o.name):
+    for org in contact["organizations"]:
         organization_table_values.append(
-            [org.id, sanitize(org.name, 20), sanitize(org.status, 10)]
+            [org["id"], sanitize(org["name"], 20), sanitize(org["status"], 10)]
         )
 
-    for resource in contact.resources.order_by(lambda r: r.name):
+    for resource in contact["resources"]:
         resource_table_values.append(
-            [resource.id, resource.name, sanitize(resource.value, 20)]
+            [resource["id"], resource["name"], sanitize(resource["value"], 20)]
         )
 
-    custom_field_table_values = get_custom_field_info(contact.custom_fields)
-
-    # Update all the data in the screen to the new contact
-    app.window["-CONTACT_VIEW-"].metadata = contact.id
-    app.window["-CONTACT_INFO_TABLE-"].update(values=contact_info_table_values)
-    app.window["-CONTACT_ORGANIZATIONS_TABLE-"].update(values=organization_table_values)
-    app.window["-CONTACT_RESOURCES_TABLE-"].update(values=resource_table_values)
-    app.window["-CONTACT_CUSTOM_FIELDS_TABLE-"].update(values=custom_field_table_values)
-
-    app.window["-CONTACT_NAME-"].update(sanitize(contact.name, 30))
-    app.window["-CONTACT_STATUS-"].update(sanitize(contact.status, 12))
-    app.window["-CONTACT_PHONE-"].update(
-        sanitize(format_phone(contact.phone_numbers[0]), 20)
-        if contact.phone_numbers
-        else "No phone number"
-    )
-    app.window["-CONTACT_ADDRESS-"].update(
-        sanitize(contact.addresses[0], 20) if contact.addresses else "No address"
-    )
-    app.window["-CONTACT_EMAIL-"].update(
-        sanitize(contact.emails[0], 30) if contact.emails else "No email"
-    )
-
-    app.switch_screen(
-        Screen.CONTACT_VIEW, data=contact, push=push
-    )  # Switch to the contact viewer screen
-
-
-@db_session
-def swap_to_resource_viewer(
-    app: "App",
-    resource_id: int | None = None,
-    resource: Resource | None = None,
-    push: bool = True,
-) -> None:
+    return {
+        "screen": Screen.CONTACT_VIEW,
+        "pages": _relation_pages(Screen.CONTACT_VIEW, contact),
+        "record": RecordRef(contact["id"], contact["name"]),
+        "depends": {("contact", contact["id"])}
+        | {("organization", row[0]) for row in organization_table_values}
+        | {("resource", row[0]) for row in resource_table_values},
+        "tables": {
+            "-CONTACT_INFO_TABLE-": contact_info_table_values,
+            "-CONTACT_ORGANIZATIONS_TABLE-": organization_table_values,
+            "-CONTACT_RESOURCES_TABLE-": resource_table_values,
+            "-CONTACT_CUSTOM_FIELDS_TABLE-": get_custom_field_info(
+                contact["custom_fields"]
+            ),
+        },
+        "text": {
+            "-CONTACT_NAME-": sanitize(contact["name"], 30),
+            "-CONTACT_STATUS-": sanitize(contact["status"], 12),
+            "-CONTACT_PHONE-": sanitize(format_phone(contact["phone_numbers"][0]), 20)
+            if contact["phone_numbers"]
+            else "No phone number",
+            "-CONTACT_ADDRESS-": sanitize(contact["addresses"][0], 20)
+            if contact["addresses"]
+            else "No address",
+            "-CONTACT_EMAIL-": sanitize(contact["emails"][0], 30)
+            if contact["emails"]
+            else "No email",
+        },
+    }
+
+
+def load_resource_view(resource_id: int, pages: dict[str, Page] | None = None) -> dict:
     """
-    Get ready to swap the UI to the resource viewer screen.
+    Load everything the resource viewer shows. Runs on the database worker.
     """
-    if resource_id:
-        resource = Resource.get(id=resource_id)
-
-    if not resource:
-        raise ValueError("Must provide either ID or Resource.")
+    resource = load_record("resource", resource_id, pages)
 
     contacts_values = []  # ID, Name, Email, and phone
     organizations_values = []  # ID, Name, Status, and Primary Contact
+    depends = {("resource", resource["id"])}
 
     # Compile the information of each resource-related contact into a table
-    for contact in resource.contacts.order_by(lambda c: c.name):
+    for contact in resource["contacts"]:
         contacts_values.append(
             [
-                contact.id,
-                contact.name,
-                contact.emails[0] if contact.emails else "No Email",
-                format_phone(contact.phone_numbers[0])
-                if contact.phone_numbers
+                contact["id"],
+                contact["name"],
+                contact["emails"][0] if contact["emails"] else "No Email",
+                format_phone(contact["phone_numbers"][0])
+                if contact["phone_numbers"]
                 else "No Phone Number",
             ]
         )
 
     # Compile the information of each resource-related organization into a table
-    for org in resource.organizations.order_by(lambda o: o.name):
-        if org.primary_contact:
-            primary = org.primary_contact.name
+    for org in resource["organizations"]:
+        if org["primary_id"] is not None:
+            primary = org["primary_name"]
+            depends.add(("contact", org["primary_id"]))
         else:
             primary = "No Primary Contact"
         organizations_values.append(
             [
-                org.id,
-                org.name,
-                org.status,
+                org["id"],
+                org["name"],
+                org["status"],
                 primary,
             ]
         )
 
     # Deprecate the displayed values in case they are above desired length
-    if len(resource.name) > 20:
-        name = resource.name[:20] + "..."
+    if len(resource["name"]) > 20:
+        name = resource["name"][:20] + "..."
 
     else:
-        name = resource.name
+        name = resource["name"]
 
-    if len(resource.value) > 20:
-        value = resource.value[:20] + "..."
+    if len(resource["value"]) > 20:
+        value = resource["value"][:20] + "..."
 
     else:
-        value = resource.value
+        value = resource["value"]
+
+    return {
+        "screen": Screen.RESOURCE_VIEW,
+        "pages": _relation_pages(Screen.RESOURCE_VIEW, resource),
+        "record": RecordRef(resource["id"], resource["name"]),
+        "depends": depends
+        | {("contact", row[0]) for row in contacts_values}
+        | {("organization", row[0]) for row in organizations_values},
+        "tables": {
+            "-RESOURCE_CONTACTS_TABLE-": contacts_values,
+            "-RESOURCE_ORGANIZATIONS_TABLE-": organizations_values,
+        },
+        "text": {
+            "-RESOURCE_NAME-": name,
+            "-RESOURCE_VALUE-": value,
+        },
+    }
+
+
+def apply_view(app: "App", view: dict, push: bool = True, switch: bool = True) -> None:
+    """
+    Show a view loaded by one of the load_*_view() functions. Runs on the UI thread.
+    Without switch, the data is updated without switching screens, such as when paging.
+    """
+    screen: Screen = view["screen"]
+
+    # Update all the data in the screen to the new record
+    app.window[screen.value].metadata = view["record"].id
+
+    for key, values in view["tables"].items():
+        app.window[key].update(values=values)
+
+    for key, value in view["text"].items():
+        app.window[key].update(value)
+
+    for key, info in view["pages"].items():
+        page, matches = info["page"], info["matches"]
+        controls = key.rstrip("-")
+
+        app.window[key].metadata = page
+        app.window[f"{controls}_COUNT-"].update(
+            _count_text(page, matches, info["total"])
+        )
+        app.window[f"{controls}_PREV-"].update(disabled=page.number == 0)
+        app.window[f"{controls}_NEXT-"].update(
+            disabled=(page.number + 1) * PAGE_SIZE >= matches
+        )
+
+        # Don't touch the filter while it's being typed in, which would move the cursor
+        if app.window[f"{controls}_FILTER-"].get() != page.filter:
+            app.window[f"{controls}_FILTER-"].update(page.filter)
+
+    if screen == Screen.ORG_VIEW:
+        app.window["-NAME_TEXT-"].update(font=("Arial", 11))
+
+    if switch:
+        app.switch_screen(screen, data=view["record"], push=push)
+
+
+def _current_pages(app: "App", record_type: str, record_id: int) -> dict[str, Page]:
+    """
+    The pages of the relationship tables that aren't on the first, unfiltered page,
+    if the record is the one last shown in its viewer. Other records start on the first page.
+    """
+    screen = SCREENS[record_type]
+
+    if app.window[screen.value].metadata != record_id:
+        return {}
+
+    return {
+        name: app.window[key].metadata
+        for key, name in RELATION_TABLES[screen].items()
+        if app.window[key].metadata not in (None, Page())
+    }
+
+
+def _show(
+    app: "App", record_type: str, record_id: int, push: bool, switch: bool = True
+) -> None:
+    """
+    Show a record's viewer, straight from the cache if it is there,
+    or once the database worker has loaded it if it isn't.
+    """
+    # Only the first page of each relationship is cached
+    if pages := _current_pages(app, record_type, record_id):
+        app.worker.submit(
+            LOADERS[record_type],
+            record_id,
+            pages,
+            callback=lambda view: apply_view(app, view, push, switch),
+        )
+        return
+
+    # While the worker is busy, a change to the record may still be on its way
+    if not app.worker.busy:
+        if (view := app.viewer_cache.get(record_type, record_id)) is not None:
+            apply_view(app, view, push, switch)
+            return
+
+    app.worker.submit(
+        app.viewer_cache.load,
+        record_type,
+        record_id,
+        callback=lambda view: apply_view(app, view, push, switch),
+    )
+
+
+def prefetch_view(app: "App", record_type: str, record_id: int) -> None:
+    """
+    Load a record's viewer into the cache in the background, such as when its row is
+    selected, so it opens instantly if the user double-clicks it.
+    """
+    if app.viewer_cache.get(record_type, record_id) is None:
+        # Errors are ignored, since the user didn't ask for the record yet
+        app.worker.submit(
+            app.viewer_cache.load, record_type, record_id, error=lambda e: None
+        )
+
+
+def show_relation_page(app: "App", table_key: str, page: Page) -> None:
+    """
+    Show another page of a relationship table in the current viewer, or filter it.
+    """
+    screen = next(s for s, tables in RELATION_TABLES.items() if table_key in tables)
+    record_type = next(t for t, s in SCREENS.items() if s == screen)
+
+    app.window[table_key].metadata = page
+    _show(app, record_type, app.window[screen.value].metadata, push=False, switch=False)
+
+
+def swap_to_org_viewer(
+    app: "App",
+    org_id: int | None = None,
+    org: Organization | None = None,
+    push: bool = True,
+) -> None:
+    """
+    Get ready to swap the UI to the organization viewer screen.
+    """
+    if org:
+        org_id = org.id
+
+    if not org_id:
+        raise ValueError("Must provide either ID or Organization.")
+
+    _show(app, "organization", org_id, push)
+
+
+def swap_to_contact_viewer(
+    app: "App",
+    contact_id: int | None = None,
+    contact: Contact | None = None,
+    push: bool = True,
+) -> None:
+    """
+    Get ready to swap the UI to the contact viewer screen.
+    """
+    if contact:
+        contact_id = contact.id
+
+    if not contact_id:
+        raise ValueError("Must provide either ID or Contact.")
+
+    _show(app, "contact", contact_id, push)
 
-    # Update all the data in the screen to the new resource
-    app.window["-RESOURCE_VIEW-"].metadata = resource.id
-    app.window["-RESOURCE_NAME-"].update(name)
-    app.window["-RESOURCE_VALUE-"].update(value)
 
-    app.window["-RESOURCE_CONTACTS_TABLE-"].update(values=contacts_values)
-    app.window["-RESOURCE_ORGANIZATIONS_TABLE-"].update(values=organizations_values)
+def swap_to_resource_viewer(
+    app: "App",
+    resource_id: int | None = None,
+    resource: Resource | None = None,
+    push: bool = True,
+) -> None:
+    """
+    Get ready to swap the UI to the resource viewer screen.
+    """
+    if resource:
+        resource_id = resource.id
+
+    if not resource_id:
+        raise ValueError("Must provide either ID or Resource.")
 
-    app.switch_screen(Screen.RESOURCE_VIEW, data=resource, push=push)
+    _show(app, "resource", resource_id, push)
+
+
+LOADERS = {
+    "organization": load_org_view,
+    "contact": load_contact_view,
+    "resource": load_resource_view,
+}
+
+SCREENS = {
+    "organization": Screen.ORG_VIEW,
+    "contact": Screen.CONTACT_VIEW,
+    "resource": Screen.RESOURCE_VIEW,
+}
+
+# The relationship shown in each paged table of the viewers
+RELATION_TABLES = {
+    Screen.ORG_VIEW: {
+        "-ORG_CONTACT_INFO_TABLE-": "contacts",
+        "-ORG_RESOURCES_TABLE-": "resources",
+    },
+    Screen.CONTACT_VIEW: {
+        "-CONTACT_ORGANIZATIONS_TABLE-": "organizations",
+        "-CONTACT_RESOURCES_TABLE-": "resources",
+    },
+    Screen.RESOURCE_VIEW: {
+        "-RESOURCE_CONTACTS_TABLE-": "contacts",
+        "-RESOURCE_ORGANIZATIONS_TABLE-": "organizations",
+    },
+}
@@ -0,0 +1,379 @@
+"""
+Continuous archiving for SimpleCTE databases.
+Triggers record every change to the database in a _changelog table. The maintenance
+scheduler regularly ships those changes to the backup folder as compressed batches, so
+a database can be rebuilt as of any moment by restoring the newest snapshot before
+that moment and replaying the archived changes on top of it.
+
+Run this file directly to restore a database to a point in time:
+    python simplecte/utils/archive.py <backup path> <destination> --at "10/19/2026 14:30:00"
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import uuid
+from datetime import datetime as dt
+
+if __name__ == "__main__":
+    # Running as a script puts simplecte/utils on the path instead of simplecte/
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.backup import DATETIME_FORMAT
+from utils.backup_store import BackupStore, Snapshot
+
+__all__ = (
+    "install_changelog",
+    "remove_changelog",
+    "ChangeArchiver",
+    "restore_to_time",
+)
+
+# The current time as a POSIX timestamp with fractions of a second, in SQL
+SQL_NOW = "((julianday('now') - 2440587.5) * 86400.0)"
+
+
+def _user_tables(connection: sqlite3.Connection) -> list[str]:
+    return [
+        row[0]
+        for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '\\_%' ESCAPE '\\'"
+        )
+    ]
+
+
+def _table_columns(
+    connection: sqlite3.Connection, table: str
+) -> tuple[list[str], list[str]]:
+    """
+    Get the columns and the primary key columns of a table.
+    """
+    info = connection.execute(f'PRAGMA table_info("{table}")').fetchall()
+    columns = [row[1] for row in info]
+    primary_key = [row[1] for row in sorted(info, key=lambda r: r[5]) if row[5]]
+
+    return columns, primary_key or columns
+
+
+def _json_row(alias: str, columns: list[str]) -> str:
+    return (
+        "json_object("
+        + ", ".join(f"'{column}', {alias}.\"{column}\"" for column in columns)
+        + ")"
+    )
+
+
+def get_timeline(connection: sqlite3.Connection) -> str | None:
+    """
+    Get the archive timeline of a database. A database gets a new timeline when it is
+    restored to a point in time, so changes made after a restore never mix with the
+    changes of the history that was rolled back.
+    """
+    try:
+        row = connection.execute(
+            "SELECT value FROM _archive_meta WHERE key = 'timeline'"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+
+    return row[0] if row else None
+
+
+def install_changelog(db_path: str) -> bool:
+    """
+    Create the changelog table and the triggers that fill it. The triggers are
+    recreated every time, so they always cover every table and column.
+    Returns True if the changelog was newly created, meaning there is no base snapshot for it yet.
+    """
+    connection = sqlite3.connect(db_path, timeout=60)
+
+    try:
+        created = get_timeline(connection) is None
+
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS _changelog ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, "
+                "tbl TEXT NOT NULL, op TEXT NOT NULL, row TEXT NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS _archive_meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO _archive_meta VALUES ('timeline', ?)",
+                (uuid.uuid4().hex[:8],),
+            )
+
+            _drop_triggers(connection)
+
+            for table in _user_tables(connection):
+                columns, primary_key = _table_columns(connection, table)
+                name = table.lower()
+
+                for event in ("INSERT", "UPDATE"):
+                    connection.execute(
+                        f'CREATE TRIGGER "_changelog_{name}_{event.lower()}" '
+                        f'AFTER {event} ON "{table}" BEGIN '
+                        f"INSERT INTO _changelog (ts, tbl, op, row) VALUES "
+                        f"({SQL_NOW}, '{table}', 'upsert', {_json_row('NEW', columns)}); END"
+                    )
+
+                connection.execute(
+                    f'CREATE TRIGGER "_changelog_{name}_delete" '
+                    f'AFTER DELETE ON "{table}" BEGIN '
+                    f"INSERT INTO _changelog (ts, tbl, op, row) VALUES "
+                    f"({SQL_NOW}, '{table}', 'delete', {_json_row('OLD', primary_key)}); END"
+                )
+    finally:
+        connection.close()
+
+    return created
+
+
+def _drop_triggers(connection: sqlite3.Connection) -> None:
+    triggers = connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '\\_changelog\\_%' ESCAPE '\\'"
+    ).fetchall()
+
+    for (trigger,) in triggers:
+        connection.execute(f'DROP TRIGGER "{trigger}"')
+
+
+def remove_changelog(db_path: str) -> None:
+    """
+    Stop recording changes. The changelog table is left alone, so any changes
+    that were not shipped yet can still be archived.
+    """
+    connection = sqlite3.connect(db_path, timeout=60)
+
+    try:
+        with connection:
+            _drop_triggers(connection)
+    finally:
+        connection.close()
+
+
+class ChangeArchiver:
+    """
+    Ships batches of recorded changes from a database's changelog to
+    <archive path>/<timeline>/<first seq>-<last seq>.jsonl.gz.
+    """
+
+    def __init__(self, db_path: str, archive_path: str):
+        self.db_path = db_path
+        self.archive_path = archive_path
+
+    def ship(self) -> str | None:
+        """
+        Archive every change recorded since the last batch. Returns the path of the
+        new batch, or None if nothing changed.
+        """
+        connection = sqlite3.connect(self.db_path, timeout=60)
+
+        try:
+            timeline = get_timeline(connection)
+
+            if timeline is None:
+                return None
+
+            rows = connection.execute(
+                "SELECT seq, ts, tbl, op, row FROM _changelog ORDER BY seq"
+            ).fetchall()
+
+            if not rows:
+                return None
+
+            folder = os.path.join(self.archive_path, timeline)
+            os.makedirs(folder, exist_ok=True)
+
+            # Batches are named after the changes they hold, so shipping the same changes
+            # twice after a crash just overwrites the same file
+            batch = os.path.join(
+                folder, f"{rows[0][0]:012d}-{rows[-1][0]:012d}.jsonl.gz"
+            )
+
+            with gzip.open(batch + ".part", "wt", encoding="utf-8") as f:
+                for seq, ts, table, op, row in rows:
+                    f.write(
+                        json.dumps(
+                            {"seq": seq, "ts": ts, "tbl": table, "op": op, "row": row}
+                        )
+                        + "\n"
+                    )
+
+            os.replace(batch + ".part", batch)
+
+            with connection:
+                connection.execute(
+                    "DELETE FROM _changelog WHERE seq <= ?", (rows[-1][0],)
+                )
+        finally:
+            connection.close()
+
+        return batch
+
+
+def _read_batches(archive_path: str, timeline: str, after_seq: int):
+    """
+    Yield every archived change of a timeline with a sequence number above after_seq, in order.
+    """
+    folder = os.path.join(archive_path, timeline)
+
+    if not os.path.exists(folder):
+        return
+
+    last_seq = after_seq
+
+    for file_name in sorted(os.listdir(folder)):
+        if not file_name.endswith(".jsonl.gz"):
+            continue
+
+        if int(file_name.split("-")[1].split(".")[0]) <= last_seq:
+            continue
+
+        with gzip.open(os.path.join(folder, file_name), "rt", encoding="utf-8") as f:
+            for line in f:
+                change = json.loads(line)
+
+                # Batches can overlap if a batch was re-shipped with newer changes
+                if change["seq"] <= last_seq:
+                    continue
+
+                last_seq = change["seq"]
+                yield change
+
+
+def _apply_change(connection: sqlite3.Connection, change: dict) -> None:
+    row = json.loads(change["row"])
+    columns = ", ".join(f'"{column}"' for column in row)
+
+    if change["op"] == "upsert":
+        connection.execute(
+            f'INSERT OR REPLACE INTO "{change["tbl"]}" ({columns}) '
+            f"VALUES ({', '.join('?' for _ in row)})",
+            list(row.values()),
+        )
+
+    elif change["op"] == "delete":
+        connection.execute(
+            f'DELETE FROM "{change["tbl"]}" WHERE '
+            + " AND ".join(f'"{column}" = ?' for column in row),
+            list(row.values()),
+        )
+
+
+def _snapshot_position(db_path: str) -> tuple[str | None, int]:
+    """
+    Get the timeline of a restored snapshot and the sequence number of the last change it contains.
+    """
+    connection = sqlite3.connect(db_path)
+
+    try:
+        timeline = get_timeline(connection)
+        row = connection.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = '_changelog'"
+        ).fetchone()
+    finally:
+        connection.close()
+
+    return timeline, row[0] if row else 0
+
+
+def restore_to_time(
+    store: BackupStore, archive_path: str, timestamp: float, destination: str
+) -> int:
+    """
+    Rebuild the database as it was at `timestamp` into destination, by restoring the
+    newest snapshot taken before then and replaying archived changes up to that time.
+    The restored database starts a new timeline and is added to the store as a snapshot.
+    Returns the number of replayed changes.
+    """
+    temp_path = destination + ".restore"
+    snapshot: Snapshot | None = None
+    timeline = None
+    position = 0
+
+    for candidate in reversed(store.snapshots()):
+        if candidate.created > timestamp:
+            continue
+
+        store.restore(candidate, temp_path)
+        timeline, position = _snapshot_position(temp_path)
+
+        # Snapshots taken before archiving was turned on can't be replayed onto
+        if timeline is not None:
+            snapshot = candidate
+            break
+
+    if snapshot is None:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        raise ValueError("There is no archived snapshot from before that time.")
+
+    connection = sqlite3.connect(temp_path)
+    replayed = 0
+
+    try:
+        with connection:
+            # The changes are replayed exactly, so they shouldn't be recorded again
+            _drop_triggers(connection)
+
+            for change in _read_batches(archive_path, timeline, position):
+                if change["ts"] > timestamp:
+                    break
+
+                _apply_change(connection, change)
+                position = change["seq"]
+                replayed += 1
+
+            connection.execute("DELETE FROM _changelog")
+            connection.execute(
+                "UPDATE sqlite_sequence SET seq = ? WHERE name = '_changelog'",
+                (position,),
+            )
+            connection.execute(
+                "UPDATE _archive_meta SET value = ? WHERE key = 'timeline'",
+                (uuid.uuid4().hex[:8],),
+            )
+    finally:
+        connection.close()
+
+    os.replace(temp_path, destination)
+
+    # The maintenance scheduler reinstalls the triggers once the restored database is opened
+    store.add_file(destination)
+
+    return replayed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Restore a SimpleCTE database to a point in time."
+    )
+    parser.add_argument("backup_path", help="The backup folder from settings.json.")
+    parser.add_argument("destination", help="Where to write the restored database.")
+    parser.add_argument(
+        "--at",
+        required=True,
+        help=f"The time to restore to, formatted like {dt.now().strftime(DATETIME_FORMAT)}.",
+    )
+
+    args = parser.parse_args()
+
+    replayed = restore_to_time(
+        BackupStore(os.path.join(args.backup_path, "store")),
+        os.path.join(args.backup_path, "wal"),
+        dt.strptime(args.at, DATETIME_FORMAT).timestamp(),
+        args.destination,
+    )
+
+    print(f"Restored the database and replayed {replayed} changes.")
+
+
+if __name__ == "__main__":
+    main()
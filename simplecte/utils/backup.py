@@ -1,102 +1,222 @@
 """
-SimpleCTE backup program. This will autonomously back up your database files to the specified location in settings.json.
-This script is not meant to be imported by the program, and is meant to run as a separate process.
-This script is invoked by simplecte/process/settings.py line 103 (spawn_backup_process) and is not meant to be run manually.
+SimpleCTE backup functions. These back up the database to the location specified in settings.json.
+Automated backups are run by the maintenance scheduler (simplecte/process/maintenance.py),
+either inside the program or as a separate process started with `main.py --daemon`.
 """
 
 import os
-import json
+import sqlite3
 import time
-from datetime import timedelta, datetime as dt
-import shutil
-from dataclasses import dataclass
-from filelock import FileLock
+import uuid
+from datetime import datetime as dt
+from typing import Callable
 
 DATETIME_FORMAT = r"%m/%d/%Y %H:%M:%S"
-# TODO: Make sure this can run on its own, from startup.
-
-
-@dataclass
-class Settings:
-    raw: dict
-    db_path: str
-    backup_path: str
-    name_format: str
-    date_format: str
-    backup_interval: int
-    last_backup: str
-    backup_enabled: bool
-
-    @classmethod
-    def load_settings(cls) -> "Settings":
-        with FileLock("settings.lock"):
-            with open("simplecte/data/settings.json", "r") as f:
-                settings = json.load(f)
-
-        written_pid = settings["backup"]["processId"]
-
-        self = cls(
-            raw=settings,
-            db_path=settings["database"]["path"],
-            backup_path=settings["backup"]["path"],
-            name_format=settings["backup"]["name"],
-            date_format=settings["backup"]["date"],
-            last_backup=settings["backup"]["lastBackup"],
-            backup_interval=settings["backup"]["interval"],
-            backup_enabled=settings["backup"]["enabled"],
-        )
-
-        if written_pid is None or written_pid != os.getpid():
-            settings["backup"]["processId"] = os.getpid()
-
-            self.write_settings(mark_backup=False)
-
-        return self
-
-    def write_settings(self, mark_backup=True) -> None:
-        if mark_backup:
-            self.raw["backup"]["lastBackup"] = dt.now().strftime(DATETIME_FORMAT)
-
-        with FileLock("settings.lock"):
-            with open("simplecte/data/settings.json", "w") as f:
-                json.dump(self.raw, f, indent=4)
-
-
-def backup():
-    while True:
-        config = Settings.load_settings()
-
-        if not config.backup_enabled:
-            exit()
-
-        if config.last_backup is not None:
-            last_backup_time = dt.strptime(config.last_backup, DATETIME_FORMAT)
-            next_backup_time = last_backup_time + timedelta(
-                seconds=config.backup_interval
+
+# How many database pages to copy before letting other connections write again.
+# With SQLite's default 4 KiB pages, this is roughly 1 MiB per step.
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_DELAY = 0.005  # Seconds to yield to writers between steps
+
+
+def table_counts(connection: sqlite3.Connection) -> dict[str, int]:
+    """
+    Count the rows of every table in a database, leaving out SQLite's and SimpleCTE's internal tables.
+    """
+    tables = connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' "
+        "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '\\_%' ESCAPE '\\'"
+    ).fetchall()
+
+    return {
+        table: connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        for (table,) in tables
+    }
+
+
+def hot_backup(
+    db_path: str,
+    backup_path: str,
+    pages: int = BACKUP_PAGES_PER_STEP,
+    progress: "Callable[[int, int], None] | None" = None,
+    step_delay: float = BACKUP_STEP_DELAY,
+    bytes_per_second: int | None = None,
+) -> dict[str, int] | None:
+    """
+    Back up a live database using SQLite's online backup API.
+    Unlike copying the file, this always produces a consistent copy, even if the
+    program writes to the database while the backup is running. Pages are copied
+    a few at a time so writers are never blocked for the whole backup.
+    progress is called with the number of pages copied and the total page count
+    after every step. The backup is written to a temporary file first, so a
+    partially written backup never exists under the real name.
+    If bytes_per_second is given, the pause between steps is stretched so the
+    backup reads no faster than that.
+    Returns the row counts of the database right after the copy finished, to verify the
+    backup against, or None if the database changed before they could be counted.
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(db_path)
+
+    temp_path = backup_path + ".part"
+
+    def report(status: int, remaining: int, total: int):
+        if progress is not None:
+            progress(total - remaining, total)
+
+        # Give writers a chance to get in between steps
+        if remaining and step_delay:
+            time.sleep(step_delay)
+
+    source = sqlite3.connect(db_path)
+
+    try:
+        destination = sqlite3.connect(temp_path)
+
+        try:
+            if bytes_per_second:
+                page_size = source.execute("PRAGMA page_size").fetchone()[0]
+                step_delay = max(step_delay, pages * page_size / bytes_per_second)
+
+            source.backup(destination, pages=pages, progress=report)
+
+            # data_version changes when another connection commits, which would make the counts useless
+            version = source.execute("PRAGMA data_version").fetchone()[0]
+            counts = table_counts(source)
+
+            if source.execute("PRAGMA data_version").fetchone()[0] != version:
+                counts = None
+        finally:
+            destination.close()
+
+        os.replace(temp_path, backup_path)
+    except BaseException:
+        # A failed backup shouldn't leave its partial copy behind
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        raise
+    finally:
+        source.close()
+
+    return counts
+
+
+def verify_backup(
+    backup_path: str,
+    expected_counts: dict[str, int] | None = None,
+    time_limit: float | None = None,
+    full: bool = False,
+) -> list[str] | None:
+    """
+    Check that a backup can be opened and is intact, and that its tables have as many rows
+    as the database had when it was backed up. backup_path can be a database file or the
+    manifest of a snapshot in a backup store.
+    A quick check is run unless full is True, which runs a complete integrity check instead.
+    Returns a list of problems, which is empty if the backup is fine, or None if the check
+    did not finish within time_limit seconds.
+    """
+    if backup_path.endswith(".json"):
+        # Imported here because the backup store itself imports hot_backup from this file
+        from utils.backup_store import BackupStore
+
+        snapshot_id = os.path.splitext(os.path.basename(backup_path))[0]
+        store = BackupStore(os.path.dirname(os.path.dirname(backup_path)))
+        snapshot = store.get_snapshot(snapshot_id)
+
+        if snapshot is None:
+            return [f"The snapshot {snapshot_id} does not exist."]
+
+        temp_path = os.path.join(store.path, f"verify-{uuid.uuid4().hex[:8]}.db")
+
+        try:
+            store.restore(snapshot, temp_path)
+        except (OSError, ValueError) as e:
+            return [str(e)]
+
+        try:
+            return verify_backup(
+                temp_path,
+                expected_counts or snapshot.counts,
+                time_limit,
+                full,
             )
-            time_to_next_backup = (next_backup_time - dt.now()).total_seconds()
+        finally:
+            os.remove(temp_path)
+
+    if not os.path.exists(backup_path):
+        return [f"{backup_path} does not exist."]
+
+    # Open read-only, so checking a backup never changes it
+    connection = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+
+    if time_limit is not None:
+        deadline = time.monotonic() + time_limit
+
+        # Returning a truthy value from the progress handler interrupts the check
+        connection.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+
+    try:
+        check = "integrity_check" if full else "quick_check"
+        result = [row[0] for row in connection.execute(f"PRAGMA {check}")]
+
+        if result != ["ok"]:
+            return result
+
+        if expected_counts is None:
+            return []
+
+        counts = table_counts(connection)
+    except sqlite3.OperationalError as e:
+        if "interrupted" in str(e):
+            return None
+
+        return [str(e)]
+    except sqlite3.DatabaseError as e:
+        # Raised for files that aren't databases at all
+        return [str(e)]
+    finally:
+        connection.close()
+
+    return [
+        f"{table} has {counts.get(table, 0)} rows instead of {count}."
+        for table, count in expected_counts.items()
+        if counts.get(table, 0) != count
+    ]
+
 
-            if time_to_next_backup > 0:
-                time.sleep(time_to_next_backup)
-                continue
+def backup(
+    db_path: str,
+    backup_settings: dict,
+    bytes_per_second: int | None = None,
+) -> tuple[str, dict[str, int] | None]:
+    """
+    Perform one backup as configured by the "backup" section of settings.json.
+    Returns the path of the new backup file, or of the snapshot manifest for incremental backups,
+    along with the row counts to verify it against.
+    """
+    backup_path = backup_settings["path"]
 
-        db_name = config.db_path.split("\\")[-1][0:-3]
-        date = dt.now().strftime(config.date_format)
-        backup = (
-            config.backup_path
-            + "\\"
-            + config.name_format.format(dbName=db_name, date=date)
-            + ".db"
-        )
+    if not os.path.exists(backup_path):
+        os.makedirs(backup_path)
 
-        if not os.path.exists(config.backup_path):
-            os.makedirs(config.backup_path)
+    # Point-in-time restores replay archived changes onto snapshots, so continuous archiving needs the store too
+    if backup_settings.get("incremental") or backup_settings.get("continuous"):
+        # Imported here because the backup store itself imports hot_backup from this file
+        from utils.backup_store import BackupStore
 
-        shutil.copy(config.db_path, backup)
+        store = BackupStore(os.path.join(backup_path, "store"))
+        snapshot = store.add_snapshot(db_path, bytes_per_second=bytes_per_second)
+        store.prune(**backup_settings.get("retention", {}))
 
-        config.write_settings()
+        return store.manifest_path(snapshot), snapshot.counts
 
-        time.sleep(config.backup_interval)
+    db_name = os.path.splitext(os.path.basename(db_path))[0]
+    date = dt.now().strftime(backup_settings["date"])
+    destination = os.path.join(
+        backup_path, backup_settings["name"].format(dbName=db_name, date=date) + ".db"
+    )
 
+    counts = hot_backup(db_path, destination, bytes_per_second=bytes_per_second)
 
-backup()
+    return destination, counts
@@ -0,0 +1,314 @@
+"""
+Deduplicated backup storage for SimpleCTE databases.
+Instead of copying the whole database for every backup, each snapshot is split into chunks
+that are stored once, compressed, under the hash of their contents. A snapshot is then just
+a small manifest listing its chunks, so a backup only costs the disk space of what changed.
+
+Run this file directly to list or restore snapshots:
+    python simplecte/utils/backup_store.py list <store path>
+    python simplecte/utils/backup_store.py restore <store path> <snapshot id> <destination>
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import zlib
+from dataclasses import dataclass, asdict
+from datetime import datetime as dt
+
+if __name__ == "__main__":
+    # Running as a script puts simplecte/utils on the path instead of simplecte/
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.backup import hot_backup
+
+__all__ = ("BackupStore", "Snapshot")
+
+# SQLite rewrites pages in place, so unchanged data stays at the same offset between
+# snapshots. Fixed chunks that are a multiple of every possible page size (512 B to 64 KiB)
+# therefore line up with page boundaries and deduplicate as well as content-defined chunks would.
+CHUNK_SIZE = 64 * 1024
+COMPRESSION_LEVEL = 6
+SNAPSHOT_ID_FORMAT = "%Y%m%d-%H%M%S"
+
+
+@dataclass
+class Snapshot:
+    id: str
+    db_name: str
+    created: float  # POSIX timestamp
+    size: int
+    chunks: list[str]
+    counts: dict[str, int] | None = (
+        None  # Row counts of the database when it was backed up
+    )
+
+    @property
+    def created_at(self) -> dt:
+        return dt.fromtimestamp(self.created)
+
+
+class BackupStore:
+    """
+    A folder holding deduplicated database snapshots. The layout is:
+        chunks/<first two hex digits>/<sha256>   zlib-compressed chunk data
+        snapshots/<snapshot id>.json             the chunk list of one snapshot
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.chunks_path = os.path.join(path, "chunks")
+        self.snapshots_path = os.path.join(path, "snapshots")
+
+        os.makedirs(self.chunks_path, exist_ok=True)
+        os.makedirs(self.snapshots_path, exist_ok=True)
+
+    def _chunk_file(self, digest: str) -> str:
+        return os.path.join(self.chunks_path, digest[:2], digest)
+
+    def _write_chunk(self, digest: str, data: bytes) -> bool:
+        """
+        Store a chunk if it is not stored already. Returns whether it was new.
+        """
+        chunk_file = self._chunk_file(digest)
+
+        if os.path.exists(chunk_file):
+            return False
+
+        os.makedirs(os.path.dirname(chunk_file), exist_ok=True)
+
+        temp_file = chunk_file + ".part"
+        with open(temp_file, "wb") as f:
+            f.write(zlib.compress(data, COMPRESSION_LEVEL))
+
+        os.replace(temp_file, chunk_file)
+        return True
+
+    def _read_chunk(self, digest: str) -> bytes:
+        with open(self._chunk_file(digest), "rb") as f:
+            data = zlib.decompress(f.read())
+
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Backup chunk {digest} is corrupted.")
+
+        return data
+
+    def _new_snapshot_id(self, created: dt) -> str:
+        snapshot_id = created.strftime(SNAPSHOT_ID_FORMAT)
+        suffix = 1
+
+        # Two snapshots can be taken in the same second, so make sure the ID is unique
+        while os.path.exists(self.manifest_path(snapshot_id)):
+            suffix += 1
+            snapshot_id = f"{created.strftime(SNAPSHOT_ID_FORMAT)}-{suffix}"
+
+        return snapshot_id
+
+    def add_file(
+        self,
+        file_path: str,
+        db_name: str | None = None,
+        counts: dict[str, int] | None = None,
+    ) -> Snapshot:
+        """
+        Store a snapshot of a file that nothing is writing to, such as a finished backup.
+        Use add_snapshot() to back up a live database.
+        """
+        created = dt.now()
+        chunks = []
+        size = 0
+
+        with open(file_path, "rb") as f:
+            while data := f.read(CHUNK_SIZE):
+                digest = hashlib.sha256(data).hexdigest()
+                self._write_chunk(digest, data)
+
+                chunks.append(digest)
+                size += len(data)
+
+        if db_name is None:
+            db_name = os.path.splitext(os.path.basename(file_path))[0]
+
+        snapshot = Snapshot(
+            id=self._new_snapshot_id(created),
+            db_name=db_name,
+            created=created.timestamp(),
+            size=size,
+            chunks=chunks,
+            counts=counts,
+        )
+
+        # The manifest is written last, so a snapshot only exists once all its chunks do
+        manifest = self.manifest_path(snapshot)
+        with open(manifest + ".part", "w") as f:
+            json.dump(asdict(snapshot), f)
+
+        os.replace(manifest + ".part", manifest)
+
+        return snapshot
+
+    def add_snapshot(
+        self, db_path: str, bytes_per_second: int | None = None
+    ) -> Snapshot:
+        """
+        Take a consistent snapshot of a live database and store it.
+        """
+        db_name = os.path.splitext(os.path.basename(db_path))[0]
+        temp_path = os.path.join(self.path, f"{db_name}.snapshot.db")
+
+        counts = hot_backup(db_path, temp_path, bytes_per_second=bytes_per_second)
+
+        try:
+            return self.add_file(temp_path, db_name=db_name, counts=counts)
+        finally:
+            os.remove(temp_path)
+
+    def manifest_path(self, snapshot: "Snapshot | str") -> str:
+        snapshot_id = snapshot if isinstance(snapshot, str) else snapshot.id
+        return os.path.join(self.snapshots_path, snapshot_id + ".json")
+
+    def snapshots(self) -> list[Snapshot]:
+        """
+        Get every snapshot in the store, oldest first.
+        """
+        snapshots = []
+
+        for file_name in os.listdir(self.snapshots_path):
+            if not file_name.endswith(".json"):
+                continue
+
+            with open(os.path.join(self.snapshots_path, file_name), "r") as f:
+                snapshots.append(Snapshot(**json.load(f)))
+
+        return sorted(snapshots, key=lambda s: s.created)
+
+    def get_snapshot(self, snapshot_id: str) -> Snapshot | None:
+        manifest = self.manifest_path(snapshot_id)
+
+        if not os.path.exists(manifest):
+            return None
+
+        with open(manifest, "r") as f:
+            return Snapshot(**json.load(f))
+
+    def restore(self, snapshot: "Snapshot | str", destination: str) -> None:
+        """
+        Rebuild the database file of a snapshot at destination.
+        The file is assembled next to the destination and moved into place at the end,
+        so an interrupted restore never leaves a half-written database behind.
+        """
+        if isinstance(snapshot, str):
+            snapshot_id = snapshot
+            snapshot = self.get_snapshot(snapshot_id)
+
+            if snapshot is None:
+                raise ValueError(f"There is no snapshot called {snapshot_id}.")
+
+        temp_path = destination + ".part"
+
+        with open(temp_path, "wb") as f:
+            for digest in snapshot.chunks:
+                f.write(self._read_chunk(digest))
+
+        os.replace(temp_path, destination)
+
+    def delete_snapshot(self, snapshot: "Snapshot | str") -> None:
+        """
+        Delete a snapshot's manifest. Its chunks are removed by collect_garbage().
+        """
+        os.remove(self.manifest_path(snapshot))
+
+    def collect_garbage(self) -> int:
+        """
+        Delete every chunk that no snapshot uses anymore. Returns how many were deleted.
+        """
+        in_use = set()
+
+        for snapshot in self.snapshots():
+            in_use.update(snapshot.chunks)
+
+        deleted = 0
+
+        for folder in os.listdir(self.chunks_path):
+            folder_path = os.path.join(self.chunks_path, folder)
+
+            for digest in os.listdir(folder_path):
+                if digest not in in_use:
+                    os.remove(os.path.join(folder_path, digest))
+                    deleted += 1
+
+        return deleted
+
+    def prune(
+        self, hourly: int = 24, daily: int = 7, weekly: int = 4
+    ) -> list[Snapshot]:
+        """
+        Apply the retention rules: keep the newest snapshot of each of the last
+        `hourly` hours, `daily` days, and `weekly` weeks that have snapshots, and delete the rest.
+        The newest snapshot is always kept. Returns the deleted snapshots.
+        """
+        snapshots = self.snapshots()[::-1]  # Newest first
+
+        if not snapshots:
+            return []
+
+        keep = {snapshots[0].id}
+
+        for count, bucket_format in (
+            (hourly, "%Y-%m-%d %H"),
+            (daily, "%Y-%m-%d"),
+            (weekly, "%G-%V"),  # ISO year and week
+        ):
+            buckets = set()
+
+            for snapshot in snapshots:
+                if len(buckets) >= count:
+                    break
+
+                bucket = snapshot.created_at.strftime(bucket_format)
+
+                if bucket not in buckets:
+                    buckets.add(bucket)
+                    keep.add(snapshot.id)
+
+        removed = [s for s in snapshots if s.id not in keep]
+
+        for snapshot in removed:
+            self.delete_snapshot(snapshot)
+
+        if removed:
+            self.collect_garbage()
+
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage SimpleCTE backup snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="List the snapshots in a store.")
+    list_parser.add_argument("store")
+
+    restore_parser = commands.add_parser("restore", help="Restore a snapshot.")
+    restore_parser.add_argument("store")
+    restore_parser.add_argument("snapshot")
+    restore_parser.add_argument("destination")
+
+    args = parser.parse_args()
+    store = BackupStore(args.store)
+
+    if args.command == "list":
+        for snapshot in store.snapshots():
+            print(
+                f"{snapshot.id}  {snapshot.db_name}  "
+                f"{snapshot.created_at:%m/%d/%Y %H:%M:%S}  {snapshot.size} bytes"
+            )
+
+    elif args.command == "restore":
+        store.restore(args.snapshot, args.destination)
+
+
+if __name__ == "__main__":
+    main()
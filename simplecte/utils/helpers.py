@@ -1,3 +1,6 @@
+from typing import Any, Callable
+
+
 def format_phone(phone_number: int, truncate: bool = True) -> str:
     """
     Convert a ten-digit or eleven-digit phone number, such as
@@ -32,3 +35,54 @@ def strip_phone(phone_number: str) -> int:
     )
 
     return int(phone_number)
+
+
+def split_phone(phone_number: str | int) -> tuple[str, str]:
+    """
+    Split a phone number as it was typed, such as (012) 345-6789 x12, into its digits
+    and the digits of its extension, such as ("0123456789", "12"), keeping leading zeros.
+    Raises ValueError if it isn't a phone number.
+    """
+    text = str(phone_number)
+    phone_number = text.strip().lower()
+    extension = ""
+
+    for marker in ("ext.", "ext", "x", "#"):
+        if marker in phone_number:
+            phone_number, extension = phone_number.split(marker, 1)
+            break
+
+    digits = "".join(c for c in phone_number if c.isdigit())
+    extension = extension.strip(" .")
+
+    if (
+        not digits
+        or phone_number.strip(" ()-+.0123456789")
+        or not (extension == "" or extension.isdigit())
+    ):
+        raise ValueError(f"Invalid phone number: {text}")
+
+    return digits, extension
+
+
+def join_phone(digits: str, extension: str = "", formatted: bool = True) -> str:
+    """
+    Turn the parts of a phone number from split_phone() back into one, formatted by default.
+    """
+    phone_number = format_phone(digits, False) if formatted else digits
+
+    if extension:
+        phone_number += f" x{extension}"
+
+    return phone_number
+
+
+def attempt(action: Callable, *args, **kwargs) -> tuple[Any, Exception | None]:
+    """
+    Run a window's long operation, returning what it returns and None, or None and
+    the exception it raised, since an exception would otherwise be lost on its thread.
+    """
+    try:
+        return action(*args, **kwargs), None
+    except Exception as e:
+        return None, e
@@ -0,0 +1,131 @@
+"""
+Latency histograms of the UI's event handlers, so slow handlers can be found from
+real use instead of guesses. Each handler's times are counted in buckets that grow
+by about 19% each, from 10 microseconds to over a minute, so recording a time costs
+one logarithm and percentiles are accurate to within a bucket no matter how many
+events were recorded.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from tabulate import tabulate
+
+__all__ = ("LatencyHistogram", "LatencyRecorder")
+
+# The upper bound of the first bucket, in seconds, and how many buckets there are per doubling
+SMALLEST = 0.00001
+STEPS_PER_DOUBLING = 4
+BUCKETS = 100
+
+
+class LatencyHistogram:
+    """
+    Counts how many times fell into each bucket.
+    """
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def _bucket(seconds: float) -> int:
+        if seconds <= SMALLEST:
+            return 0
+
+        bucket = math.ceil(math.log2(seconds / SMALLEST) * STEPS_PER_DOUBLING)
+
+        return min(bucket, BUCKETS - 1)
+
+    @staticmethod
+    def _upper_bound(bucket: int) -> float:
+        return SMALLEST * 2 ** (bucket / STEPS_PER_DOUBLING)
+
+    def record(self, seconds: float) -> None:
+        self.counts[self._bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent: float) -> float:
+        """
+        The time that percent of the recorded times were at or below, as the upper
+        bound of its bucket, but never more than the longest time recorded.
+        """
+        if not self.count:
+            return 0.0
+
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+
+        for bucket, count in enumerate(self.counts):
+            seen += count
+
+            if seen >= rank:
+                return min(self._upper_bound(bucket), self.max)
+
+        return self.max
+
+
+class LatencyRecorder:
+    """
+    A histogram for each handler, by name.
+    """
+
+    def __init__(self):
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = LatencyHistogram()
+
+            self.histograms[name].record(seconds)
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        """
+        Record how long the code inside the with statement takes under name,
+        even if it leaves early.
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self) -> list[list]:
+        """
+        The count, mean, p50, p95, p99 and maximum in milliseconds of each handler,
+        slowest p99 first.
+        """
+        with self._lock:
+            rows = [
+                [
+                    name,
+                    h.count,
+                    h.total / h.count * 1000,
+                    h.percentile(50) * 1000,
+                    h.percentile(95) * 1000,
+                    h.percentile(99) * 1000,
+                    h.max * 1000,
+                ]
+                for name, h in self.histograms.items()
+                if h.count
+            ]
+
+        return sorted(rows, key=lambda row: row[5], reverse=True)
+
+    def report(self) -> str:
+        return tabulate(
+            self.summary(),
+            headers=["Handler", "Count", "Mean ms", "p50", "p95", "p99", "Max"],
+            floatfmt=".2f",
+        )
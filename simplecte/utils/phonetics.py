@@ -0,0 +1,517 @@
+"""
+Phonetic codes for names, so names that sound alike can be found however they're spelled.
+This is Lawrence Philips' Double Metaphone. Each word gets a primary code and an
+alternate code for another way it's commonly pronounced, such as "Schmidt" as both
+XMT and SMT, which lets it match "Smith" (SM0 and XMT).
+"""
+
+import re
+import unicodedata
+
+__all__ = ("double_metaphone", "name_codes")
+
+VOWELS = set("AEIOUY")
+
+# What follows a G at the start of a word that's said like a J or a K, as in "Gerald"
+SOFT_G_STARTS = ("ES", "EP", "EB", "EL", "EY", "IB", "IL", "IN", "IE", "EI", "ER")
+
+# Codes are cut to this many letters, like the original algorithm
+MAX_LENGTH = 4
+
+
+def double_metaphone(word: str) -> tuple[str, str]:
+    """
+    Get the primary and alternate Double Metaphone codes of a word, such as
+    ("STFN", "STFN") for both "Steven" and "Stephen". The alternate code is the
+    same as the primary one if the word has only one likely pronunciation.
+    """
+    word = unicodedata.normalize("NFKD", word.upper())
+    word = "".join(c for c in word if "A" <= c <= "Z" or c == " ")
+    length = len(word)
+    last = length - 1
+
+    if not word.strip():
+        return "", ""
+
+    # Padding, so looking past the end of the word never fails
+    word += "     "
+    primary, secondary = [], []
+
+    def add(main: str, alternate: str | None = None) -> None:
+        primary.append(main)
+        secondary.append(main if alternate is None else alternate)
+
+    def at(start: int, *options: str) -> bool:
+        if start < 0:
+            return False
+
+        return any(word[start : start + len(option)] == option for option in options)
+
+    def vowel(position: int) -> bool:
+        return 0 <= position < length and word[position] in VOWELS
+
+    slavo_germanic = any(s in word for s in ("W", "K", "CZ", "WITZ"))
+    current = 0
+
+    # Letters that are silent at the start of a word
+    if at(0, "GN", "KN", "PN", "WR", "PS"):
+        current += 1
+
+    # An X at the start is said like an S, as in "Xavier"
+    if word[0] == "X":
+        add("S")
+        current += 1
+
+    while current < length:
+        letter = word[current]
+
+        if letter in VOWELS:
+            if current == 0:
+                add("A")
+
+            current += 1
+
+        elif letter == "B":
+            add("P")
+            current += 2 if word[current + 1] == "B" else 1
+
+        elif letter == "C":
+            if (
+                current > 1
+                and not vowel(current - 2)
+                and at(current - 1, "ACH")
+                and word[current + 2] != "I"
+                and (word[current + 2] != "E" or at(current - 2, "BACHER", "MACHER"))
+            ):
+                add("K")
+                current += 2
+
+            elif current == 0 and at(current, "CAESAR"):
+                add("S")
+                current += 2
+
+            elif at(current, "CHIA"):
+                add("K")
+                current += 2
+
+            elif at(current, "CH"):
+                if current > 0 and at(current, "CHAE"):
+                    add("K", "X")
+
+                elif (
+                    current == 0
+                    and (
+                        at(current + 1, "HARAC", "HARIS")
+                        or at(current + 1, "HOR", "HYM", "HIA", "HEM")
+                    )
+                    and not at(0, "CHORE")
+                ):
+                    add("K")
+
+                elif (
+                    at(0, "VAN ", "VON ", "SCH")
+                    or at(current - 2, "ORCHES", "ARCHIT", "ORCHID")
+                    or at(current + 2, "T", "S")
+                    or (
+                        (at(current - 1, "A", "O", "U", "E") or current == 0)
+                        and word[current + 2] in "LRNMBHFVW "
+                    )
+                ):
+                    add("K")
+
+                elif current > 0:
+                    if at(0, "MC"):
+                        add("K")
+                    else:
+                        add("X", "K")
+
+                else:
+                    add("X")
+
+                current += 2
+
+            elif at(current, "CZ") and not at(current - 2, "WICZ"):
+                add("S", "X")
+                current += 2
+
+            elif at(current + 1, "CIA"):
+                add("X")
+                current += 3
+
+            elif at(current, "CC") and not (current == 1 and word[0] == "M"):
+                if at(current + 2, "I", "E", "H") and not at(current + 2, "HU"):
+                    if (current == 1 and word[0] == "A") or at(
+                        current - 1, "UCCEE", "UCCES"
+                    ):
+                        add("KS")
+                    else:
+                        add("X")
+
+                    current += 3
+
+                else:
+                    add("K")
+                    current += 2
+
+            elif at(current, "CK", "CG", "CQ"):
+                add("K")
+                current += 2
+
+            elif at(current, "CI", "CE", "CY"):
+                if at(current, "CIO", "CIE", "CIA"):
+                    add("S", "X")
+                else:
+                    add("S")
+                current += 2
+
+            else:
+                add("K")
+
+                if at(current + 1, " C", " Q", " G"):
+                    current += 3
+                elif at(current + 1, "C", "K", "Q") and not at(current + 1, "CE", "CI"):
+                    current += 2
+                else:
+                    current += 1
+
+        elif letter == "D":
+            if at(current, "DG"):
+                if at(current + 2, "I", "E", "Y"):
+                    add("J")
+                    current += 3
+                else:
+                    add("TK")
+                    current += 2
+
+            else:
+                add("T")
+                current += 2 if at(current, "DT", "DD") else 1
+
+        elif letter == "F":
+            add("F")
+            current += 2 if word[current + 1] == "F" else 1
+
+        elif letter == "G":
+            if word[current + 1] == "H":
+                if current > 0 and not vowel(current - 1):
+                    add("K")
+
+                elif current == 0:
+                    if word[current + 2] == "I":
+                        add("J")
+                    else:
+                        add("K")
+
+                # Silent, as in "Hugh" and "bough"
+                elif not (
+                    (current > 1 and at(current - 2, "B", "H", "D"))
+                    or (current > 2 and at(current - 3, "B", "H", "D"))
+                    or (current > 3 and at(current - 4, "B", "H"))
+                ):
+                    # Said like an F, as in "laugh" and "tough"
+                    if (
+                        current > 2
+                        and word[current - 1] == "U"
+                        and at(current - 3, "C", "G", "L", "R", "T")
+                    ):
+                        add("F")
+
+                    elif current > 0 and word[current - 1] != "I":
+                        add("K")
+
+                current += 2
+
+            elif word[current + 1] == "N":
+                if current == 1 and vowel(0) and not slavo_germanic:
+                    add("KN", "N")
+                elif not at(current + 2, "EY") and not slavo_germanic:
+                    add("N", "KN")
+                else:
+                    add("KN")
+
+                current += 2
+
+            elif at(current + 1, "LI") and not slavo_germanic:
+                add("KL", "L")
+                current += 2
+
+            elif current == 0 and (
+                word[current + 1] == "Y" or at(current + 1, *SOFT_G_STARTS)
+            ):
+                add("K", "J")
+                current += 2
+
+            elif (
+                (at(current + 1, "ER") or word[current + 1] == "Y")
+                and not at(0, "DANGER", "RANGER", "MANGER")
+                and not at(current - 1, "E", "I", "RGY", "OGY")
+            ):
+                add("K", "J")
+                current += 2
+
+            elif at(current + 1, "E", "I", "Y") or at(current - 1, "AGGI", "OGGI"):
+                if at(0, "VAN ", "VON ", "SCH") or at(current + 1, "ET"):
+                    add("K")
+                elif at(current + 1, "IER "):
+                    add("J")
+                else:
+                    add("J", "K")
+
+                current += 2
+
+            else:
+                add("K")
+                current += 2 if word[current + 1] == "G" else 1
+
+        elif letter == "H":
+            # Only said between vowels or at the start of a word
+            if (current == 0 or vowel(current - 1)) and vowel(current + 1):
+                add("H")
+                current += 2
+            else:
+                current += 1
+
+        elif letter == "J":
+            if at(current, "JOSE") or at(0, "SAN "):
+                if (current == 0 and word[current + 4] == " ") or at(0, "SAN "):
+                    add("H")
+                else:
+                    add("J", "H")
+
+            elif current == 0:
+                add("J", "A")
+
+            elif (
+                vowel(current - 1)
+                and not slavo_germanic
+                and word[current + 1] in ("A", "O")
+            ):
+                add("J", "H")
+
+            elif current == last:
+                add("J", "")
+
+            elif not at(current + 1, "L", "T", "K", "S", "N", "M", "B", "Z") and not at(
+                current - 1, "S", "K", "L"
+            ):
+                add("J")
+
+            current += 2 if word[current + 1] == "J" else 1
+
+        elif letter == "K":
+            add("K")
+            current += 2 if word[current + 1] == "K" else 1
+
+        elif letter == "L":
+            if word[current + 1] == "L":
+                # Spanish names, as in "Cabrillo" and "Gallegos"
+                if (
+                    current == length - 3 and at(current - 1, "ILLO", "ILLA", "ALLE")
+                ) or (
+                    (at(last - 1, "AS", "OS") or at(last, "A", "O"))
+                    and at(current - 1, "ALLE")
+                ):
+                    add("L", "")
+                else:
+                    add("L")
+
+                current += 2
+
+            else:
+                add("L")
+                current += 1
+
+        elif letter == "M":
+            add("M")
+
+            if (
+                at(current - 1, "UMB")
+                and (current + 1 == last or at(current + 2, "ER"))
+            ) or word[current + 1] == "M":
+                current += 2
+            else:
+                current += 1
+
+        elif letter == "N":
+            add("N")
+            current += 2 if word[current + 1] == "N" else 1
+
+        elif letter == "P":
+            if word[current + 1] == "H":
+                add("F")
+                current += 2
+            else:
+                add("P")
+                current += 2 if word[current + 1] in ("P", "B") else 1
+
+        elif letter == "Q":
+            add("K")
+            current += 2 if word[current + 1] == "Q" else 1
+
+        elif letter == "R":
+            # French names, as in "Rogier"
+            if (
+                current == last
+                and not slavo_germanic
+                and at(current - 2, "IE")
+                and not at(current - 4, "ME", "MA")
+            ):
+                add("", "R")
+            else:
+                add("R")
+
+            current += 2 if word[current + 1] == "R" else 1
+
+        elif letter == "S":
+            # Silent, as in "island" and "Carlysle"
+            if at(current - 1, "ISL", "YSL"):
+                current += 1
+
+            elif current == 0 and at(current, "SUGAR"):
+                add("X", "S")
+                current += 1
+
+            elif at(current, "SH"):
+                if at(current + 1, "HEIM", "HOEK", "HOLM", "HOLZ"):
+                    add("S")
+                else:
+                    add("X")
+
+                current += 2
+
+            elif at(current, "SIO", "SIA", "SIAN"):
+                if slavo_germanic:
+                    add("S")
+                else:
+                    add("S", "X")
+                current += 3
+
+            elif (current == 0 and at(current + 1, "M", "N", "L", "W")) or at(
+                current + 1, "Z"
+            ):
+                add("S", "X")
+                current += 2 if word[current + 1] == "Z" else 1
+
+            elif at(current, "SC"):
+                if word[current + 2] == "H":
+                    # Dutch names, as in "Schoonmaker"
+                    if at(current + 3, "OO", "ER", "EN", "UY", "ED", "EM"):
+                        if at(current + 3, "ER", "EN"):
+                            add("X", "SK")
+                        else:
+                            add("SK")
+
+                    elif current == 0 and not vowel(3) and word[3] != "W":
+                        add("X", "S")
+
+                    else:
+                        add("X")
+
+                elif at(current + 2, "I", "E", "Y"):
+                    add("S")
+
+                else:
+                    add("SK")
+
+                current += 3
+
+            else:
+                # French names, as in "Artois"
+                if current == last and at(current - 2, "AI", "OI"):
+                    add("", "S")
+                else:
+                    add("S")
+
+                current += 2 if word[current + 1] in ("S", "Z") else 1
+
+        elif letter == "T":
+            if at(current, "TION", "TIA", "TCH"):
+                add("X")
+                current += 3
+
+            elif at(current, "TH", "TTH"):
+                if at(current + 2, "OM", "AM") or at(0, "VAN ", "VON ", "SCH"):
+                    add("T")
+                else:
+                    add("0", "T")
+
+                current += 2
+
+            else:
+                add("T")
+                current += 2 if word[current + 1] in ("T", "D") else 1
+
+        elif letter == "V":
+            add("F")
+            current += 2 if word[current + 1] == "V" else 1
+
+        elif letter == "W":
+            if at(current, "WR"):
+                add("R")
+                current += 2
+                continue
+
+            if current == 0 and (vowel(current + 1) or at(current, "WH")):
+                if vowel(current + 1):
+                    add("A", "F")
+                else:
+                    add("A")
+
+            # Polish names, as in "Filipowicz"
+            if (
+                (current == last and vowel(current - 1))
+                or at(current - 1, "EWSKI", "EWSKY", "OWSKI", "OWSKY")
+                or at(0, "SCH")
+            ):
+                add("", "F")
+                current += 1
+
+            elif at(current, "WICZ", "WITZ"):
+                add("TS", "FX")
+                current += 4
+
+            else:
+                current += 1
+
+        elif letter == "X":
+            # Silent at the end of French names, as in "Breaux"
+            if not (
+                current == last
+                and (at(current - 3, "IAU", "EAU") or at(current - 2, "AU", "OU"))
+            ):
+                add("KS")
+
+            current += 2 if word[current + 1] in ("C", "X") else 1
+
+        elif letter == "Z":
+            if word[current + 1] == "H":
+                add("J")
+                current += 2
+
+            else:
+                if at(current + 1, "ZO", "ZI", "ZA") or (
+                    slavo_germanic and current > 0 and word[current - 1] != "T"
+                ):
+                    add("S", "TS")
+                else:
+                    add("S")
+
+                current += 2 if word[current + 1] == "Z" else 1
+
+        else:
+            current += 1
+
+    return "".join(primary)[:MAX_LENGTH], "".join(secondary)[:MAX_LENGTH]
+
+
+def name_codes(name: str) -> list[set[str]]:
+    """
+    Get the phonetic codes of each word of a name, both primary and alternate.
+    """
+    codes = []
+
+    for word in re.split(r"[^\w]+", name):
+        if found := {code for code in double_metaphone(word) if code}:
+            codes.append(found)
+
+    return codes
@@ -0,0 +1,203 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+__all__ = ("Scheduler", "Job", "Budget")
+
+
+@dataclass
+class Budget:
+    """
+    Limits on how much of the machine scheduled jobs may use.
+    cpu is the fraction of wall-clock time jobs may spend running, and io is
+    the number of bytes per second jobs should read or write at most.
+    """
+
+    cpu: float = 0.25
+    io: int | None = 8 * 1024 * 1024
+
+    def io_pause(self, num_bytes: int) -> float:
+        """
+        Get how long a job should pause after moving num_bytes to stay within the I/O budget.
+        """
+        if not self.io:
+            return 0
+
+        return num_bytes / self.io
+
+    def cpu_pause(self, cpu_seconds: float) -> float:
+        """
+        Get how long the scheduler should stay idle after a job used cpu_seconds of CPU time.
+        """
+        if not self.cpu or self.cpu >= 1:
+            return 0
+
+        return cpu_seconds * (1 / self.cpu - 1)
+
+
+@dataclass(order=True)
+class Job:
+    due: float  # POSIX timestamp of the next run
+    priority: int  # Lower runs first when jobs are due at the same time
+    sequence: int
+    name: str = field(compare=False)
+    action: Callable[[], None] = field(compare=False)
+    interval: float | None = field(default=None, compare=False)  # None runs once
+    cancelled: bool = field(default=False, compare=False)
+
+
+class Scheduler:
+    """
+    Runs timed jobs on a single background thread. Jobs wait in a priority queue
+    ordered by due time, and the thread sleeps until exactly the next due time
+    instead of polling. Adding or cancelling a job wakes the thread up so it can
+    recalculate when to run next.
+    """
+
+    def __init__(self, budget: Budget | None = None):
+        self.logger = logging.getLogger("scheduler")
+        self.budget = budget or Budget()
+        self._queue: list[Job] = []
+        self._jobs: dict[str, Job] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._running = False
+        self._not_before = 0.0  # Jobs can't run before this, to stay in the CPU budget
+
+    def schedule(
+        self,
+        name: str,
+        action: Callable[[], None],
+        interval: float | None = None,
+        delay: float = 0,
+        at: float | None = None,
+        priority: int = 10,
+    ) -> Job:
+        """
+        Schedule a job to run `delay` seconds from now, or at the timestamp `at`.
+        If interval is given, the job repeats every `interval` seconds after that.
+        A job with the same name as an existing job replaces it.
+        """
+        with self._condition:
+            self._cancel(name)
+
+            job = Job(
+                due=at if at is not None else time.time() + delay,
+                priority=priority,
+                sequence=next(self._sequence),
+                name=name,
+                action=action,
+                interval=interval,
+            )
+
+            heapq.heappush(self._queue, job)
+            self._jobs[name] = job
+            self._condition.notify()
+
+        return job
+
+    def _cancel(self, name: str) -> None:
+        job = self._jobs.pop(name, None)
+
+        if job is not None:
+            # Cancelled jobs are dropped when they reach the front of the queue
+            job.cancelled = True
+
+    def cancel(self, name: str) -> None:
+        with self._condition:
+            self._cancel(name)
+            self._condition.notify()
+
+    def next_due(self, name: str) -> float | None:
+        with self._condition:
+            job = self._jobs.get(name)
+            return job.due if job else None
+
+    def _next_job(self) -> Job | None:
+        """
+        Wait until the next job is due and take it off the queue.
+        Returns None once the scheduler is stopped.
+        """
+        with self._condition:
+            while self._running:
+                while self._queue and self._queue[0].cancelled:
+                    heapq.heappop(self._queue)
+
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+
+                wake_at = max(self._queue[0].due, self._not_before)
+                timeout = wake_at - time.time()
+
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+
+                job = heapq.heappop(self._queue)
+
+                if job.interval is None:
+                    self._jobs.pop(job.name, None)
+
+                return job
+
+        return None
+
+    def _run_job(self, job: Job) -> None:
+        started = time.time()
+        cpu_started = time.thread_time()
+
+        try:
+            job.action()
+        except Exception:
+            self.logger.exception(f"Scheduled job {job.name} failed.")
+
+        cpu_used = time.thread_time() - cpu_started
+        self.logger.info(
+            f"Ran {job.name} in {time.time() - started:.2f}s ({cpu_used:.2f}s CPU)."
+        )
+
+        with self._condition:
+            self._not_before = time.time() + self.budget.cpu_pause(cpu_used)
+
+            if job.interval is not None and not job.cancelled:
+                job.due = started + job.interval
+                job.sequence = next(self._sequence)
+                heapq.heappush(self._queue, job)
+
+    def _loop(self) -> None:
+        while (job := self._next_job()) is not None:
+            self._run_job(job)
+
+    def run_forever(self) -> None:
+        """
+        Run jobs on the current thread until stop() is called.
+        """
+        self._running = True
+        self._loop()
+
+    def start(self) -> None:
+        """
+        Run jobs on a background thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._loop, name="scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, wait: bool = False) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+        if wait and self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# SimpleCTE imports its packages from the simplecte folder, like main.py does
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "simplecte")
+)
+
+
+@pytest.fixture(scope="session")
+def database(tmp_path_factory):
+    """
+    The app's database, opened on a new file in ID block 1 of a replicated setup.
+    Pony can only bind it once, so every test shares it.
+    """
+    from database import db
+    from database.replication import enable_replication
+
+    path = str(tmp_path_factory.mktemp("database") / "simplecte.db")
+    enable_replication(path, block=1)
+    db.construct_database("sqlite", path)
+
+    yield db
+
+    db.read_pool.close()
+    db.disconnect()
@@ -0,0 +1,133 @@
+"""
+Tests for backups, checking them, and thinning out a backup store's snapshots.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime as dt, timedelta
+
+import pytest
+
+from utils.backup import backup, hot_backup, verify_backup
+from utils.backup_store import BackupStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "simplecte.db")
+    connection = sqlite3.connect(path)
+
+    with connection:
+        connection.execute("CREATE TABLE Contact (id INTEGER PRIMARY KEY, name TEXT)")
+        connection.executemany(
+            "INSERT INTO Contact (name) VALUES (?)",
+            [(f"Contact {i}",) for i in range(500)],
+        )
+
+        # Enough data to fill several of the backup store's chunks
+        connection.execute("CREATE TABLE Note (id INTEGER PRIMARY KEY, text TEXT)")
+        connection.executemany(
+            "INSERT INTO Note (text) VALUES (?)", [("x" * 500,)] * 1000
+        )
+
+    connection.close()
+
+    return path
+
+
+def test_hot_backup_is_a_verified_copy(db_path, tmp_path):
+    destination = str(tmp_path / "backup.db")
+    counts = hot_backup(db_path, destination, step_delay=0)
+
+    assert counts == {"Contact": 500, "Note": 1000}
+    assert verify_backup(destination, counts) == []
+    assert not os.path.exists(destination + ".part")
+
+
+def test_verify_finds_missing_rows_and_damage(db_path, tmp_path):
+    destination = str(tmp_path / "backup.db")
+    hot_backup(db_path, destination, step_delay=0)
+
+    assert verify_backup(destination, {"Contact": 501}) == [
+        "Contact has 500 rows instead of 501."
+    ]
+
+    with open(destination, "r+b") as f:
+        f.write(b"not a database at all")
+
+    assert verify_backup(destination)
+    assert verify_backup(str(tmp_path / "missing.db")) == [
+        f"{tmp_path / 'missing.db'} does not exist."
+    ]
+
+
+def test_incremental_backup_is_verified(db_path, tmp_path):
+    settings = {"path": str(tmp_path / "backups"), "incremental": True}
+    manifest, counts = backup(db_path, settings)
+
+    assert manifest.endswith(".json")
+    assert verify_backup(manifest, counts) == []
+
+
+def test_snapshots_share_unchanged_chunks(db_path, tmp_path):
+    store = BackupStore(str(tmp_path / "store"))
+    first = store.add_snapshot(db_path)
+
+    connection = sqlite3.connect(db_path)
+
+    with connection:
+        connection.execute("UPDATE Contact SET name = 'Changed' WHERE id = 1")
+
+    connection.close()
+
+    second = store.add_snapshot(db_path)
+    stored = sum(len(files) for _, _, files in os.walk(store.chunks_path))
+
+    assert len(first.chunks) > 2
+    assert stored < len(first.chunks) + len(second.chunks)
+
+    restored = str(tmp_path / "restored.db")
+    store.restore(first.id, restored)
+    connection = sqlite3.connect(restored)
+
+    try:
+        assert connection.execute(
+            "SELECT name FROM Contact WHERE id = 1"
+        ).fetchone() == ("Contact 0",)
+    finally:
+        connection.close()
+
+
+def test_prune_keeps_one_snapshot_per_period(db_path, tmp_path):
+    store = BackupStore(str(tmp_path / "store"))
+    now = dt(2026, 3, 18, 12, 30)
+
+    # Two snapshots an hour for the last three hours, and one a day for ten days before that
+    times = [now - timedelta(hours=h, minutes=m) for h in range(3) for m in (0, 10)]
+    times += [now - timedelta(days=d) for d in range(1, 11)]
+
+    for created in times:
+        snapshot = store.add_file(db_path)
+
+        with open(store.manifest_path(snapshot), "r+") as f:
+            manifest = json.load(f)
+            manifest["created"] = created.timestamp()
+            f.seek(0)
+            f.truncate()
+            json.dump(manifest, f)
+
+    removed = store.prune(hourly=3, daily=5, weekly=0)
+    kept = [snapshot.created_at for snapshot in store.snapshots()]
+
+    # The older snapshot of each hour, and the days beyond the last five, are deleted
+    assert len(removed) == 3 + 6
+    assert sorted(kept, reverse=True) == [
+        now,
+        now - timedelta(hours=1),
+        now - timedelta(hours=2),
+        now - timedelta(days=1),
+        now - timedelta(days=2),
+        now - timedelta(days=3),
+        now - timedelta(days=4),
+    ]
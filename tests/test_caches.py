@@ -0,0 +1,124 @@
+"""
+Tests that the caches kept about the records follow the changes write methods report,
+see records_changed(), and are emptied by reset_caches().
+"""
+
+from database.graph import RecordGraph
+
+
+def _name_search(database, query: str) -> list[int]:
+    return database.read(
+        lambda connection: database.name_index.search(connection, "organization", query)
+    )
+
+
+def _neighbors(database, node) -> dict:
+    return database.read(lambda connection: database.graph.within(connection, node, 1))
+
+
+def test_name_index_follows_renames(database):
+    org = database.create_organization(name="Quillfeather Guild", type="Community")
+
+    assert org.id in _name_search(database, "Quilfeather")
+
+    database.update_organization(org.id, name="Larkspur Guild")
+
+    assert org.id not in _name_search(database, "Quillfeather")
+    assert org.id in _name_search(database, "Larkspr")
+
+
+def test_graph_follows_links(database):
+    org = database.create_organization(name="Riverside Clinic", type="Community")
+    contact = database.create_contact(first_name="Dana", last_name="Whitlock")
+    node = ("organization", org.id)
+
+    assert _neighbors(database, node) == {}
+
+    database.add_contact_to_org(contact.id, org.id)
+    assert _neighbors(database, node) == {("contact", contact.id): 1}
+
+    database.remove_contact_from_org(contact.id, org.id)
+    assert _neighbors(database, node) == {}
+
+
+def test_statistics_go_stale_on_changes(database):
+    def totals():
+        results = database.read(database.statistics.refresh)
+        return dict(results["totals"])
+
+    before = totals()
+    assert not database.statistics.stale
+
+    database.create_contact(first_name="Emil", last_name="Sato")
+
+    assert database.statistics.stale
+    assert totals()["Contacts"] == before["Contacts"] + 1
+
+
+def test_viewer_cache_drops_views_of_changed_records(database):
+    # Imported here because the viewers need the window's toolkit. process goes first,
+    # like in main.py, since ui_management imports from it.
+    import process  # noqa: F401
+    from ui_management import ViewerCache
+
+    cache = ViewerCache()
+    org = database.create_organization(name="Maple Street Garden", type="Community")
+    contact = database.create_contact(first_name="Femi", last_name="Adeyemi")
+    database.add_contact_to_org(contact.id, org.id)
+    database.change_listeners.append(cache.invalidate)
+
+    try:
+        view = cache.load("organization", org.id)
+        assert cache.get("organization", org.id) is view
+
+        # A change to a contact shown in the view drops it too
+        database.update_contact(contact.id, first_name="Femi-Ola")
+        assert cache.get("organization", org.id) is None
+
+        view = cache.load("organization", org.id)
+        assert "Femi-Ola Adeyemi" in str(view["tables"])
+    finally:
+        database.change_listeners.remove(cache.invalidate)
+
+
+def test_reset_caches_forgets_everything(database):
+    database.create_organization(name="Oakwood Library", type="Community")
+    _name_search(database, "Oakwood")
+    _neighbors(database, ("organization", 1))
+    database.read(database.statistics.refresh)
+
+    database.reset_caches()
+
+    assert database.name_index._indexes == {}
+    assert database.graph._neighbors is None
+    assert database.statistics.cached() == {}
+    assert database.statistics.stale
+
+
+def test_graph_rereads_only_changed_records():
+    class Connection:
+        """
+        Counts the statements the graph runs.
+        """
+
+        def __init__(self):
+            self.statements = []
+
+        def execute(self, sql, arguments=()):
+            self.statements.append(sql)
+            return []
+
+    graph = RecordGraph()
+    connection = Connection()
+
+    graph.within(connection, ("organization", 1))
+    built = len(connection.statements)
+
+    graph.within(connection, ("organization", 1))
+    assert len(connection.statements) == built
+
+    graph.invalidate({("organization", 1)})
+    graph.within(connection, ("organization", 1))
+
+    # Only the tables with an organization column are read again
+    assert len(connection.statements) == built + 2
@@ -0,0 +1,87 @@
+"""
+Tests for the write methods of Database, on a replicated database.
+"""
+
+from types import SimpleNamespace
+
+from pony import orm
+
+from database import Contact, NameSound, Organization, Phone, get_table_values
+from database.replication import id_range
+
+
+def test_create_contact_takes_ids_from_block(database):
+    start, end = id_range(database.id_block)
+
+    # Several words, so several phonetic codes are created in one go
+    contact = database.create_contact(first_name="Maria", last_name="de la Cruz Ortega")
+
+    with orm.db_session:
+        contact = Contact[contact.id]
+        sound_ids = [sound.id for sound in contact.sound_index]
+
+        assert start <= contact.id < end
+        assert len(sound_ids) > 1
+        assert all(start <= sound_id < end for sound_id in sound_ids)
+        assert len(set(sound_ids)) == len(sound_ids)
+
+
+def test_rename_gives_new_sounds_unused_ids(database):
+    org = database.create_organization(name="Northside Tool Library", type="Community")
+    database.update_organization(org.id, name="Northside Tool and Seed Library")
+
+    with orm.db_session:
+        ids = orm.select(s.id for s in NameSound)[:]
+
+        assert len(set(ids)) == len(ids)
+
+
+def test_records_with_several_phones_get_unique_ids(database):
+    start, end = id_range(database.id_block)
+
+    contact = database.create_contact(
+        first_name="Priya",
+        last_name="Natarajan",
+        phone_numbers=["(555) 201-3344", "555-201-7788 x12"],
+    )
+    org = database.create_organization(
+        name="Eastgate Makerspace",
+        type="Community",
+        phones=["5553010001", "5553010002"],
+    )
+    database.update_organization(
+        org.id, phones=["5553010003", "5553010004", "5553010005"]
+    )
+
+    with orm.db_session:
+        ids = orm.select(p.id for p in Phone)[:]
+
+        assert len(Contact[contact.id].phone_index) == 2
+        assert len(Organization[org.id].phone_index) == 3
+        assert len(set(ids)) == len(ids)
+        assert all(start <= i < end for i in ids)
+
+
+def test_phone_search_shows_matched_number_without_read_pool(database):
+    contact = database.create_contact(
+        first_name="Tomas",
+        last_name="Lindqvist",
+        phone_numbers=["5554440000", "5558675309"],
+    )
+    app = SimpleNamespace(db=database)
+    search_info = {"query": "555867", "field": "phone"}
+
+    with orm.db_session:
+        from_read_pool = get_table_values(app, Contact, search_info)
+
+        read_pool, database.read_pool = database.read_pool, None
+
+        try:
+            from_pony = get_table_values(app, Contact, search_info)
+        finally:
+            database.read_pool = read_pool
+
+    row = next(row for row in from_pony if row[0] == contact.id)
+
+    assert row == next(row for row in from_read_pool if row[0] == contact.id)
+    assert "867" in row[3]
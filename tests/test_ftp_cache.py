@@ -0,0 +1,131 @@
+"""
+Tests for FTPCache against a local FTP server from pyftpdlib, which records the
+commands it receives so the tests can check what was downloaded and from where.
+"""
+
+import ftplib
+import os
+import threading
+
+import pytest
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import FTPServer
+
+from database.ftp import BLOCK_SIZE, FTPCache
+
+REMOTE_PATH = "/simplecte.db"
+SIZE = BLOCK_SIZE * 4 + 123
+
+
+class RecordingHandler(FTPHandler):
+    commands: list[tuple[str, str]] = []
+
+    def pre_process_command(self, line, cmd, arg):
+        self.commands.append((cmd, arg))
+        super().pre_process_command(line, cmd, arg)
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / "server"
+    root.mkdir()
+    (root / REMOTE_PATH.lstrip("/")).write_bytes(os.urandom(SIZE))
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_user("user", "password", str(root), perm="elradfmwMT")
+
+    RecordingHandler.authorizer = authorizer
+    RecordingHandler.commands = []
+
+    ftp_server = FTPServer(("127.0.0.1", 0), RecordingHandler)
+    thread = threading.Thread(
+        target=ftp_server.serve_forever,
+        kwargs={"timeout": 0.1, "handle_exit": False},
+        daemon=True,
+    )
+    thread.start()
+
+    yield root, ftp_server.socket.getsockname()[1]
+
+    ftp_server.close_all()
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def cache(server, tmp_path):
+    _, port = server
+
+    return FTPCache(
+        "127.0.0.1",
+        REMOTE_PATH,
+        username="user",
+        password="password",
+        server_port=port,
+        cache_path=str(tmp_path / "cache"),
+    )
+
+
+def downloads() -> list[str]:
+    return [arg for cmd, arg in RecordingHandler.commands if cmd == "RETR"]
+
+
+def test_second_fetch_is_served_from_cache(server, cache):
+    root, _ = server
+    remote = (root / REMOTE_PATH.lstrip("/")).read_bytes()
+
+    path = cache.fetch()
+    assert open(path, "rb").read() == remote
+    assert len(downloads()) == 1
+
+    assert cache.fetch() == path
+    assert open(path, "rb").read() == remote
+    assert len(downloads()) == 1
+
+
+def test_interrupted_download_resumes_from_offset(server, cache, monkeypatch):
+    root, _ = server
+    remote = (root / REMOTE_PATH.lstrip("/")).read_bytes()
+    received = []
+
+    class InterruptedFTP(ftplib.FTP):
+        """
+        Loses the connection after the first block of the first download.
+        """
+
+        def retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+            if received:
+                return super().retrbinary(cmd, callback, blocksize, rest)
+
+            def write_then_drop(data):
+                callback(data)
+                received.append(len(data))
+                raise ConnectionResetError("The connection was lost.")
+
+            return super().retrbinary(cmd, write_then_drop, blocksize, rest)
+
+    monkeypatch.setattr(ftplib, "FTP", InterruptedFTP)
+
+    path = cache.fetch()
+
+    assert open(path, "rb").read() == remote
+    assert len(downloads()) == 2
+    assert ("REST", str(received[0])) in RecordingHandler.commands
+
+
+def test_changed_modification_time_downloads_again(server, cache):
+    root, _ = server
+    remote_file = root / REMOTE_PATH.lstrip("/")
+
+    cache.fetch()
+
+    # Same size, so only the modification time tells the copies apart
+    changed = os.urandom(SIZE)
+    remote_file.write_bytes(changed)
+    modified = os.stat(remote_file).st_mtime + 120
+    os.utime(remote_file, (modified, modified))
+
+    path = cache.fetch()
+
+    assert open(path, "rb").read() == changed
+    assert len(downloads()) == 2
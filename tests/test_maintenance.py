@@ -0,0 +1,113 @@
+"""
+Tests for the maintenance jobs, on database files of their own. The jobs only need
+to know whether the database is a local copy, so the app's database is left out.
+"""
+
+import logging
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from process.maintenance import Maintenance
+from process.settings import Settings
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "simplecte.db")
+    connection = sqlite3.connect(path)
+
+    with connection:
+        connection.execute("CREATE TABLE Contact (id INTEGER PRIMARY KEY, name TEXT)")
+        connection.executemany(
+            "INSERT INTO Contact (name) VALUES (?)", [("Ana",), ("Ben",)]
+        )
+
+    connection.close()
+
+    return path
+
+
+@pytest.fixture
+def maintenance(tmp_path, db_path, monkeypatch):
+    # The settings file lock is made in the working directory
+    monkeypatch.chdir(tmp_path)
+
+    settings = Settings(str(tmp_path / "settings.json"))
+    settings.settings["database"]["path"] = db_path
+    settings.settings["backup"]["path"] = str(tmp_path / "backups")
+    db = SimpleNamespace(ftp_cache=None, server_replica=None, disconnect=lambda: None)
+
+    return Maintenance(settings, db)
+
+
+def test_integrity_check_passes(maintenance, caplog):
+    with caplog.at_level(logging.INFO, logger="maintenance"):
+        maintenance.run_integrity_check()
+
+    assert not caplog.records
+    assert "integrity" in maintenance.config["lastRun"]
+
+
+def test_integrity_check_out_of_time_is_retried(maintenance, db_path, caplog):
+    # Enough rows that the check runs long enough to be interrupted
+    connection = sqlite3.connect(db_path)
+
+    with connection:
+        connection.executemany(
+            "INSERT INTO Contact (name) VALUES (?)", [("Cleo",)] * 20000
+        )
+
+    connection.close()
+    maintenance.config["integrityTimeLimit"] = -1
+
+    with caplog.at_level(logging.INFO, logger="maintenance"):
+        maintenance.run_integrity_check()
+
+    assert "ran out of time" in caplog.text
+    assert "integrity" not in maintenance.config["lastRun"]
+
+
+def test_integrity_check_on_locked_database_is_an_error(
+    maintenance, db_path, monkeypatch, caplog
+):
+    monkeypatch.setattr(
+        maintenance, "_connect", lambda: sqlite3.connect(db_path, timeout=0)
+    )
+    writer = sqlite3.connect(db_path, isolation_level=None)
+    writer.execute("BEGIN EXCLUSIVE")
+
+    try:
+        with caplog.at_level(logging.INFO, logger="maintenance"):
+            maintenance.run_integrity_check()
+    finally:
+        writer.rollback()
+        writer.close()
+
+    assert "database is locked" in caplog.text
+    assert "ran out of time" not in caplog.text
+    assert [r.levelno for r in caplog.records] == [logging.ERROR]
+
+
+def test_damaged_database_fails_integrity_check(maintenance, db_path, caplog):
+    with open(db_path, "r+b") as f:
+        f.write(b"not a database at all")
+
+    with caplog.at_level(logging.INFO, logger="maintenance"):
+        maintenance.run_integrity_check()
+
+    assert "failed its integrity check" in caplog.text
+
+
+def test_ftp_copy_is_maintained_without_rewriting_it(maintenance, tmp_path, db_path):
+    maintenance.settings.settings["database"]["path"] = str(tmp_path / "remote.db")
+    maintenance.db.ftp_cache = SimpleNamespace(local_path=db_path)
+
+    assert maintenance.db_path == db_path
+
+    maintenance.reschedule()
+
+    assert "integrity" in maintenance.scheduler._jobs
+    assert "analyze" not in maintenance.scheduler._jobs
+    assert "vacuum" not in maintenance.scheduler._jobs
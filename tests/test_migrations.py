@@ -0,0 +1,85 @@
+"""
+Tests for the migrations that fill new tables from data databases already have.
+"""
+
+import sqlite3
+
+import pytest
+
+from database.migrations import MIGRATIONS, migrate
+from database.replication import id_range
+
+# The tables as they were before the phone index and the name sounds were added
+SCHEMA = """
+CREATE TABLE Organization (id INTEGER PRIMARY KEY, name TEXT, phones JSON);
+CREATE TABLE Contact (
+    id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT, phone_numbers JSON
+);
+CREATE TABLE Phone (
+    id INTEGER PRIMARY KEY, digits TEXT, reversed_digits TEXT, extension TEXT,
+    organization INTEGER, contact INTEGER
+);
+CREATE TABLE NameSound (
+    id INTEGER PRIMARY KEY, code TEXT, organization INTEGER, contact INTEGER
+);
+INSERT INTO Organization VALUES (1, 'Riverside Food Bank', '[5551234567, 5557654321]');
+INSERT INTO Contact VALUES (1, 'Dana', 'Okafor Reyes', '[5550001111]');
+PRAGMA user_version = 1;
+"""
+
+
+@pytest.fixture
+def old_database(tmp_path):
+    path = str(tmp_path / "old.db")
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    connection.close()
+
+    return path
+
+
+def _replicate(path: str, block: int) -> tuple[int, int]:
+    """
+    Give a database an ID block, the way enable_replication() does.
+    """
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        "CREATE TABLE _sync_state (key TEXT PRIMARY KEY, value TEXT);"
+        f"INSERT INTO _sync_state VALUES ('block', '{block}');"
+    )
+    connection.close()
+
+    return id_range(block)
+
+
+def _ids(path: str, table: str) -> list[int]:
+    connection = sqlite3.connect(path)
+
+    try:
+        return [row[0] for row in connection.execute(f"SELECT id FROM {table}")]
+    finally:
+        connection.close()
+
+
+def test_name_sounds_use_sqlite_ids(old_database):
+    assert migrate(old_database) == len(MIGRATIONS) - 1
+    assert sorted(_ids(old_database, "NameSound"))[0] == 1
+
+
+def test_phone_index_uses_id_block(old_database):
+    start, end = _replicate(old_database, block=3)
+
+    migrate(old_database)
+    ids = _ids(old_database, "Phone")
+
+    assert sorted(ids) == list(range(start, start + 3))
+
+
+def test_name_sounds_use_id_block(old_database):
+    start, end = _replicate(old_database, block=3)
+
+    migrate(old_database)
+    ids = _ids(old_database, "NameSound")
+
+    assert len(ids) > 2
+    assert all(start <= i < end for i in ids)
@@ -0,0 +1,163 @@
+"""
+Tests for replication between two small databases with the same kind of tables as
+SimpleCTE's: records, and a link table whose foreign keys cascade like Pony's.
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+from database.replication import (
+    Replicator,
+    allocate_block,
+    enable_replication,
+    sync,
+)
+
+SCHEMA = """
+CREATE TABLE Organization (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL);
+CREATE TABLE Contact (id INTEGER PRIMARY KEY AUTOINCREMENT, first_name TEXT NOT NULL);
+CREATE TABLE Membership (
+    organization INTEGER NOT NULL REFERENCES Organization (id) ON DELETE CASCADE,
+    contact INTEGER NOT NULL REFERENCES Contact (id) ON DELETE CASCADE,
+    title TEXT,
+    PRIMARY KEY (organization, contact)
+);
+INSERT INTO Organization VALUES (1, 'Westfield Food Bank');
+INSERT INTO Contact VALUES (1, 'Ana'), (2, 'Ben');
+INSERT INTO Membership VALUES (1, 1, 'Primary');
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA foreign_keys = ON")  # Like Pony's connections
+
+    return connection
+
+
+def _run(path: str, sql: str, *args) -> None:
+    connection = _connect(path)
+
+    with connection:
+        connection.execute(sql, args)
+
+    connection.close()
+
+
+def _rows(path: str, sql: str) -> list[tuple]:
+    connection = _connect(path)
+
+    try:
+        return connection.execute(sql).fetchall()
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def nodes(tmp_path):
+    paths = []
+
+    for block in (1, 2):
+        path = str(tmp_path / f"node{block}.db")
+        connection = sqlite3.connect(path)
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        enable_replication(path, block=block)
+        paths.append(path)
+
+    return paths
+
+
+def test_enable_only_sends_new_changes(nodes):
+    first, _ = nodes
+
+    # The records that were there before count as shared, so they are never sent
+    assert _rows(first, "SELECT DISTINCT version FROM _sync_meta") == [(0,)]
+
+    _run(first, "INSERT INTO Contact VALUES (10000000, 'Cleo')")
+
+    with Replicator(first) as replicator:
+        assert _rows(first, "SELECT pk, origin FROM _sync_meta WHERE version > 0") == [
+            ("[10000000]", replicator.node)
+        ]
+
+
+def test_sync_exchanges_changes_both_ways(nodes):
+    first, second = nodes
+    _run(first, "INSERT INTO Contact VALUES (10000000, 'Cleo')")
+    _run(second, "UPDATE Organization SET name = 'Westfield Pantry' WHERE id = 1")
+
+    assert sync(first, second) == (1, 1)
+
+    for path in nodes:
+        assert _rows(path, "SELECT * FROM Organization") == [(1, "Westfield Pantry")]
+        assert (10000000, "Cleo") in _rows(path, "SELECT * FROM Contact")
+
+    # Nothing is sent twice
+    assert sync(first, second) == (0, 0)
+
+
+def test_conflicting_changes_keep_the_latest(nodes):
+    first, second = nodes
+    _run(first, "UPDATE Organization SET name = 'Westfield Pantry' WHERE id = 1")
+    time.sleep(0.01)
+    _run(second, "UPDATE Organization SET name = 'Westfield Kitchen' WHERE id = 1")
+
+    sync(second, first)
+
+    for path in nodes:
+        assert _rows(path, "SELECT name FROM Organization") == [("Westfield Kitchen",)]
+
+
+@pytest.mark.parametrize("deleting_node_first", [True, False])
+def test_deleting_a_record_removes_links_to_it_on_both_nodes(
+    nodes, deleting_node_first
+):
+    first, second = nodes
+
+    # One node deletes the organization while the other links another contact to it
+    _run(first, "DELETE FROM Organization WHERE id = 1")
+    _run(second, "INSERT INTO Membership VALUES (1, 2, 'Volunteer')")
+
+    if deleting_node_first:
+        sync(first, second)
+    else:
+        sync(second, first)
+
+    for path in nodes:
+        assert _rows(path, "SELECT * FROM Organization") == []
+        assert _rows(path, "SELECT * FROM Membership") == []
+        assert _rows(path, "PRAGMA foreign_key_check") == []
+
+    # The links deleted along with it are passed on as deletions too
+    assert _rows(
+        second,
+        "SELECT pk FROM _sync_meta WHERE tbl = 'Membership' AND deleted = 1 ORDER BY pk",
+    ) == [("[1,1]",), ("[1,2]",)]
+
+
+def test_exported_changes_are_imported_once(nodes):
+    first, second = nodes
+    _run(first, "UPDATE Contact SET first_name = 'Benjamin' WHERE id = 2")
+
+    with Replicator(first) as source, Replicator(second) as destination:
+        data = source.export_changes(destination.node)
+
+        assert destination.apply(data) == 1
+        assert destination.apply(data) == 0
+
+        # Already exported, so the next export is empty
+        assert destination.apply(source.export_changes(destination.node)) == 0
+
+    assert _rows(second, "SELECT first_name FROM Contact WHERE id = 2") == [
+        ("Benjamin",)
+    ]
+
+
+def test_allocated_blocks_are_never_reused(nodes):
+    first, _ = nodes
+
+    assert [allocate_block(first) for _ in range(3)] == [2, 3, 4]
@@ -0,0 +1,83 @@
+"""
+Tests for the maintenance scheduler, with short delays so they run quickly.
+"""
+
+import threading
+import time
+
+import pytest
+
+from utils.scheduler import Budget, Scheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler(Budget(cpu=1, io=None))
+    scheduler.start()
+
+    yield scheduler
+
+    scheduler.stop(wait=True)
+
+
+def _wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.01)
+
+
+def test_jobs_run_by_due_time_then_priority(scheduler):
+    ran = []
+    at = time.time() + 0.1
+
+    scheduler.schedule("late", lambda: ran.append("late"), at=at + 0.1)
+    scheduler.schedule("low", lambda: ran.append("low"), at=at, priority=20)
+    scheduler.schedule("high", lambda: ran.append("high"), at=at, priority=0)
+
+    _wait_for(lambda: len(ran) == 3)
+
+    assert ran == ["high", "low", "late"]
+
+
+def test_interval_jobs_repeat_until_cancelled(scheduler):
+    runs = []
+    scheduler.schedule("repeat", lambda: runs.append(time.time()), interval=0.05)
+
+    _wait_for(lambda: len(runs) >= 3)
+    scheduler.cancel("repeat")
+    count = len(runs)
+    time.sleep(0.2)
+
+    assert len(runs) == count
+    assert scheduler.next_due("repeat") is None
+
+
+def test_scheduling_a_name_again_replaces_the_job(scheduler):
+    ran = []
+    scheduler.schedule("upload", lambda: ran.append("first"), delay=0.1)
+    scheduler.schedule("upload", lambda: ran.append("second"), delay=0.1)
+
+    _wait_for(lambda: ran)
+    time.sleep(0.15)
+
+    assert ran == ["second"]
+
+
+def test_failing_job_does_not_stop_the_scheduler(scheduler):
+    done = threading.Event()
+
+    scheduler.schedule("broken", lambda: 1 / 0)
+    scheduler.schedule("next", done.set, delay=0.05)
+
+    assert done.wait(5)
+
+
+def test_budget_pauses():
+    budget = Budget(cpu=0.25, io=1000)
+
+    assert budget.io_pause(500) == 0.5
+    assert budget.cpu_pause(1) == pytest.approx(3)
+    assert Budget(cpu=1, io=None).cpu_pause(1) == 0
+    assert Budget(cpu=1, io=None).io_pause(500) == 0
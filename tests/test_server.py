@@ -0,0 +1,141 @@
+"""
+Tests for the database server, run on its own event loop thread against the
+test database, with RemoteDatabase and ServerReplica as clients.
+"""
+
+import asyncio
+import socket
+import sqlite3
+import threading
+
+import pytest
+from pony import orm
+
+from database import Organization
+from database.remote import RemoteDatabase, ServerReplica
+from database.replication import get_id_block
+from database.server import DatabaseServer
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    yield loop
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    loop.close()
+
+
+def _run(loop, coroutine):
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result(timeout=30)
+
+
+@pytest.fixture
+def server(database, loop):
+    server = DatabaseServer(database, port=0)
+    _run(loop, server.start())
+
+    yield server
+
+    _run(loop, server.close())
+
+
+def test_bad_content_length_is_rejected(server):
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as s:
+        s.sendall(b"POST /records/contact HTTP/1.1\r\nContent-Length: lots\r\n\r\n")
+        response = s.recv(4096)
+
+    assert response.startswith(b"HTTP/1.1 400")
+
+
+def _create(database, name: str | None):
+    def action():
+        if name is None:
+            raise ValueError("Organizations need a name.")
+
+        return database.create_organization(name=name, type="Community").id
+
+    return action
+
+
+def test_writes_arriving_together_are_committed_together(server, loop, database):
+    commits = []
+    database.commit_listeners.append(lambda: commits.append(1))
+
+    async def write_all():
+        return await asyncio.gather(
+            *(server._write(_create(database, f"Batch {i}")) for i in range(10))
+        )
+
+    try:
+        ids = _run(loop, write_all())
+    finally:
+        database.commit_listeners.pop()
+
+    assert len(set(ids)) == 10
+    assert commits == [1]
+
+    with orm.db_session:
+        assert [Organization[i].name for i in ids] == [f"Batch {i}" for i in range(10)]
+
+
+def test_failed_write_does_not_undo_the_rest_of_its_group(server, loop, database):
+    async def write_all():
+        return await asyncio.gather(
+            server._write(_create(database, "Before the failure")),
+            server._write(_create(database, None)),
+            server._write(_create(database, "After the failure")),
+            return_exceptions=True,
+        )
+
+    first, failed, last = _run(loop, write_all())
+
+    assert isinstance(failed, ValueError)
+
+    with orm.db_session:
+        assert Organization[first].name == "Before the failure"
+        assert Organization[last].name == "After the failure"
+
+
+def test_replica_syncs_both_ways(server, database, tmp_path):
+    org = database.create_organization(name="Eastgate Makerspace", type="Community")
+    replica = ServerReplica(
+        RemoteDatabase("127.0.0.1", server.port), cache_path=str(tmp_path)
+    )
+    path = replica.fetch()
+
+    # The copy gets a block of its own, above the server's
+    assert get_id_block(path) not in (None, database.id_block)
+
+    connection = sqlite3.connect(path)
+
+    try:
+        name = connection.execute(
+            "SELECT name FROM Organization WHERE id = ?", (org.id,)
+        ).fetchone()[0]
+        assert name == "Eastgate Makerspace"
+
+        with connection:
+            connection.execute(
+                "UPDATE Organization SET name = 'Eastgate Makers' WHERE id = ?",
+                (org.id,),
+            )
+
+        assert replica.sync() == 0
+
+        with orm.db_session:
+            assert Organization[org.id].name == "Eastgate Makers"
+
+        later = database.create_organization(name="Harbor Co-op", type="Community")
+
+        assert replica.sync() >= 1
+        assert connection.execute(
+            "SELECT name FROM Organization WHERE id = ?", (later.id,)
+        ).fetchone() == ("Harbor Co-op",)
+    finally:
+        connection.close()
+        replica.remote.close()
@@ -0,0 +1,81 @@
+"""
+Tests for DatabaseWorker, with a stand-in for the window that keeps the events it
+receives, so the test can hand them to dispatch() like the main loop does.
+"""
+
+import queue
+
+import pytest
+
+from process.worker import WORKER_EVENT, DatabaseWorker
+
+
+class Window:
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def write_event_value(self, key, value):
+        self.events.put((key, value))
+
+    def next_result(self):
+        key, value = self.events.get(timeout=5)
+        assert key == WORKER_EVENT
+
+        return value
+
+
+@pytest.fixture
+def window():
+    return Window()
+
+
+def test_callbacks_run_in_submit_order(database, window):
+    worker = DatabaseWorker(window, database)
+    results = []
+
+    try:
+        for number in range(3):
+            worker.submit(lambda n=number: n * 10, callback=results.append)
+
+        worker.submit(lambda: 1 / 0, error=lambda e: results.append(type(e).__name__))
+
+        for _ in range(4):
+            worker.dispatch(window.next_result())
+    finally:
+        worker.stop()
+
+    assert results == [0, 10, 20, "ZeroDivisionError"]
+
+
+def test_call_returns_the_result(database, window):
+    worker = DatabaseWorker(window, database)
+
+    try:
+        assert worker.call(lambda a, b: a + b, 2, 3) == 5
+        assert worker.call(lambda: "read", read=True) == "read"
+    finally:
+        worker.stop()
+
+    assert window.events.empty()
+
+
+def test_new_worker_ignores_results_of_stopped_worker(database, window):
+    old = DatabaseWorker(window, database)
+    old.submit(lambda: "old", callback=lambda value: None)
+    old.stop()
+
+    # Still waiting in the window's queue when the worker is replaced,
+    # like after restoring a backup
+    stale = window.next_result()
+
+    new = DatabaseWorker(window, database)
+    results = []
+
+    try:
+        new.submit(lambda: "new", callback=results.append)
+        new.dispatch(stale)
+        new.dispatch(window.next_result())
+    finally:
+        new.stop()
+
+    assert results == ["new"]